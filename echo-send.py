@@ -14,18 +14,29 @@
 # limitations under the License.
 
 import getopt
-import socket
+import json
 import sys
 import traceback
+from zephyr.common import echo_client
 from zephyr.common import exceptions
-
-DEFAULT_ECHO_PORT = 5080
-TERMINATION_STRING = chr(0x03) + chr(0x04)
+from zephyr.common.zephyr_constants import DEFAULT_ECHO_PORT
 
 
 def usage():
     print('Usage: echo-send.py [-i <ip>] [-p <port>] [-d] [-c <protocol>]')
     print('                    [-o <output_string>] [-t <timeout>]')
+    print('       echo-send.py -l <seconds> [-n <connections>] [-r <rate>]')
+    print('                    [-k] [-i <ip>] [-p <port>] [-c <protocol>]')
+    print('       echo-send.py -w')
+    print('  -l, --load    Generate load for the given number of seconds and')
+    print('                print a JSON report of the throughput, errors and')
+    print('                latency percentiles')
+    print('  -n, --connections  Concurrent connections for the load')
+    print('  -r, --rate    Requests per second across all connections')
+    print('                (as fast as possible by default)')
+    print('  -k, --keep-alive  Send many requests per TCP connection')
+    print('  -w, --worker  Read batches of requests as JSON lines on stdin,')
+    print('                answering each on stdout, until stdin closes')
 
 
 arg_map, _ = getopt.getopt(
@@ -35,28 +46,47 @@ arg_map, _ = getopt.getopt(
     'c:'
     'o:'
     't:'
-    'h',
-    ['help', 'ip', 'port', 'protocol', 'timeout', 'out-str'])
+    'l:'
+    'n:'
+    'r:'
+    'kwh',
+    ['help', 'ip=', 'port=', 'protocol=', 'timeout=', 'out-str=', 'worker',
+     'load=', 'connections=', 'rate=', 'keep-alive'])
 
 ip_addr = 'localhost'
 port = DEFAULT_ECHO_PORT
 echo_request_string = "ping"
 protocol = "tcp"
 timeout = 5
+worker = False
+load_duration = None
+connections = 1
+rate = None
+keep_alive = False
 
 
 for arg, value in arg_map:
-    if arg in ('-i', 'ip'):
+    if arg in ('-i', '--ip'):
         ip_addr = value
-    elif arg in ('-p', 'port'):
+    elif arg in ('-p', '--port'):
         port = int(value)
-    elif arg in ('-c', 'protocol'):
+    elif arg in ('-c', '--protocol'):
         protocol = value
-    elif arg in ('-t', 'timeout'):
+    elif arg in ('-t', '--timeout'):
         timeout = float(value)
-    elif arg in ('-o', 'out-str'):
+    elif arg in ('-o', '--out-str'):
         echo_request_string = value
-    elif arg in ('-h', 'help'):
+    elif arg in ('-w', '--worker'):
+        worker = True
+    elif arg in ('-l', '--load'):
+        load_duration = float(value)
+    elif arg in ('-n', '--connections'):
+        connections = int(value)
+    elif arg in ('-r', '--rate'):
+        rate = float(value)
+    elif arg in ('-k', '--keep-alive'):
+        keep_alive = True
+    elif arg in ('-h', '--help'):
         usage()
         exit(0)
     else:
@@ -64,43 +94,20 @@ for arg, value in arg_map:
         raise exceptions.ArgMismatchException(
             "Option not recognized: " + arg)
 
-try:
-    req = echo_request_string + TERMINATION_STRING
-    if protocol == 'tcp':
-        new_socket = socket.create_connection((ip_addr, port), timeout)
-        new_socket.sendall(req)
-    elif protocol == 'udp':
-        new_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        new_socket.settimeout(timeout)
-        new_socket.sendto(req, (ip_addr, port))
-    else:
-        raise exceptions.ArgMismatchException(
-            'Unsupported self.protocol: ' + protocol)
-    new_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    new_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-    data = ''
-    if protocol == 'tcp':
-        while True:
-            new_data = new_socket.recv(2048)
-            """ :type: str"""
-            pos = new_data.find(TERMINATION_STRING)
-            if pos != -1:
-                data += new_data[0:pos]
-                break
-            else:
-                data += new_data
-
-    elif protocol == 'udp':
-        data, addr = new_socket.recvfrom(2048)
-
-    new_socket.close()
+if worker:
+    echo_client.run_echo_worker(sys.stdin, sys.stdout)
+    exit(0)
 
-    pos = data.find(TERMINATION_STRING)
-    out_str = data
-    if pos != -1:
-        out_str = data[0:pos]
+try:
+    if load_duration is not None:
+        report = echo_client.EchoClient(keep_alive=keep_alive).generate_load(
+            ip_addr, port, connections, rate, load_duration,
+            echo_request_string, protocol, timeout)
+        print(json.dumps(report, sort_keys=True))
+        exit(0)
 
-    print(out_str.strip())
+    print(echo_client.EchoClient().send(
+        ip_addr, port, echo_request_string, protocol, timeout).strip())
 
 except Exception as e:
     sys.stderr.write("ERROR: " + str(e))
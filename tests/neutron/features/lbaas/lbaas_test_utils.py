@@ -25,6 +25,7 @@ from zephyr.tsm.neutron_test_case import NeutronTestCase
 LBNetData = namedtuple('LBNetData', 'lbaas member pinger router member_vms')
 
 NUM_PACKETS_TO_SEND = 50
+MAX_MISSED_IN_A_ROW = 5
 DEFAULT_POOL_PORT = DEFAULT_ECHO_PORT
 
 
@@ -169,15 +170,14 @@ class LBaaSTestCase(NeutronTestCase):
         net_id = self.topos[name][net]['network']['id']
         gw_ip = self.topos[name][net]['subnet']['gateway_ip']
 
-        ret = []
         new_name = name.translate(None, 'aeiou')
-        for i in range(0, num_members):
-            ret.append(GuestData(*self.create_vm_server(
-                name='m_' + new_name + '_' + str(i),
-                net_id=net_id,
-                gw_ip=gw_ip,
-                hv_host=hv_host)))
-        return ret
+        servers = self.create_vm_servers(
+            [{'name': 'm_' + new_name + '_' + str(i),
+              'net_id': net_id,
+              'gw_ip': gw_ip,
+              'hv_host': hv_host}
+             for i in range(0, num_members)])
+        return [GuestData(*server) for server in servers]
 
     def create_pinger_vm(self,
                          name='main',
@@ -344,34 +344,42 @@ class LBaaSTestCase(NeutronTestCase):
 
             self.LOG.debug("Sending " + str(num_packets) +
                            " TCP count from LBaaS VM to VIP:" + str(vip))
+            # Send in batches no bigger than the allowed run of misses, so
+            # an unreachable VIP is given up on as soon as it was before
             streak_no_response = 0
-            for i in range(0, num_packets):
-                reply = pinger.vm.send_echo_request(
+            sent = 0
+            while sent < num_packets:
+                replies = pinger.vm.send_echo_requests(
                     dest_ip=str(vip), dest_port=to_port,
-                    echo_request='ping').strip()
-                self.LOG.debug('Got reply from echo-server: ' + reply)
-                replying_vm = reply.split(':')[-1]
-                if replying_vm != '':
-                    if replying_vm not in host_replies:
-                        if "MISMATCH_RESPONSE_" + replying_vm \
-                                not in host_replies:
+                    echo_requests=['ping'] * min(
+                        MAX_MISSED_IN_A_ROW, num_packets - sent))
+                for r in replies:
+                    sent += 1
+                    reply = r['reply'].strip()
+                    self.LOG.debug('Got reply from echo-server: ' + reply)
+                    replying_vm = reply.split(':')[-1]
+                    if replying_vm != '':
+                        if replying_vm not in host_replies:
+                            if "MISMIATCHED_RESPONSE_" + replying_vm \
+                                    not in host_replies:
+                                host_replies["MISMIATCHED_RESPONSE_" +
+                                             replying_vm] = 0
                             host_replies["MISMIATCHED_RESPONSE_" +
-                                         replying_vm] = 0
-                        host_replies["MISMIATCHED_RESPONSE_" +
-                                     replying_vm] += 1
+                                         replying_vm] += 1
+                        else:
+                            host_replies[replying_vm] += 1
+                        streak_no_response = 0
                     else:
-                        host_replies[replying_vm] += 1
-                    streak_no_response = 0
-                else:
-                    host_replies["NO_RESPONSE"] += 1
-                    streak_no_response += 1
-                    if streak_no_response >= 5:
-                        self.LOG.fatal("5 missed packets in a row: giving up")
-                        # Fill in the rest of the "NO_RESPONSE"
-                        # (minus one because we already marked
-                        # this packet as NO_RESPONSE)
-                        host_replies["NO_RESPONSE"] += num_packets - i - 1
-                        break
+                        host_replies["NO_RESPONSE"] += 1
+                        streak_no_response += 1
+                        if streak_no_response >= MAX_MISSED_IN_A_ROW:
+                            self.LOG.fatal(
+                                str(MAX_MISSED_IN_A_ROW) +
+                                " missed packets in a row: giving up")
+                            # Fill in the rest of the "NO_RESPONSE"
+                            host_replies["NO_RESPONSE"] += num_packets - sent
+                            sent = num_packets
+                            break
         finally:
             for g in member_list:
                 g.vm.stop_echo_server(ip_addr=g.ip, port=to_port)
@@ -35,6 +35,8 @@ L2GWPeeredTopo = namedtuple("L2GWPeeredTopo", "east west")
 
 
 class L2GWNeutronTestCase(NeutronTestCase):
+    # The peering topologies bind fixed tunnel CIDRs to host interfaces
+    parallel_safe = False
     l2_setup = False
 
     @classmethod
@@ -21,6 +21,9 @@ from zephyr.tsm import test_case
 
 
 class TestExternalConnectivity(neutron_test_case.NeutronTestCase):
+    # Uses the edge routers
+    parallel_safe = False
+
     @neutron_test_case.require_extension('extraroute')
     @test_case.require_hosts(['edge1', 'ext1'])
     def test_neutron_api_ping_external(self):
@@ -21,6 +21,9 @@ from zephyr.tsm import test_case
 
 
 class TestExtraRoutes(NeutronTestCase):
+    # Uses the edge router
+    parallel_safe = False
+
     def __init__(self, run_method='runTest'):
         super(TestExtraRoutes, self).__init__(run_method)
         self.net1 = None
@@ -21,6 +21,9 @@ from zephyr.tsm import test_case
 
 
 class TestFloatingIP(neutron_test_case.NeutronTestCase):
+    # Uses the edge router
+    parallel_safe = False
+
     @neutron_test_case.require_extension('extraroute')
     def test_external_connectivity_via_fip_assigned_after_creation(self):
         # Create a SG to allow pings to come back into a FIP (just
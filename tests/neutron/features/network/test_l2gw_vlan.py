@@ -20,6 +20,8 @@ from zephyr.vtm.l2gw_fixture import L2GWFixture
 
 
 class TestL2GWVLAN(NeutronTestCase):
+    # Binds a port to a compute host interface
+    parallel_safe = False
     l2_setup = False
 
     @classmethod
@@ -25,20 +25,36 @@ from zephyr.common import exceptions
 from zephyr.common import file_location
 from zephyr.common import log_slicer
 
+MERGED_LOG_FILE = 'merged.log'
+
 
 def usage(except_obj):
-    print('Usage: tsm-log-slicer.py -r results_dir [-l <leeway>] [-d] ')
+    print('Usage: tsm-log-slicer.py -r results_dir [-l <leeway>] '
+          '[-p <processes>] [-i] [-m] [-d] ')
     print('')
+    print('   Merge Options:')
+    print('     -m, --merge')
+    print('         Instead of slicing, merge all the logs in full-logs')
+    print('         into one time-ordered log, ' + MERGED_LOG_FILE + ',')
+    print('         with each line tagged with its log\'s name.')
     print('   Slice Options:')
     print('     -l, --leeway')
     print('         Set leeway time for logs (default +/- 5 seconds).')
+    print('     -i, --by-test-id')
+    print('         Slice JSON-lines logs by the test id on each record,')
+    print('         rather than by time, so records of tests running at')
+    print('         the same time are left out.')
+    print('     -p, --processes')
+    print('         Number of log files to slice in parallel (default is')
+    print('         the number of CPUs).')
     print('   Debug Options:')
     print('     -d, --debug')
     print('         Turn on DEBUG logging (and split log output to stdout).')
     print('   Required Parameters:')
     print('     -r, --results-dir <dir>')
     print('          Results directory for the test run (must have')
-    print('          results.json file and full-logs directory).')
+    print('          results.json file and full-logs directory, or just')
+    print('          full-logs when merging).')
     if except_obj is not None:
         raise except_obj
 
@@ -49,12 +65,18 @@ try:
         (
             'h'
             'd'
+            'i'
             'l:'
+            'm'
+            'p:'
             'r:'
         ),
         [
             'help',
             'leeway=',
+            'by-test-id',
+            'merge',
+            'processes=',
             'debug',
             'results-dir=',
         ])
@@ -63,6 +85,9 @@ try:
     debug = False
     results_dir = None
     leeway = 5
+    processes = None
+    merge = False
+    by_test_id = False
 
     for arg, value in arg_map:
         if arg in ('-h', '--help'):
@@ -74,6 +99,12 @@ try:
             debug = True
         elif arg in ('-l', '--leeway'):
             leeway = value
+        elif arg in ('-p', '--processes'):
+            processes = int(value)
+        elif arg in ('-m', '--merge'):
+            merge = True
+        elif arg in ('-i', '--by-test-id'):
+            by_test_id = True
         else:
             raise exceptions.ArgMismatchException('Invalid argument' + arg)
 
@@ -81,6 +112,18 @@ try:
         usage(exceptions.ArgMismatchException(
             "Results directory is a required parameter!"))
 
+    log_files = [file_location.FileLocation(f)
+                 for f in cli.LinuxCLI.ls(results_dir + '/full-logs/*')]
+
+    if merge:
+        print('Merging log files: ' + str([f.full_path() for f in log_files]))
+        count = log_slicer.merge_log_files(
+            [(f, None, 0) for f in log_files],
+            results_dir + '/' + MERGED_LOG_FILE)
+        print('Wrote ' + str(count) + ' log records to: ' +
+              results_dir + '/' + MERGED_LOG_FILE)
+        sys.exit(0)
+
     print('Reading results from:' + results_dir + '/results.json')
     with open(results_dir + '/results.json', 'r') as fp:
         result_map = json.load(fp)
@@ -88,23 +131,35 @@ try:
     print('Read results: ')
     pprint.pprint(result_map)
 
-    log_files = cli.LinuxCLI.ls(results_dir + '/full-logs/*')
-    print('Slicing log files: ' + str(log_files))
+    print('Slicing log files: ' + str([f.full_path() for f in log_files]))
 
+    windows = []
+    test_dirs = {}
     for tc in result_map['testsuite']['testcases']:
-        start_time = tc["starttime"]
-        stop_time = tc["stoptime"]
         tcname = tc["name"]
-        print("Creating sliced log-files for test: " + tcname)
         cli.LinuxCLI(priv=False).mkdir(results_dir + '/' + tcname)
-        log_slicer.slice_log_files_by_time(
-            log_files=[file_location.FileLocation(f) for f in log_files],
-            out_dir=results_dir + '/' + tcname,
-            slice_start_time=datetime.datetime.strptime(
-                start_time, '%Y-%m-%d %H:%M:%S,%f'),
-            slice_stop_time=datetime.datetime.strptime(
-                stop_time, '%Y-%m-%d %H:%M:%S,%f'),
-            leeway=leeway)
+        test_dirs[tc['classname'] + '.' + tcname] = results_dir + '/' + tcname
+        windows.append((results_dir + '/' + tcname,
+                        datetime.datetime.strptime(
+                            tc["starttime"], '%Y-%m-%d %H:%M:%S,%f'),
+                        datetime.datetime.strptime(
+                            tc["stoptime"], '%Y-%m-%d %H:%M:%S,%f')))
+
+    if by_test_id:
+        json_logs = [f for f in log_files
+                     if log_slicer.is_json_log(f.full_path())]
+        print('Slicing JSON log files by test id: ' +
+              str([f.full_path() for f in json_logs]))
+        log_slicer.slice_json_logs_by_test(json_logs, test_dirs)
+        log_files = [f for f in log_files if f not in json_logs]
+
+    print("Creating sliced log-files for tests: " +
+          str([w[0] for w in windows]))
+    log_slicer.slice_log_files_by_windows(
+        log_files=log_files,
+        windows=windows,
+        leeway=leeway,
+        processes=processes)
 
 except exceptions.ExitCleanException:
     exit(1)
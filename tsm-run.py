@@ -36,6 +36,7 @@ from zephyr.vtm.virtual_topology_manager import VirtualTopologyManager
 def usage(except_obj):
     print('Usage: tsm-run.py -t <tests> ')
     print('                  [-u <underlay_config>] [-n <name>] [-d]')
+    print('                  [-w <workers>] [-q]')
     print('                  [extra_options]')
     print('')
     print('   Test Execution Options:')
@@ -44,6 +45,10 @@ def usage(except_obj):
     print('         separated by commas with no spaces.')
     print('     -n, --name <name>')
     print('         Name this test run (timestamp by default).')
+    print('     -w, --workers <num>')
+    print('         Run test classes in parallel across this many workers,')
+    print('         each with its own tenant, networks and VM names (1 by')
+    print('         default, to run all tests serially).')
     print('   Underlay Options:')
     print('     -u, --underlay_config <config>')
     print('         Load the underlay from the given config file. ')
@@ -60,9 +65,16 @@ def usage(except_obj):
     print('         List of arguments to give the selected client.  These')
     print('         should be key=value pairs, separated by commas, with no')
     print('         spaces.')
+    print('     --neutron-cache-ttl <seconds>')
+    print('         Cache neutron list/show results for up to this many')
+    print('         seconds (dropped on any change made through the')
+    print('         client).  No caching by default.')
     print('   Debug Options:')
     print('     -d, --debug')
     print('         Turn on DEBUG logging (and split log output to stdout).')
+    print('     -q, --queued-logging')
+    print('         Write logs from a background thread, so tests do not')
+    print('         wait on log output (all logs are flushed at the end).')
     print('   Output File Options:')
     print('     -l, --log-dir <dir>')
     print('         Log file directory (default: /tmp/zephyr/results)')
@@ -88,17 +100,22 @@ try:
             'l:'
             'r:'
             'a:'
+            'w:'
+            'q'
         ),
         [
             'help',
             'tests=',
             'name=',
+            'workers=',
             'underlay_config=',
             'client=',
             'client-auth=',
             'client-args=',
+            'neutron-cache-ttl=',
             'log-dir=',
             'debug',
+            'queued-logging',
             'results-dir=',
             'debug-test'
         ])
@@ -107,6 +124,7 @@ try:
     client_impl_type = 'neutron'
     client_auth_type = 'noauth'
     client_args = {}
+    neutron_cache_ttl = None
     tests = ''
     underlay_config = z_con.DEFAULT_UNDERLAY_CONFIG
     debug = False
@@ -114,6 +132,8 @@ try:
     log_dir = '/tmp/zephyr/logs'
     results_dir = '/tmp/zephyr/results'
     topology = '2z-3c-2edge.json'
+    workers = 1
+    queued_logging = False
     name = datetime.datetime.utcnow().strftime('%Y_%m_%d_%H-%M-%S')
 
     for arg, value in arg_map:
@@ -128,6 +148,11 @@ try:
             tests = value.split(',')
         elif arg in ('-n', '--name'):
             name = value
+        elif arg in ('-w', '--workers'):
+            if not value.isdigit() or int(value) < 1:
+                usage(ArgMismatchException(
+                    'Workers should be a positive number'))
+            workers = int(value)
         elif arg in ('-u', '--underlay-config'):
             underlay_config = value
         elif arg in ('-c', '--client'):
@@ -138,6 +163,8 @@ try:
             log_dir = value
         elif arg in ('-d', '--debug'):
             debug = True
+        elif arg in ('-q', '--queued-logging'):
+            queued_logging = True
         elif arg in '--debug-test':
             test_debug = True
         elif arg in ('-r', '--results-dir'):
@@ -155,6 +182,12 @@ try:
                         'Client args should be key=value pairs, with '
                         'one "=", separated by "," and no spaces.'))
                 client_args[p[0]] = p[1]
+        elif arg == '--neutron-cache-ttl':
+            try:
+                neutron_cache_ttl = float(value)
+            except ValueError:
+                usage(ArgMismatchException(
+                    'Neutron cache TTL should be a number of seconds'))
         else:
             raise ArgMismatchException('Invalid argument' + arg)
 
@@ -181,13 +214,14 @@ try:
                 'password': os.environ.get('OS_PASSWORD', 'cat'),
                 'tenant_name': os.environ.get('OS_TENANT_NAME', 'admin')}
         base_client_args.update(client_args)
-        client_impl = create_neutron_client(**base_client_args)
+        client_impl = create_neutron_client(cache_ttl=neutron_cache_ttl,
+                                            **base_client_args)
     else:
         raise ArgMismatchException(
             'Invalid client API implementation:' + client_impl_type)
 
     print('Setting up log manager with debug=' + str(debug))
-    log_manager = LogManager(root_dir=log_dir)
+    log_manager = LogManager(root_dir=log_dir, queued=queued_logging)
     console_log = log_manager.add_stdout_logger(
         name='tsm-run-console',
         log_level=logging.DEBUG if debug is True else logging.INFO)
@@ -203,7 +237,7 @@ try:
     vtm.read_underlay_config(underlay_config)
 
     console_log.debug('Setting up tsm')
-    tsm = TestSystemManager(vtm, log_manager=log_manager)
+    tsm = TestSystemManager(vtm, log_manager=log_manager, workers=workers)
     tsm.configure_logging(debug=debug)
 
     if test_debug:
@@ -267,6 +301,7 @@ try:
     finally:
         rdir = results_dir + '/' + name
         tsm.create_results(results_dir=rdir)
+        log_manager.stop()
 
 except ExitCleanException:
     exit(1)
@@ -17,7 +17,9 @@ import os
 import pwd
 import subprocess
 import time
+from zephyr.common import cmd_daemon
 from zephyr.common.exceptions import *
+from zephyr.common.process_table import process_table
 
 
 def _create_ns(name):
@@ -25,6 +27,10 @@ def _create_ns(name):
 
 
 def _remove_ns(name):
+    daemon = cmd_daemon.get_client()
+    if daemon is not None:
+        # Its helper for the namespace would keep it alive
+        daemon.release_netns(name)
     LinuxCLI().cmd('ip netns del ' + name)
 
 
@@ -84,7 +90,8 @@ class CommandStatus(object):
         """ :type: list[subprocess.Popen]"""
 
     def __repr__(self):
-        return 'PID: ' + str(self.process.pid) + '\n' + \
+        return 'PID: ' + (str(self.process.pid) if self.process
+                          else '') + '\n' + \
                'RETCODE: ' + str(self.ret_code) + '\n' + \
                'CMD: ' + self.command + '\n' + \
                'STDOUT: [' + self.stdout + ']' + '\n' + \
@@ -152,7 +159,7 @@ class LinuxCLI(object):
         if len(commands) == 0:
             return ret
 
-        cmd_array = [(['timeout'] if timeout else []) +
+        cmd_array = [(['timeout', str(timeout)] if timeout else []) +
                      self.priv_prefix().split() + self.cmd_prefix().split() +
                      commands[0]]
 
@@ -170,6 +177,18 @@ class LinuxCLI(object):
         if self.debug is True:
             return CommandStatus(command=cmd_str)
 
+        # Whatever processes the command starts or stops must show up
+        process_table.invalidate()
+
+        daemon = self.get_cmd_daemon(blocking, stdin, stdout, stderr)
+        if daemon is not None:
+            daemon_cmds = ([(['timeout', str(timeout)] if timeout else []) +
+                            commands[0]] + commands[1:])
+            ret_code, out, err = daemon.execute(
+                daemon_cmds, netns=self.netns_name(), env=self.env_map)
+            return self.command_result(cmd_str, ret_code, out, err,
+                                       timeout, verify)
+
         processes = []
         """ :type: list[subprocess.Popen]"""
 
@@ -196,32 +215,9 @@ class LinuxCLI(object):
                                  process_array=processes)
 
         stdout, stderr = p.communicate()
-
-        # 'timeout' returns 124 on timeout
-        if p.returncode == 124 and timeout is not None:
-            raise SubprocessTimeoutException('Process timed out: ' + cmd_str)
-
-        out = ''
-        for line in stdout:
-            out += line
-
-        err = ''
-        for line in stderr:
-            err += line
-
-        if verify and p.returncode != 0:
-            raise SubprocessFailedException(
-                'Command: [' + str(cmd_str) + '] returned error: ' +
-                str(p.returncode) + ', output was stdout[' +
-                str(out) + ']/stderr[' + str(err) + ']')
-
-        if self.print_cmd_out:
-            print("stdout: " + str(out) + "/stderr: " + str(err))
-
-        return CommandStatus(process=p, command=cmd_str,
-                             ret_code=p.returncode,
-                             stdout=out, stderr=err,
-                             process_array=processes)
+        return self.command_result(cmd_str, p.returncode, stdout, stderr,
+                                   timeout, verify, process=p,
+                                   process_array=processes)
 
     def cmd(self, cmd_line, timeout=None, blocking=True,
             verify=False,
@@ -254,6 +250,17 @@ class LinuxCLI(object):
         if self.debug is True:
             return CommandStatus(command=cmd)
 
+        process_table.invalidate()
+
+        daemon = self.get_cmd_daemon(blocking, stdin, stdout, stderr)
+        if daemon is not None:
+            ret_code, out, err = daemon.execute(
+                ('timeout ' + str(timeout) + ' ' if timeout is not None
+                 else '') + cmd_line,
+                shell=True, netns=self.netns_name(), env=self.env_map)
+            return self.command_result(cmd, ret_code, out, err,
+                                       timeout, verify)
+
         p = subprocess.Popen(cmd, shell=True,
                              stdin=stdin, stdout=stdout, stderr=stderr,
                              env=self.env_map, preexec_fn=os.setsid)
@@ -261,30 +268,60 @@ class LinuxCLI(object):
             return CommandStatus(process=p, command=cmd)
 
         o, e = p.communicate()
+        return self.command_result(cmd, p.returncode, o, e, timeout, verify,
+                                   process=p)
 
+    def command_result(self, cmd, ret_code, out, err, timeout, verify,
+                       process=None, process_array=None):
+        """
+        Check the outcome of a finished blocking command and package it up
+        as a CommandStatus.
+        :type cmd: str
+        :type ret_code: int
+        :type out: str
+        :type err: str
+        :type timeout: int
+        :type verify: bool
+        :type process: subprocess.Popen
+        :type process_array: list[subprocess.Popen]
+        :return: zephyr.common.cli.CommandStatus
+        """
         # 'timeout' returns 124 on timeout
-        if p.returncode == 124 and timeout is not None:
+        if ret_code == 124 and timeout is not None:
             raise SubprocessTimeoutException('Process timed out: ' + cmd)
 
-        out = ''
-        for line in o if o else []:
-            out += line
-
-        err = ''
-        for line in e if e else []:
-            err += line
+        out = out if out else ''
+        err = err if err else ''
 
-        if verify and p.returncode != 0:
+        if verify and ret_code != 0:
             raise SubprocessFailedException(
                 'Command: [' + str(cmd) + '] returned error: ' +
-                str(p.returncode) + ', output was stdout[' +
+                str(ret_code) + ', output was stdout[' +
                 str(out) + ']/stderr[' + str(err) + ']')
 
         if self.print_cmd_out:
             print("stdout: " + str(out) + "/stderr: " + str(err))
 
-        return CommandStatus(process=p, command=cmd, ret_code=p.returncode,
-                             stdout=out, stderr=err)
+        return CommandStatus(process=process, command=cmd, ret_code=ret_code,
+                             stdout=out, stderr=err,
+                             process_array=process_array)
+
+    def get_cmd_daemon(self, blocking, stdin, stdout, stderr):
+        """
+        Get the privileged command daemon client to run a command through,
+        if one is running and the command can go through it: only blocking,
+        privileged commands with their standard streams left as pipes are
+        routed to the daemon.  Anything else is run as a local process.
+        :type blocking: bool
+        :return: zephyr.common.cmd_daemon.CommandDaemonClient
+        """
+        if (not self.priv or not blocking or stdin != subprocess.PIPE or
+                stdout != subprocess.PIPE or stderr != subprocess.PIPE):
+            return None
+        return cmd_daemon.get_client()
+
+    def netns_name(self):
+        return None
 
     def cmd_prefix(self):
         return ''
@@ -336,31 +373,33 @@ class LinuxCLI(object):
         Gets all running processes' PIDS as a list
         :return: list[str]
         """
-        return [i.strip()
-                for i in self.cmd(
-                "ps -aef | grep -v grep | awk '{print $2}'").stdout.split()]
+        return [str(pid) for pid in process_table.snapshot().pids()]
 
     def get_process_pids(self, process_name):
         """
-        Gets all running processes' PIDS which match the process name as a list
+        Gets all running processes' PIDS which match the process name as a
+        list (matching the owner or command line, like grepping 'ps -ef')
         :return: list[str]
         """
-        awk_cmd = r'{printf "%s\n", $2}'
-        return [i.strip() for i in
-                self.cmd("ps -aef | grep -v grep | grep " + process_name +
-                         r" | awk '" + awk_cmd + r"'").stdout.split()]
+        return [str(pid)
+                for pid in process_table.snapshot().find(process_name)]
 
-    def get_parent_pids(self, child_pid):
+    def get_parent_pids(self, child_pid, timeout=0):
         """
-        Gets all running processes' PIDS which match the process name as a list
+        Gets the PIDS of all the given process' children as a list, waiting
+        up to timeout seconds for it to start any
+        :type child_pid: int|str
+        :type timeout: float
         :return: list[str]
         """
-        return [i.strip() for i in
-                self.cmd("ps -aef | grep -v grep | awk '{ if ($3==" +
-                         str(child_pid) + ") print $2 }'").stdout.split()]
+        if timeout > 0:
+            return [str(pid) for pid in
+                    process_table.wait_for_children(child_pid, timeout)]
+        return [str(pid) for pid in
+                process_table.snapshot().children(child_pid)]
 
     def is_pid_running(self, pid):
-        return str(pid) in self.get_running_pids()
+        return process_table.is_running(pid)
 
     def replace_text_in_file(self, rfile, search_str, replace_str,
                              line_global_replace=False):
@@ -530,5 +569,8 @@ class NetNSCLI(LinuxCLI):
                                        log_cmd=log_cmd, logger=logger)
         self.name = name
 
+    def netns_name(self):
+        return self.name
+
     def cmd_prefix(self):
         return 'ip netns exec ' + self.name + ' '
@@ -0,0 +1,687 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ctypes
+import getopt
+import json
+import os
+import shutil
+import socket
+import SocketServer
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from zephyr.common.exceptions import *
+
+DAEMON_SOCKET_ENV = 'ZEPHYR_CMD_DAEMON_SOCKET'
+DAEMON_START_TIMEOUT = 10
+
+# How often the daemon looks for namespace helpers whose namespace has been
+# deleted (or replaced by a new one of the same name)
+NETNS_HELPER_CHECK_INTERVAL = 1.0
+
+NETNS_RUN_DIR = '/var/run/netns'
+NETNS_ETC_DIR = '/etc/netns'
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_SLAVE = 0x80000
+MNT_DETACH = 0x2
+ST_RDONLY = 0x1
+
+_HEADER = struct.Struct('!I')
+
+_client = None
+""" :type: CommandDaemonClient"""
+_client_lock = threading.Lock()
+# The directory start_cmd_daemon made for the socket, if it made one
+_socket_dir = None
+
+
+def send_message(sock, message):
+    """
+    :type sock: socket.socket
+    :type message: dict
+    """
+    data = json.dumps(message)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def recv_message(sock):
+    """
+    Read one message from the socket, or None if the peer closed it.
+    :type sock: socket.socket
+    :return: dict
+    """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+def encode_output(data):
+    # Command output is arbitrary bytes, which JSON can't carry, so map each
+    # byte to the code point of the same value
+    return (data or '').decode('latin-1')
+
+
+def decode_output(data):
+    return data.encode('latin-1')
+
+
+def _to_str(obj):
+    # JSON decodes every string as unicode, but Python 2's exec wants bytes
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    if isinstance(obj, list):
+        return [_to_str(i) for i in obj]
+    if isinstance(obj, dict):
+        return dict((_to_str(k), _to_str(v)) for k, v in obj.iteritems())
+    return obj
+
+
+def run_request(request):
+    """
+    Run the command(s) in a request and return the response message.  A
+    request holds either a single shell command line (with 'shell' set), or
+    a list of argv lists to pipe together, just like LinuxCLI.cmd and
+    LinuxCLI.cmd_pipe.
+    :type request: dict
+    :return: dict
+    """
+    request = _to_str(request)
+    netns = request.get('netns')
+    shell = request.get('shell', False)
+    commands = request['commands']
+    if shell:
+        commands = [commands]
+
+    if netns:
+        # Only when there's no namespace helper to run it (see
+        # NetNSHelper).  'ip netns exec' enters the namespace, remounts
+        # /sys for it (brctl, for one, reads it) and sets up any
+        # per-namespace /etc overrides.  Doing that in the forked child
+        # ourselves would mean running Python code between fork and exec
+        # in a threaded server, which can deadlock on locks other threads
+        # held at the fork.
+        prefix = 'ip netns exec ' + netns + ' '
+        commands = ([prefix + commands[0]] if shell
+                    else [prefix.split() + c for c in commands])
+
+    processes = []
+    """ :type: list[subprocess.Popen]"""
+    try:
+        for i in range(0, len(commands)):
+            p = subprocess.Popen(
+                commands[i], shell=shell,
+                stdin=subprocess.PIPE if i == 0 else processes[i - 1].stdout,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                env=request.get('env'), cwd=request.get('cwd'),
+                close_fds=True, preexec_fn=os.setsid)
+            processes.append(p)
+    except (OSError, ValueError) as e:
+        for p in processes:
+            p.kill()
+            p.wait()
+        return {'error': str(e)}
+
+    out, err = processes[-1].communicate()
+    for p in processes[:-1]:
+        p.wait()
+    return {'returncode': processes[-1].returncode,
+            'stdout': encode_output(out),
+            'stderr': encode_output(err)}
+
+
+def netns_id(name):
+    """
+    :type name: str
+    :return: (int, int) The device and inode of the named net namespace,
+    which change if it is deleted and added again, or None if there is no
+    such namespace
+    """
+    try:
+        st = os.stat(os.path.join(NETNS_RUN_DIR, name))
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def enter_netns(name):
+    """
+    Move this process into the named net namespace the way 'ip netns exec'
+    does: into the namespace, and into a mount namespace of its own, with
+    /sys remounted to show the net namespace's devices, and the files in
+    /etc/netns/<name> bound over the ones in /etc.  Only for a namespace
+    helper's own process, before it starts any threads.
+    :type name: str
+    """
+    libc = ctypes.CDLL(None, use_errno=True)
+
+    def check(ret, what):
+        if ret != 0:
+            raise SubprocessFailedException(
+                'Could not ' + what + ' for net namespace [' + name + ']: ' +
+                os.strerror(ctypes.get_errno()))
+
+    fd = os.open(os.path.join(NETNS_RUN_DIR, name), os.O_RDONLY)
+    try:
+        check(libc.setns(fd, CLONE_NEWNET), 'enter namespace')
+    finally:
+        os.close(fd)
+    check(libc.unshare(CLONE_NEWNS), 'unshare mounts')
+    # Keep mounts made outside showing up here, but not the other way
+    check(libc.mount('none', '/', None, MS_REC | MS_SLAVE, None),
+          'make mounts slaves')
+    mount_flags = 0
+    if libc.umount2('/sys', MNT_DETACH) != 0:
+        # No sysfs to unmount, or one we can only cover, and a read-only
+        # one can only be covered by another read-only one
+        if os.statvfs('/sys').f_flag & ST_RDONLY:
+            mount_flags = MS_RDONLY
+    check(libc.mount(name, '/sys', 'sysfs', mount_flags, None),
+          'mount /sys')
+
+    etc_dir = os.path.join(NETNS_ETC_DIR, name)
+    if os.path.isdir(etc_dir):
+        for entry in os.listdir(etc_dir):
+            libc.mount(os.path.join(etc_dir, entry),
+                       os.path.join('/etc', entry), 'none', MS_BIND, None)
+
+
+def wait_for_daemon(process, client, timeout):
+    """
+    Wait for a daemon process just started to accept connections.
+    :type process: subprocess.Popen
+    :type client: CommandDaemonClient
+    :type timeout: float
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            client.request({'commands': [['true']]})
+            break
+        except SubprocessFailedException as e:
+            client.close()
+            if process.poll() is not None:
+                raise SubprocessFailedException(
+                    'Command daemon exited with code ' +
+                    str(process.returncode))
+            if time.time() > deadline:
+                process.terminate()
+                process.wait()
+                raise SubprocessTimeoutException(
+                    'Command daemon did not start in time: ' + str(e))
+            time.sleep(0.05)
+    client.close()
+
+
+class NetNSHelper(object):
+    """
+    A child of the daemon which has entered a net namespace once (see
+    enter_netns), and runs the commands for that namespace from then on, so
+    they don't each pay for an 'ip netns exec'.  It serves them just as the
+    daemon does, on a socket of its own next to the daemon's, and exits
+    when the daemon closes its stdin (or dies).
+    """
+
+    def __init__(self, name, socket_path):
+        """
+        :type name: str
+        :type socket_path: str
+        """
+        self.name = name
+        self.ns_id = netns_id(name)
+        self.socket_path = socket_path
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'zephyr.common.cmd_daemon',
+             '-s', socket_path, '-n', name],
+            stdin=subprocess.PIPE, close_fds=True, preexec_fn=os.setsid)
+        self.client = CommandDaemonClient(socket_path)
+        try:
+            wait_for_daemon(self.process, self.client, DAEMON_START_TIMEOUT)
+        except SubprocessFailedException:
+            self.stop()
+            raise
+
+    def is_current(self):
+        """
+        :return: bool True if the helper is running, in the namespace which
+        now has its name
+        """
+        return (self.process.poll() is None and
+                netns_id(self.name) == self.ns_id)
+
+    def stop(self):
+        self.process.stdin.close()
+        self.process.wait()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class NetNSHelpers(object):
+    """
+    The daemon's namespace helpers, started the first time a command is run
+    in each namespace, and stopped once the namespace is gone.
+    """
+
+    def __init__(self, socket_dir):
+        """
+        :type socket_dir: str
+        """
+        self.socket_dir = socket_dir
+        self.helpers = {}
+        """ :type: dict[str, NetNSHelper]"""
+        self.locks = {}
+        """ :type: dict[str, threading.Lock]"""
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.pruner = threading.Thread(target=self.prune_loop)
+        self.pruner.daemon = True
+        self.pruner.start()
+
+    def netns_lock(self, name):
+        with self.lock:
+            if name not in self.locks:
+                self.locks[name] = threading.Lock()
+            return self.locks[name]
+
+    def get(self, name):
+        """
+        :type name: str
+        :return: NetNSHelper The helper for the namespace as it is now
+        (starting one if need be), or None if there is no such namespace
+        """
+        with self.netns_lock(name):
+            helper = self.helpers.get(name)
+            if helper is not None and helper.is_current():
+                return helper
+            if helper is not None:
+                self.release(name)
+            if netns_id(name) is None or self.stopped.is_set():
+                return None
+            helper = NetNSHelper(
+                name, os.path.join(self.socket_dir, 'netns-' + name + '.sock'))
+            with self.lock:
+                self.helpers[name] = helper
+            return helper
+
+    def release(self, name):
+        """
+        Stop the namespace's helper, if it has one, so it no longer holds
+        the namespace (and its interfaces) open.
+        :type name: str
+        """
+        with self.lock:
+            helper = self.helpers.pop(name, None)
+        if helper is not None:
+            helper.stop()
+
+    def prune_loop(self):
+        while not self.stopped.wait(NETNS_HELPER_CHECK_INTERVAL):
+            with self.lock:
+                stale = [name for name, helper in self.helpers.iteritems()
+                         if not helper.is_current()]
+            for name in stale:
+                self.release(name)
+
+    def stop(self):
+        self.stopped.set()
+        self.pruner.join()
+        with self.lock:
+            names = self.helpers.keys()
+        for name in names:
+            self.release(name)
+
+
+class CommandRequestHandler(SocketServer.BaseRequestHandler):
+    def handle(self):
+        while True:
+            request = recv_message(self.request)
+            if request is None:
+                return
+            if request.get('op') == 'shutdown':
+                send_message(self.request, {'returncode': 0})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            if request.get('op') == 'release_netns':
+                if self.server.netns_helpers is not None:
+                    self.server.netns_helpers.release(
+                        _to_str(request['netns']))
+                send_message(self.request, {'returncode': 0})
+                continue
+            send_message(self.request, self.server.run_request(request))
+
+
+class CommandDaemonServer(SocketServer.ThreadingMixIn,
+                          SocketServer.UnixStreamServer):
+    """
+    A long-lived, privileged command execution daemon.  Every privileged
+    LinuxCLI command normally costs a 'sudo -E' (plus an 'ip netns exec' for
+    NetNSCLI) on top of the command itself.  The daemon is started once as
+    root and runs commands on behalf of its clients, so no command pays for
+    a sudo.  Commands for a net namespace are handed to a helper which has
+    entered it once (see NetNSHelper), so they don't pay for an 'ip netns
+    exec' either.  Clients talk to it over a UNIX socket with
+    length-prefixed JSON messages, one connection per client thread.  The
+    socket must be in a directory no other user can write to (see
+    start_cmd_daemon).
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, owner_uid=None, owner_gid=None,
+                 netns_helpers=True):
+        """
+        :type socket_path: str
+        :type owner_uid: int
+        :type owner_gid: int
+        :type netns_helpers: bool Start namespace helpers (else run every
+        namespaced command through 'ip netns exec')
+        """
+        # Anyone who can write to the directory could swap the socket for
+        # their own, so refuse a shared one like /tmp
+        socket_dir = os.path.dirname(os.path.abspath(socket_path))
+        if os.stat(socket_dir).st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise ArgMismatchException(
+                'Command daemon socket directory [' + socket_dir +
+                '] must not be writable by other users')
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        # Only the user who started the daemon may connect: anyone who can
+        # reach the socket can run commands as root
+        old_umask = os.umask(0o177)
+        try:
+            SocketServer.UnixStreamServer.__init__(
+                self, socket_path, CommandRequestHandler)
+        finally:
+            os.umask(old_umask)
+        if owner_uid is not None:
+            os.chown(socket_path, owner_uid,
+                     owner_gid if owner_gid is not None else -1)
+        self.netns_helpers = (NetNSHelpers(socket_dir) if netns_helpers
+                              else None)
+
+    def run_request(self, request):
+        """
+        :type request: dict
+        :return: dict
+        """
+        netns = request.get('netns')
+        if netns and self.netns_helpers is not None:
+            try:
+                helper = self.netns_helpers.get(_to_str(netns))
+            except SubprocessFailedException:
+                # Leave it to 'ip netns exec'
+                helper = None
+            if helper is not None:
+                try:
+                    return helper.client.request(dict(request, netns=None))
+                except SubprocessFailedException as e:
+                    # The command may or may not have run, so don't run it
+                    # again
+                    self.netns_helpers.release(_to_str(netns))
+                    return {'error': str(e)}
+        return run_request(request)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        if self.netns_helpers is not None:
+            self.netns_helpers.stop()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class CommandDaemonClient(object):
+    """
+    Client side of the command daemon.  Each thread (and each process, as
+    the client may be inherited across a fork) keeps its own connection, so
+    concurrent commands run concurrently in the daemon.
+    """
+
+    def __init__(self, socket_path):
+        """
+        :type socket_path: str
+        """
+        self.socket_path = socket_path
+        self.local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self.local, 'sock', None)
+        if sock is not None and self.local.pid == os.getpid():
+            return sock
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error as e:
+            sock.close()
+            raise SubprocessFailedException(
+                'Could not connect to command daemon at [' +
+                self.socket_path + ']: ' + str(e))
+        self.local.sock = sock
+        self.local.pid = os.getpid()
+        return sock
+
+    def close(self):
+        sock = getattr(self.local, 'sock', None)
+        if sock is not None and self.local.pid == os.getpid():
+            sock.close()
+        self.local.sock = None
+
+    def request(self, message):
+        """
+        :type message: dict
+        :return: dict
+        """
+        try:
+            send_message(self._connection(), message)
+        except socket.error:
+            # A failed send (EPIPE, once the daemon has closed this
+            # connection) means the request never reached the daemon, so
+            # retry it once on a fresh connection.  A closed connection
+            # may also take the send and only fail on the receive below,
+            # which isn't retried, as the command may have run.
+            self.close()
+            send_message(self._connection(), message)
+
+        try:
+            response = recv_message(self.local.sock)
+        except socket.error as e:
+            response = None
+            self.close()
+            raise SubprocessFailedException(
+                'Command daemon connection failed: ' + str(e))
+        if response is None:
+            self.close()
+            raise SubprocessFailedException(
+                'Command daemon closed the connection')
+        return response
+
+    def execute(self, commands, shell=False, netns=None, env=None):
+        """
+        Run a shell command line (shell=True) or a pipe of argv lists in the
+        daemon, in the given net namespace (None for the root namespace).
+        :type commands: str | list[list[str]]
+        :type shell: bool
+        :type netns: str
+        :type env: dict[str, str]
+        :return: (int, str, str) Return code, stdout and stderr
+        """
+        response = self.request({'commands': commands,
+                                 'shell': shell,
+                                 'netns': netns,
+                                 'env': env,
+                                 'cwd': os.getcwd()})
+        if 'error' in response:
+            raise SubprocessFailedException(
+                'Command daemon could not run [' + str(commands) + ']: ' +
+                response['error'])
+        return (response['returncode'],
+                decode_output(response['stdout']),
+                decode_output(response['stderr']))
+
+    def release_netns(self, name):
+        """
+        Stop the daemon's helper for the net namespace, which would
+        otherwise keep it (and its interfaces) around after it is deleted.
+        :type name: str
+        """
+        self.request({'op': 'release_netns', 'netns': name})
+
+    def shutdown(self):
+        self.request({'op': 'shutdown'})
+        self.close()
+
+
+def get_client():
+    """
+    Get the client for the running command daemon, if there is one (either
+    started by this process, or inherited through the environment).
+    :return: CommandDaemonClient
+    """
+    global _client
+    socket_path = os.environ.get(DAEMON_SOCKET_ENV)
+    if not socket_path:
+        return None
+    with _client_lock:
+        if _client is None or _client.socket_path != socket_path:
+            _client = CommandDaemonClient(socket_path)
+        return _client
+
+
+def start_cmd_daemon(socket_path=None, timeout=DAEMON_START_TIMEOUT):
+    """
+    Start the command daemon as root (through sudo, unless already root) and
+    wait for it to accept connections.  From then on, privileged commands
+    run by LinuxCLI, in this process and its children, go through it.
+    :type socket_path: str
+    :type timeout: int
+    :return: subprocess.Popen
+    """
+    global _socket_dir
+    if socket_path is None:
+        # A private (0700) directory, so no other user can pre-create the
+        # socket or reach it
+        _socket_dir = tempfile.mkdtemp(prefix='zephyr-cmd-daemon.')
+        socket_path = os.path.join(_socket_dir, 'cmd.sock')
+
+    cmd = [sys.executable, '-m', 'zephyr.common.cmd_daemon',
+           '-s', socket_path]
+    if os.geteuid() != 0:
+        cmd = ['sudo', '-E'] + cmd
+
+    process = subprocess.Popen(cmd, preexec_fn=os.setsid)
+    wait_for_daemon(process, CommandDaemonClient(socket_path), timeout)
+
+    os.environ[DAEMON_SOCKET_ENV] = socket_path
+    return process
+
+
+def stop_cmd_daemon(process=None):
+    """
+    Shut down the running command daemon and stop routing commands to it.
+    :type process: subprocess.Popen
+    """
+    global _socket_dir
+    client = get_client()
+    os.environ.pop(DAEMON_SOCKET_ENV, None)
+    if client is not None:
+        try:
+            client.shutdown()
+        except SubprocessFailedException:
+            pass
+    if process is not None:
+        process.wait()
+    if _socket_dir is not None:
+        shutil.rmtree(_socket_dir, ignore_errors=True)
+        _socket_dir = None
+
+
+def usage():
+    print('Usage: python -m zephyr.common.cmd_daemon -s <socket_path> '
+          '[-n <netns>]')
+
+
+def exit_with_parent(socket_path):
+    # The daemon holds the other end of stdin, so it reads EOF when the
+    # daemon closes it or dies
+    while sys.stdin.read(4096):
+        pass
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    arg_map, extra_args = getopt.getopt(sys.argv[1:], 'hs:n:',
+                                        ['help', 'socket=', 'netns='])
+    daemon_socket = None
+    daemon_netns = None
+    for arg, value in arg_map:
+        if arg in ('-h', '--help'):
+            usage()
+            sys.exit(0)
+        elif arg in ('-s', '--socket'):
+            daemon_socket = value
+        elif arg in ('-n', '--netns'):
+            daemon_netns = value
+
+    if daemon_socket is None:
+        usage()
+        sys.exit(2)
+
+    # Commands run by the daemon must not route back into it
+    os.environ.pop(DAEMON_SOCKET_ENV, None)
+
+    if daemon_netns is not None:
+        # A namespace helper, run by the daemon
+        enter_netns(daemon_netns)
+        server = CommandDaemonServer(daemon_socket, netns_helpers=False)
+        watcher = threading.Thread(target=exit_with_parent,
+                                   args=(daemon_socket,))
+        watcher.daemon = True
+        watcher.start()
+    else:
+        sudo_uid = os.environ.get('SUDO_UID')
+        sudo_gid = os.environ.get('SUDO_GID')
+        server = CommandDaemonServer(
+            daemon_socket,
+            owner_uid=int(sudo_uid) if sudo_uid else None,
+            owner_gid=int(sudo_gid) if sudo_gid else None)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
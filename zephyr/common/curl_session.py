@@ -0,0 +1,184 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import pycurl
+from StringIO import StringIO
+import threading
+import time
+
+# Idle handles kept open (with their connections) for reuse
+CURL_MAX_IDLE_HANDLES = 16
+# Connections opened to one host at once by request_all
+CURL_MAX_HOST_CONNECTIONS = 8
+
+
+class CurlRequest(object):
+    def __init__(self, method, url, json_data=None, filename=None):
+        """
+        :type method: str 'GET', 'POST', 'PUT' or 'DELETE'
+        :type url: str
+        :type json_data: any Sent as the JSON body
+        :type filename: str Uploaded as a form file
+        """
+        self.method = method
+        self.url = url
+        self.json_data = json_data
+        self.filename = filename
+
+
+class CurlSession(object):
+    """
+    Makes HTTP requests through pycurl, reusing curl handles, and with them
+    their open (keep-alive) connections, from one request to the next.  The
+    handles share their DNS and SSL session caches.  A session may be used
+    from several threads at once; each request takes an idle handle (or a
+    new one) for itself.
+    """
+
+    def __init__(self, max_idle_handles=CURL_MAX_IDLE_HANDLES,
+                 max_host_connections=CURL_MAX_HOST_CONNECTIONS):
+        """
+        :type max_idle_handles: int
+        :type max_host_connections: int
+        """
+        self.max_idle_handles = max_idle_handles
+        self.share = pycurl.CurlShare()
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        self.idle_handles = []
+        """ :type: list[pycurl.Curl]"""
+        self.lock = threading.Lock()
+
+        # Concurrent requests go through one multi handle (and its
+        # connection cache), multiplexed over HTTP/2 where the server
+        # allows
+        self.multi = pycurl.CurlMulti()
+        self.multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+        self.multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS,
+                          max_host_connections)
+        self.multi_lock = threading.Lock()
+
+    def get_handle(self):
+        """
+        :return: pycurl.Curl An idle handle, or a new one
+        """
+        with self.lock:
+            if len(self.idle_handles) > 0:
+                return self.idle_handles.pop()
+        c = pycurl.Curl()
+        c.setopt(pycurl.SHARE, self.share)
+        return c
+
+    def release_handle(self, c):
+        """
+        :type c: pycurl.Curl
+        """
+        with self.lock:
+            if len(self.idle_handles) < self.max_idle_handles:
+                self.idle_handles.append(c)
+                return
+        c.close()
+
+    def prepare(self, c, request):
+        """
+        Set a handle up for a request (clearing any earlier request's
+        options, but keeping its connections and shared caches).
+        :type c: pycurl.Curl
+        :type request: CurlRequest
+        :return: StringIO The buffer the response body is written to
+        """
+        cbuffer = StringIO()
+        c.reset()
+        c.setopt(pycurl.URL, request.url)
+        c.setopt(pycurl.WRITEDATA, cbuffer)
+        if request.method != 'GET' and request.method != 'POST':
+            c.setopt(pycurl.CUSTOMREQUEST, request.method)
+        if request.json_data:
+            c.setopt(pycurl.HTTPHEADER, ["Content-Type: application/json"])
+            c.setopt(pycurl.POSTFIELDS, json.dumps(request.json_data))
+        if request.filename:
+            c.setopt(pycurl.HTTPPOST,
+                     [('fileupload', (pycurl.FORM_FILE, request.filename))])
+        return cbuffer
+
+    def request(self, method, url, json_data=None, filename=None):
+        """
+        :type method: str 'GET', 'POST', 'PUT' or 'DELETE'
+        :type url: str
+        :type json_data: any Sent as the JSON body
+        :type filename: str Uploaded as a form file
+        :return: str The response body
+        """
+        c = self.get_handle()
+        try:
+            cbuffer = self.prepare(
+                c, CurlRequest(method, url, json_data, filename))
+            c.perform()
+        finally:
+            self.release_handle(c)
+        return cbuffer.getvalue()
+
+    def request_all(self, requests):
+        """
+        Make several requests at once through the curl multi interface.
+        All of the requests are finished before any failure is raised.
+        :type requests: list[CurlRequest]
+        :return: list[str] The response bodies, in the order given
+        """
+        handles = []
+        failures = []
+        with self.multi_lock:
+            try:
+                for request in requests:
+                    c = self.get_handle()
+                    c.cbuffer = self.prepare(c, request)
+                    handles.append(c)
+                    self.multi.add_handle(c)
+
+                remaining = len(handles)
+                while remaining > 0:
+                    ret = pycurl.E_CALL_MULTI_PERFORM
+                    while ret == pycurl.E_CALL_MULTI_PERFORM:
+                        ret, remaining = self.multi.perform()
+                    while True:
+                        queued, ok_list, err_list = self.multi.info_read()
+                        failures += err_list
+                        if queued == 0:
+                            break
+                    if remaining > 0 and self.multi.select(1.0) <= 0:
+                        # No sockets to wait on yet (curl may be resolving
+                        # a name), so give it a moment
+                        time.sleep(0.01)
+            finally:
+                for c in handles:
+                    self.multi.remove_handle(c)
+
+        bodies = [c.cbuffer.getvalue() for c in handles]
+        for c in handles:
+            self.release_handle(c)
+        if len(failures) > 0:
+            c, errno, message = min(failures,
+                                    key=lambda f: handles.index(f[0]))
+            raise pycurl.error(errno, message)
+        return bodies
+
+    def close(self):
+        with self.lock:
+            for c in self.idle_handles:
+                c.close()
+            self.idle_handles = []
+        with self.multi_lock:
+            self.multi.close()
+        self.share.close()
@@ -0,0 +1,455 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import json
+import socket
+import threading
+import time
+from zephyr.common.cmd_daemon import decode_output
+from zephyr.common.cmd_daemon import encode_output
+from zephyr.common.echo_server import RECV_SIZE
+from zephyr.common.echo_server import TERMINATION_STRING
+from zephyr.common.exceptions import *
+from zephyr.common.latency_histogram import LatencyHistogram
+from zephyr.common.zephyr_constants import DEFAULT_ECHO_PORT
+
+DEFAULT_ECHO_TIMEOUT = 10
+DEFAULT_LOAD_DURATION = 10
+ECHO_WORKER_STOP_TIMEOUT = 3
+
+
+def echo_reply(reply='', latency=0.0, error=None):
+    """
+    The outcome of one echo request: the reply (without the termination
+    string, '' if there was none), who sent it (the echo data the server
+    appended to the request), how long it took in seconds, and why it
+    failed, if it did.
+    :type reply: str
+    :type latency: float
+    :type error: str
+    :return: dict[str, any]
+    """
+    return {'reply': reply,
+            'source': reply.rpartition(':')[2] if ':' in reply else '',
+            'latency': latency,
+            'error': error}
+
+
+def load_report(histogram, error_counts, duration):
+    """
+    Summarize a load run: how many requests were sent, answered and
+    failed (with a count for each error), the replies per second, the
+    latency summary (see LatencyHistogram.summary) and the histogram
+    itself (see LatencyHistogram.to_dict), so runs may be merged later.
+    :type histogram: LatencyHistogram
+    :type error_counts: dict[str, int]
+    :type duration: float Seconds the run took
+    :return: dict[str, any]
+    """
+    errors = sum(error_counts.values())
+    return {'requests': histogram.total + errors,
+            'replies': histogram.total,
+            'errors': errors,
+            'error_counts': error_counts,
+            'duration': duration,
+            'throughput': histogram.total / duration if duration else 0.0,
+            'latency': histogram.summary(),
+            'histogram': histogram.to_dict()}
+
+
+class EchoClient(object):
+    """
+    Sends echo requests from this process.  With keep_alive, TCP
+    connections are kept open after each request and reused by the next
+    request to the same server (echo servers take any number of requests
+    per connection).  It is off by default, as a load balancer picks its
+    member once per connection, and tests counting which member answers
+    need every request on a fresh connection.
+    """
+
+    def __init__(self, keep_alive=False):
+        """
+        :type keep_alive: bool
+        """
+        self.keep_alive = keep_alive
+        self.pool = {}
+        """ :type: dict[(str, int), list[socket.socket]]"""
+        self.lock = threading.Lock()
+
+    def get_connection(self, dest_ip, dest_port, timeout):
+        if self.keep_alive:
+            with self.lock:
+                idle = self.pool.get((dest_ip, dest_port))
+                if idle:
+                    sock = idle.pop()
+                    sock.settimeout(timeout)
+                    return sock
+        return socket.create_connection((dest_ip, dest_port), timeout)
+
+    def release_connection(self, dest_ip, dest_port, sock):
+        if not self.keep_alive:
+            sock.close()
+            return
+        with self.lock:
+            self.pool.setdefault((dest_ip, dest_port), []).append(sock)
+
+    def close(self):
+        with self.lock:
+            for idle in self.pool.values():
+                for sock in idle:
+                    sock.close()
+            self.pool = {}
+
+    def send(self, dest_ip='localhost', dest_port=DEFAULT_ECHO_PORT,
+             echo_request='ping', protocol='tcp',
+             timeout=DEFAULT_ECHO_TIMEOUT):
+        """
+        Send one request and return the reply (without the termination
+        string).
+        :type dest_ip: str
+        :type dest_port: int
+        :type echo_request: str
+        :type protocol: str
+        :type timeout: float
+        :return: str
+        """
+        req = echo_request + TERMINATION_STRING
+        if protocol == 'udp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.settimeout(timeout)
+                sock.sendto(req, (dest_ip, dest_port))
+                return sock.recvfrom(RECV_SIZE)[0].partition(
+                    TERMINATION_STRING)[0]
+            finally:
+                sock.close()
+        elif protocol != 'tcp':
+            raise ArgMismatchException('Unsupported protocol: ' + protocol)
+
+        sock = self.get_connection(dest_ip, dest_port, timeout)
+        try:
+            sock.sendall(req)
+            data = ''
+            while TERMINATION_STRING not in data:
+                new_data = sock.recv(RECV_SIZE)
+                if not new_data:
+                    raise socket.error('Connection closed before reply')
+                data += new_data
+        except Exception:
+            sock.close()
+            raise
+        reply, _, rest = data.partition(TERMINATION_STRING)
+        if rest:
+            # Out of step with the server, so don't reuse it
+            sock.close()
+        else:
+            self.release_connection(dest_ip, dest_port, sock)
+        return reply
+
+    def send_timed(self, dest_ip='localhost', dest_port=DEFAULT_ECHO_PORT,
+                   echo_request='ping', protocol='tcp',
+                   timeout=DEFAULT_ECHO_TIMEOUT):
+        """
+        Send one request, and return its outcome (see echo_reply) instead
+        of raising if it fails.
+        :return: dict[str, any]
+        """
+        start = time.time()
+        try:
+            reply = self.send(dest_ip, dest_port, echo_request, protocol,
+                              timeout)
+        except (socket.error, IOError) as e:
+            return echo_reply(latency=time.time() - start, error=str(e))
+        return echo_reply(reply, time.time() - start)
+
+    def send_batch(self, dest_ip='localhost', dest_port=DEFAULT_ECHO_PORT,
+                   echo_requests=list(['ping']), protocol='tcp',
+                   timeout=DEFAULT_ECHO_TIMEOUT, concurrency=1):
+        """
+        Send all of the requests, up to concurrency of them at a time, and
+        return their outcomes (see echo_reply) in the same order.
+        :type dest_ip: str
+        :type dest_port: int
+        :type echo_requests: list[str]
+        :type protocol: str
+        :type timeout: float
+        :type concurrency: int
+        :return: list[dict[str, any]]
+        """
+        if concurrency <= 1 or len(echo_requests) <= 1:
+            return [self.send_timed(dest_ip, dest_port, r, protocol, timeout)
+                    for r in echo_requests]
+        with futures.ThreadPoolExecutor(
+                max_workers=min(concurrency, len(echo_requests))) as pool:
+            jobs = [pool.submit(self.send_timed, dest_ip, dest_port, r,
+                                protocol, timeout)
+                    for r in echo_requests]
+        return [job.result() for job in jobs]
+
+    def generate_load(self, dest_ip='localhost',
+                      dest_port=DEFAULT_ECHO_PORT, connections=1,
+                      rate=None, duration=DEFAULT_LOAD_DURATION,
+                      echo_request='ping', protocol='tcp',
+                      timeout=DEFAULT_ECHO_TIMEOUT):
+        """
+        Send requests from the given number of concurrent connections for
+        the duration, and report on them (see load_report).  With a rate
+        (requests per second across all connections), each request is due
+        at a fixed time, and its latency counts from then rather than from
+        when it was actually sent, so a server that falls behind shows up
+        in the latencies rather than just slowing the load down.  Without
+        one, every connection sends as fast as it is answered.  Unless
+        keep_alive is set, every request makes a new connection, which is
+        what a connection rate through a NAT or load balancer needs.
+        :type dest_ip: str
+        :type dest_port: int
+        :type connections: int
+        :type rate: float
+        :type duration: float Seconds
+        :type echo_request: str
+        :type protocol: str
+        :type timeout: float
+        :return: dict[str, any]
+        """
+        histogram = LatencyHistogram()
+        error_counts = {}
+        lock = threading.Lock()
+        sequence = [0]
+        start = time.time()
+        end = start + duration
+
+        def run_connection():
+            while True:
+                if rate:
+                    with lock:
+                        due = start + sequence[0] / float(rate)
+                        sequence[0] += 1
+                    if due >= end:
+                        return
+                    wait = due - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+                else:
+                    due = time.time()
+                    if due >= end:
+                        return
+                try:
+                    self.send(dest_ip, dest_port, echo_request, protocol,
+                              timeout)
+                except (socket.error, IOError) as e:
+                    with lock:
+                        error_counts[str(e)] = error_counts.get(str(e), 0) + 1
+                    continue
+                latency = time.time() - due
+                with lock:
+                    histogram.record(latency)
+
+        with futures.ThreadPoolExecutor(max_workers=connections) as pool:
+            jobs = [pool.submit(run_connection) for _ in range(connections)]
+        for job in jobs:
+            job.result()
+        return load_report(histogram, error_counts, time.time() - start)
+
+
+def run_echo_batch(clients, batch):
+    """
+    :type clients: dict[bool, EchoClient] Clients by keep_alive
+    :type batch: dict[str, any] A request read by the echo worker
+    :return: dict[str, any] The worker's response
+    """
+    client = clients[batch.get('keep_alive', False) is True]
+    if batch.get('op', 'send') == 'load':
+        return {'report': client.generate_load(
+            str(batch['dest_ip']), int(batch['dest_port']),
+            int(batch.get('connections', 1)),
+            float(batch['rate']) if batch.get('rate') else None,
+            float(batch.get('duration', DEFAULT_LOAD_DURATION)),
+            decode_output(batch.get('echo_request', u'ping')),
+            str(batch.get('protocol', 'tcp')),
+            float(batch.get('timeout', DEFAULT_ECHO_TIMEOUT)))}
+
+    replies = client.send_batch(
+        str(batch['dest_ip']), int(batch['dest_port']),
+        [decode_output(r) for r in batch['echo_requests']],
+        str(batch.get('protocol', 'tcp')),
+        float(batch.get('timeout', DEFAULT_ECHO_TIMEOUT)),
+        int(batch.get('concurrency', 1)))
+    for r in replies:
+        r['reply'] = encode_output(r['reply'])
+        r['source'] = encode_output(r['source'])
+    return {'replies': replies}
+
+
+def run_echo_worker(in_file, out_file):
+    """
+    Serve batches of echo requests, one JSON object per line on in_file,
+    answering each with a JSON line on out_file, until in_file is closed.
+    The worker is started inside the namespace the requests should come
+    from, so each batch costs no more than the requests themselves.
+    :type in_file: file
+    :type out_file: file
+    """
+    clients = {False: EchoClient(), True: EchoClient(keep_alive=True)}
+    while True:
+        line = in_file.readline()
+        if not line:
+            break
+        try:
+            response = run_echo_batch(clients, json.loads(line))
+        except Exception as e:
+            response = {'error': str(e)}
+        out_file.write(json.dumps(response) + '\n')
+        out_file.flush()
+    for client in clients.values():
+        client.close()
+
+
+class EchoWorkerClient(object):
+    """
+    Sends echo requests through an echo worker (see run_echo_worker)
+    started with the given CLI, so they come from wherever that CLI runs
+    its commands (e.g. a host's net namespace).  The worker is started on
+    first use, and again by the request after one that finds it dead or
+    can't talk to it (which stops it).  Batches from several threads are
+    sent to the worker one at a time.
+    """
+
+    def __init__(self, cli, worker_cmd):
+        """
+        :type cli: zephyr.common.cli.LinuxCLI
+        :type worker_cmd: list[str]
+        """
+        self.cli = cli
+        self.worker_cmd = worker_cmd
+        self.status = None
+        """ :type: zephyr.common.cli.CommandStatus"""
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.status = self.cli.cmd_pipe([self.worker_cmd], blocking=False)
+        if self.status.process is None:
+            self.status = None
+            raise SubprocessFailedException(
+                'Could not start echo worker: ' + ' '.join(self.worker_cmd))
+
+    def stop(self):
+        with self.lock:
+            if self.status is None:
+                return
+            self._stop_worker()
+
+    def _stop_worker(self):
+        """
+        Stop the worker and reap it (with the lock held), so the next
+        request starts a new one.
+        """
+        process = self.status.process
+        # The worker exits once its input is closed
+        if not process.stdin.closed:
+            try:
+                process.stdin.close()
+            except IOError:
+                # Whatever was left to flush can't be sent any more
+                pass
+        deadline = time.time() + ECHO_WORKER_STOP_TIMEOUT
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+        if process.poll() is None:
+            self.status.terminate()
+        process.wait()
+        for f in (process.stdout, process.stderr):
+            if f is not None:
+                f.close()
+        self.status = None
+
+    def send_batch(self, dest_ip='localhost', dest_port=DEFAULT_ECHO_PORT,
+                   echo_requests=list(['ping']), protocol='tcp',
+                   timeout=DEFAULT_ECHO_TIMEOUT, concurrency=1,
+                   keep_alive=False):
+        """
+        Send the requests from the worker (see EchoClient.send_batch).
+        :type keep_alive: bool Reuse TCP connections across requests
+        :return: list[dict[str, any]]
+        """
+        response = self.request({'dest_ip': dest_ip,
+                                 'dest_port': dest_port,
+                                 'echo_requests': [encode_output(r)
+                                                   for r in echo_requests],
+                                 'protocol': protocol,
+                                 'timeout': timeout,
+                                 'concurrency': concurrency,
+                                 'keep_alive': keep_alive})
+        replies = response['replies']
+        for r in replies:
+            r['reply'] = decode_output(r['reply'])
+            r['source'] = decode_output(r['source'])
+            r['error'] = str(r['error']) if r['error'] is not None else None
+        return replies
+
+    def generate_load(self, dest_ip='localhost',
+                      dest_port=DEFAULT_ECHO_PORT, connections=1,
+                      rate=None, duration=DEFAULT_LOAD_DURATION,
+                      echo_request='ping', protocol='tcp',
+                      timeout=DEFAULT_ECHO_TIMEOUT, keep_alive=False):
+        """
+        Generate load from the worker (see EchoClient.generate_load).
+        :type keep_alive: bool Reuse TCP connections across requests
+        :return: dict[str, any]
+        """
+        return self.request({'op': 'load',
+                             'dest_ip': dest_ip,
+                             'dest_port': dest_port,
+                             'connections': connections,
+                             'rate': rate,
+                             'duration': duration,
+                             'echo_request': encode_output(echo_request),
+                             'protocol': protocol,
+                             'timeout': timeout,
+                             'keep_alive': keep_alive})['report']
+
+    def request(self, batch):
+        """
+        Send one request to the worker (starting it if needed) and return
+        its response.
+        :type batch: dict[str, any]
+        :return: dict[str, any]
+        """
+        request = json.dumps(batch)
+        with self.lock:
+            if (self.status is None or
+                    self.status.process.poll() is not None):
+                self.start()
+            process = self.status.process
+            try:
+                process.stdin.write(request + '\n')
+                process.stdin.flush()
+                line = process.stdout.readline()
+            except IOError as e:
+                # Not to be reused, or left running
+                self._stop_worker()
+                raise SubprocessFailedException(
+                    'Echo worker connection failed: ' + str(e))
+            if not line:
+                self.status.terminate()
+                err = self.status.stderr
+                self._stop_worker()
+                raise SubprocessFailedException(
+                    'Echo worker exited: ' + str(err))
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise SubprocessFailedException(
+                'Echo worker failed: ' + str(response['error']))
+        return response
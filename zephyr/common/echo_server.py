@@ -0,0 +1,321 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from zephyr.common import exceptions
+from zephyr.common.zephyr_constants import DEFAULT_ECHO_PORT
+
+TERMINATION_STRING = chr(0x03) + chr(0x04)
+
+LISTEN_BACKLOG = 128
+RECV_SIZE = 65536
+ECHO_SERVER_START_TIMEOUT = 5
+
+_AGAIN = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+class EchoConnection(object):
+    def __init__(self, sock):
+        """
+        :type sock: socket.socket
+        """
+        self.sock = sock
+        self.in_data = ''
+        self.out_data = ''
+
+
+class EchoServer(object):
+    """
+    Answers every request (data up to the TERMINATION_STRING) with the
+    request, a ':' and the echo data.  All of the ports and protocols are
+    served by one epoll loop, which blocks while there is nothing to do,
+    and each TCP connection may send any number of requests, one after
+    the other, before closing.
+    """
+
+    def __init__(self, ip_addr='localhost', port=DEFAULT_ECHO_PORT,
+                 echo_data='pong', protocol='tcp', logger=None):
+        """
+        :type ip_addr: str
+        :type port: int | list[int]
+        :type echo_data: str
+        :type protocol: str | list[str] 'tcp', 'udp' or both
+        :type logger: logging.Logger
+        """
+        self.ip_addr = ip_addr
+        self.ports = port if isinstance(port, list) else [port]
+        self.port = self.ports[0]
+        self.protocols = (protocol if isinstance(protocol, list)
+                          else [protocol])
+        self.echo_data = echo_data
+        self.LOG = logger
+        if self.LOG is None:
+            self.LOG = logging.getLogger('echo-server-null')
+            self.LOG.addHandler(logging.NullHandler())
+
+        for p in self.protocols:
+            if p not in ('tcp', 'udp'):
+                raise exceptions.ArgMismatchException(
+                    'Unsupported protocol: ' + p)
+
+        self.epoll = None
+        self.listeners = {}
+        """ :type: dict[int, (socket.socket, str)]"""
+        self.connections = {}
+        """ :type: dict[int, EchoConnection]"""
+        self.wake_fds = None
+        self.stop_requested = False
+        self.stopped = False
+        self.thread = None
+        """ :type: threading.Thread"""
+
+    def open(self):
+        """
+        Bind and listen on all of the ports, so the server is reachable
+        (connections queue up) as soon as this returns.
+        """
+        if self.stopped:
+            raise exceptions.SubprocessFailedException(
+                'Echo server on ' + self.ip_addr + ':' + str(self.ports) +
+                ' was stopped and cannot be restarted')
+        self.epoll = select.epoll()
+        self.wake_fds = os.pipe()
+        self.epoll.register(self.wake_fds[0], select.EPOLLIN)
+        try:
+            for port in self.ports:
+                for protocol in self.protocols:
+                    self.add_listener(port, protocol)
+        except socket.error:
+            self.close()
+            raise
+
+    def add_listener(self, port, protocol):
+        if protocol == 'tcp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setblocking(0)
+        sock.bind((self.ip_addr, port))
+        if protocol == 'tcp':
+            sock.listen(LISTEN_BACKLOG)
+        self.listeners[sock.fileno()] = (sock, protocol)
+        self.epoll.register(sock.fileno(), select.EPOLLIN)
+        self.LOG.debug('Listening on ' + protocol + ' ' + self.ip_addr +
+                       ':' + str(port))
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.sock.close()
+        self.connections = {}
+        for sock, _ in self.listeners.values():
+            sock.close()
+        self.listeners = {}
+        if self.epoll is not None:
+            self.epoll.close()
+            self.epoll = None
+        if self.wake_fds is not None:
+            os.close(self.wake_fds[0])
+            os.close(self.wake_fds[1])
+            self.wake_fds = None
+        self.stopped = True
+
+    def request_stop(self):
+        """
+        Make serve() return.  Safe to call from another thread or a signal
+        handler.
+        """
+        self.stop_requested = True
+        if self.wake_fds is not None:
+            try:
+                os.write(self.wake_fds[1], 'x')
+            except OSError:
+                pass
+
+    def serve(self, timeout=None):
+        """
+        Run the event loop until a stop is requested or the timeout (in
+        seconds, None for none) runs out.
+        :type timeout: float
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while not self.stop_requested:
+            wait = -1
+            if deadline is not None:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    self.LOG.debug('Echo server timeout reached')
+                    break
+            try:
+                events = self.epoll.poll(wait)
+            except IOError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                if fd in self.listeners:
+                    sock, protocol = self.listeners[fd]
+                    if protocol == 'tcp':
+                        self.accept(sock)
+                    else:
+                        self.echo_datagrams(sock)
+                elif fd in self.connections:
+                    self.handle_connection(self.connections[fd], event)
+
+    def start(self):
+        """
+        Open the server and serve in a background thread until stop().
+        """
+        self.open()
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.request_stop()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.close()
+
+    def reply(self, request):
+        return request + ':' + self.echo_data + TERMINATION_STRING
+
+    def accept(self, sock):
+        while True:
+            try:
+                conn, addr = sock.accept()
+            except socket.error as e:
+                if e.args[0] in _AGAIN:
+                    return
+                raise
+            conn.setblocking(0)
+            self.connections[conn.fileno()] = EchoConnection(conn)
+            self.epoll.register(conn.fileno(), select.EPOLLIN)
+            self.LOG.debug('Accepted TCP connection from: ' + str(addr))
+
+    def close_connection(self, conn):
+        """
+        :type conn: EchoConnection
+        """
+        fd = conn.sock.fileno()
+        self.epoll.unregister(fd)
+        self.connections.pop(fd)
+        conn.sock.close()
+
+    def handle_connection(self, conn, event):
+        """
+        :type conn: EchoConnection
+        :type event: int
+        """
+        if event & select.EPOLLIN:
+            while True:
+                try:
+                    data = conn.sock.recv(RECV_SIZE)
+                except socket.error as e:
+                    if e.args[0] in _AGAIN:
+                        break
+                    self.close_connection(conn)
+                    return
+                if not data:
+                    # Peer closed; anything still owed to it is dropped
+                    self.close_connection(conn)
+                    return
+                conn.in_data += data
+
+            while TERMINATION_STRING in conn.in_data:
+                request, _, conn.in_data = conn.in_data.partition(
+                    TERMINATION_STRING)
+                self.LOG.debug('Received TCP request: ' + request)
+                conn.out_data += self.reply(request)
+
+        elif event & (select.EPOLLHUP | select.EPOLLERR):
+            self.close_connection(conn)
+            return
+
+        if conn.out_data:
+            try:
+                sent = conn.sock.send(conn.out_data)
+                conn.out_data = conn.out_data[sent:]
+            except socket.error as e:
+                if e.args[0] not in _AGAIN:
+                    self.close_connection(conn)
+                    return
+            # Only wait for room to write while there is something to write
+            self.epoll.modify(conn.sock.fileno(),
+                              select.EPOLLIN |
+                              (select.EPOLLOUT if conn.out_data else 0))
+
+    def echo_datagrams(self, sock):
+        while True:
+            try:
+                data, addr = sock.recvfrom(RECV_SIZE)
+            except socket.error as e:
+                if e.args[0] in _AGAIN:
+                    return
+                raise
+            request = data.partition(TERMINATION_STRING)[0]
+            self.LOG.debug('Received UDP request from ' + str(addr) +
+                           ': ' + request)
+            try:
+                sock.sendto(self.reply(request), addr)
+            except socket.error as e:
+                # Nowhere to queue a datagram, so like the network, drop it
+                self.LOG.debug('Dropped UDP reply to ' + str(addr) + ': ' +
+                               str(e))
+
+    @staticmethod
+    def send(ip_addr, port, echo_request='ping', protocol='tcp',
+             timeout=ECHO_SERVER_START_TIMEOUT):
+        """
+        Send one request to an echo server and return its answer (without
+        the termination string).
+        :type ip_addr: str
+        :type port: int
+        :type echo_request: str
+        :type protocol: str
+        :type timeout: float
+        :return: str
+        """
+        req = echo_request + TERMINATION_STRING
+        if protocol == 'tcp':
+            sock = socket.create_connection((ip_addr, port), timeout)
+        elif protocol == 'udp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.settimeout(timeout)
+        else:
+            raise exceptions.ArgMismatchException(
+                'Unsupported protocol: ' + protocol)
+        try:
+            if protocol == 'udp':
+                sock.sendto(req, (ip_addr, port))
+                return sock.recvfrom(RECV_SIZE)[0].partition(
+                    TERMINATION_STRING)[0]
+
+            sock.sendall(req)
+            data = ''
+            while TERMINATION_STRING not in data:
+                new_data = sock.recv(RECV_SIZE)
+                if not new_data:
+                    break
+                data += new_data
+            return data.partition(TERMINATION_STRING)[0]
+        finally:
+            sock.close()
@@ -82,3 +82,16 @@ class PacketParsingException(TestException):
 class FileNotFoundException(TestException):
     def __init__(self, info):
         super(FileNotFoundException, self).__init__(info)
+
+
+class HostPhaseFailedException(TestException):
+    def __init__(self, phase, failures):
+        """
+        :type phase: str
+        :type failures: list[(str, Exception)] Host names and their errors
+        """
+        super(HostPhaseFailedException, self).__init__(
+            'Phase [' + phase + '] failed on host(s): ' +
+            ', '.join(name + ': ' + str(e) for name, e in failures))
+        self.phase = phase
+        self.failures = failures
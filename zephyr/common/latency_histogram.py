@@ -0,0 +1,164 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+# Values are kept in microseconds, with 2^(SIGNIFICANT_BITS - 1) buckets
+# for every power of two, so any value is off by less than 1/128 (0.8%)
+SIGNIFICANT_BITS = 8
+UNITS_PER_SECOND = 1000000
+
+
+class LatencyHistogram(object):
+    """
+    Counts latencies in buckets that grow with the value (in the manner of
+    an HDR histogram), so the memory used depends only on the range of the
+    values, not on how many are recorded, and percentiles keep the same
+    relative precision from microseconds to minutes.  Latencies are given
+    and returned in seconds.
+    """
+
+    def __init__(self, significant_bits=SIGNIFICANT_BITS):
+        """
+        :type significant_bits: int
+        """
+        self.significant_bits = significant_bits
+        self.sub_bucket_count = 1 << significant_bits
+        self.counts = {}
+        """ :type: dict[int, int]"""
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def index_for(self, value):
+        """
+        :type value: int Microseconds
+        :return: int
+        """
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.significant_bits
+        return (shift << self.significant_bits) + (value >> shift)
+
+    def highest_value_for(self, index):
+        """
+        The highest value counted in the given bucket.
+        :type index: int
+        :return: int Microseconds
+        """
+        if index < self.sub_bucket_count:
+            return index
+        shift = index >> self.significant_bits
+        sub_bucket = index & (self.sub_bucket_count - 1)
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, latency, count=1):
+        """
+        :type latency: float Seconds
+        :type count: int
+        """
+        value = max(0, int(round(latency * UNITS_PER_SECOND)))
+        index = self.index_for(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """
+        Add the values recorded by another histogram to this one.
+        :type other: LatencyHistogram
+        """
+        if other.significant_bits != self.significant_bits:
+            for index, count in other.counts.iteritems():
+                self.record(float(other.highest_value_for(index)) /
+                            UNITS_PER_SECOND, count)
+            return
+        for index, count in other.counts.iteritems():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = (other.min if self.min is None
+                        else min(self.min, other.min))
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """
+        The latency that the given percent of the recorded latencies are
+        no greater than (0.0 if none are recorded).
+        :type percent: float
+        :return: float Seconds
+        """
+        if self.total == 0:
+            return 0.0
+        target = max(1, int(math.ceil(percent / 100.0 * self.total)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                value = min(max(self.highest_value_for(index), self.min),
+                            self.max)
+                return float(value) / UNITS_PER_SECOND
+        return float(self.max) / UNITS_PER_SECOND
+
+    def mean(self):
+        """
+        :return: float Seconds
+        """
+        if self.total == 0:
+            return 0.0
+        return float(self.sum) / self.total / UNITS_PER_SECOND
+
+    def summary(self):
+        """
+        :return: dict[str, float] Seconds, keyed by 'min', 'mean', 'p50',
+        'p90', 'p99', 'p999' and 'max'
+        """
+        return {'min': float(self.min or 0) / UNITS_PER_SECOND,
+                'mean': self.mean(),
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'p999': self.percentile(99.9),
+                'max': float(self.max) / UNITS_PER_SECOND}
+
+    def to_dict(self):
+        """
+        :return: dict[str, any] A JSON-friendly copy of this histogram
+        """
+        return {'significant_bits': self.significant_bits,
+                'counts': dict((str(i), c)
+                               for i, c in self.counts.iteritems()),
+                'total': self.total,
+                'sum': self.sum,
+                'min': self.min,
+                'max': self.max}
+
+    @staticmethod
+    def from_dict(data):
+        """
+        :type data: dict[str, any] As made by to_dict
+        :return: LatencyHistogram
+        """
+        hist = LatencyHistogram(int(data['significant_bits']))
+        hist.counts = dict((int(i), int(c))
+                           for i, c in data['counts'].iteritems())
+        hist.total = int(data['total'])
+        hist.sum = int(data['sum'])
+        hist.min = int(data['min']) if data['min'] is not None else None
+        hist.max = int(data['max'])
+        return hist
@@ -12,13 +12,302 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
+import collections
+from concurrent import futures
 import datetime
+import errno
+import gzip
+import json
 import logging
 import logging.handlers
 import os
+import Queue
+import shutil
+import socket
+import tempfile
+import threading
+import time
 from zephyr.common.exceptions import *
 from zephyr.common.file_location import *
 from zephyr.common.cli import LinuxCLI
+from zephyr.common import log_slicer
+
+
+LOG_CONTEXT = threading.local()
+HOST_NAME = socket.gethostname()
+
+# Rolled-over logs are compressed in the background, favoring speed over
+# size (gzip's level 1 is several times faster than its level 9)
+ROLLOVER_COMPRESS_LEVEL = 1
+ROLLOVER_COMPRESS_WORKERS = 2
+COMPRESS_CHUNK_SIZE = 1024 * 1024
+
+
+def set_test_id(test_id):
+    """
+    Set the id of the test running in this thread, which is added to the
+    records it logs (see ContextFilter).
+    :type test_id: str None when no test is running
+    """
+    LOG_CONTEXT.test_id = test_id
+
+
+def get_test_id():
+    """
+    :return: str The id of the test running in this thread, or None
+    """
+    return getattr(LOG_CONTEXT, 'test_id', None)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the host and the running test's id to each record as it is
+    logged (rather than when it is formatted, which may be in another
+    thread in queued mode).
+    """
+
+    def filter(self, record):
+        record.host = HOST_NAME
+        record.test_id = get_test_id()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line, with its epoch time
+    first, so logs can be sliced on the time or test id fields without
+    parsing dates (see log_slicer) and loaded by other tools as is.
+    """
+
+    def format(self, record):
+        fields = collections.OrderedDict([
+            ('time', record.created),
+            ('name', record.name),
+            ('level', record.levelname),
+            ('host', getattr(record, 'host', HOST_NAME)),
+            ('test_id', getattr(record, 'test_id', get_test_id())),
+            ('thread', record.threadName),
+            ('message', record.getMessage())])
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            fields['exception'] = record.exc_text
+        return json.dumps(fields)
+
+
+CONTEXT_FILTER = ContextFilter()
+
+
+def compress_file(file_path, compress_level=ROLLOVER_COMPRESS_LEVEL):
+    """
+    Gzip a file into file_path + '.gz' and remove the original.  The
+    compressed file is written under a temporary name and renamed when
+    complete, so a partial one is never left behind.
+    :type file_path: str
+    :type compress_level: int 1 (fastest) to 9 (smallest)
+    :return: str The compressed file, or None if the file was gone
+    """
+    try:
+        src = open(file_path, 'rb')
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path) or '.',
+        prefix=os.path.basename(file_path) + '.', suffix='.gz.tmp')
+    try:
+        with src, os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(filename=os.path.basename(file_path),
+                               mode='wb', compresslevel=compress_level,
+                               fileobj=raw) as gz:
+                shutil.copyfileobj(src, gz, COMPRESS_CHUNK_SIZE)
+        os.rename(tmp_path, file_path + '.gz')
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(file_path)
+    return file_path + '.gz'
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    A FileHandler which leaves its output in the file's buffer after each
+    record rather than flushing it, so a QueueListener can write a whole
+    batch of records and flush once (see flush_buffer).
+    """
+
+    def flush(self):
+        pass
+
+    def flush_buffer(self):
+        logging.FileHandler.flush(self)
+
+
+class QueueHandler(logging.Handler):
+    """
+    The one handler of a logger in queued mode.  It only puts records on
+    its QueueListener's queue, and the listener's thread passes them to
+    the logger's real handlers (which format and write them).
+    """
+
+    def __init__(self, listener):
+        """
+        :type listener: QueueListener
+        """
+        super(QueueHandler, self).__init__()
+        self.listener = listener
+        self.target_handlers = []
+        """ :type: list[logging.Handler]"""
+
+    def add_target(self, handler):
+        """
+        :type handler: logging.Handler
+        """
+        with self.listener.lock:
+            self.target_handlers = self.target_handlers + [handler]
+
+    def remove_target(self, handler):
+        """
+        :type handler: logging.Handler
+        """
+        with self.listener.lock:
+            self.target_handlers = [h for h in self.target_handlers
+                                    if h is not handler]
+
+    @staticmethod
+    def prepare(record):
+        """
+        Fill in the record's message and traceback text now, as its args
+        may change and its traceback should not be kept alive while it
+        waits in the queue.
+        :type record: logging.LogRecord
+        :return: logging.LogRecord
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.listener.enqueue(self, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def handle_targets(self, record):
+        """
+        Called by the listener with a record taken off the queue.
+        :type record: logging.LogRecord
+        :return: list[logging.Handler] The handlers that took the record
+        """
+        handled = []
+        for handler in self.target_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+                handled.append(handler)
+        return handled
+
+
+class QueueListener(object):
+    """
+    Takes the records loggers put on a queue (through their QueueHandlers)
+    and writes them from a single background thread, so logging never
+    waits on the disk or stdout.  Whatever is queued is written as a
+    batch, and the handlers flushed once the queue is empty.
+    """
+
+    def __init__(self):
+        self.queue = Queue.Queue()
+        self.thread = None
+        """ :type: threading.Thread"""
+        # Held while records are handled, so handlers can be swapped safely
+        self.lock = threading.RLock()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run,
+                                           name='log-writer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        """
+        Write everything queued so far and stop the writer thread.  Any
+        later records are written directly by the logging thread.
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def is_running(self):
+        """
+        :return: bool
+        """
+        return self.thread is not None
+
+    def enqueue(self, queue_handler, record):
+        """
+        :type queue_handler: QueueHandler
+        :type record: logging.LogRecord
+        """
+        if not self.is_running():
+            with self.lock:
+                self.flush_handlers(queue_handler.handle_targets(record))
+            return
+        self.queue.put((queue_handler, record))
+
+    def flush(self):
+        """
+        Wait until every record queued so far is written and flushed.
+        """
+        if self.is_running():
+            self.queue.join()
+
+    @staticmethod
+    def flush_handlers(handlers):
+        """
+        :type handlers: collections.Iterable[logging.Handler]
+        """
+        for handler in handlers:
+            if isinstance(handler, BufferedFileHandler):
+                handler.flush_buffer()
+            else:
+                handler.flush()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            with self.lock:
+                written = set()
+                for item in batch:
+                    if item is None:
+                        continue
+                    queue_handler, record = item
+                    try:
+                        written.update(queue_handler.handle_targets(record))
+                    except Exception:
+                        queue_handler.handleError(record)
+                try:
+                    self.flush_handlers(written)
+                except Exception:
+                    pass
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                return
 
 
 # TODO(micucci):  CT-159: Clean up logging
@@ -28,7 +317,13 @@ from zephyr.common.cli import LinuxCLI
 # to make it easy to see who is logging what message where.
 class LogManager(object):
 
-    def __init__(self, root_dir='.'):
+    def __init__(self, root_dir='.', queued=False):
+        """
+        :type root_dir: str
+        :type queued: bool Queue all log records to be written by one
+        background thread (see QueueListener), rather than by the thread
+        logging them.  Call flush() to be sure they are all written.
+        """
         self.loggers = {}
         """ :type: dict [str, Logger]"""
         self.default_log_level = logging.WARNING
@@ -46,11 +341,29 @@ class LogManager(object):
         """ :type: set [(FileLocation, str, int, str)]"""
         self.collated_log_files = set()
         """ :type: set [(FileLocation, str, int)]"""
+        self.listener = None
+        """ :type: QueueListener"""
+        self.queue_handlers = {}
+        """ :type: dict [str, QueueHandler]"""
+        self.compressor = None
+        """ :type: futures.ThreadPoolExecutor"""
+        self.compress_jobs = {}
+        """ :type: dict [str, futures.Future]"""
+        self.compress_lock = threading.Lock()
+        self.handler_lock = threading.RLock()
+        if queued:
+            self.listener = QueueListener()
+            self.handler_lock = self.listener.lock
+            self.listener.start()
+            atexit.register(self.stop)
         # Set up a default, standard format
         self.add_format('standard',
                         logging.Formatter('%(asctime)s - %(name)s - '
                                           '%(levelname)s - %(message)s'),
                         '%Y-%m-%d %H:%M:%S,%f', 0)
+        # And a JSON-lines format, for logs meant for other tools
+        self.add_format('json', JSONFormatter(),
+                        log_slicer.JSON_LOG_FORMAT, 0)
 
         if not LinuxCLI().exists(self.root_dir):
             print("Creating dir: " + self.root_dir)
@@ -106,6 +419,58 @@ class LogManager(object):
             raise ObjectNotFoundException('No logger found: ' + name)
         return self.loggers[name]
 
+    def _file_handler(self, file_name, mode):
+        """
+        :type file_name: str
+        :type mode: str
+        :return: logging.FileHandler
+        """
+        if self.listener is not None:
+            return BufferedFileHandler(file_name, mode)
+        return logging.FileHandler(file_name, mode)
+
+    def _add_handler(self, logger, handler):
+        """
+        :type logger: logging.Logger
+        :type handler: logging.Handler
+        """
+        if logger.name in self.queue_handlers:
+            self.queue_handlers[logger.name].add_target(handler)
+        else:
+            logger.addHandler(handler)
+
+    def _remove_handler(self, logger, handler):
+        """
+        :type logger: logging.Logger
+        :type handler: logging.Handler
+        """
+        if logger.name in self.queue_handlers:
+            self.queue_handlers[logger.name].remove_target(handler)
+        else:
+            logger.removeHandler(handler)
+
+    def flush(self):
+        """
+        Make sure every record logged so far is written out to its file
+        (or stdout), waiting for the background writer in queued mode.
+        """
+        if self.listener is not None:
+            self.listener.flush()
+        for logger_infos in self.open_log_files.values():
+            for l, h, df, dp in logger_infos:
+                QueueListener.flush_handlers([h])
+
+    def stop(self):
+        """
+        Flush all logs and stop the background writer (if queued).  Any
+        later records are written as they are logged.  Also wait for any
+        rolled-over logs still being compressed.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+        self.flush()
+        self.wait_for_rollover()
+
     def _log_check_and_create(self, name, level, handler_obj, format_name):
         """
         Internal function to create and set up logger
@@ -129,18 +494,25 @@ class LogManager(object):
             # Set logger's log level to be all inclusive and let handlers
             # set more specific levels
             new_log.setLevel(1)
-            new_log.addHandler(handler_obj)
+            self._add_handler(new_log, handler_obj)
         else:
             new_log = logging.getLogger(name)
             # Set logger's log level to be all inclusive and let handlers
             # set more specific levels
             new_log.setLevel(1)
-            new_log.handlers = [handler_obj]
+            if self.listener is not None:
+                self.queue_handlers[name] = QueueHandler(self.listener)
+                new_log.handlers = [self.queue_handlers[name]]
+                self.queue_handlers[name].add_target(handler_obj)
+            else:
+                new_log.handlers = [handler_obj]
 
         # new_log.debug("Starting log [" + name + "] with handler type [" +
         #             handler_obj.__class__.__name__ + "] and level" +
         # str(level))
 
+        if CONTEXT_FILTER not in new_log.filters:
+            new_log.addFilter(CONTEXT_FILTER)
         self.loggers[name] = new_log
 
         return new_log
@@ -179,7 +551,7 @@ class LogManager(object):
         """
         mode = 'a' if file_overwrite is False else 'w'
 
-        handler = logging.FileHandler(self.root_dir + "/" + file_name, mode)
+        handler = self._file_handler(self.root_dir + "/" + file_name, mode)
         new_log = self._log_check_and_create(name,
                                              log_level,
                                              handler,
@@ -218,20 +590,20 @@ class LogManager(object):
         """
         file1_mode = 'a' if file1_overwrite is False else 'w'
         file2_mode = 'a' if file2_overwrite is False else 'w'
-        file1_handler = logging.FileHandler(self.root_dir + "/" + file1_name,
-                                            file1_mode)
+        file1_handler = self._file_handler(self.root_dir + "/" + file1_name,
+                                           file1_mode)
         new_log = self._log_check_and_create(name, file1_log_level,
                                              file1_handler,
                                              file1_format_name)
 
-        file2_handler = logging.FileHandler(self.root_dir + "/" + file2_name,
-                                            file2_mode)
+        file2_handler = self._file_handler(self.root_dir + "/" + file2_name,
+                                           file2_mode)
         file2_handler.setLevel(
             file2_log_level if file2_log_level is not None
             else self.default_log_level)
         file2_handler.setFormatter(self.get_format(file2_format_name))
 
-        new_log.addHandler(file2_handler)
+        self._add_handler(new_log, file2_handler)
 
         date_format1, date_position1 = self.date_formats[file1_format_name]
         date_format2, date_position2 = self.date_formats[file2_format_name]
@@ -271,13 +643,13 @@ class LogManager(object):
                                              logging.StreamHandler(),
                                              stdout_format_name)
 
-        file_handler = logging.FileHandler(self.root_dir + "/" + file_name,
-                                           mode)
+        file_handler = self._file_handler(self.root_dir + "/" + file_name,
+                                          mode)
         file_handler.setLevel(file_log_level if file_log_level is not None
                               else self.default_log_level)
         file_handler.setFormatter(self.get_format(file_format_name))
 
-        new_log.addHandler(file_handler)
+        self._add_handler(new_log, file_handler)
         date_format, date_position = self.date_formats[file_format_name]
         self.add_log_file(FileLocation(self.root_dir + "/" + file_name),
                           new_log, file_handler,
@@ -304,6 +676,7 @@ class LogManager(object):
         Gather all the log files into one place
         :return:
         """
+        self.flush()
         for loc, logger_infos in self.open_log_files.iteritems():
             (l, fh, date_format, date_pos) = logger_infos[0]
             loc.copy_file(near_path=dest_path)
@@ -319,38 +692,130 @@ class LogManager(object):
                 (FileLocation(dest_path + '/' + new_file_name),
                  date_format, date_pos))
 
+    def merge_collated_logs(self, dest_file, collated_dir=None):
+        """
+        Merge the collated logs (see collate_logs) into one time-ordered
+        file, each line tagged with the log it came from.
+        :type dest_file: str
+        :type collated_dir: str Only merge the logs collated into this
+        directory (defaults to all of them)
+        :return: int The number of log records written
+        """
+        log_files = sorted(
+            (log_file for log_file in self.collated_log_files
+             if (collated_dir is None or
+                 os.path.normpath(log_file[0].path) ==
+                 os.path.normpath(collated_dir))),
+            key=lambda log_file: log_file[0].full_path())
+        return log_slicer.merge_log_files(log_files, dest_file)
+
     def _rollover_file(self, file_path, backup_dir=None,
                        date_pattern='%Y%m%d%H%M%S', zip_file=True):
         cli = LinuxCLI(priv=False)
         suff_str = '.' + datetime.datetime.now().strftime(date_pattern)
-        dest_dir = backup_dir \
-            if backup_dir is not None \
-            else (self.root_dir + '/log_bak')
+        dest_dir = self._backup_dir(backup_dir)
 
         if not cli.exists(dest_dir):
             cli.mkdir(dest_dir)
         dest_filename = (dest_dir + '/' +
                          os.path.basename(file_path) + suff_str)
 
-        # Move the file, zip if requested
-        cli.move(file_path, dest_filename)
+        # Move the file (a rename, unless the backup dir is on another
+        # filesystem), and zip in the background if requested
+        try:
+            os.rename(file_path, dest_filename)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            cli.move(file_path, dest_filename)
         if zip_file:
-            cli.cmd('gzip -9 ' + dest_filename)
+            self._compress_in_background(dest_filename)
+
+    def _backup_dir(self, backup_dir=None):
+        """
+        :type backup_dir: str
+        :return: str
+        """
+        return (backup_dir if backup_dir is not None
+                else (self.root_dir + '/log_bak'))
+
+    def _compress_in_background(self, file_path):
+        """
+        :type file_path: str
+        """
+        with self.compress_lock:
+            if self.compressor is None:
+                self.compressor = futures.ThreadPoolExecutor(
+                    max_workers=ROLLOVER_COMPRESS_WORKERS)
+            self.compress_jobs[file_path] = self.compressor.submit(
+                compress_file, file_path)
+
+    def wait_for_rollover(self):
+        """
+        Wait for the rolled-over logs still being compressed.
+        :return: list[str] The compressed files
+        """
+        with self.compress_lock:
+            jobs = self.compress_jobs.values()
+            self.compress_jobs = {}
+        compressed = [job.result() for job in jobs]
+        return [f for f in compressed if f is not None]
+
+    def prune_backups(self, backup_dir=None, max_bytes=None, max_age=None):
+        """
+        Remove old backups of rolled-over logs: any older than max_age,
+        then the oldest until the rest take up no more than max_bytes.
+        Logs still being compressed are left alone.
+        :type backup_dir: str Defaults to log_bak under the root dir
+        :type max_bytes: int
+        :type max_age: float Seconds since the backup was last modified
+        :return: list[str] The removed files
+        """
+        dest_dir = self._backup_dir(backup_dir)
+        if not os.path.isdir(dest_dir):
+            return []
+        with self.compress_lock:
+            busy = set(os.path.abspath(f) for f, job in
+                       self.compress_jobs.iteritems() if not job.done())
+        backups = []
+        for name in os.listdir(dest_dir):
+            path = dest_dir + '/' + name
+            if (name.endswith('.tmp') or os.path.abspath(path) in busy or
+                    not os.path.isfile(path)):
+                continue
+            stat = os.stat(path)
+            backups.append((stat.st_mtime, stat.st_size, path))
+        backups.sort()
+
+        removed = []
+        total = sum(size for mtime, size, path in backups)
+        now = time.time()
+        for mtime, size, path in backups:
+            if ((max_age is not None and now - mtime > max_age) or
+                    (max_bytes is not None and total > max_bytes)):
+                os.remove(path)
+                removed.append(path)
+                total -= size
+        return removed
 
     # TODO(micucci): Make sure logging can have subdirs under root dir to
     # help organize logs!
     def rollover_logs_fresh(self, backup_dir=None,
                             date_pattern='%Y%m%d%H%M%S', zip_file=True,
-                            file_filter='*.log'):
+                            file_filter='*.log', max_backup_bytes=None,
+                            max_backup_age=None):
         """
         Rollover all files in root directory matching glob filter.  This
         assumes a fresh start, where there are no handlers or loggers
         currently active for those files (at the start of a server
-        process for example)
+        process for example).  Zipping happens in the background (see
+        wait_for_rollover).
         :type backup_dir: str
         :type date_pattern: str
         :type zip_file: bool
         :type file_filter: str
+        :type max_backup_bytes: int Prune backups down to this size
+        :type max_backup_age: float Prune backups older than this (seconds)
         :return:
         """
         file_list = LinuxCLI().ls(self.root_dir + '/' + file_filter)
@@ -360,35 +825,49 @@ class LogManager(object):
                 self._rollover_file(file_path=f, backup_dir=backup_dir,
                                     date_pattern=date_pattern,
                                     zip_file=zip_file)
+        if max_backup_bytes is not None or max_backup_age is not None:
+            self.prune_backups(backup_dir, max_backup_bytes, max_backup_age)
 
     def rollover_logs_by_date(self, backup_dir=None,
-                              date_pattern='%Y%m%d%H%M%S', zip_file=True):
+                              date_pattern='%Y%m%d%H%M%S', zip_file=True,
+                              max_backup_bytes=None, max_backup_age=None):
         """
         If the filename exists, roll it over to a new file based on the
-        parameters.  Return the name of the new file.
+        parameters.  Zipping happens in the background (see
+        wait_for_rollover).
         :type backup_dir: str
         :type date_pattern: str
         :type zip_file: bool
-        :return: str
+        :type max_backup_bytes: int Prune backups down to this size
+        :type max_backup_age: float Prune backups older than this (seconds)
+        :return:
         """
+        self.flush()
         for file_loc, logger_list in self.open_log_files.iteritems():
             cli = LinuxCLI(priv=False)
             if (cli.exists(file_loc.full_path()) and
                     os.path.getsize(file_loc.full_path())) > 0:
-
-                # Close previous, now-stale file handlers
-                for l, h, df, dp in logger_list:
-                    h.close()
-                    l.removeHandler(h)
-
-                self._rollover_file(file_loc.full_path(), backup_dir,
-                                    date_pattern, zip_file)
-
-                # Pop off old logger/handler pairs and re-populate with new
-                # handler objects which point to the original file location
-                for i in range(0, len(logger_list)):
-                    l, h, df, dp = logger_list.pop()
-                    new_handler = logging.FileHandler(
-                        filename=file_loc.full_path(), mode='w')
-                    l.addHandler(new_handler)
-                    logger_list.append((l, new_handler, df, dp))
+                # Hold off the background writer (in queued mode) until
+                # the new handlers are in place
+                with self.handler_lock:
+                    # Close previous, now-stale file handlers
+                    for l, h, df, dp in logger_list:
+                        self._remove_handler(l, h)
+                        h.close()
+
+                    self._rollover_file(file_loc.full_path(), backup_dir,
+                                        date_pattern, zip_file)
+
+                    # Pop off old logger/handler pairs and re-populate with
+                    # new handler objects which point to the original file
+                    # location
+                    for i in range(0, len(logger_list)):
+                        l, h, df, dp = logger_list.pop(0)
+                        new_handler = self._file_handler(
+                            file_loc.full_path(), 'w')
+                        new_handler.setLevel(h.level)
+                        new_handler.setFormatter(h.formatter)
+                        self._add_handler(l, new_handler)
+                        logger_list.append((l, new_handler, df, dp))
+        if max_backup_bytes is not None or max_backup_age is not None:
+            self.prune_backups(backup_dir, max_backup_bytes, max_backup_age)
@@ -12,8 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
 import datetime
-from zephyr.common import cli
+import heapq
+import json
+import multiprocessing
+import os
+import Queue
+import re
+import threading
+from zephyr.common.exceptions import *
 
 COMMON_FORMATS = [
     ('%Y.%m.%d %H:%M:%S.%f', 0),
@@ -23,6 +31,433 @@ COMMON_FORMATS = [
     ('%Y/%m/%d %H:%M:%S', 0)
 ]
 
+# Bytes of log between the entries of a log index, so finding a time
+# parses at most this much of the log line by line
+INDEX_INTERVAL = 64 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+# The date format of logs written by log_manager.JSONFormatter, one JSON
+# object per line starting with the record's epoch time
+JSON_LOG_FORMAT = 'json'
+JSON_TIME_PATTERN = re.compile(r'\{"time": ([0-9.eE+-]+)[,}]')
+JSON_TEST_ID_PATTERN = re.compile(r', "test_id": ("(?:[^"\\]|\\.)*"|null)[,}]')
+
+
+def parse_line_time(line, date_format, date_position):
+    """
+    Parse the timestamp at the start of a log line.
+    :type line: str
+    :type date_format: str A strptime format, or JSON_LOG_FORMAT
+    :type date_position: int Index of the timestamp's first
+    space-separated word in the line
+    :return: datetime.datetime The time, or None if the line has none
+    """
+    if date_format == JSON_LOG_FORMAT:
+        match = JSON_TIME_PATTERN.match(line)
+        if match is None:
+            return None
+        return datetime.datetime.fromtimestamp(float(match.group(1)))
+    dateline = ' '.join(line.split(' ')[date_position:date_position + 2])
+    try:
+        return datetime.datetime.strptime(dateline.rstrip('\n'), date_format)
+    except ValueError:
+        return None
+
+
+def detect_log_format(line):
+    """
+    Find which of the COMMON_FORMATS (or JSON lines) the given (first)
+    log line uses.
+    :type line: str
+    :return: (str, int) The date format and position, or None if the
+    line matches none of them
+    """
+    if parse_line_time(line, JSON_LOG_FORMAT, 0) is not None:
+        return JSON_LOG_FORMAT, 0
+    for fmt, pos in COMMON_FORMATS:
+        if parse_line_time(line, fmt, pos) is not None:
+            return fmt, pos
+    return None
+
+
+def line_test_id(line):
+    """
+    Get the test id of a JSON log line, without decoding the whole line.
+    :type line: str
+    :return: str The test id, or None if the line has none
+    """
+    match = JSON_TEST_ID_PATTERN.search(line)
+    if match is None:
+        return None
+    return json.loads(match.group(1))
+
+
+class LogIndex(object):
+    """
+    A sparse index from the timestamps in a log file to byte offsets,
+    with an entry for the first timestamped line after every
+    INDEX_INTERVAL bytes.  Lines are expected in time order, so a time
+    can be found with a binary search on the index and a short scan from
+    the nearest entry before it, rather than parsing the whole log.
+
+    The index is built by refresh() in one pass over the file, and later
+    refreshes only index what has been appended since, so one index serves
+    every slice taken from the same log.
+    """
+
+    def __init__(self, file_path, index_interval=INDEX_INTERVAL):
+        """
+        :type file_path: str
+        :type index_interval: int
+        """
+        self.file_path = file_path
+        self.index_interval = index_interval
+        self.date_format = None
+        """ :type: str"""
+        self.date_position = 0
+        self.times = []
+        """ :type: list[datetime.datetime]"""
+        self.offsets = []
+        """ :type: list[int]"""
+        self.size = 0
+        self.inode = None
+        self.first_line = None
+        self.format_checked = False
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Bring the index up to date with the file, indexing only the newly
+        appended part unless the file was replaced or truncated.
+        """
+        with self.lock:
+            stat = os.stat(self.file_path)
+            if stat.st_ino != self.inode or stat.st_size < self.size:
+                self.reset(stat.st_ino)
+            if stat.st_size == self.size:
+                return
+            with open(self.file_path, 'rb') as f:
+                first_line = f.readline()
+                if self.format_checked and first_line != self.first_line:
+                    # A new log that happens to have the old one's inode
+                    self.reset(stat.st_ino)
+                if not self.format_checked:
+                    self.format_checked = True
+                    self.first_line = first_line
+                    log_format = detect_log_format(first_line)
+                    if log_format is None:
+                        # No appropriate formats, so nothing to index
+                        return
+                    self.date_format, self.date_position = log_format
+                if self.date_format is None:
+                    return
+                self.index_from(f, self.size)
+
+    def reset(self, inode):
+        self.date_format = None
+        self.date_position = 0
+        self.times = []
+        self.offsets = []
+        self.size = 0
+        self.inode = inode
+        self.first_line = None
+        self.format_checked = False
+
+    def index_from(self, f, offset):
+        """
+        :type f: file
+        :type offset: int Start of a line, where indexing picks up
+        """
+        f.seek(offset)
+        next_entry = (self.offsets[-1] + self.index_interval
+                      if self.offsets else offset)
+        for line in iter(f.readline, ''):
+            if not line.endswith('\n'):
+                # Partly written line: leave it for the next refresh
+                break
+            if offset >= next_entry:
+                line_time = self.line_time(line)
+                if line_time is not None:
+                    self.times.append(line_time)
+                    self.offsets.append(offset)
+                    next_entry = offset + self.index_interval
+            offset += len(line)
+        self.size = offset
+
+    def usable(self):
+        """
+        :return: bool True if the log has a known timestamp format
+        """
+        return self.date_format is not None
+
+    def line_time(self, line):
+        """
+        :type line: str
+        :return: datetime.datetime
+        """
+        return parse_line_time(line, self.date_format, self.date_position)
+
+    def find_offset(self, f, at_time, after=False):
+        """
+        Find the offset of the first timestamped line at or after the given
+        time (strictly after it, with after=True), or the end of the
+        indexed log if there is none.
+        :type f: file
+        :type at_time: datetime.datetime
+        :type after: bool
+        :return: int
+        """
+        if at_time is None:
+            return 0 if not after else self.size
+        search = bisect.bisect_right if after else bisect.bisect_left
+        entry = search(self.times, at_time)
+        if entry == 0:
+            # The first index entry is the first timestamped line
+            return self.offsets[0] if self.offsets else self.size
+        offset = self.offsets[entry - 1]
+        f.seek(offset)
+        while offset < self.size:
+            line = f.readline()
+            line_time = self.line_time(line)
+            if line_time is not None and (line_time > at_time or
+                                          (line_time == at_time and
+                                           not after)):
+                return offset
+            offset += len(line)
+        return self.size
+
+    def byte_range(self, start_time=None, stop_time=None):
+        """
+        The byte range of the lines timestamped from start_time to
+        stop_time (inclusive), including any untimestamped lines (such as
+        tracebacks) that follow them.
+        :type start_time: datetime.datetime
+        :type stop_time: datetime.datetime
+        :return: (int, int) Start and end offsets
+        """
+        with self.lock:
+            if not self.usable():
+                return 0, 0
+            with open(self.file_path, 'rb') as f:
+                start = self.find_offset(f, start_time)
+                end = self.find_offset(f, stop_time, after=True)
+        return start, max(start, end)
+
+    def copy_range(self, out_file, start, end):
+        """
+        Stream the given byte range of the log to an open file.
+        :type out_file: file
+        :type start: int
+        :type end: int
+        """
+        with open(self.file_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = f.read(min(COPY_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                out_file.write(data)
+                remaining -= len(data)
+
+
+LOG_INDEXES = {}
+""" :type: dict[str, LogIndex]"""
+LOG_INDEXES_LOCK = threading.Lock()
+
+
+def get_log_index(file_path):
+    """
+    Get the (refreshed) index for a log file, building it on first use.
+    :type file_path: str
+    :return: LogIndex
+    """
+    with LOG_INDEXES_LOCK:
+        index = LOG_INDEXES.get(file_path)
+        if index is None:
+            index = LogIndex(file_path)
+            LOG_INDEXES[file_path] = index
+    index.refresh()
+    return index
+
+
+def make_dir(dir_path):
+    """
+    Create a directory (and its parents) unless it exists, which another
+    slicing process may have just done.
+    :type dir_path: str
+    """
+    try:
+        os.makedirs(dir_path)
+    except OSError:
+        if not os.path.isdir(dir_path):
+            raise
+
+
+def slice_header(file_path, start_time, stop_time, date_format=None):
+    """
+    :type file_path: str
+    :type start_time: datetime.datetime
+    :type stop_time: datetime.datetime
+    :type date_format: str The log's date format
+    :return: str Empty for JSON logs, so slices stay valid JSON lines
+    """
+    if date_format == JSON_LOG_FORMAT:
+        return ''
+    return ('SLICE OF LOG [' + file_path + '] FROM [' + str(start_time) +
+            '] TO [' + str(stop_time) + ']\n')
+
+
+def slice_log_file_by_windows(file_path, windows, ext='.slice'):
+    """
+    Slice one log file into every given time window in a single
+    sequential read of the log.  The log is cut at every window's start
+    and end offset, and each piece between two cuts is streamed once, to
+    every window it falls in.
+    :type file_path: str
+    :type windows: list[(str, datetime.datetime, datetime.datetime)]
+    Output directory, start and stop time of each window (leeway included)
+    :type ext: str
+    :return: list[str] The slice files written
+    """
+    index = get_log_index(file_path)
+    if not index.usable():
+        return []
+    filename = os.path.basename(file_path) + ext
+
+    ranges = []
+    for out_dir, start_time, stop_time in windows:
+        start, end = index.byte_range(start_time, stop_time)
+        if start < end:
+            ranges.append((start, end, out_dir + '/' + filename,
+                           slice_header(file_path, start_time, stop_time,
+                                        index.date_format)))
+    if not ranges:
+        return []
+    cuts = sorted(set([r[0] for r in ranges] + [r[1] for r in ranges]))
+    ranges.sort()
+
+    open_files = {}
+    """ :type: dict[int, file]"""
+    next_range = 0
+    try:
+        with open(file_path, 'rb') as f:
+            for cut, next_cut in zip(cuts, cuts[1:]):
+                while (next_range < len(ranges) and
+                       ranges[next_range][0] == cut):
+                    slice_file, header = ranges[next_range][2:]
+                    make_dir(os.path.dirname(slice_file))
+                    open_files[next_range] = open(slice_file, 'wb')
+                    open_files[next_range].write(header)
+                    next_range += 1
+                if not open_files:
+                    continue
+                f.seek(cut)
+                remaining = next_cut - cut
+                while remaining > 0:
+                    data = f.read(min(COPY_CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    for out_file in open_files.values():
+                        out_file.write(data)
+                    remaining -= len(data)
+                for i in open_files.keys():
+                    if ranges[i][1] == next_cut:
+                        open_files.pop(i).close()
+    finally:
+        for out_file in open_files.values():
+            out_file.close()
+    return [r[2] for r in ranges]
+
+
+def slice_worker(jobs, next_job, results):
+    """
+    Run in each slicing process: take the next job until none are left.
+    The jobs are inherited when the process is forked and handed out with
+    a shared counter, so only the results (strings) are ever pickled.
+    :type jobs: list[(str, list, str)] Arguments to
+    slice_log_file_by_windows
+    :type next_job: multiprocessing.Value
+    :type results: multiprocessing.Queue
+    """
+    while True:
+        with next_job.get_lock():
+            job = next_job.value
+            next_job.value += 1
+        if job >= len(jobs):
+            return
+        try:
+            results.put((job, slice_log_file_by_windows(*jobs[job]), None))
+        except Exception as e:
+            results.put((job, [], jobs[job][0] + ': ' + str(e)))
+
+
+def slice_log_files_by_windows(log_files, windows, leeway=0, ext='.slice',
+                               processes=None):
+    """
+    Slice the given log files into many time windows at once (such as one
+    per test case), rather than re-reading every log for every window
+    with slice_log_files_by_time.  Each log is read once and its slices
+    for all windows written together, with the logs shared out over a
+    pool of processes (see slice_worker).
+    :type log_files: list[FileLocation]
+    :type windows: list[(str, datetime.datetime, datetime.datetime)]
+    Output directory, start and stop time of each window
+    :type leeway: int Seconds to widen every window by on each side
+    :type ext: str
+    :type processes: int Size of the process pool (defaults to the
+    number of CPUs); 1 slices in this process
+    :return: list[str] The slice files written
+    """
+    leeway_delta = datetime.timedelta(seconds=float(leeway))
+    concrete_windows = [
+        (out_dir,
+         start_time - leeway_delta if start_time is not None else None,
+         stop_time + leeway_delta if stop_time is not None else None)
+        for out_dir, start_time, stop_time in windows]
+
+    jobs = [(f.full_path(), concrete_windows, ext) for f in log_files
+            if os.path.isfile(f.full_path())]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        return [slice_file for job in jobs
+                for slice_file in slice_log_file_by_windows(*job)]
+
+    next_job = multiprocessing.Value('i', 0)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=slice_worker,
+                                       args=(jobs, next_job, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    slices = [None] * len(jobs)
+    errors = []
+    try:
+        for _ in jobs:
+            while True:
+                try:
+                    job, slice_files, error = results.get(timeout=1)
+                    break
+                except Queue.Empty:
+                    if not any(w.is_alive() for w in workers):
+                        raise SubprocessFailedException(
+                            'Log slicing processes exited early')
+            slices[job] = slice_files
+            if error is not None:
+                errors.append(error)
+    finally:
+        for worker in workers:
+            worker.join(1)
+            if worker.is_alive():
+                worker.terminate()
+    if errors:
+        raise SubprocessFailedException(
+            'Failed to slice logs: ' + ', '.join(errors))
+    return [slice_file for result in slices for slice_file in result]
+
 
 def slice_log_files_by_time(log_files, out_dir, slice_start_time=None,
                             slice_stop_time=None, leeway=0,
@@ -42,54 +477,157 @@ def slice_log_files_by_time(log_files, out_dir, slice_start_time=None,
     :type ext: str
     :return:
     """
+    leeway_delta = datetime.timedelta(seconds=float(leeway))
+    concrete_start_time = (slice_start_time - leeway_delta
+                           if slice_start_time is not None else None)
+    concrete_stop_time = (slice_stop_time + leeway_delta
+                          if slice_stop_time is not None else None)
 
-    concrete_start_time = slice_start_time - datetime.timedelta(seconds=leeway)
-    concrete_stop_time = slice_stop_time + datetime.timedelta(seconds=leeway)
-
-    log_file_set = log_files
-
-    for filepath in log_file_set:
-        lines_to_write = []
-        if cli.LinuxCLI(priv=False).exists(filepath.full_path()):
-            with open(filepath.full_path(), 'r') as cf:
-                firstline = cf.readline()
-                current_format = None
-                current_pos = None
-                for fmt, pos in COMMON_FORMATS:
-                    try:
-                        current_format = fmt
-                        current_pos = pos
-                        dateline = ' '.join(
-                            firstline.split(' ')[current_pos:current_pos + 2])
-                        datetime.datetime.strptime(dateline, current_format)
-                        break
-                    except ValueError:
-                        continue
-                if not current_format:
-                    # No appropriate formats, so skip file
-                    continue
+    for filepath in log_files:
+        if not os.path.isfile(filepath.full_path()):
+            continue
+        index = get_log_index(filepath.full_path())
+        if not index.usable():
+            # No appropriate formats, so skip file
+            continue
+        start, end = index.byte_range(concrete_start_time,
+                                      concrete_stop_time)
+        if start == end:
+            continue
+
+        make_dir(out_dir)
+        filename = out_dir + '/' + filepath.filename + ext
+        with open(filename, 'wb') as out_file:
+            out_file.write(slice_header(filepath.full_path(),
+                                        concrete_start_time,
+                                        concrete_stop_time,
+                                        index.date_format))
+            index.copy_range(out_file, start, end)
 
-                for line in cf.readlines():
-                    dateline = ' '.join(
-                        line.split(' ')[current_pos:current_pos + 2])
-                    try:
-                        current_time = datetime.datetime.strptime(
-                            dateline, current_format)
-                        if current_time < concrete_start_time:
-                            continue
-                        elif current_time > concrete_stop_time:
-                            break
-                        else:
-                            lines_to_write.append(line)
-                    except ValueError:
-                        continue
 
-            if len(lines_to_write) != 0:
-                filename = out_dir + '/' + filepath.filename + ext
-                cli.LinuxCLI(priv=False).write_to_file(
-                    filename,
-                    'SLICE OF LOG [' + filepath.full_path() + '] FROM [' +
-                    str(concrete_start_time) + '] TO [' +
-                    str(concrete_stop_time) + ']\n')
-                cli.LinuxCLI(priv=False).write_to_file(
-                    filename, ''.join(lines_to_write), append=True)
+def log_records(file_path, date_format=None, date_position=0, tag=''):
+    """
+    Read a log as records: a timestamped line and the untimestamped lines
+    (such as tracebacks) after it.  Lines before the first timestamp are
+    given the earliest possible time.  Only one record is held at a time.
+    :type file_path: str
+    :type date_format: str Detected from the first line if not given
+    :type date_position: int
+    :type tag: str Prefix for every line of the records
+    :return: iterator[(datetime.datetime, str)]
+    """
+    with open(file_path, 'rb') as f:
+        if date_format is None:
+            log_format = detect_log_format(f.readline())
+            f.seek(0)
+            if log_format is None:
+                return
+            date_format, date_position = log_format
+
+        record_time = datetime.datetime.min
+        record = []
+        for line in f:
+            if not line.endswith('\n'):
+                line += '\n'
+            line_time = parse_line_time(line, date_format, date_position)
+            if line_time is not None:
+                if record:
+                    yield record_time, ''.join(record)
+                record_time = line_time
+                record = []
+            record.append(tag + line)
+        if record:
+            yield record_time, ''.join(record)
+
+
+def numbered_records(records, num):
+    """
+    Add the log's number to each of its records, to break ties between
+    logs in a merge (so records at the same time keep the logs' order).
+    :type records: iterator[(datetime.datetime, str)]
+    :type num: int
+    :return: iterator[(datetime.datetime, int, str)]
+    """
+    for record_time, record in records:
+        yield record_time, num, record
+
+
+def merge_log_files(log_files, out_file_path):
+    """
+    Merge logs into one time-ordered log, with each line tagged with the
+    name of the log it came from.  Each log must already be in time order;
+    they are merged as streams (with a heap holding the next record of
+    each), so memory use does not grow with the size of the logs.
+    :type log_files: list[(FileLocation, str, int)] Each log, with its
+    date format and position (a format of None is detected from the
+    log's first line)
+    :type out_file_path: str
+    :return: int The number of records written
+    """
+    streams = []
+    for num, (location, date_format, date_position) in \
+            enumerate(log_files):
+        if not os.path.isfile(location.full_path()):
+            continue
+        streams.append(numbered_records(
+            log_records(location.full_path(), date_format, date_position,
+                        '[' + location.filename + '] '), num))
+
+    out_dir = os.path.dirname(out_file_path)
+    if out_dir != '':
+        make_dir(out_dir)
+    count = 0
+    with open(out_file_path, 'wb') as out_file:
+        for record_time, num, record in heapq.merge(*streams):
+            out_file.write(record)
+            count += 1
+    return count
+
+
+def is_json_log(file_path):
+    """
+    :type file_path: str
+    :return: bool True if the log is JSON lines (see
+    log_manager.JSONFormatter)
+    """
+    with open(file_path, 'rb') as f:
+        return detect_log_format(f.readline()) == (JSON_LOG_FORMAT, 0)
+
+
+def slice_json_logs_by_test(log_files, test_dirs, ext='.slice'):
+    """
+    Split JSON-lines logs (see log_manager.JSONFormatter) by the test id
+    each record was logged under, in one pass over each log.  Unlike
+    slicing by time, this leaves out records of other tests running at
+    the same time.
+    :type log_files: list[FileLocation]
+    :type test_dirs: dict[str, str] Output directory for each test id;
+    records of other tests (or none) are skipped
+    :type ext: str
+    :return: list[str] The slice files written
+    """
+    slices = []
+    for location in log_files:
+        if not os.path.isfile(location.full_path()):
+            continue
+        out_files = {}
+        """ :type: dict[str, file]"""
+        if not is_json_log(location.full_path()):
+            continue
+        try:
+            with open(location.full_path(), 'rb') as f:
+                for line in f:
+                    test_id = line_test_id(line)
+                    if test_id not in test_dirs:
+                        continue
+                    if test_id not in out_files:
+                        make_dir(test_dirs[test_id])
+                        slice_file = (test_dirs[test_id] + '/' +
+                                      location.filename + ext)
+                        out_files[test_id] = open(slice_file, 'wb')
+                        slices.append(slice_file)
+                    out_files[test_id].write(line)
+        finally:
+            for out_file in out_files.values():
+                out_file.close()
+    return slices
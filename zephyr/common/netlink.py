@@ -0,0 +1,573 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import errno
+import os
+import socket
+import struct
+import threading
+from zephyr.common.exceptions import *
+from zephyr.common import packet_socket
+
+NETLINK_ROUTE = 0
+
+# Message types
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+# Message flags
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+# Link attributes
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_LINK = 5
+IFLA_MASTER = 10
+IFLA_LINKINFO = 18
+IFLA_NET_NS_FD = 28
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+VETH_INFO_PEER = 1
+IFLA_VLAN_ID = 1
+IFLA_BR_STP_STATE = 5
+IFF_UP = 0x1
+
+# Address attributes
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+# Route attributes and values
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RT_SCOPE_NOWHERE = 255
+RTN_UNICAST = 1
+
+NLMSG_HEADER = struct.Struct('=IHHII')
+NLMSG_ERROR_CODE = struct.Struct('=i')
+RTATTR_HEADER = struct.Struct('=HH')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTMSG = struct.Struct('=BBBBBBBBI')
+
+RECV_BUFFER_SIZE = 65536
+
+# Keep each batch datagram well under the default socket send buffer
+MAX_BATCH_SIZE = 32768
+
+
+def align(length):
+    return (length + 3) & ~3
+
+
+def rtattr(attr_type, data):
+    """
+    Pack a netlink route attribute (type-length-value, padded to 4 bytes).
+    :type attr_type: int
+    :type data: str
+    :return: str
+    """
+    length = RTATTR_HEADER.size + len(data)
+    return (RTATTR_HEADER.pack(length, attr_type) + data +
+            '\0' * (align(length) - length))
+
+
+def rtattr_str(attr_type, value):
+    # Names read from JSON configs arrive as unicode
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return rtattr(attr_type, value + '\0')
+
+
+def rtattr_u32(attr_type, value):
+    return rtattr(attr_type, struct.pack('=I', value))
+
+
+def parse_rtattrs(data, offset=0):
+    """
+    :type data: str
+    :type offset: int
+    :return: dict[int, str]
+    """
+    attrs = {}
+    while offset + RTATTR_HEADER.size <= len(data):
+        length, attr_type = RTATTR_HEADER.unpack_from(data, offset)
+        if length < RTATTR_HEADER.size:
+            break
+        attrs[attr_type] = data[offset + RTATTR_HEADER.size:offset + length]
+        offset += align(length)
+    return attrs
+
+
+def pack_mac(mac):
+    return ''.join(chr(int(b, 16)) for b in mac.split(':'))
+
+
+def pack_ip(ip):
+    return socket.inet_aton(ip)
+
+
+def route_dest(route_ip):
+    """
+    Split a route destination (an IP, a CIDR string or 'default') into an
+    address and prefix length.
+    :type route_ip: zephyr.common.ip.IP | str
+    :return: (str, int)
+    """
+    if isinstance(route_ip, str):
+        if route_ip == 'default':
+            return '0.0.0.0', 0
+        parts = route_ip.split('/')
+        return parts[0], int(parts[1]) if len(parts) > 1 else 32
+    return route_ip.ip, int(route_ip.subnet)
+
+
+class BatchState(threading.local):
+    """
+    The requests a thread has queued on an IPRoute, and its batch nesting.
+    """
+
+    def __init__(self):
+        super(BatchState, self).__init__()
+        self.pending = []
+        """ :type: list[(int, str, str)]"""
+        self.pending_fds = []
+        """ :type: list[int]"""
+        self.batch_depth = 0
+        self.index_cache = {}
+        """ :type: dict[str, int]"""
+
+
+class IPRoute(object):
+    """
+    Link, address and route configuration over an rtnetlink socket opened
+    in a given IP net namespace (or the current one), in place of running
+    'ip link', 'ip addr', 'ip route' and 'brctl' commands.  Requires
+    CAP_NET_ADMIN (and CAP_SYS_ADMIN to open it in another namespace).
+
+    Each operation is normally sent and acknowledged on its own.  Inside a
+    batch() block, operations are instead queued and sent to the kernel
+    together when the block exits, so configuring a whole host costs a
+    single round trip.  Looking up an interface index flushes the queue
+    first, so operations that depend on earlier ones still see their
+    effect.
+
+    With check set, failed operations raise SubprocessFailedException.
+    Otherwise, like the unverified CLI commands they replace, failures are
+    only recorded in 'errors' (and logged, if a logger is given).
+
+    Hosts configure each other's interfaces (a veth peer's bridge, say), so
+    one IPRoute may be used from several threads at once.  Every thread
+    keeps its own batch, and the socket is only used by one at a time.
+    """
+
+    def __init__(self, netns=None, check=True, logger=None):
+        """
+        :type netns: str
+        :type check: bool
+        :type logger: logging.Logger
+        """
+        self.netns = netns
+        self.check = check
+        self.logger = logger
+        self.sock = None
+        """ :type: socket.socket"""
+        self.seq = 0
+        self.state = BatchState()
+        """ :type: BatchState"""
+        self.lock = threading.RLock()
+        self.errors = []
+        """ :type: list[(str, int)]"""
+
+    def open(self):
+        with self.lock:
+            if self.sock is not None:
+                return
+            try:
+                with packet_socket.netns_context(self.netns):
+                    self.sock = socket.socket(socket.AF_NETLINK,
+                                              socket.SOCK_RAW, NETLINK_ROUTE)
+                self.sock.bind((0, 0))
+            except (socket.error, OSError) as e:
+                self.close()
+                raise SubprocessFailedException(
+                    'Could not open netlink socket in namespace [' +
+                    str(self.netns) + ']: ' + str(e))
+
+    def close(self):
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+        for fd in self.state.pending_fds:
+            os.close(fd)
+        self.state.pending_fds = []
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Queue all operations issued inside the block and send them in one
+        go when it exits.  Batches may be nested; only the outermost one
+        sends.
+        """
+        self.state.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.state.batch_depth -= 1
+            if self.state.batch_depth == 0:
+                try:
+                    self.flush()
+                finally:
+                    self.state.index_cache = {}
+
+    def request(self, msg_type, flags, body, description):
+        """
+        Queue a request message, and send it right away unless batching.
+        :type msg_type: int
+        :type flags: int
+        :type body: str
+        :type description: str Shown in errors for this request
+        """
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+        header = NLMSG_HEADER.pack(NLMSG_HEADER.size + len(body), msg_type,
+                                   flags | NLM_F_REQUEST | NLM_F_ACK, seq, 0)
+        self.state.pending.append((seq, header + body, description))
+        if self.state.batch_depth == 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Send all queued requests, then collect every acknowledgement.
+        """
+        if len(self.state.pending) == 0:
+            return
+        pending = self.state.pending
+        self.state.pending = []
+        waiting = dict((seq, desc) for seq, _, desc in pending)
+        failures = []
+        try:
+            with self.lock:
+                self.open()
+                chunk = ''
+                for _, msg, _ in pending:
+                    if len(chunk) + len(msg) > MAX_BATCH_SIZE:
+                        self.sock.send(chunk)
+                        chunk = ''
+                    chunk += msg
+                self.sock.send(chunk)
+
+                while len(waiting) > 0:
+                    for msg_type, seq, data in self.recv_messages():
+                        if msg_type != NLMSG_ERROR or seq not in waiting:
+                            continue
+                        code = -NLMSG_ERROR_CODE.unpack_from(data)[0]
+                        desc = waiting.pop(seq)
+                        if code != 0:
+                            failures.append((desc, code))
+        finally:
+            for fd in self.state.pending_fds:
+                os.close(fd)
+            self.state.pending_fds = []
+
+        self.report(failures)
+
+    def report(self, failures):
+        """
+        :type failures: list[(str, int)]
+        """
+        if len(failures) == 0:
+            return
+        with self.lock:
+            self.errors += failures
+        message = ', '.join(desc + ': ' + os.strerror(code)
+                            for desc, code in failures)
+        if self.logger is not None:
+            self.logger.debug('Netlink request(s) failed: ' + message)
+        if self.check:
+            raise SubprocessFailedException(
+                'Netlink request(s) failed: ' + message)
+
+    def recv_messages(self):
+        """
+        Read one datagram off the socket and split it into its messages.
+        :return: list[(int, int, str)] Type, sequence number and payload
+        """
+        data = self.sock.recv(RECV_BUFFER_SIZE)
+        messages = []
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, msg_type, _, seq, _ = NLMSG_HEADER.unpack_from(
+                data, offset)
+            if length < NLMSG_HEADER.size:
+                break
+            messages.append(
+                (msg_type, seq,
+                 data[offset + NLMSG_HEADER.size:offset + length]))
+            offset += align(length)
+        return messages
+
+    def link_index(self, name):
+        """
+        Look up an interface's index by name, or None if there is no such
+        interface.  Queued requests are sent first.  Inside a batch, all
+        interfaces are fetched at once and remembered until the batch ends,
+        so configuring many interfaces needs few lookups.
+        :type name: str
+        :return: int
+        """
+        if name not in self.state.index_cache:
+            self.flush()
+            links = self.dump_links()
+            if self.state.batch_depth == 0:
+                return links.get(name)
+            self.state.index_cache = links
+        return self.state.index_cache.get(name)
+
+    def dump_links(self):
+        """
+        :return: dict[str, int] Every interface's index, by name
+        """
+        body = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        links = {}
+        with self.lock:
+            self.open()
+            self.seq += 1
+            self.sock.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(body),
+                                             RTM_GETLINK,
+                                             NLM_F_REQUEST | NLM_F_DUMP,
+                                             self.seq, 0) + body)
+            while True:
+                for msg_type, seq, data in self.recv_messages():
+                    if seq != self.seq:
+                        continue
+                    if msg_type == NLMSG_DONE:
+                        return links
+                    if msg_type == NLMSG_ERROR:
+                        raise SubprocessFailedException(
+                            'Netlink link dump failed: ' + os.strerror(
+                                -NLMSG_ERROR_CODE.unpack_from(data)[0]))
+                    if msg_type == RTM_NEWLINK:
+                        index = IFINFOMSG.unpack_from(data)[2]
+                        attrs = parse_rtattrs(data, IFINFOMSG.size)
+                        if IFLA_IFNAME in attrs:
+                            links[attrs[IFLA_IFNAME].rstrip('\0')] = index
+
+    def netns_fd(self, netns):
+        """
+        Open a net namespace for an IFLA_NET_NS_FD attribute, keeping it
+        open until the request using it has been sent.
+        :type netns: str
+        :return: int
+        """
+        fd = os.open(os.path.join(packet_socket.NETNS_RUN_DIR, netns),
+                     os.O_RDONLY)
+        self.state.pending_fds.append(fd)
+        return fd
+
+    def link_request(self, msg_type, flags, name, attrs, description,
+                     ifi_flags=0, ifi_change=0):
+        body = (IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, ifi_flags,
+                               ifi_change) +
+                rtattr_str(IFLA_IFNAME, name) + attrs)
+        self.request(msg_type, flags, body, description)
+
+    @staticmethod
+    def link_info(kind, data=''):
+        return rtattr(IFLA_LINKINFO,
+                      rtattr_str(IFLA_INFO_KIND, kind) +
+                      (rtattr(IFLA_INFO_DATA, data) if data else ''))
+
+    def add_veth(self, name, peer_name, peer_netns=None):
+        """
+        Create a veth pair, optionally with the peer created directly in
+        another net namespace (no separate move/rename step).
+        :type name: str
+        :type peer_name: str
+        :type peer_netns: str
+        """
+        peer = (IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) +
+                rtattr_str(IFLA_IFNAME, peer_name))
+        if peer_netns is not None:
+            peer += rtattr_u32(IFLA_NET_NS_FD, self.netns_fd(peer_netns))
+        self.link_request(RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, name,
+                          self.link_info('veth', rtattr(VETH_INFO_PEER, peer)),
+                          'add veth ' + name + ' peer ' + peer_name)
+
+    def add_bridge(self, name, stp=False):
+        """
+        :type name: str
+        :type stp: bool
+        """
+        data = rtattr_u32(IFLA_BR_STP_STATE, 1) if stp else ''
+        self.link_request(RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, name,
+                          self.link_info('bridge', data),
+                          'add bridge ' + name)
+
+    def add_vlan(self, name, parent, vlan_id):
+        """
+        :type name: str
+        :type parent: str
+        :type vlan_id: int
+        """
+        parent_index = self.link_index(parent)
+        if parent_index is None:
+            self.report([('add vlan ' + name, errno.ENODEV)])
+            return
+        self.link_request(RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, name,
+                          rtattr_u32(IFLA_LINK, parent_index) +
+                          self.link_info('vlan',
+                                         rtattr(IFLA_VLAN_ID,
+                                                struct.pack('=H',
+                                                            int(vlan_id)))),
+                          'add vlan ' + name)
+
+    def del_link(self, name):
+        """
+        :type name: str
+        """
+        self.state.index_cache.pop(name, None)
+        self.link_request(RTM_DELLINK, 0, name, '', 'del link ' + name)
+
+    def set_link(self, name, up=None, mac=None, master=None, netns=None,
+                 new_name=None):
+        """
+        Change an existing interface: bring it up or down, set its MAC,
+        enslave it to a bridge ('' to release it), or move and/or rename it.
+        :type name: str
+        :type up: bool
+        :type mac: str
+        :type master: str
+        :type netns: str
+        :type new_name: str
+        """
+        attrs = ''
+        if mac is not None:
+            attrs += rtattr(IFLA_ADDRESS, pack_mac(mac))
+        if master is not None:
+            master_index = self.link_index(master) if master != '' else 0
+            if master_index is None:
+                self.report([('set master ' + master + ' on ' + name,
+                              errno.ENODEV)])
+                return
+            attrs += rtattr_u32(IFLA_MASTER, master_index)
+        if netns is not None:
+            attrs += rtattr_u32(IFLA_NET_NS_FD, self.netns_fd(netns))
+            self.state.index_cache.pop(name, None)
+
+        if new_name is not None:
+            # Renaming needs the device picked by index, as IFLA_IFNAME then
+            # carries the new name
+            index = self.link_index(name)
+            if index is None:
+                self.report([('rename ' + name, errno.ENODEV)])
+                return
+            self.state.index_cache.pop(name, None)
+            body = (IFINFOMSG.pack(socket.AF_UNSPEC, 0, index,
+                                   IFF_UP if up else 0,
+                                   IFF_UP if up is not None else 0) +
+                    rtattr_str(IFLA_IFNAME, new_name) + attrs)
+            self.request(RTM_NEWLINK, 0, body, 'set link ' + name)
+            return
+
+        self.link_request(RTM_NEWLINK, 0, name, attrs, 'set link ' + name,
+                          ifi_flags=IFF_UP if up else 0,
+                          ifi_change=IFF_UP if up is not None else 0)
+
+    def addr_request(self, msg_type, flags, name, ip, description):
+        index = self.link_index(name)
+        if index is None:
+            self.report([(description, errno.ENODEV)])
+            return
+        address = pack_ip(ip.ip)
+        body = (IFADDRMSG.pack(socket.AF_INET, int(ip.subnet), 0,
+                               RT_SCOPE_UNIVERSE, index) +
+                rtattr(IFA_LOCAL, address) + rtattr(IFA_ADDRESS, address))
+        self.request(msg_type, flags, body, description)
+
+    def add_addr(self, name, ip):
+        """
+        :type name: str
+        :type ip: zephyr.common.ip.IP
+        """
+        self.addr_request(RTM_NEWADDR, NLM_F_CREATE | NLM_F_EXCL, name, ip,
+                          'add addr ' + str(ip) + ' on ' + name)
+
+    def del_addr(self, name, ip):
+        """
+        :type name: str
+        :type ip: zephyr.common.ip.IP
+        """
+        self.addr_request(RTM_DELADDR, 0, name, ip,
+                          'del addr ' + str(ip) + ' on ' + name)
+
+    def route_request(self, msg_type, flags, route_ip, gw_ip, dev,
+                      description):
+        dst, prefix = route_dest(route_ip)
+        attrs = rtattr(RTA_DST, pack_ip(dst)) if prefix > 0 else ''
+        if gw_ip is not None:
+            attrs += rtattr(RTA_GATEWAY, pack_ip(gw_ip.ip))
+        if dev is not None:
+            index = self.link_index(dev)
+            if index is None:
+                self.report([(description, errno.ENODEV)])
+                return
+            attrs += rtattr_u32(RTA_OIF, index)
+
+        if msg_type == RTM_NEWROUTE:
+            header = (RTPROT_BOOT,
+                      RT_SCOPE_LINK if gw_ip is None else RT_SCOPE_UNIVERSE,
+                      RTN_UNICAST)
+        else:
+            # Like 'ip route del', match the route whatever its protocol,
+            # scope and type
+            header = (0, RT_SCOPE_NOWHERE, 0)
+        body = RTMSG.pack(*((socket.AF_INET, prefix, 0, 0, RT_TABLE_MAIN) +
+                            header + (0,))) + attrs
+        self.request(msg_type, flags, body, description)
+
+    def add_route(self, route_ip, gw_ip=None, dev=None):
+        """
+        :type route_ip: zephyr.common.ip.IP | str
+        :type gw_ip: zephyr.common.ip.IP
+        :type dev: str
+        """
+        self.route_request(RTM_NEWROUTE, NLM_F_CREATE | NLM_F_EXCL,
+                           route_ip, gw_ip, dev,
+                           'add route ' + str(route_ip))
+
+    def del_route(self, route_ip):
+        """
+        :type route_ip: zephyr.common.ip.IP | str
+        """
+        self.route_request(RTM_DELROUTE, 0, route_ip, None, None,
+                           'del route ' + str(route_ip))
@@ -0,0 +1,356 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import struct
+from zephyr.common.exceptions import *
+from zephyr.common.pcap_packet import *
+
+BROADCAST_MAC = 'ff:ff:ff:ff:ff:ff'
+ZERO_MAC = '00:00:00:00:00:00'
+
+ETHERNET_MIN_FRAME_SIZE = 60
+
+IP4_FLAG_DONT_FRAGMENT = 0x4000
+IP4_DEFAULT_TTL = 64
+
+TCP_FLAG_NAMES = {
+    'fin': TCP_PROTOCOL_FLAG_FINAL,
+    'syn': TCP_PROTOCOL_FLAG_SYN,
+    'rst': TCP_PROTOCOL_FLAG_RESET,
+    'psh': TCP_PROTOCOL_FLAG_PUSH,
+    'ack': TCP_PROTOCOL_FLAG_ACK,
+    'urg': TCP_PROTOCOL_FLAG_URGENT,
+    'ece': TCP_PROTOCOL_FLAG_ECE,
+    'cwr': TCP_PROTOCOL_FLAG_CWS}
+
+
+def encode_mac_address(mac):
+    """
+    :type mac: str 'aa:bb:cc:dd:ee:ff'
+    :return: str The 6 bytes of the address
+    """
+    octets = mac.replace('-', ':').split(':')
+    if len(octets) != 6:
+        raise ArgMismatchException('Invalid MAC address: ' + str(mac))
+    try:
+        return ''.join(chr(int(o, 16)) for o in octets)
+    except ValueError:
+        raise ArgMismatchException('Invalid MAC address: ' + str(mac))
+
+
+def encode_ip4(ip):
+    """
+    :type ip: str
+    :return: str The 4 bytes of the address
+    """
+    try:
+        return socket.inet_pton(socket.AF_INET, ip)
+    except (socket.error, TypeError):
+        raise ArgMismatchException('Invalid IPv4 address: ' + str(ip))
+
+
+def checksum(data):
+    """
+    The internet checksum (RFC 1071) of the data.
+    :type data: str
+    :return: int
+    """
+    if len(data) % 2 == 1:
+        data += '\0'
+    total = sum(struct.unpack('!' + str(len(data) / 2) + 'H', data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+class PacketLayer(object):
+    """
+    One header of a frame being built.  Layers are listed outermost first
+    (see build_frame), and each one encodes itself around the bytes of the
+    layers inside it, so lengths and checksums can be filled in.
+    """
+
+    @staticmethod
+    def layer_name():
+        """
+        :return: str
+        """
+        raise ArgMismatchException(
+            "Base layer class shouldn't be used directly.  "
+            "Use a specific layer type instead.")
+
+    def type_number(self):
+        """
+        The number the enclosing layer uses to identify this one (its
+        Ethernet type or IP protocol).
+        :return: int
+        """
+        return 0
+
+    def encode(self, payload, enclosing=None, inner=None):
+        """
+        :type payload: str The encoded layers (and data) inside this one
+        :type enclosing: PacketLayer The layer just outside this one
+        :type inner: PacketLayer The layer just inside this one
+        :return: str
+        """
+        raise ArgMismatchException(
+            "Base layer class shouldn't be used directly.  "
+            "Use a specific layer type instead.")
+
+
+class Ethernet(PacketLayer):
+    @staticmethod
+    def layer_name():
+        return 'ethernet'
+
+    def __init__(self, source_mac, dest_mac=BROADCAST_MAC, type=None,
+                 pad=True):
+        """
+        :type source_mac: str
+        :type dest_mac: str
+        :type type: int Taken from the inner layer if not given
+        :type pad: bool Pad the frame to the Ethernet minimum
+        """
+        self.source_mac = source_mac
+        self.dest_mac = dest_mac
+        self.type = type
+        self.pad = pad
+
+    def encode(self, payload, enclosing=None, inner=None):
+        ether_type = self.type
+        if ether_type is None:
+            ether_type = inner.type_number() if inner is not None else 0
+        frame = (encode_mac_address(self.dest_mac) +
+                 encode_mac_address(self.source_mac) +
+                 struct.pack('!H', ether_type) + payload)
+        if self.pad and len(frame) < ETHERNET_MIN_FRAME_SIZE:
+            frame += '\0' * (ETHERNET_MIN_FRAME_SIZE - len(frame))
+        return frame
+
+
+class ARP(PacketLayer):
+    @staticmethod
+    def layer_name():
+        return 'arp'
+
+    def __init__(self, sender_mac, sender_ip, target_ip,
+                 target_mac=ZERO_MAC,
+                 operation=ARP_PROTOCOL_OPERATION_REQUEST):
+        """
+        :type sender_mac: str
+        :type sender_ip: str
+        :type target_ip: str
+        :type target_mac: str
+        :type operation: int
+        """
+        self.sender_mac = sender_mac
+        self.sender_ip = sender_ip
+        self.target_ip = target_ip
+        self.target_mac = target_mac
+        self.operation = operation
+
+    def type_number(self):
+        return ETHERNET_PROTOCOL_TYPE_ARP
+
+    def encode(self, payload, enclosing=None, inner=None):
+        return (struct.pack('!HHBBH', ARP_PROTOCOL_HW_TYPE_EHTERNET,
+                            ETHERNET_PROTOCOL_TYPE_IP4, 6, 4,
+                            self.operation) +
+                encode_mac_address(self.sender_mac) +
+                encode_ip4(self.sender_ip) +
+                encode_mac_address(self.target_mac) +
+                encode_ip4(self.target_ip) + payload)
+
+
+class IP4(PacketLayer):
+    @staticmethod
+    def layer_name():
+        return 'ip'
+
+    def __init__(self, source_ip, dest_ip, protocol=None, ttl=IP4_DEFAULT_TTL,
+                 tos=0, id=0, flags=IP4_FLAG_DONT_FRAGMENT, total_length=None):
+        """
+        :type source_ip: str
+        :type dest_ip: str
+        :type protocol: int Taken from the inner layer if not given
+        :type ttl: int
+        :type tos: int
+        :type id: int
+        :type flags: int Flags and fragment offset
+        :type total_length: int Pad the packet with zeros to this length
+        """
+        self.source_ip = source_ip
+        self.dest_ip = dest_ip
+        self.protocol = protocol
+        self.ttl = ttl
+        self.tos = tos
+        self.id = id
+        self.flags = flags
+        self.total_length = total_length
+
+    def type_number(self):
+        return ETHERNET_PROTOCOL_TYPE_IP4
+
+    def pseudo_header(self, protocol, length):
+        """
+        The IPv4 pseudo-header TCP and UDP checksums cover.
+        :type protocol: int
+        :type length: int
+        :return: str
+        """
+        return (encode_ip4(self.source_ip) + encode_ip4(self.dest_ip) +
+                struct.pack('!BBH', 0, protocol, length))
+
+    def encode(self, payload, enclosing=None, inner=None):
+        protocol = self.protocol
+        if protocol is None:
+            protocol = inner.type_number() if inner is not None else 0
+        if (self.total_length is not None and
+                self.total_length > 20 + len(payload)):
+            payload += '\0' * (self.total_length - 20 - len(payload))
+        header = struct.pack('!BBHHHBBH4s4s', 0x45, self.tos,
+                             20 + len(payload), self.id, self.flags,
+                             self.ttl, protocol, 0,
+                             encode_ip4(self.source_ip),
+                             encode_ip4(self.dest_ip))
+        return (header[:10] + struct.pack('!H', checksum(header)) +
+                header[12:] + payload)
+
+
+class ICMP(PacketLayer):
+    @staticmethod
+    def layer_name():
+        return 'icmp'
+
+    def __init__(self, type=ICMP_PROTOCOL_TYPE_ECHO_REQUEST, code=0, id=0,
+                 seq=0):
+        """
+        :type type: int
+        :type code: int
+        :type id: int Identifier (echo messages only)
+        :type seq: int Sequence number (echo messages only)
+        """
+        self.type = type
+        self.code = code
+        self.id = id
+        self.seq = seq
+
+    def type_number(self):
+        return IP4_PROTOCOL_ICMP
+
+    def encode(self, payload, enclosing=None, inner=None):
+        message = struct.pack('!BBHHH', self.type, self.code, 0, self.id,
+                              self.seq) + payload
+        return (message[:2] + struct.pack('!H', checksum(message)) +
+                message[4:])
+
+
+class TCP(PacketLayer):
+    @staticmethod
+    def layer_name():
+        return 'tcp'
+
+    def __init__(self, source_port=0, dest_port=0, seq=0, ack=0,
+                 flags=TCP_PROTOCOL_FLAG_SYN, window=65535, urgent=0):
+        """
+        :type source_port: int
+        :type dest_port: int
+        :type seq: int
+        :type ack: int
+        :type flags: int TCP_PROTOCOL_FLAG_* values or'ed together
+        :type window: int
+        :type urgent: int
+        """
+        self.source_port = source_port
+        self.dest_port = dest_port
+        self.seq = seq
+        self.ack = ack
+        self.flags = flags
+        self.window = window
+        self.urgent = urgent
+
+    def type_number(self):
+        return IP4_PROTOCOL_TCP
+
+    def encode(self, payload, enclosing=None, inner=None):
+        segment = struct.pack('!HHIIHHHH', self.source_port, self.dest_port,
+                              self.seq, self.ack,
+                              (5 << 12) | (self.flags & 0x1ff),
+                              self.window, 0, self.urgent) + payload
+        pseudo = (enclosing.pseudo_header(IP4_PROTOCOL_TCP, len(segment))
+                  if isinstance(enclosing, IP4) else '')
+        return (segment[:16] +
+                struct.pack('!H', checksum(pseudo + segment)) +
+                segment[18:])
+
+
+class UDP(PacketLayer):
+    @staticmethod
+    def layer_name():
+        return 'udp'
+
+    def __init__(self, source_port=0, dest_port=0):
+        """
+        :type source_port: int
+        :type dest_port: int
+        """
+        self.source_port = source_port
+        self.dest_port = dest_port
+
+    def type_number(self):
+        return IP4_PROTOCOL_UDP
+
+    def encode(self, payload, enclosing=None, inner=None):
+        datagram = struct.pack('!HHHH', self.source_port, self.dest_port,
+                               8 + len(payload), 0) + payload
+        pseudo = (enclosing.pseudo_header(IP4_PROTOCOL_UDP, len(datagram))
+                  if isinstance(enclosing, IP4) else '')
+        # A zero checksum means "none" in UDP, so send all ones instead
+        udp_checksum = checksum(pseudo + datagram) or 0xffff
+        return datagram[:6] + struct.pack('!H', udp_checksum) + datagram[8:]
+
+
+def build_frame(layers, payload=''):
+    """
+    Build the bytes of a frame from its layers, outermost (normally
+    Ethernet) first, around the given payload.
+    :type layers: list[PacketLayer]
+    :type payload: str
+    :return: str
+    """
+    data = payload
+    for i in reversed(range(len(layers))):
+        data = layers[i].encode(
+            data,
+            enclosing=layers[i - 1] if i > 0 else None,
+            inner=layers[i + 1] if i + 1 < len(layers) else None)
+    return data
+
+
+def parse_tcp_flags(flags):
+    """
+    Parse TCP flags given by name, such as 'syn' or 'syn|ack' (any of
+    '|', ',', '+' or spaces between names).
+    :type flags: str
+    :return: int
+    """
+    value = 0
+    for name in flags.replace('|', ' ').replace(',', ' ').replace(
+            '+', ' ').split():
+        if name.lower() not in TCP_FLAG_NAMES:
+            raise ArgMismatchException('Unknown TCP flag: ' + name)
+        value |= TCP_FLAG_NAMES[name.lower()]
+    return value
@@ -0,0 +1,460 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import ctypes
+import errno
+from fcntl import ioctl
+import os
+import select
+import socket
+import struct
+import time
+from zephyr.common.cli import LinuxCLI
+from zephyr.common.cli import NetNSCLI
+from zephyr.common.exceptions import *
+from zephyr.common import packet_builder
+
+ETH_P_ALL = 0x0003
+ETH_HEADER_LENGTH = 14
+
+ARPHRD_ETHER = 1
+ARPHRD_LOOPBACK = 772
+
+PACKET_OUTGOING = 4
+
+SO_ATTACH_FILTER = 26
+SIOCGSTAMP = 0x8906
+SIOCGIFADDR = 0x8915
+
+CLONE_NEWNET = 0x40000000
+NETNS_RUN_DIR = '/var/run/netns'
+THREAD_NETNS_PATH = '/proc/thread-self/ns/net'
+
+# The routing and neighbour tables of the calling thread's net namespace
+THREAD_ROUTE_PATH = '/proc/thread-self/net/route'
+THREAD_ARP_PATH = '/proc/thread-self/net/arp'
+
+ARP_RESOLVE_TIMEOUT = 1
+
+# Largest frame the kernel will hand us on a standard MTU, plus room for
+# jumbo frames and offloaded (GSO) segments.
+MAX_FRAME_SIZE = 65535
+
+
+def _setns(ns_path, name):
+    libc = ctypes.CDLL('libc.so.6', use_errno=True)
+    fd = os.open(ns_path, os.O_RDONLY)
+    try:
+        if libc.setns(fd, CLONE_NEWNET) != 0:
+            err = ctypes.get_errno()
+            raise SubprocessFailedException(
+                'Could not enter net namespace [' + name + ']: ' +
+                os.strerror(err))
+    finally:
+        os.close(fd)
+
+
+def enter_netns(name):
+    """
+    Move the calling process (thread, strictly speaking) into the named IP
+    net namespace, as created by 'ip netns add'.  Any sockets created after
+    this call will belong to the namespace.  Requires CAP_SYS_ADMIN.
+    :type name: str
+    :return:
+    """
+    _setns(os.path.join(NETNS_RUN_DIR, name), name)
+
+
+@contextlib.contextmanager
+def netns_context(name):
+    """
+    Temporarily move the calling thread into the named IP net namespace
+    (or leave it where it is, if name is None), returning it to its own
+    namespace afterwards.  Sockets created inside stay in the namespace.
+    :type name: str
+    """
+    if name is None:
+        yield
+        return
+
+    own_fd = os.open(THREAD_NETNS_PATH, os.O_RDONLY)
+    try:
+        enter_netns(name)
+        try:
+            yield
+        finally:
+            _setns('/proc/self/fd/' + str(own_fd), 'original')
+    finally:
+        os.close(own_fd)
+
+
+def enter_cli_netns(cli):
+    """
+    Enter the net namespace the given CLI runs its commands in, if any.
+    :type cli: LinuxCLI
+    :return:
+    """
+    if isinstance(cli, NetNSCLI):
+        enter_netns(cli.name)
+
+
+def cli_netns(cli):
+    """
+    The net namespace the given CLI runs its commands in, or None.
+    :type cli: LinuxCLI
+    :return: str
+    """
+    return cli.name if isinstance(cli, NetNSCLI) else None
+
+
+def interface_ip4(interface):
+    """
+    The (first) IPv4 address of an interface in the calling thread's net
+    namespace, or None if it has none.
+    :type interface: str
+    :return: str
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        ifreq = ioctl(sock, SIOCGIFADDR,
+                      struct.pack('16s16x', interface[0:15]))
+    except IOError as e:
+        if e.errno == errno.EADDRNOTAVAIL:
+            return None
+        raise SubprocessFailedException(
+            'Could not get the IP address of [' + interface + ']: ' +
+            str(e))
+    finally:
+        sock.close()
+    return socket.inet_ntoa(ifreq[20:24])
+
+
+def next_hop(dest_ip, interface=None):
+    """
+    The IP the calling thread's net namespace would send a packet for
+    dest_ip to (the route's gateway, or dest_ip itself when it is on a
+    connected network), out of the given interface if any.
+    :type dest_ip: str
+    :type interface: str
+    :return: str
+    """
+    dest = struct.unpack('=I', socket.inet_aton(dest_ip))[0]
+    best = None
+    with open(THREAD_ROUTE_PATH) as route_file:
+        for line in route_file.readlines()[1:]:
+            fields = line.split()
+            if len(fields) < 8 or (interface is not None and
+                                   fields[0] != interface):
+                continue
+            route_dest, gateway, mask = (int(fields[1], 16),
+                                         int(fields[2], 16),
+                                         int(fields[7], 16))
+            if dest & mask != route_dest:
+                continue
+            prefix = bin(mask).count('1')
+            if best is None or prefix > best[0]:
+                best = (prefix, gateway)
+    if best is None or best[1] == 0:
+        return dest_ip
+    return socket.inet_ntoa(struct.pack('=I', best[1]))
+
+
+def lookup_neighbour(ip, interface=None):
+    """
+    The MAC address the calling thread's net namespace has resolved ip to,
+    or None if it hasn't (yet).
+    :type ip: str
+    :type interface: str
+    :return: str
+    """
+    with open(THREAD_ARP_PATH) as arp_file:
+        for line in arp_file.readlines()[1:]:
+            fields = line.split()
+            if (len(fields) >= 6 and fields[0] == ip and
+                    int(fields[2], 16) != 0 and
+                    (interface is None or fields[5] == interface)):
+                return fields[3]
+    return None
+
+
+def parse_bpf_program(bpf_text):
+    """
+    Parse the decimal BPF program output by 'tcpdump -ddd' into a list of
+    (code, jt, jf, k) instruction tuples.  The first line of the output is
+    the instruction count.
+    :type bpf_text: str
+    :return: list[(int, int, int, int)]
+    """
+    lines = [l.strip() for l in bpf_text.splitlines() if l.strip() != '']
+    if len(lines) == 0:
+        raise ArgMismatchException('Empty BPF program')
+
+    count = int(lines[0])
+    instructions = [tuple(int(f) for f in l.split()) for l in lines[1:]]
+    if len(instructions) != count or \
+            any(len(i) != 4 for i in instructions):
+        raise ArgMismatchException(
+            'Malformed BPF program, expected ' + str(count) +
+            ' instructions: ' + bpf_text)
+    return instructions
+
+
+def compile_bpf_filter(pcap_filter, cli=LinuxCLI(), interface='any'):
+    """
+    Compile a pcap rule set into a kernel BPF program.  The compilation
+    itself is done by tcpdump (run once, without capturing), so any rule
+    tcpdump would accept on the command line can be attached to a packet
+    socket.  The 'any' interface is compiled against the loopback device so
+    the program matches the raw Ethernet frames a packet socket bound to
+    all interfaces receives.
+    :type pcap_filter: zephyr.common.pcap.Rule
+    :type cli: LinuxCLI
+    :type interface: str
+    :return: list[(int, int, int, int)]
+    """
+    filter_str = pcap_filter.to_str() if pcap_filter is not None else ''
+    if filter_str == '':
+        return None
+
+    compile_iface = 'lo' if interface == 'any' else interface
+    result = cli.cmd_pipe(
+        [['tcpdump', '-ddd', '-i', compile_iface, filter_str]])
+    if result.ret_code != 0:
+        raise SubprocessFailedException(
+            'Could not compile pcap filter [' + filter_str + ']: ' +
+            result.stderr)
+    return parse_bpf_program(result.stdout)
+
+
+def make_sll_header(pkttype, hatype, hwaddr, protocol):
+    """
+    Build a 'Linux cooked' (SLL) link-layer header, which is what tcpdump
+    presents for captures on the 'any' interface.
+    :type pkttype: int
+    :type hatype: int
+    :type hwaddr: str
+    :type protocol: int
+    :return: str
+    """
+    return struct.pack('!HHH8sH', pkttype, hatype, len(hwaddr),
+                       hwaddr[0:8], protocol)
+
+
+class PacketSocket(object):
+    """
+    A raw AF_PACKET socket bound to an interface (or to all interfaces if
+    'any' is used), optionally with a kernel BPF filter attached.  Frames are
+    read directly off the socket, with no external process involved.  The
+    socket must be opened from within the net namespace it should capture
+    in (see enter_netns).
+    """
+
+    def __init__(self, interface='any', bpf_program=None, max_size=0):
+        """
+        :type interface: str
+        :type bpf_program: list[(int, int, int, int)]
+        :type max_size: int
+        """
+        self.interface = interface
+        self.bpf_program = bpf_program
+        self.max_size = max_size
+        self.sock = None
+        """ :type: socket.socket"""
+
+    def open(self):
+        try:
+            if self.interface == 'any':
+                # Binding to all interfaces can't be expressed through
+                # bind() in Python, so listen on all protocols from the
+                # start, and discard any frames that were queued before the
+                # filter was attached.
+                self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                          socket.htons(ETH_P_ALL))
+                if self.bpf_program is not None:
+                    self.attach_filter(self.bpf_program)
+                    self.drain()
+            else:
+                # Open with protocol 0 so no frames are queued until the
+                # filter is attached and the socket is bound with ETH_P_ALL.
+                self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                          0)
+                if self.bpf_program is not None:
+                    self.attach_filter(self.bpf_program)
+                self.sock.bind((self.interface, ETH_P_ALL))
+        except (socket.error, IOError) as e:
+            self.close()
+            raise SubprocessFailedException(
+                'Could not open packet socket on [' + self.interface +
+                ']: ' + str(e))
+
+    def drain(self):
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self.sock.recv(MAX_FRAME_SIZE)
+        except socket.error as e:
+            if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        finally:
+            self.sock.setblocking(True)
+
+    def attach_filter(self, bpf_program):
+        """
+        :type bpf_program: list[(int, int, int, int)]
+        """
+        filter_array = ''.join(struct.pack('HBBI', *i) for i in bpf_program)
+        filter_buf = ctypes.create_string_buffer(filter_array)
+        fprog = struct.pack('HL', len(bpf_program),
+                            ctypes.addressof(filter_buf))
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_packet(self, timeout=None):
+        """
+        Receive the next frame from the socket, waiting at most timeout
+        seconds (forever if None).  Returns a tuple of the frame data (with
+        an SLL header on the 'any' interface, to match tcpdump) and the
+        kernel's receive time as a (sec, usec) pair of integers, or None if
+        the timeout was hit.
+        :type timeout: float
+        :return: (str, (int, int))|None
+        """
+        while True:
+            try:
+                ready, _, _ = select.select([self.sock], [], [], timeout)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if len(ready) == 0:
+                return None
+
+            data, addr = self.sock.recvfrom(MAX_FRAME_SIZE)
+            _, protocol, pkttype, hatype, hwaddr = addr
+
+            # Like libpcap, ignore the outgoing copy of loopback frames, or
+            # every frame on 'lo' would be seen twice
+            if pkttype == PACKET_OUTGOING and hatype == ARPHRD_LOOPBACK:
+                continue
+
+            tv = ioctl(self.sock, SIOCGSTAMP, struct.pack('ll', 0, 0))
+            sec, usec = struct.unpack('ll', tv)
+
+            if self.interface == 'any':
+                link_len = (ETH_HEADER_LENGTH
+                            if hatype in (ARPHRD_ETHER, ARPHRD_LOOPBACK)
+                            else 0)
+                data = (make_sll_header(pkttype, hatype, hwaddr, protocol) +
+                        data[link_len:])
+
+            if self.max_size != 0:
+                data = data[0:self.max_size]
+
+            return data, (sec, usec)
+
+    def hw_address(self):
+        """
+        The MAC address of the interface the socket is bound to.
+        :return: str
+        """
+        hwaddr = self.sock.getsockname()[4]
+        return ':'.join('{0:02x}'.format(ord(c)) for c in hwaddr[0:6])
+
+    def send_frames(self, frames, count=1, interval=None, stop_event=None):
+        """
+        Send the frames out of the interface, in order, count times over
+        (or until stop_event is set if count is 0), waiting interval
+        seconds between frames.  Returns the number of frames sent.
+        :type frames: list[str]
+        :type count: int
+        :type interval: float
+        :type stop_event: threading.Event
+        :return: int
+        """
+        if self.interface == 'any':
+            raise ArgMismatchException(
+                "Frames can't be sent on the 'any' interface")
+        sent = 0
+        next_time = time.time()
+        rounds = 0
+        while count == 0 or rounds < count:
+            for frame in frames:
+                if stop_event is not None and stop_event.is_set():
+                    return sent
+                if interval and sent > 0:
+                    next_time += interval
+                    wait = next_time - time.time()
+                    if wait > 0:
+                        time.sleep(wait)
+                try:
+                    self.sock.send(frame)
+                except socket.error as e:
+                    raise SubprocessFailedException(
+                        'Could not send frame on [' + self.interface +
+                        ']: ' + str(e))
+                sent += 1
+            rounds += 1
+        return sent
+
+    def resolve_mac(self, ip, source_ip=None, timeout=ARP_RESOLVE_TIMEOUT):
+        """
+        Find the MAC address of ip (which must be on the interface's
+        network), from the neighbour table if it is there, otherwise by
+        sending an ARP request for it and waiting for the reply.  Returns
+        None if it can't be resolved within the timeout.  Must be called
+        from within the socket's net namespace.
+        :type ip: str
+        :type source_ip: str
+        :type timeout: float
+        :return: str
+        """
+        mac = lookup_neighbour(ip, self.interface)
+        if mac is not None:
+            return mac
+
+        own_mac = self.hw_address()
+        request = packet_builder.build_frame(
+            [packet_builder.Ethernet(own_mac),
+             packet_builder.ARP(own_mac,
+                                source_ip or interface_ip4(self.interface) or
+                                '0.0.0.0',
+                                ip)])
+        target = socket.inet_aton(ip)
+        self.sock.send(request)
+        deadline = time.time() + timeout
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                return None
+            ret = self.recv_packet(timeout=left)
+            if ret is None:
+                return None
+            frame = ret[0]
+            # An ARP reply (Ethernet type, then operation) from the target
+            if (len(frame) >= 42 and
+                    frame[12:14] == struct.pack(
+                        '!H', packet_builder.ETHERNET_PROTOCOL_TYPE_ARP) and
+                    frame[20:22] == struct.pack(
+                        '!H', packet_builder.ARP_PROTOCOL_OPERATION_REPLY) and
+                    frame[28:32] == target):
+                return ':'.join('{0:02x}'.format(ord(c))
+                                for c in frame[22:28])
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
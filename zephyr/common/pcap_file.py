@@ -0,0 +1,315 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import mmap
+import struct
+import time
+from zephyr.common.exceptions import *
+from zephyr.common.pcap_packet import format_timestamp
+from zephyr.common.pcap_packet import PCAPPacket
+from zephyr.common.pcap_packet import PCAPSLL
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+
+DEFAULT_SNAPLEN = 262144
+
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+PCAP_GLOBAL_HEADER_LENGTH = 24
+PCAP_RECORD_HEADER_LENGTH = 16
+
+PCAPNG_BLOCK_SECTION_HEADER = 0x0a0d0d0a
+PCAPNG_BLOCK_INTERFACE_DESC = 0x00000001
+PCAPNG_BLOCK_PACKET = 0x00000002
+PCAPNG_BLOCK_SIMPLE_PACKET = 0x00000003
+PCAPNG_BLOCK_ENHANCED_PACKET = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_OPTION_END = 0
+PCAPNG_OPTION_IF_TSRESOL = 9
+
+
+def link_type_for_interface(interface):
+    """
+    Link type of packets captured on an interface.  Captures on the 'any'
+    interface use 'Linux cooked' (SLL) headers.
+    :type interface: str
+    :return: int
+    """
+    return LINKTYPE_LINUX_SLL if interface == 'any' else LINKTYPE_ETHERNET
+
+
+def link_type_parse_stack(link_type):
+    """
+    Parse class stack to pass to PCAPPacket.parse for packets of the given
+    link type (None means the default, Ethernet).
+    :type link_type: int
+    :return: list[class]|None
+    """
+    return [PCAPSLL] if link_type == LINKTYPE_LINUX_SLL else None
+
+
+def _pad32(length):
+    return (length + 3) & ~3
+
+
+class PCAPFileReader(object):
+    """
+    Streams PCAPPackets out of a pcap or pcapng file.  The file is memory
+    mapped and only the current packet's data is copied out of it, so
+    memory use stays constant no matter how big the capture is:
+
+        with PCAPFileReader('capture.pcap') as reader:
+            for packet in reader:
+                pmap = packet.parse(
+                    link_type_parse_stack(reader.link_type))
+
+    The link type is known after the first packet is read.  For pcapng
+    files, it is the link type of the first interface.
+    """
+
+    def __init__(self, filename):
+        """
+        :type filename: str
+        """
+        self.filename = filename
+        self.link_type = None
+        """ :type: int """
+        self.file = None
+        self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __iter__(self):
+        self.close()
+        self.file = open(self.filename, 'rb')
+        if len(self.file.read(4)) < 4:
+            raise ArgMismatchException(
+                'File too short to be a packet capture: ' + self.filename)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic_le, = struct.unpack_from('<I', self.map, 0)
+        magic_be, = struct.unpack_from('>I', self.map, 0)
+        if PCAP_MAGIC_USEC in (magic_le, magic_be) or \
+                PCAP_MAGIC_NSEC in (magic_le, magic_be):
+            return self._read_pcap()
+        if magic_le == PCAPNG_BLOCK_SECTION_HEADER:
+            return self._read_pcapng()
+        raise ArgMismatchException(
+            'Unknown packet capture file format: ' + self.filename)
+
+    def _read_pcap(self):
+        m = self.map
+        if len(m) < PCAP_GLOBAL_HEADER_LENGTH:
+            raise ArgMismatchException(
+                'Truncated pcap file header: ' + self.filename)
+
+        endian = ('<' if struct.unpack_from('<I', m, 0)[0] in
+                  (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else '>')
+        magic, _, _, _, _, _, self.link_type = struct.unpack_from(
+            endian + 'IHHiIII', m, 0)
+        frac_divisor = 1000000000.0 if magic == PCAP_MAGIC_NSEC \
+            else 1000000.0
+
+        record_header = endian + 'IIII'
+        offset = PCAP_GLOBAL_HEADER_LENGTH
+        while offset + PCAP_RECORD_HEADER_LENGTH <= len(m):
+            ts_sec, ts_frac, incl_len, _ = struct.unpack_from(
+                record_header, m, offset)
+            offset += PCAP_RECORD_HEADER_LENGTH
+            if offset + incl_len > len(m):
+                # Capture was cut off while writing the last packet
+                break
+            epoch_time = ts_sec + ts_frac / frac_divisor
+            yield PCAPPacket(m[offset:offset + incl_len],
+                             format_timestamp(epoch_time), epoch_time)
+            offset += incl_len
+
+    def _read_pcapng(self):
+        m = self.map
+        endian = '<'
+        # Per-interface link types and timestamp units (in seconds)
+        interfaces = []
+        offset = 0
+        while offset + 12 <= len(m):
+            block_type, = struct.unpack_from(endian + 'I', m, offset)
+            if block_type == PCAPNG_BLOCK_SECTION_HEADER:
+                # Each section sets its own byte order and interfaces
+                bom, = struct.unpack_from('<I', m, offset + 8)
+                endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+                interfaces = []
+
+            block_len, = struct.unpack_from(endian + 'I', m, offset + 4)
+            if block_len < 12 or offset + block_len > len(m):
+                # Capture was cut off while writing the last block
+                break
+            body = offset + 8
+            body_end = offset + block_len - 4
+
+            if block_type == PCAPNG_BLOCK_INTERFACE_DESC:
+                link_type, _, _ = struct.unpack_from(endian + 'HHI', m, body)
+                interfaces.append(
+                    (link_type,
+                     self._pcapng_ts_unit(endian, body + 8, body_end)))
+                if self.link_type is None:
+                    self.link_type = link_type
+
+            elif block_type in (PCAPNG_BLOCK_ENHANCED_PACKET,
+                                PCAPNG_BLOCK_PACKET):
+                if block_type == PCAPNG_BLOCK_ENHANCED_PACKET:
+                    if_id, ts_high, ts_low, cap_len, _ = struct.unpack_from(
+                        endian + 'IIIII', m, body)
+                else:
+                    if_id, _, ts_high, ts_low, cap_len, _ = \
+                        struct.unpack_from(endian + 'HHIIII', m, body)
+                data = body + 20
+                ts_unit = (interfaces[if_id][1] if if_id < len(interfaces)
+                           else 0.000001)
+                epoch_time = ((ts_high << 32) + ts_low) * ts_unit
+                yield PCAPPacket(m[data:data + cap_len],
+                                 format_timestamp(epoch_time), epoch_time)
+
+            elif block_type == PCAPNG_BLOCK_SIMPLE_PACKET:
+                # Simple packets carry no capture length or timestamp, the
+                # data is the whole packet unless the snaplen cut it short
+                orig_len, = struct.unpack_from(endian + 'I', m, body)
+                data = body + 4
+                cap_len = min(orig_len, body_end - data)
+                yield PCAPPacket(m[data:data + cap_len], '', None)
+
+            offset += block_len
+
+    def _pcapng_ts_unit(self, endian, offset, end):
+        """
+        Find the if_tsresol option in an interface description block's
+        options and return the timestamp unit in seconds.
+        """
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', self.map, offset)
+            if code == PCAPNG_OPTION_END:
+                break
+            if code == PCAPNG_OPTION_IF_TSRESOL and length >= 1:
+                tsresol, = struct.unpack_from('B', self.map, offset + 4)
+                if tsresol & 0x80:
+                    return 2.0 ** -(tsresol & 0x7f)
+                return 10.0 ** -tsresol
+            offset += 4 + _pad32(length)
+        return 0.000001
+
+
+class PCAPFileWriter(object):
+    """
+    Writes PCAPPackets to a pcap (default) or pcapng file, which can then
+    be opened by wireshark, tcpdump, or read back with PCAPFileReader.
+    Output is buffered; call close (or use a 'with' block) to make sure
+    all packets are on disk.
+    """
+
+    def __init__(self, filename, link_type=LINKTYPE_ETHERNET,
+                 snaplen=DEFAULT_SNAPLEN, pcapng=False):
+        """
+        :type filename: str
+        :type link_type: int
+        :type snaplen: int
+        :type pcapng: bool
+        """
+        self.filename = filename
+        self.link_type = link_type
+        self.snaplen = snaplen
+        self.pcapng = pcapng
+        self.file = open(filename, 'wb')
+        if pcapng:
+            self._write_pcapng_headers()
+        else:
+            self.file.write(struct.pack(
+                '=IHHiIII', PCAP_MAGIC_USEC, 2, 4, 0, 0, snaplen, link_type))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write_pcapng_block(self, block_type, body):
+        body += '\0' * (_pad32(len(body)) - len(body))
+        block_len = len(body) + 12
+        self.file.write(struct.pack('=II', block_type, block_len) + body +
+                        struct.pack('=I', block_len))
+
+    def _write_pcapng_headers(self):
+        # Section length of -1 means unspecified
+        self._write_pcapng_block(
+            PCAPNG_BLOCK_SECTION_HEADER,
+            struct.pack('=IHHq', PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1))
+        # Microsecond resolution is the pcapng default, so no options
+        self._write_pcapng_block(
+            PCAPNG_BLOCK_INTERFACE_DESC,
+            struct.pack('=HHI', self.link_type, 0, self.snaplen))
+
+    @staticmethod
+    def packet_epoch_time(packet):
+        """
+        The capture time of a packet as a UNIX timestamp.  Packets captured
+        by tcpdump only have the time of day, which is taken to be today.
+        :type packet: PCAPPacket
+        :return: float
+        """
+        if packet.epoch_time is not None:
+            return packet.epoch_time
+        try:
+            tod = datetime.datetime.strptime(packet.timestamp,
+                                             '%H:%M:%S.%f')
+        except (TypeError, ValueError):
+            return time.time()
+        ts = datetime.datetime.combine(datetime.date.today(), tod.time())
+        return time.mktime(ts.timetuple()) + ts.microsecond / 1000000.0
+
+    def write_packet(self, packet):
+        """
+        :type packet: PCAPPacket
+        """
+        data = packet.packet_data
+        orig_len = len(data)
+        data = bytes(data[0:self.snaplen])
+        ts_sec, ts_usec = divmod(
+            int(round(self.packet_epoch_time(packet) * 1000000)), 1000000)
+
+        if self.pcapng:
+            ts = ts_sec * 1000000 + ts_usec
+            self._write_pcapng_block(
+                PCAPNG_BLOCK_ENHANCED_PACKET,
+                struct.pack('=IIIII', 0, ts >> 32, ts & 0xffffffff,
+                            len(data), orig_len) + data)
+        else:
+            self.file.write(
+                struct.pack('=IIII', ts_sec, ts_usec, len(data), orig_len) +
+                data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
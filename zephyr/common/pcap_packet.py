@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+import struct
 from zephyr.common.exceptions import *
 
 ETHERNET_PROTOCOL_TYPE_IP4 = 0x0800
@@ -60,7 +62,61 @@ ICMP_PROTOCOL_DU_CODE_HOST_PRECEDENCE_VIOLATION = 14
 ICMP_PROTOCOL_DU_CODE_PRECEDENCE_CUTOFF = 15
 
 
+def format_timestamp(epoch_time):
+    """
+    Format a UNIX timestamp the way tcpdump prints it (HH:MM:SS.usec)
+    :type epoch_time: float
+    :return: str
+    """
+    return datetime.datetime.fromtimestamp(epoch_time).strftime(
+        '%H:%M:%S.%f')
+
+
+def as_buffer(packet_data):
+    """
+    Returns a buffer which can be decoded with the struct module.  Packet
+    data given as a list of ints is copied into a bytearray, while bytes,
+    bytearrays and memoryviews are used as-is (without copying).
+    :type packet_data: list[int]|str|bytearray|memoryview
+    :return: str|bytearray|memoryview
+    """
+    if isinstance(packet_data, list):
+        return bytearray(packet_data)
+    return packet_data
+
+
+def decode_mac_address(buf, offset=0):
+    """
+    :type buf: str|bytearray|memoryview
+    :type offset: int
+    :return: str
+    """
+    return '%02x:%02x:%02x:%02x:%02x:%02x' % struct.unpack_from(
+        '!6B', buf, offset)
+
+
+def decode_ip4(buf, offset=0):
+    """
+    :type buf: str|bytearray|memoryview
+    :type offset: int
+    :return: str
+    """
+    return '%d.%d.%d.%d' % struct.unpack_from('!4B', buf, offset)
+
+
+def decode_raw(buf, offset, length):
+    """
+    :type buf: str|bytearray|memoryview
+    :type offset: int
+    :type length: int
+    :return: list[int]
+    """
+    return list(struct.unpack_from('!' + str(length) + 'B', buf, offset))
+
+
 class PCAPPacket(object):
+    __slots__ = ('timestamp', 'epoch_time', 'packet_data', 'layer_data',
+                 'extra_data')
 
     @staticmethod
     def char8_to_int16(char_msb, char_lsb):
@@ -120,18 +176,32 @@ class PCAPPacket(object):
         return '{0:02x}:{1:02x}:{2:02x}:{3:02x}:{4:02x}:{5:02x}'.format(
             char1, char2, char3, char4, char5, char6)
 
-    def __init__(self, packet_data, timestamp):
+    def __init__(self, packet_data, timestamp, epoch_time=None):
         """
-        :param packet_data: list[int]
+        :param packet_data: str|bytearray|list[int] Raw frame data.  Lists
+        of ints are converted to bytes once, here.
         :param timestamp: str
+        :param epoch_time: float Capture time as a UNIX timestamp, if known
         """
         self.timestamp = timestamp
-        self.packet_data = packet_data
+        self.epoch_time = epoch_time
+        """ :type: float """
+        self.packet_data = (bytes(bytearray(packet_data))
+                            if isinstance(packet_data, list)
+                            else packet_data)
+        """ :type: str """
         self.layer_data = {}
         """ :type: dict[str, PCAPEncapsulatedLayer] """
         self.extra_data = {}
         """ :type: dict[str, list[str]] """
 
+    def __reduce__(self):
+        # Parsed layers hold views into packet_data, which can't be
+        # pickled, so only send the raw data (packets are parsed by
+        # the receiver anyway).
+        return PCAPPacket, (self.packet_data, self.timestamp,
+                            self.epoch_time)
+
     def __iter__(self):
         return iter(self.layer_data)
 
@@ -147,6 +217,9 @@ class PCAPPacket(object):
 
     def parse(self, parse_class_stack=None):
         """
+        Split the packet into its layers.  Each layer only decodes what it
+        needs to find the next layer when it is parsed; the rest of its
+        fields are decoded from the packet data on first access.
         :param parse_class_stack: list[class] Stack of classes to parse
         packet (highest layer first in list)
         :return: dict[str, PCAPEncapsulatedLayer]
@@ -155,8 +228,10 @@ class PCAPPacket(object):
         self.extra_data['parse_classes'] = []
         self.extra_data['parse_types'] = []
 
-        # Start parsing with the whole packet (starting from Link-Layer)
-        current_data = self.packet_data
+        # Start parsing with the whole packet (starting from Link-Layer).
+        # Each layer gets a view on the rest of the packet, so no data is
+        # copied between layers.
+        current_data = memoryview(self.packet_data)
 
         # By default, the parsing stack is None, which tells us to figure
         # it out automatically, so let's start with Ethernet_II, as it's
@@ -172,9 +247,14 @@ class PCAPPacket(object):
         # If there are no more parsers to run in the stack, finish up
         while parse_class_name is not None:
 
+            # Instantiate the object based on the class given as the
+            # "next parser"
+            link_obj = parse_class_name()
+            """ :type: PCAPEncapsulatedLayer"""
+
             # Check type and set up some extra information about the classes
             # used to parse
-            if not isinstance(parse_class_name(), PCAPEncapsulatedLayer):
+            if not isinstance(link_obj, PCAPEncapsulatedLayer):
                 raise ArgMismatchException(
                     'Parsing classes must be of type "PCAPEncapsulatedLayer"')
 
@@ -185,11 +265,6 @@ class PCAPPacket(object):
             self.extra_data['parse_errors.' +
                             parse_class_name.layer_name()] = []
 
-            # Instantiate the object based on the class given as the
-            # "next parser"
-            link_obj = parse_class_name()
-            """ :type: PCAPEncapsulatedLayer"""
-
             try:
                 # Parse the current packet data and set the result as the
                 # new packet data for the
@@ -230,7 +305,38 @@ class PCAPPacket(object):
         return self.to_str()
 
 
+class LazyField(object):
+    """
+    A layer field which is decoded from the layer's data the first time it
+    is read, and cached in the given slot after that.  Reading the field
+    before the layer is parsed returns the default value.
+    """
+
+    def __init__(self, slot, decode, default):
+        """
+        :param slot: str Name of the slot to cache the decoded value in
+        :param decode: callable Takes the layer and returns the value
+        :param default: T Value of the field before the layer is parsed
+        """
+        self.slot = slot
+        self.decode = decode
+        self.default = default
+
+    def __get__(self, layer, layer_type=None):
+        if layer is None:
+            return self
+        try:
+            return getattr(layer, self.slot)
+        except AttributeError:
+            if layer.data is None:
+                return self.default
+            value = self.decode(layer)
+            setattr(layer, self.slot, value)
+            return value
+
+
 class PCAPEncapsulatedLayer(object):
+    __slots__ = ('next_parse_recommendation', 'data')
 
     @staticmethod
     def layer_name():
@@ -244,15 +350,19 @@ class PCAPEncapsulatedLayer(object):
 
     def __init__(self):
         self.next_parse_recommendation = None
+        # The layer's own bytes (header and payload), set when parsed
+        self.data = None
+        """ :type: str|bytearray|memoryview """
 
     def to_str(self):
         return ''
 
     def parse_layer(self, packet_data):
         """
-        :param packet_data: list[int] Array of int representing the bytes in
+        :param packet_data: list[int]|str|bytearray|memoryview The bytes in
         the packet
-        :return: list[int]
+        :return: list[int]|str|bytearray|memoryview The rest of the packet,
+        of the same type as packet_data
         """
         raise PacketParsingException(
             "Base layer class shouldn't be used directly.  "
@@ -261,6 +371,7 @@ class PCAPEncapsulatedLayer(object):
 
 
 class PCAPEthernet(PCAPEncapsulatedLayer):
+    __slots__ = ('type', '_dest_mac', '_source_mac')
 
     @staticmethod
     def layer_name():
@@ -271,13 +382,16 @@ class PCAPEthernet(PCAPEncapsulatedLayer):
 
     def __init__(self):
         super(PCAPEthernet, self).__init__()
-        self.dest_mac = ''
-        """ :type: str """
-        self.source_mac = ''
-        """ :type: str """
         self.type = 0
         """ :type: int """
 
+    dest_mac = LazyField(
+        '_dest_mac', lambda l: decode_mac_address(l.data, 0), '')
+    """ :type: str """
+    source_mac = LazyField(
+        '_source_mac', lambda l: decode_mac_address(l.data, 6), '')
+    """ :type: str """
+
     def to_str(self):
         return 's_mac[' + self.source_mac + '] ' + 'd_mac[' + \
                self.dest_mac + '] ' + \
@@ -285,8 +399,8 @@ class PCAPEthernet(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         Ethernet_II frame structure:
         6 bytes - dest_mac
@@ -301,9 +415,8 @@ class PCAPEthernet(PCAPEncapsulatedLayer):
                 'but packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.dest_mac = PCAPPacket.char8_to_mac_address(*packet_data[0:6])
-        self.source_mac = PCAPPacket.char8_to_mac_address(*packet_data[6:12])
-        self.type = PCAPPacket.char8_to_int16(*packet_data[12:14])
+        self.data = as_buffer(packet_data)
+        self.type, = struct.unpack_from('!H', self.data, 12)
 
         # Otherwise, judge based on the type from our built-ins
         if self.type == 0x0800:
@@ -319,6 +432,7 @@ class PCAPEthernet(PCAPEncapsulatedLayer):
 
 
 class PCAPSLL(PCAPEncapsulatedLayer):
+    __slots__ = ('type', '_dest_mac', '_source_mac')
 
     @staticmethod
     def layer_name():
@@ -329,13 +443,16 @@ class PCAPSLL(PCAPEncapsulatedLayer):
 
     def __init__(self):
         super(PCAPSLL, self).__init__()
-        self.dest_mac = ''
-        """ :type: str """
-        self.source_mac = ''
-        """ :type: str """
         self.type = 0
         """ :type: int """
 
+    dest_mac = LazyField(
+        '_dest_mac', lambda l: decode_mac_address(bytearray(6)), '')
+    """ :type: str """
+    source_mac = LazyField(
+        '_source_mac', lambda l: decode_mac_address(l.data, 6), '')
+    """ :type: str """
+
     def to_str(self):
         return 's_mac[' + self.source_mac + '] ' + 'd_mac[' + \
                self.dest_mac + '] ' + \
@@ -343,8 +460,8 @@ class PCAPSLL(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         If Linux-Cooked (SLL) link-layer (i.e. the 'any' interface was used):
         6 bytes - Linux Cooked Protocol info
@@ -360,9 +477,8 @@ class PCAPSLL(PCAPEncapsulatedLayer):
                 "but packet size is [" +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.dest_mac = PCAPPacket.char8_to_mac_address(*([0] * 6))
-        self.source_mac = PCAPPacket.char8_to_mac_address(*packet_data[6:12])
-        self.type = PCAPPacket.char8_to_int16(packet_data[14], packet_data[15])
+        self.data = as_buffer(packet_data)
+        self.type, = struct.unpack_from('!H', self.data, 14)
 
         # Otherwise, judge based on the type from our built-ins
         if self.type == 0x0800:
@@ -378,6 +494,8 @@ class PCAPSLL(PCAPEncapsulatedLayer):
 
 
 class PCAPIP4(PCAPEncapsulatedLayer):
+    __slots__ = ('version', 'header_length', 'protocol',
+                 '_source_ip', '_dest_ip')
 
     @staticmethod
     def layer_name():
@@ -394,10 +512,11 @@ class PCAPIP4(PCAPEncapsulatedLayer):
         """ :type: int """
         self.protocol = 0
         """ :type: int """
-        self.source_ip = ''
-        """ :type: str """
-        self.dest_ip = ''
-        """ :type: str """
+
+    source_ip = LazyField('_source_ip', lambda l: decode_ip4(l.data, 12), '')
+    """ :type: str """
+    dest_ip = LazyField('_dest_ip', lambda l: decode_ip4(l.data, 16), '')
+    """ :type: str """
 
     def to_str(self):
         return 'ver[' + str(self.version) + '] ' + 'h_len[' + \
@@ -408,8 +527,8 @@ class PCAPIP4(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         If IP, the packet will look like this with word, word offset, and
         total offset followed by size of field):
@@ -435,7 +554,10 @@ class PCAPIP4(PCAPEncapsulatedLayer):
                 'but packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.version = (packet_data[0] & 0xf0) >> 4
+        self.data = as_buffer(packet_data)
+        version_ihl, self.protocol = struct.unpack_from('!B8xB', self.data)
+
+        self.version = (version_ihl & 0xf0) >> 4
 
         # Version must be either 4 or 6, no exceptions
         if self.version != 4 and self.version != 6:
@@ -443,7 +565,7 @@ class PCAPIP4(PCAPEncapsulatedLayer):
                 'IP version must be either 4 or 6, but it was [' +
                 str(self.version) + ']', fatal=True)
 
-        self.header_length = packet_data[0] & 0x0f
+        self.header_length = version_ihl & 0x0f
 
         # Do a sanity check on header length vs. packet size
         if self.header_length < 5:
@@ -457,8 +579,6 @@ class PCAPIP4(PCAPEncapsulatedLayer):
                 str(self.header_length) + '] longer than the packet size [' +
                 str(len(packet_data)) + ']!', fatal=True)
 
-        self.protocol = packet_data[9]
-
         # Otherwise, judge based on the type from our built-ins
         if self.protocol == IP4_PROTOCOL_TCP:
             self.next_parse_recommendation = PCAPTCP
@@ -471,21 +591,18 @@ class PCAPIP4(PCAPEncapsulatedLayer):
                 "IP protocol [" +
                 str(self.protocol) + "] unknown", fatal=False)
 
-        self.source_ip = PCAPPacket.char8_to_ip4(packet_data[12],
-                                                 packet_data[13],
-                                                 packet_data[14],
-                                                 packet_data[15])
-        self.dest_ip = PCAPPacket.char8_to_ip4(packet_data[16],
-                                               packet_data[17],
-                                               packet_data[18],
-                                               packet_data[19])
-
         # Remember, header length is in 4-octet words, so multiply by 4 to
         # get the data's starting byte
         return packet_data[(self.header_length * 4):]
 
 
 class PCAPARP(PCAPEncapsulatedLayer):
+    __slots__ = ('hw_addr_length', 'proto_addr_length',
+                 '_hw_type', '_proto_type', '_operation',
+                 '_sender_hw_addr_raw', '_sender_hw_addr_ether',
+                 '_sender_proto_addr_raw', '_sender_ip_addr',
+                 '_target_hw_addr_raw', '_target_hw_addr_ether',
+                 '_target_proto_addr_raw', '_target_ip_addr')
 
     @staticmethod
     def layer_name():
@@ -496,32 +613,76 @@ class PCAPARP(PCAPEncapsulatedLayer):
 
     def __init__(self):
         super(PCAPARP, self).__init__()
-        self.hw_type = 0
-        """ :type: int """
-        self.proto_type = 0
-        """ :type: int """
         self.hw_addr_length = 0
         """ :type: int """
         self.proto_addr_length = 0
         """ :type: int """
-        self.operation = 0
-        """ :type: int """
-        self.sender_hw_addr_raw = ''
-        """ :type: list[int] """
-        self.sender_hw_addr_ether = ''
-        """ :type: str """
-        self.sender_proto_addr_raw = ''
-        """ :type: list[int] """
-        self.sender_ip_addr = ''
-        """ :type: str """
-        self.target_hw_addr_raw = ''
-        """ :type: list[int] """
-        self.target_hw_addr_ether = ''
-        """ :type: str """
-        self.target_proto_addr_raw = ''
-        """ :type: list[int] """
-        self.target_ip_addr = ''
-        """ :type: str """
+
+    def _sender_hw_addr_base(self):
+        return 8
+
+    def _sender_proto_addr_base(self):
+        return 8 + self.hw_addr_length
+
+    def _target_hw_addr_base(self):
+        return 8 + self.hw_addr_length + self.proto_addr_length
+
+    def _target_proto_addr_base(self):
+        return 8 + (2 * self.hw_addr_length) + self.proto_addr_length
+
+    hw_type = LazyField(
+        '_hw_type', lambda l: struct.unpack_from('!H', l.data, 0)[0], 0)
+    """ :type: int """
+    proto_type = LazyField(
+        '_proto_type', lambda l: struct.unpack_from('!H', l.data, 2)[0], 0)
+    """ :type: int """
+    operation = LazyField(
+        '_operation', lambda l: struct.unpack_from('!H', l.data, 6)[0], 0)
+    """ :type: int """
+    sender_hw_addr_raw = LazyField(
+        '_sender_hw_addr_raw',
+        lambda l: decode_raw(l.data, l._sender_hw_addr_base(),
+                             l.hw_addr_length), '')
+    """ :type: list[int] """
+    sender_proto_addr_raw = LazyField(
+        '_sender_proto_addr_raw',
+        lambda l: decode_raw(l.data, l._sender_proto_addr_base(),
+                             l.proto_addr_length), '')
+    """ :type: list[int] """
+    target_hw_addr_raw = LazyField(
+        '_target_hw_addr_raw',
+        lambda l: decode_raw(l.data, l._target_hw_addr_base(),
+                             l.hw_addr_length), '')
+    """ :type: list[int] """
+    target_proto_addr_raw = LazyField(
+        '_target_proto_addr_raw',
+        lambda l: decode_raw(l.data, l._target_proto_addr_base(),
+                             l.proto_addr_length), '')
+    """ :type: list[int] """
+    sender_hw_addr_ether = LazyField(
+        '_sender_hw_addr_ether',
+        lambda l: (decode_mac_address(l.data, l._sender_hw_addr_base())
+                   if l.hw_type == ARP_PROTOCOL_HW_TYPE_EHTERNET else ''),
+        '')
+    """ :type: str """
+    target_hw_addr_ether = LazyField(
+        '_target_hw_addr_ether',
+        lambda l: (decode_mac_address(l.data, l._target_hw_addr_base())
+                   if l.hw_type == ARP_PROTOCOL_HW_TYPE_EHTERNET else ''),
+        '')
+    """ :type: str """
+    sender_ip_addr = LazyField(
+        '_sender_ip_addr',
+        lambda l: (decode_ip4(l.data, l._sender_proto_addr_base())
+                   if l.proto_type == ETHERNET_PROTOCOL_TYPE_IP4 else ''),
+        '')
+    """ :type: str """
+    target_ip_addr = LazyField(
+        '_target_ip_addr',
+        lambda l: (decode_ip4(l.data, l._target_proto_addr_base())
+                   if l.proto_type == ETHERNET_PROTOCOL_TYPE_IP4 else ''),
+        '')
+    """ :type: str """
 
     def to_str(self):
         return 'hw_type[' + str(self.hw_type) + '] ' + 'p_type[' + \
@@ -534,8 +695,8 @@ class PCAPARP(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         If IP, the packet will look like this with word, word offset, and
         total offset followed by size of field):
@@ -559,14 +720,9 @@ class PCAPARP(PCAPEncapsulatedLayer):
                 'but packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.hw_type = PCAPPacket.char8_to_int16(packet_data[0],
-                                                 packet_data[1])
-        self.proto_type = PCAPPacket.char8_to_int16(packet_data[2],
-                                                    packet_data[3])
-        self.hw_addr_length = packet_data[4]
-        self.proto_addr_length = packet_data[5]
-        self.operation = PCAPPacket.char8_to_int16(packet_data[6],
-                                                   packet_data[7])
+        self.data = as_buffer(packet_data)
+        self.hw_addr_length, self.proto_addr_length = struct.unpack_from(
+            '!BB', self.data, 4)
 
         # Sanity check on packet length now that we know the sizes of the
         # HW and Protocol addresses
@@ -579,48 +735,22 @@ class PCAPARP(PCAPEncapsulatedLayer):
                 'but the real packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        sender_hw_addr_base = 8
-        sender_proto_addr_base = sender_hw_addr_base + self.hw_addr_length
-        target_hw_addr_base = sender_proto_addr_base + self.proto_addr_length
-        target_proto_addr_base = target_hw_addr_base + self.hw_addr_length
-        target_proto_addr_finish = \
-            target_proto_addr_base + self.proto_addr_length
-
-        self.sender_hw_addr_raw = \
-            packet_data[sender_hw_addr_base:sender_proto_addr_base]
-        self.sender_proto_addr_raw = \
-            packet_data[sender_proto_addr_base:target_hw_addr_base]
-        self.target_hw_addr_raw = \
-            packet_data[target_hw_addr_base:target_proto_addr_base]
-        self.target_proto_addr_raw = \
-            packet_data[target_proto_addr_base:target_proto_addr_finish]
-
-        if self.hw_type == ARP_PROTOCOL_HW_TYPE_EHTERNET:
-            self.sender_hw_addr_ether = \
-                PCAPPacket.char8_to_mac_address(*self.sender_hw_addr_raw)
-            self.target_hw_addr_ether = \
-                PCAPPacket.char8_to_mac_address(*self.target_hw_addr_raw)
-
-        if self.proto_type == ETHERNET_PROTOCOL_TYPE_IP4:
-            self.sender_ip_addr = \
-                PCAPPacket.char8_to_ip4(*self.sender_proto_addr_raw)
-            self.target_ip_addr = \
-                PCAPPacket.char8_to_ip4(*self.target_proto_addr_raw)
-
         self.next_parse_recommendation = None
 
-        if len(packet_data) > target_proto_addr_finish:
+        if len(packet_data) > expected_size:
             raise PacketParsingException(
                 'ARP packet has junk data at end of packet [' +
                 ', '.join(['0x{0:02x}'.format(i)
-                           for i in packet_data[target_proto_addr_finish:]]),
+                           for i in bytearray(packet_data[expected_size:])]),
                 fatal=False)
 
-        # Should be empty, but just in case...
-        return []
+        # ARP is the last parsing step, so there is no data left
+        return packet_data[len(packet_data):]
 
 
 class PCAPTCP(PCAPEncapsulatedLayer):
+    __slots__ = ('data_offset', '_source_port', '_dest_port', '_seq',
+                 '_ack', '_flags', '_window_size')
 
     def is_flag_set(self, flag):
         return self.flags & flag != 0
@@ -634,20 +764,29 @@ class PCAPTCP(PCAPEncapsulatedLayer):
 
     def __init__(self):
         super(PCAPTCP, self).__init__()
-        self.source_port = 0
-        """ :type: int """
-        self.dest_port = 0
-        """ :type: int """
-        self.seq = 0
-        """ :type: int """
-        self.ack = 0
-        """ :type: int """
         self.data_offset = 0
         """ :type: int """
-        self.flags = 0
-        """ :type: int """
-        self.window_size = 0
-        """ :type: int """
+
+    source_port = LazyField(
+        '_source_port', lambda l: struct.unpack_from('!H', l.data, 0)[0], 0)
+    """ :type: int """
+    dest_port = LazyField(
+        '_dest_port', lambda l: struct.unpack_from('!H', l.data, 2)[0], 0)
+    """ :type: int """
+    seq = LazyField(
+        '_seq', lambda l: struct.unpack_from('!I', l.data, 4)[0], 0)
+    """ :type: int """
+    ack = LazyField(
+        '_ack', lambda l: struct.unpack_from('!I', l.data, 8)[0], 0)
+    """ :type: int """
+    flags = LazyField(
+        '_flags',
+        lambda l: (lambda ns, f: ((ns & 0x1) * 0xFF) + f)(
+            *struct.unpack_from('!BB', l.data, 12)), 0)
+    """ :type: int """
+    window_size = LazyField(
+        '_window_size', lambda l: struct.unpack_from('!H', l.data, 14)[0], 0)
+    """ :type: int """
 
     def to_str(self):
         return 's_port[' + str(self.source_port) + '] ' + 'd_port[' + \
@@ -660,8 +799,8 @@ class PCAPTCP(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         If TCP, the packet will look like this:
         word 1, 0: total 0:  2 bytes - Source port
@@ -685,19 +824,9 @@ class PCAPTCP(PCAPEncapsulatedLayer):
                 'but packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.source_port = PCAPPacket.char8_to_int16(packet_data[0],
-                                                     packet_data[1])
-        self.dest_port = PCAPPacket.char8_to_int16(packet_data[2],
-                                                   packet_data[3])
-        self.seq = PCAPPacket.char8_to_int32(packet_data[4],
-                                             packet_data[5],
-                                             packet_data[6],
-                                             packet_data[7])
-        self.ack = PCAPPacket.char8_to_int32(packet_data[8],
-                                             packet_data[9],
-                                             packet_data[10],
-                                             packet_data[11])
-        self.data_offset = (packet_data[12] & 0xF0) >> 4
+        self.data = as_buffer(packet_data)
+        self.data_offset = (struct.unpack_from('!B', self.data, 12)[0] &
+                            0xF0) >> 4
 
         # Sanity check on data offset
         if self.data_offset < 5:
@@ -711,10 +840,6 @@ class PCAPTCP(PCAPEncapsulatedLayer):
                 str(self.data_offset) + '] longer than the packet size [' +
                 str(len(packet_data)) + ']!', fatal=True)
 
-        self.flags = ((packet_data[12] & 0x1) * 0xFF) + packet_data[13]
-        self.window_size = PCAPPacket.char8_to_int16(packet_data[14],
-                                                     packet_data[15])
-
         # TCP is the last parsed packet in our stack.
         # Can add Layer 5-7 here (HTTP, SOAP, etc.)
         self.next_parse_recommendation = None
@@ -725,6 +850,7 @@ class PCAPTCP(PCAPEncapsulatedLayer):
 
 
 class PCAPUDP(PCAPEncapsulatedLayer):
+    __slots__ = ('_source_port', '_dest_port', '_length')
 
     @staticmethod
     def layer_name():
@@ -735,12 +861,16 @@ class PCAPUDP(PCAPEncapsulatedLayer):
 
     def __init__(self):
         super(PCAPUDP, self).__init__()
-        self.source_port = 0
-        """ :type: int """
-        self.dest_port = 0
-        """ :type: int """
-        self.length = 0
-        """ :type: int """
+
+    source_port = LazyField(
+        '_source_port', lambda l: struct.unpack_from('!H', l.data, 0)[0], 0)
+    """ :type: int """
+    dest_port = LazyField(
+        '_dest_port', lambda l: struct.unpack_from('!H', l.data, 2)[0], 0)
+    """ :type: int """
+    length = LazyField(
+        '_length', lambda l: struct.unpack_from('!H', l.data, 4)[0], 0)
+    """ :type: int """
 
     def to_str(self):
         return 's_port[' + str(self.source_port) + '] ' + 'd_port[' + \
@@ -749,8 +879,8 @@ class PCAPUDP(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         If UDP, the packet will look like this:
         word 1, 0: total 0:  2 bytes - Source port
@@ -767,12 +897,7 @@ class PCAPUDP(PCAPEncapsulatedLayer):
                 'but packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.source_port = PCAPPacket.char8_to_int16(packet_data[0],
-                                                     packet_data[1])
-        self.dest_port = PCAPPacket.char8_to_int16(packet_data[2],
-                                                   packet_data[3])
-        self.length = PCAPPacket.char8_to_int16(packet_data[4],
-                                                packet_data[5])
+        self.data = as_buffer(packet_data)
 
         # UDP is the last parsing step in the standard TCP/IP stack
         self.next_parse_recommendation = None
@@ -783,6 +908,7 @@ class PCAPUDP(PCAPEncapsulatedLayer):
 
 
 class PCAPICMP(PCAPEncapsulatedLayer):
+    __slots__ = ('_type', '_code', '_header_data')
 
     @staticmethod
     def layer_name():
@@ -793,12 +919,16 @@ class PCAPICMP(PCAPEncapsulatedLayer):
 
     def __init__(self):
         super(PCAPICMP, self).__init__()
-        self.type = 0
-        """ :type: int """
-        self.code = 0
-        """ :type: int """
-        self.header_data = []
-        """ :type: list[int] """
+
+    type = LazyField(
+        '_type', lambda l: struct.unpack_from('!B', l.data, 0)[0], 0)
+    """ :type: int """
+    code = LazyField(
+        '_code', lambda l: struct.unpack_from('!B', l.data, 1)[0], 0)
+    """ :type: int """
+    header_data = LazyField(
+        '_header_data', lambda l: decode_raw(l.data, 4, 4), [])
+    """ :type: list[int] """
 
     def to_str(self):
         return 'type[' + str(self.type) + '] ' + 'code[' + \
@@ -807,8 +937,8 @@ class PCAPICMP(PCAPEncapsulatedLayer):
 
     def parse_layer(self, packet_data):
         """
-        :type packet_data: list[int]
-        :return: list[int]
+        :type packet_data: list[int]|str|bytearray|memoryview
+        :return: list[int]|str|bytearray|memoryview
 
         If UDP, the packet will look like this:
         word 1, 0: total 0: 1 byte  - Type
@@ -825,9 +955,7 @@ class PCAPICMP(PCAPEncapsulatedLayer):
                 'but packet size is [' +
                 str(len(packet_data)) + ']', fatal=True)
 
-        self.type = packet_data[0]
-        self.code = packet_data[1]
-        self.header_data = packet_data[4:8]
+        self.data = as_buffer(packet_data)
 
         # ICMP is the last parsing step in the standard TCP/IP stack
         self.next_parse_recommendation = None
@@ -0,0 +1,275 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pwd
+import re
+import threading
+import time
+
+PROC_DIR = '/proc'
+
+# How long a snapshot of the process table may be reused for queries, as
+# long as no command has been run in the meantime
+SNAPSHOT_MAX_AGE = 0.5
+
+# States of processes which have exited but not yet been reaped
+EXITED_STATES = ('Z', 'X')
+
+_user_names = {}
+""" :type: dict[int, str]"""
+
+
+def user_name(uid):
+    """
+    :type uid: int
+    :return: str The user's name, or the UID itself if it has none
+    """
+    if uid not in _user_names:
+        try:
+            _user_names[uid] = pwd.getpwuid(uid).pw_name
+        except KeyError:
+            _user_names[uid] = str(uid)
+    return _user_names[uid]
+
+
+class ProcessInfo(object):
+    def __init__(self, pid, ppid, pgid, sid, state, name, uid, cmdline):
+        """
+        :type pid: int
+        :type ppid: int
+        :type pgid: int
+        :type sid: int
+        :type state: str
+        :type name: str Executable name, as shown in /proc/<pid>/stat
+        :type uid: int
+        :type cmdline: list[str]
+        """
+        self.pid = pid
+        self.ppid = ppid
+        self.pgid = pgid
+        self.sid = sid
+        self.state = state
+        self.name = name
+        self.uid = uid
+        self.cmdline = cmdline
+
+    def command(self):
+        """
+        The command line as 'ps -f' shows it (the name in brackets for
+        kernel threads, which have none).
+        :return: str
+        """
+        if len(self.cmdline) == 0:
+            return '[' + self.name + ']'
+        return ' '.join(self.cmdline)
+
+    def has_exited(self):
+        return self.state in EXITED_STATES
+
+    def __repr__(self):
+        return ('ProcessInfo(pid=' + str(self.pid) + ', ppid=' +
+                str(self.ppid) + ', cmd=' + self.command() + ')')
+
+
+def read_process(pid, proc_dir=PROC_DIR):
+    """
+    Read a process' details from /proc.
+    :type pid: int
+    :type proc_dir: str
+    :return: ProcessInfo|None None if there is no such process (any more)
+    """
+    pid_dir = os.path.join(proc_dir, str(pid))
+    try:
+        uid = os.stat(pid_dir).st_uid
+        with open(os.path.join(pid_dir, 'stat'), 'r') as f:
+            stat = f.read()
+        with open(os.path.join(pid_dir, 'cmdline'), 'r') as f:
+            cmdline = f.read()
+    except (IOError, OSError):
+        return None
+
+    # The name is in parentheses and may itself contain anything,
+    # including spaces and parentheses
+    name_end = stat.rfind(')')
+    name = stat[stat.find('(') + 1:name_end]
+    fields = stat[name_end + 2:].split()
+    return ProcessInfo(pid=int(pid), ppid=int(fields[1]),
+                       pgid=int(fields[2]), sid=int(fields[3]),
+                       state=fields[0], name=name, uid=uid,
+                       cmdline=[a for a in cmdline.split('\0') if a != ''])
+
+
+class ProcessSnapshot(object):
+    """
+    All the processes running at one point in time, indexed by PID, parent,
+    session and name.  PID lists are in ascending order, like 'ps' shows.
+    """
+
+    def __init__(self, processes):
+        """
+        :type processes: list[ProcessInfo]
+        """
+        self.time = time.time()
+        self.processes = {}
+        """ :type: dict[int, ProcessInfo]"""
+        self.by_parent = {}
+        """ :type: dict[int, list[int]]"""
+        self.by_session = {}
+        """ :type: dict[int, list[int]]"""
+        self.by_name = {}
+        """ :type: dict[str, list[int]]"""
+        for p in sorted(processes, key=lambda p: p.pid):
+            self.processes[p.pid] = p
+            self.by_parent.setdefault(p.ppid, []).append(p.pid)
+            self.by_session.setdefault(p.sid, []).append(p.pid)
+            self.by_name.setdefault(p.name, []).append(p.pid)
+
+    def age(self):
+        return time.time() - self.time
+
+    def pids(self):
+        """
+        :return: list[int]
+        """
+        return sorted(self.processes.iterkeys())
+
+    def get(self, pid):
+        """
+        :type pid: int
+        :return: ProcessInfo|None
+        """
+        return self.processes.get(int(pid))
+
+    def children(self, pid):
+        """
+        :type pid: int
+        :return: list[int]
+        """
+        return list(self.by_parent.get(int(pid), []))
+
+    def session(self, sid):
+        """
+        :type sid: int
+        :return: list[int]
+        """
+        return list(self.by_session.get(int(sid), []))
+
+    def named(self, name):
+        """
+        Processes whose executable has exactly the given name.
+        :type name: str
+        :return: list[int]
+        """
+        return list(self.by_name.get(name, []))
+
+    def find(self, pattern):
+        """
+        Processes whose owner or command line matches the regular
+        expression, which is what grepping the output of 'ps -ef' for a
+        process finds.
+        :type pattern: str
+        :return: list[int]
+        """
+        regex = re.compile(pattern)
+        return [pid for pid in self.pids()
+                if regex.search(user_name(self.processes[pid].uid)) or
+                regex.search(self.processes[pid].command())]
+
+
+class ProcessTable(object):
+    """
+    Queries on the system's processes, read straight out of /proc rather
+    than by running 'ps'.  The whole table is read once into a snapshot,
+    which serves further queries until it is max_age seconds old, or until
+    it is invalidated (e.g. because a command was run, which may have
+    started or stopped processes).
+    """
+
+    def __init__(self, proc_dir=PROC_DIR, max_age=SNAPSHOT_MAX_AGE):
+        """
+        :type proc_dir: str
+        :type max_age: float
+        """
+        self.proc_dir = proc_dir
+        self.max_age = max_age
+        self.current = None
+        """ :type: ProcessSnapshot"""
+        self.lock = threading.Lock()
+
+    def snapshot(self, max_age=None):
+        """
+        Get a snapshot of the process table no older than max_age (the
+        table's max_age by default, 0 to always read afresh).
+        :type max_age: float
+        :return: ProcessSnapshot
+        """
+        if max_age is None:
+            max_age = self.max_age
+        with self.lock:
+            current = self.current
+            if current is None or current.age() > max_age:
+                current = ProcessSnapshot(
+                    [p for p in (read_process(pid, self.proc_dir)
+                                 for pid in os.listdir(self.proc_dir)
+                                 if pid.isdigit())
+                     if p is not None])
+                self.current = current
+        return current
+
+    def invalidate(self):
+        self.current = None
+
+    def is_running(self, pid, include_exited=True):
+        """
+        Check on a single process directly, without reading the whole
+        table.  Like 'ps', this counts a process which has exited but not
+        been reaped yet (a zombie) as running, unless told otherwise.
+        Threads other than a process' main thread don't count.
+        :type pid: int|str
+        :type include_exited: bool
+        :return: bool
+        """
+        try:
+            with open(os.path.join(self.proc_dir, str(pid).strip(),
+                                   'status'), 'r') as f:
+                status = dict(l.split(':', 1) for l in f if ':' in l)
+        except (IOError, OSError):
+            return False
+        if status.get('Tgid', '').strip() != str(pid).strip():
+            return False
+        return (include_exited or
+                status.get('State', '').strip()[0:1] not in EXITED_STATES)
+
+    def wait_for_children(self, pid, timeout):
+        """
+        Get a process' children, waiting up to timeout seconds for it to
+        have any (a process started in the background may not have had
+        time to start its own yet).
+        :type pid: int
+        :type timeout: float
+        :return: list[int]
+        """
+        deadline = time.time() + timeout
+        delay = 0.01
+        while True:
+            children = self.snapshot(max_age=0).children(pid)
+            if len(children) > 0 or time.time() >= deadline:
+                return children
+            time.sleep(min(delay, max(deadline - time.time(), 0)))
+            delay = min(delay * 2, 0.5)
+
+
+# Shared by everything in this process, so one snapshot serves all
+process_table = ProcessTable()
@@ -12,19 +12,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
 from fcntl import F_GETFL
 from fcntl import F_SETFL
 from fcntl import fcntl
 import multiprocessing
 import os
 import Queue
+import select
 import threading
 import time
 from zephyr.common.cli import LinuxCLI
+from zephyr.common import packet_socket
+from zephyr.common.pcap_file import DEFAULT_SNAPLEN
+from zephyr.common.pcap_file import link_type_for_interface
+from zephyr.common.pcap_file import PCAPFileWriter
 from zephyr.common.pcap_packet import *
 
 TCPDUMP_LISTEN_START_TIMEOUT = 10
 
+# How often to re-check a starting capture for errors while waiting for it
+# to signal it is ready
+READY_POLL_INTERVAL = 0.05
+
+# Capture engines: 'tcpdump' scrapes the hex output of a tcpdump process,
+# 'packet_socket' reads frames directly from an AF_PACKET socket, and
+# 'auto' uses the packet socket when privileged enough to open one,
+# falling back to tcpdump otherwise.
+CAPTURE_ENGINE_TCPDUMP = 'tcpdump'
+CAPTURE_ENGINE_PACKET_SOCKET = 'packet_socket'
+CAPTURE_ENGINE_AUTO = 'auto'
+
 
 def sig_handler():
     with open('tcpdump.out', 'a') as f:
@@ -45,6 +63,35 @@ def parse_line_to_byte_array(line):
     return byte_data
 
 
+def open_dump_file(interface, max_size, save_dump_filename):
+    """
+    Open a pcap file to save the packets of a capture into.
+    :type interface: str
+    :type max_size: int
+    :type save_dump_filename: str
+    :return: PCAPFileWriter
+    """
+    return PCAPFileWriter(
+        save_dump_filename if save_dump_filename is not None
+        else 'tcp.out.' + str(time.time()),
+        link_type=link_type_for_interface(interface),
+        snaplen=max_size if max_size != 0 else DEFAULT_SNAPLEN)
+
+
+def socket_packet(packet_data, sec, usec):
+    """
+    Make a PCAPPacket from a frame read off a packet socket, stamped with
+    the kernel's receive time.
+    :type packet_data: str
+    :type sec: int
+    :type usec: int
+    :return: PCAPPacket
+    """
+    timestamp = (datetime.datetime.fromtimestamp(sec).strftime('%H:%M:%S') +
+                 '.{0:06d}'.format(usec))
+    return PCAPPacket(packet_data, timestamp, sec + usec / 1000000.0)
+
+
 def tcpdump_start(kwarg_map):
     try:
         return TCPDump.read_packet(**kwarg_map)
@@ -53,9 +100,22 @@ def tcpdump_start(kwarg_map):
         return 1
 
 
+def packet_socket_start(kwarg_map):
+    try:
+        return TCPDump.read_packet_socket(**kwarg_map)
+    except Exception as e:
+        print('Exception occured in subprocess: ' + str(e))
+        return 1
+
+
 class TCPDump(object):
 
-    def __init__(self):
+    def __init__(self, engine=CAPTURE_ENGINE_AUTO):
+        """
+        :param engine: str Capture engine to use, one of 'auto' (default),
+        'packet_socket' or 'tcpdump'
+        """
+        self.engine = engine
         self.process = None
         """ :type: multiprocessing.Process"""
         self.tcpdump_pid = None
@@ -86,9 +146,13 @@ class TCPDump(object):
         will limit the blocking call to timeout seconds.  This time
         limit only applies to the execution of tcpdump if blocking is
         set to True.  The optional save_dump_file parameter can be set
-        to true to save the temporary packet capture file to the given
+        to true to save the captured packets as a pcap file with the given
         save file name (use tcp.out.<timestamp> if name not provided)
 
+        Packets are captured with the engine chosen when this object was
+        created.  Both engines run in the net namespace of the given CLI
+        and produce the same PCAPPackets.
+
         :type cli: LinuxCLI
         :type interface: str
         :type count: int
@@ -137,15 +201,13 @@ class TCPDump(object):
                      'save_dump_file': save_dump_file,
                      'save_dump_filename': save_dump_filename
                      }
-        self.process = multiprocessing.Process(target=tcpdump_start,
+        start_func = (packet_socket_start
+                      if self.use_packet_socket() else tcpdump_start)
+        self.process = multiprocessing.Process(target=start_func,
                                                args=(kwarg_map,))
         self.process.start()
         deadline_time = time.time() + TCPDUMP_LISTEN_START_TIMEOUT
-        while not self.tcpdump_ready.is_set():
-            if time.time() > deadline_time:
-                self.process.terminate()
-                raise SubprocessFailedException("tcpdump failed to start "
-                                                "listening within timeout")
+        while not self.tcpdump_ready.wait(READY_POLL_INTERVAL):
             if self.tcpdump_error.is_set():
                 error_info = self.subprocess_info_queue.get(timeout=2)
                 if 'error' in error_info:
@@ -156,7 +218,17 @@ class TCPDump(object):
                         'stdout [' + error_info['stdout'] + '] ' +
                         'stderr [' + error_info['stderr'] + '] }')
                 raise SubprocessFailedException('tcpdump error UNKNOWN')
-            time.sleep(0)
+            if not self.process.is_alive():
+                # It may have signalled ready and then finished (having
+                # captured its count of packets, say) since the wait
+                if self.tcpdump_ready.is_set():
+                    break
+                raise SubprocessFailedException(
+                    'tcpdump process exited before it started listening')
+            if time.time() > deadline_time:
+                self.process.terminate()
+                raise SubprocessFailedException("tcpdump failed to start "
+                                                "listening within timeout")
 
         if blocking is True:
             self.process.join(timeout)
@@ -164,6 +236,23 @@ class TCPDump(object):
                 raise SubprocessTimeoutException('tcpdump failed to receive '
                                                  'packets within timeout')
 
+    def use_packet_socket(self):
+        """
+        Whether this capture will read from a packet socket rather than
+        run tcpdump.  Opening packet sockets and entering net namespaces
+        both require root, so 'auto' only picks the packet socket when
+        running as root.
+        :return: bool
+        """
+        if self.engine == CAPTURE_ENGINE_PACKET_SOCKET:
+            return True
+        if self.engine == CAPTURE_ENGINE_TCPDUMP:
+            return False
+        if self.engine == CAPTURE_ENGINE_AUTO:
+            return os.geteuid() == 0
+        raise ArgMismatchException(
+            'Unknown capture engine: ' + str(self.engine))
+
     def wait_for_packets(self, count=1, timeout=None):
         ret = []
         start_time = time.time()
@@ -221,6 +310,7 @@ class TCPDump(object):
 
         tmp_dump_filename = './.tcpdump.out.' + str(time.time())
         tcp_processes = []
+        dump_writer = None
         try:
             # If flag set provided, use them instead, for synch with
             # external functions
@@ -270,41 +360,38 @@ class TCPDump(object):
             fcntl(tcp_actual_process.stderr, F_SETFL, flags_se | os.O_NONBLOCK)
 
             err_out = ''
+            stderr_fd = tcp_actual_process.stderr.fileno()
             while not tcp_ready.is_set():
-                try:
-                    line = os.read(tcp_actual_process.stderr.fileno(), 256)
-                    if line.find('listening on') != -1:
-                        # TODO(micucci): Replace sleep after TCPDump s
-                        # starts with a real check # This is dangerous,
-                        # and might not actually be enough to signal the
-                        # tcpdump is actually running.  Instead, let's
-                        # create a Cython module that passes calls through
-                        # to libpcap (there are 0 good libpcap implementations
-                        # for Python that are maintained, documented,
-                        # and simple).
-                        time.sleep(1)
-                        tcp_ready.set()
-                    else:
-                        err_out += line
-                        if tcp_piped_process.poll() is not None:
-                            out, err = tcp_piped_process.communicate()
-                            status_queue.put(
-                                {'error': 'tcpdump exited abnormally',
-                                 'returncode': tcp_piped_process.returncode,
-                                 'stdout': out,
-                                 'stderr': err_out})
-                            tcp_error.set()
-
-                            raise SubprocessFailedException(
-                                'tcpdump exited abnormally with status: ' +
-                                str(tcp_piped_process.returncode) +
-                                ', out: ' + out +
-                                ', err: ' + err +
-                                ', err_out: ' + err_out)
-                        time.sleep(0)
+                # Sleep until tcpdump writes to stderr, waking up now and
+                # then to check whether it has exited
+                readable, _, _ = select.select([stderr_fd], [], [],
+                                               READY_POLL_INTERVAL)
+                if len(readable) > 0:
+                    try:
+                        err_out += os.read(stderr_fd, 256)
+                    except OSError:
+                        pass
+
+                if err_out.find('listening on') != -1:
+                    # tcpdump only prints this once the capture handle is
+                    # active and the filter is installed, so from here on
+                    # the kernel queues every matching packet for it.
+                    tcp_ready.set()
+                elif tcp_piped_process.poll() is not None:
+                    out, err = tcp_piped_process.communicate()
+                    status_queue.put(
+                        {'error': 'tcpdump exited abnormally',
+                         'returncode': tcp_piped_process.returncode,
+                         'stdout': out,
+                         'stderr': err_out})
+                    tcp_error.set()
 
-                except OSError:
-                    pass
+                    raise SubprocessFailedException(
+                        'tcpdump exited abnormally with status: ' +
+                        str(tcp_piped_process.returncode) +
+                        ', out: ' + out +
+                        ', err: ' + err +
+                        ', err_out: ' + err_out)
 
             # FLAG STATE: ready[set], stop[clear], finished[clear]
             # tcpdump return output format:
@@ -319,6 +406,10 @@ class TCPDump(object):
             # \t0x<addr>:  FFFF FFFF FFFF FFFF FFFF FFFF FFFF FFFF\n
             # (Next packet)
 
+            if save_dump_file is True:
+                dump_writer = open_dump_file(interface, max_size,
+                                             save_dump_filename)
+
             packet_data = []
             timestamp = ''
             with open(tmp_dump_filename, 'r+') as f:
@@ -354,6 +445,8 @@ class TCPDump(object):
                                 # onto the return list, calling
                                 # the callback function if one is set.
                                 packet = PCAPPacket(packet_data, timestamp)
+                                if dump_writer is not None:
+                                    dump_writer.write_packet(packet)
                                 packet_queue.put(packet)
                                 if callback is not None:
                                     callback(packet,
@@ -379,6 +472,8 @@ class TCPDump(object):
                             # the return list, calling the callback function
                             # if one is set.
                             packet = PCAPPacket(packet_data, timestamp)
+                            if dump_writer is not None:
+                                dump_writer.write_packet(packet)
                             packet_queue.put(packet)
                             if callback is not None:
                                 callback(packet,
@@ -390,13 +485,10 @@ class TCPDump(object):
                         # Start the new packet by reading the timestamp
                         timestamp = line.split(' ', 2)[0]
         finally:
-            # Save the tcpdump output (if requested), and delete the
+            # Finish the saved pcap file (if requested), and delete the
             # temporary file
-            if save_dump_file is True:
-                LinuxCLI().copy_file(
-                    tmp_dump_filename,
-                    save_dump_filename if save_dump_filename is not None
-                    else 'tcp.out.' + str(time.time()))
+            if dump_writer is not None:
+                dump_writer.close()
             LinuxCLI().rm(tmp_dump_filename)
             tcp_processes.terminate()
 
@@ -410,3 +502,103 @@ class TCPDump(object):
 
         # FLAG STATE: ready[set], stop[set], finished[set]
         return packet_queue
+
+    @staticmethod
+    def read_packet_socket(cli=LinuxCLI(), flag_set=None, interface='any',
+                           count=1, packet_type='', pcap_filter=None,
+                           max_size=0, packet_queues=None, callback=None,
+                           callback_args=None, save_dump_file=False,
+                           save_dump_filename=None):
+        """
+        Same as read_packet, but reads frames straight off an AF_PACKET
+        socket in the CLI's net namespace instead of parsing tcpdump's
+        output.  The pcap filter is compiled to BPF and attached to the
+        socket, so filtering is done by the kernel.  The packet_type
+        parameter only affects how tcpdump prints packets, so it is
+        ignored here.
+        """
+        # If flag set provided, use them instead, for synch with
+        # external functions
+        tcp_ready = threading.Event() \
+            if flag_set is None else flag_set[0]
+        tcp_error = threading.Event() \
+            if flag_set is None else flag_set[1]
+        tcp_stop = threading.Event() \
+            if flag_set is None else flag_set[2]
+        tcp_finished = threading.Event() \
+            if flag_set is None else flag_set[3]
+
+        # If queue set provided, use them instead for synch
+        # with external functions
+        packet_queue = Queue.Queue() \
+            if packet_queues is None else packet_queues[0]
+        status_queue = Queue.Queue() \
+            if packet_queues is None else packet_queues[1]
+
+        dump_writer = None
+        psock = None
+        try:
+            # FLAG STATE: ready[clear], stop[clear], finished[clear]
+            try:
+                bpf_program = packet_socket.compile_bpf_filter(
+                    pcap_filter, cli=cli, interface=interface)
+                packet_socket.enter_cli_netns(cli)
+                psock = packet_socket.PacketSocket(
+                    interface=interface, bpf_program=bpf_program,
+                    max_size=max_size)
+                psock.open()
+            except Exception as e:
+                status_queue.put(
+                    {'error': 'packet socket failed to open',
+                     'returncode': 1,
+                     'stdout': '',
+                     'stderr': str(e)})
+                tcp_error.set()
+                raise
+
+            if save_dump_file is True:
+                dump_writer = open_dump_file(interface, max_size,
+                                             save_dump_filename)
+
+            # The filter is attached and the socket bound, so every frame
+            # from here on will be captured
+            tcp_ready.set()
+
+            # FLAG STATE: ready[set], stop[clear], finished[clear]
+            received = 0
+            while not tcp_stop.is_set() and (count == 0 or received < count):
+                # Wake up periodically to check the stop flag
+                ret = psock.recv_packet(timeout=0.1)
+                if ret is None:
+                    continue
+
+                packet_data, (sec, usec) = ret
+
+                # Create the packet and push it onto the return list,
+                # calling the callback function if one is set.
+                packet = socket_packet(packet_data, sec, usec)
+                if dump_writer is not None:
+                    dump_writer.write_packet(packet)
+                packet_queue.put(packet)
+                if callback is not None:
+                    callback(packet,
+                             *(callback_args
+                               if callback_args is not None
+                               else ()))
+                received += 1
+        finally:
+            if psock is not None:
+                psock.close()
+            if dump_writer is not None:
+                dump_writer.close()
+
+        status_queue.put({'success': '',
+                          'returncode': 0,
+                          'stdout': '',
+                          'stderr': ''})
+
+        # FLAG STATE: ready[set], stop[set], finished[clear]
+        tcp_finished.set()
+
+        # FLAG STATE: ready[set], stop[set], finished[set]
+        return packet_queue
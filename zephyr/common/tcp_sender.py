@@ -12,50 +12,318 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
+import multiprocessing
+import os
+import threading
+from zephyr.common.cli import CommandStatus
 from zephyr.common.cli import LinuxCLI
 from zephyr.common.exceptions import ArgMismatchException
 from zephyr.common.exceptions import SubprocessFailedException
+from zephyr.common import packet_builder
+from zephyr.common import packet_socket
 
-import multiprocessing
+SEND_START_TIMEOUT = 10
+
+# Send engines: 'mz' runs mausezahn for every send, 'packet_socket' builds
+# the frames in Python and writes them to an AF_PACKET socket in the CLI's
+# net namespace, and 'auto' uses the packet socket when privileged enough
+# to open one (and the packet is one it can build), falling back to mz
+# otherwise.
+SEND_ENGINE_MZ = 'mz'
+SEND_ENGINE_PACKET_SOCKET = 'packet_socket'
+SEND_ENGINE_AUTO = 'auto'
+
+# Options that apply to the IP header of any IP-based packet type
+IP4_OPTIONS = ('ttl', 'tos', 'id')
 
 
 def send_packet(tcp_event, **kwargs):
     TCPSender.send_packet(tcp_ready=tcp_event, **kwargs)
 
 
+def parse_byte_data(byte_data):
+    """
+    Parse a frame given as hex bytes, optionally separated by ':', '-' or
+    spaces, as mz takes them.
+    :type byte_data: str
+    :return: str
+    """
+    hex_str = ''.join(byte_data.replace(':', ' ').replace('-', ' ').split())
+    try:
+        return binascii.unhexlify(hex_str)
+    except (TypeError, binascii.Error):
+        raise ArgMismatchException('Invalid byte data: ' + byte_data)
+
+
+def int_option(options, names, default):
+    """
+    Pop the first of the given options that is set, as an int (decimal or
+    0x-prefixed hex).
+    :type options: dict[str, str]
+    :type names: list[str]
+    :type default: int
+    :return: int
+    """
+    value = default
+    for name in names:
+        if name in options:
+            value = int(str(options.pop(name)), 0)
+    return value
+
+
+def build_packet(psock, packet_type=None, source_port=None, dest_port=None,
+                 source_ip=None, dest_ip=None, source_mac=None,
+                 dest_mac=None, packet_options=None, byte_data=None,
+                 payload=None):
+    """
+    Build the frame mz would send for the given TCPSender.send_packet
+    arguments, using the interface the packet socket is bound to for the
+    default source MAC and IP, and resolving the next hop's MAC for the
+    destination (broadcast if it can't be resolved).  Must be called
+    from within the socket's net namespace.  Raises ArgMismatchException
+    for anything it can't build.
+    :type psock: packet_socket.PacketSocket
+    :return: str
+    """
+    options = dict(packet_options) if packet_options is not None else {}
+    if 'rand' in (source_mac, dest_mac):
+        # mz picks a new random address for every frame
+        raise ArgMismatchException('Random MAC addresses are not supported')
+    own_mac = psock.hw_address()
+
+    if packet_type is None:
+        if byte_data is None:
+            raise ArgMismatchException(
+                'The "byte_data" parameter is required if "packet_type" '
+                'is not present')
+        frame = parse_byte_data(byte_data)
+        if dest_mac is not None:
+            frame = packet_builder.encode_mac_address(dest_mac) + frame[6:]
+        if source_mac is not None:
+            frame = (frame[0:6] +
+                     packet_builder.encode_mac_address(source_mac) +
+                     frame[12:])
+        return frame
+
+    if packet_type in ('arp', 'icmp') and 'command' not in options:
+        raise ArgMismatchException('arp and icmp packets need a '
+                                   'command or type')
+    source_mac = source_mac or own_mac
+
+    if packet_type == 'arp':
+        command = options.pop('command')
+        if command not in ('request', 'reply'):
+            raise ArgMismatchException('Unsupported ARP command: ' + command)
+        reply = command == 'reply'
+        sender_mac = options.pop('smac', source_mac)
+        sender_ip = options.pop(
+            'sip', source_ip or packet_socket.interface_ip4(psock.interface))
+        target_ip = options.pop('tip', dest_ip)
+        target_mac = options.pop(
+            'tmac', (dest_mac or packet_builder.ZERO_MAC) if reply
+            else packet_builder.ZERO_MAC)
+        if options:
+            raise ArgMismatchException(
+                'Unsupported ARP options: ' + str(options))
+        if sender_ip is None or target_ip is None:
+            raise ArgMismatchException('ARP packets need a sender and '
+                                       'target IP')
+        if dest_mac is None:
+            dest_mac = (target_mac if reply and
+                        target_mac != packet_builder.ZERO_MAC
+                        else packet_builder.BROADCAST_MAC)
+        return packet_builder.build_frame(
+            [packet_builder.Ethernet(source_mac, dest_mac),
+             packet_builder.ARP(
+                 sender_mac, sender_ip, target_ip, target_mac,
+                 packet_builder.ARP_PROTOCOL_OPERATION_REPLY if reply
+                 else packet_builder.ARP_PROTOCOL_OPERATION_REQUEST)],
+            payload or '')
+
+    if packet_type == 'icmp':
+        command = options.pop('command')
+        icmp_types = {
+            'ping': packet_builder.ICMP_PROTOCOL_TYPE_ECHO_REQUEST,
+            'echoreply': packet_builder.ICMP_PROTOCOL_TYPE_ECHO_REPLY}
+        if command not in icmp_types:
+            raise ArgMismatchException('Unsupported ICMP command: ' + command)
+        transport = packet_builder.ICMP(
+            icmp_types[command], id=int_option(options, ['id'], 0),
+            seq=int_option(options, ['seq'], 0))
+    elif packet_type == 'tcp':
+        transport = packet_builder.TCP(
+            int_option(options, ['sp'], source_port or 0),
+            int_option(options, ['dp'], dest_port or 0),
+            seq=int_option(options, ['s', 'seqnr'], 0),
+            ack=int_option(options, ['a', 'acknr'], 0),
+            flags=packet_builder.parse_tcp_flags(
+                options.pop('flags', 'syn')),
+            window=int_option(options, ['win'], 65535))
+    elif packet_type == 'udp':
+        transport = packet_builder.UDP(
+            int_option(options, ['sp'], source_port or 0),
+            int_option(options, ['dp'], dest_port or 0))
+    elif packet_type == 'ip':
+        transport = None
+    else:
+        raise ArgMismatchException('Unsupported packet type: ' +
+                                   str(packet_type))
+
+    ip_options = dict((k, options.pop(k)) for k in IP4_OPTIONS + (
+        ('len', 'proto', 'p') if packet_type == 'ip' else ())
+        if k in options)
+    if options:
+        raise ArgMismatchException(
+            'Unsupported ' + packet_type + ' options: ' + str(options))
+
+    source_ip = source_ip or packet_socket.interface_ip4(psock.interface)
+    if source_ip is None or dest_ip is None:
+        raise ArgMismatchException(packet_type + ' packets need a source '
+                                   'and destination IP')
+    ip_layer = packet_builder.IP4(
+        source_ip, dest_ip,
+        protocol=(int_option(ip_options, ['proto', 'p'], 0)
+                  if packet_type == 'ip' else None),
+        ttl=int_option(ip_options, ['ttl'], packet_builder.IP4_DEFAULT_TTL),
+        tos=int_option(ip_options, ['tos'], 0),
+        id=int_option(ip_options, ['id'], 0),
+        total_length=int_option(ip_options, ['len'], 0) or None)
+
+    if dest_mac is None:
+        dest_mac = (psock.resolve_mac(
+            packet_socket.next_hop(dest_ip, psock.interface), source_ip) or
+            packet_builder.BROADCAST_MAC)
+    layers = [packet_builder.Ethernet(source_mac, dest_mac), ip_layer]
+    if transport is not None:
+        layers.append(transport)
+    return packet_builder.build_frame(layers, payload or '')
+
+
 class TCPSender(object):
 
-    def __init__(self):
+    def __init__(self, engine=SEND_ENGINE_AUTO):
+        """
+        :param engine: str Send engine to use, one of 'auto' (default),
+        'packet_socket' or 'mz'
+        """
+        self.engine = engine
         self.process = None
+        """ :type: multiprocessing.Process|threading.Thread"""
+        self.stop_event = None
+        """ :type: threading.Event"""
+        self.send_error = None
+
+    @staticmethod
+    def use_packet_socket(engine, cli):
+        """
+        Whether sends should be made through a packet socket rather than
+        with mz.  Opening packet sockets and entering net namespaces both
+        require root, so 'auto' only picks the packet socket when running
+        as root (and not just logging commands).
+        :type engine: str
+        :type cli: LinuxCLI
+        :return: bool
+        """
+        if engine == SEND_ENGINE_PACKET_SOCKET:
+            return True
+        if engine == SEND_ENGINE_MZ:
+            return False
+        if engine == SEND_ENGINE_AUTO:
+            return os.geteuid() == 0 and not cli.debug
+        raise ArgMismatchException('Unknown send engine: ' + str(engine))
 
     def start_send(self, blocking=True, **kwargs):
         if self.process is not None:
             raise SubprocessFailedException(
                 'tcp send process already started')
 
-        tcp_ready = multiprocessing.Event()
-        tcp_ready.clear()
-        self.process = multiprocessing.Process(
-            target=send_packet,
-            args=(tcp_ready,), kwargs=kwargs)
+        if not self.use_packet_socket(self.engine,
+                                      kwargs.get('cli', LinuxCLI())):
+            tcp_ready = multiprocessing.Event()
+            tcp_ready.clear()
+            kwargs['engine'] = SEND_ENGINE_MZ
+            self.process = multiprocessing.Process(
+                target=send_packet,
+                args=(tcp_ready,), kwargs=kwargs)
+        else:
+            # No process to start, so send from a thread of this one, which
+            # stop_send can stop between frames
+            tcp_ready = threading.Event()
+            self.stop_event = threading.Event()
+            self.send_error = None
+            kwargs['engine'] = self.engine
+            kwargs['stop_event'] = self.stop_event
+            self.process = threading.Thread(
+                target=self.send_in_thread, args=(tcp_ready,), kwargs=kwargs)
+
         self.process.daemon = True
         self.process.start()
-        if tcp_ready.wait(10) is False:
+        if tcp_ready.wait(SEND_START_TIMEOUT) is False or self.send_error:
             raise SubprocessFailedException(
-                "mz failed to send within timeout")
+                "Packet send failed to start within timeout" +
+                (': ' + str(self.send_error) if self.send_error else ''))
 
         if blocking is True:
             self.process.join()
 
+    def send_in_thread(self, tcp_ready, **kwargs):
+        try:
+            self.send_packet(tcp_ready=tcp_ready, **kwargs)
+        except Exception as e:
+            self.send_error = e
+            tcp_ready.set()
+
     def stop_send(self, term=False):
         if self.process is None:
             raise SubprocessFailedException('tcp send process not started')
 
         if term is True:
-            self.process.terminate()
-        else:
-            self.process.join()
+            if self.stop_event is not None:
+                self.stop_event.set()
+            else:
+                self.process.terminate()
+        self.process.join()
         self.process = None
+        self.stop_event = None
+
+    @staticmethod
+    def inject_packet(cli=LinuxCLI(), tcp_ready=None, interface='any',
+                      count=None, delay=None, rate=None, stop_event=None,
+                      **build_args):
+        """
+        Build a packet (see build_packet) and send it count times (1 if
+        None, until stop_event is set if 0) straight out of the interface,
+        from a packet socket in the CLI's net namespace.  The frame is only
+        built once, and then written to the socket without running any
+        other process.
+        :type cli: LinuxCLI
+        :type tcp_ready: threading.Event
+        :type interface: str
+        :type count: int|None
+        :type delay: int|None Microseconds between frames
+        :type rate: float|None Frames per second (instead of a delay)
+        :type stop_event: threading.Event
+        :return: CommandStatus
+        """
+        interval = (1.0 / rate if rate else
+                    delay / 1000000.0 if delay else None)
+        with packet_socket.netns_context(packet_socket.cli_netns(cli)):
+            psock = packet_socket.PacketSocket(interface=interface)
+            psock.open()
+            try:
+                frame = build_packet(psock, **build_args)
+                if tcp_ready is not None:
+                    tcp_ready.set()
+                sent = psock.send_frames(
+                    [frame], count=count if count is not None else 1,
+                    interval=interval, stop_event=stop_event)
+            finally:
+                psock.close()
+        return CommandStatus(
+            command='packet_socket ' + interface + ' ' +
+                    binascii.hexlify(frame),
+            stdout='Sent ' + str(sent) + ' frame(s) on ' + interface + '\n')
 
     @staticmethod
     def send_packet(cli=LinuxCLI(), tcp_ready=None,
@@ -63,7 +331,8 @@ class TCPSender(object):
                     source_port=None, dest_port=None,
                     source_ip=None, dest_ip=None, source_mac=None,
                     dest_mac=None, packet_options=None, count=None,
-                    delay=None, byte_data=None, payload=None, timeout=None):
+                    delay=None, byte_data=None, payload=None, timeout=None,
+                    engine=SEND_ENGINE_AUTO, rate=None, stop_event=None):
         """
         :type cli: LinuxCLI
         :type tcp_ready: multiprocessing.Event
@@ -81,8 +350,29 @@ class TCPSender(object):
         :type byte_data: str|None
         :type payload: str|None
         :type timeout: int|None
+        :type engine: str 'auto', 'packet_socket' or 'mz' (see TCPSender)
+        :type rate: float|None Packets per second (instead of a delay)
+        :type stop_event: threading.Event Stops a packet socket send
         :return: CommandStatus
         """
+        if TCPSender.use_packet_socket(engine, cli):
+            try:
+                return TCPSender.inject_packet(
+                    cli, tcp_ready=tcp_ready, interface=interface,
+                    count=count, delay=delay, rate=rate,
+                    stop_event=stop_event, packet_type=packet_type,
+                    source_port=source_port, dest_port=dest_port,
+                    source_ip=source_ip, dest_ip=dest_ip,
+                    source_mac=source_mac, dest_mac=dest_mac,
+                    packet_options=packet_options, byte_data=byte_data,
+                    payload=payload)
+            except ArgMismatchException:
+                if engine != SEND_ENGINE_AUTO:
+                    raise
+                # Something only mz knows how to build
+
+        if rate and delay is None:
+            delay = int(1000000 / rate)
 
         count_str = '-c %(c)d' % {'c': count} \
             if count is not None else ''
@@ -13,14 +13,17 @@
 # limitations under the License.
 
 import importlib
-import json
 import os
-import pycurl
-from StringIO import StringIO
 import unittest
 
 import xmlrunner
 
+from zephyr.common.curl_session import CurlRequest
+from zephyr.common.curl_session import CurlSession
+
+# Shared by the curl_* helpers, so their connections are kept open
+CURL_SESSION = CurlSession()
+
 
 def get_class_from_fqn(fqn):
     # Module name is the whole string until the last dot,
@@ -34,59 +37,29 @@ def get_class_from_fqn(fqn):
 
 
 def curl_get(url):
-    cbuffer = StringIO()
-    c = pycurl.Curl()
-    c.setopt(c.URL, url)
-    c.setopt(c.WRITEDATA, cbuffer)
-    c.perform()
-    c.close()
-    body = cbuffer.getvalue()
-    return body
+    return CURL_SESSION.request('GET', url)
 
 
 def curl_post(url, json_data=None, filename=None):
-    cbuffer = StringIO()
-    c = pycurl.Curl()
-    c.setopt(c.URL, url)
-    c.setopt(c.WRITEDATA, cbuffer)
-    if json_data:
-        c.setopt(c.HTTPHEADER, ["Content-Type: application/json"])
-        c.setopt(c.POSTFIELDS, json.dumps(json_data))
-    if filename:
-        c.setopt(c.HTTPPOST, [('fileupload', (c.FORM_FILE, file))])
-    c.perform()
-    c.close()
-    body = cbuffer.getvalue()
-    return body
+    return CURL_SESSION.request('POST', url, json_data, filename)
 
 
 def curl_put(url, json_data=None, filename=None):
-    cbuffer = StringIO()
-    c = pycurl.Curl()
-    c.setopt(c.URL, url)
-    c.setopt(c.WRITEDATA, cbuffer)
-    c.setopt(pycurl.CUSTOMREQUEST, "PUT")
-    if json_data:
-        c.setopt(c.HTTPHEADER, ["Content-Type: application/json"])
-        c.setopt(c.POSTFIELDS, json.dumps(json_data))
-    if filename:
-        c.setopt(c.HTTPPOST, [('fileupload', (c.FORM_FILE, file))])
-    c.perform()
-    c.close()
-    body = cbuffer.getvalue()
-    return body
+    return CURL_SESSION.request('PUT', url, json_data, filename)
 
 
 def curl_delete(url):
-    cbuffer = StringIO()
-    c = pycurl.Curl()
-    c.setopt(c.URL, url)
-    c.setopt(c.WRITEDATA, cbuffer)
-    c.setopt(pycurl.CUSTOMREQUEST, "DELETE")
-    c.perform()
-    c.close()
-    body = cbuffer.getvalue()
-    return body
+    return CURL_SESSION.request('DELETE', url)
+
+
+def curl_all(requests):
+    """
+    Make several requests at once, returning their response bodies in the
+    order given.
+    :type requests: list[CurlRequest]
+    :return: list[str]
+    """
+    return CURL_SESSION.request_all(requests)
 
 
 def run_unit_test(test_case_name):
@@ -44,3 +44,7 @@ class ZephyrInit(object):
 
 
 DEFAULT_ECHO_PORT = 5080
+
+# How often to check whether a DHCP lease has come in (VMs may be waiting
+# on their leases in parallel, so don't spin)
+DHCP_POLL_INTERVAL = 0.1
@@ -28,23 +28,45 @@ class MidonetBackup(object):
                  zkdump=True, mysql=True,
                  zk_server=None,
                  mysql_user='root', mysql_pass=None,
-                 debug=False):
+                 debug=False, mysql_database='neutron',
+                 mysql_data_only=False):
+        """
+        :type mysql_data_only: bool Save just the rows of the database
+        (not its tables), and load them into emptied (truncated) tables.
+        Much faster to load than a full dump, but the tables must already
+        match the dump's schema.
+        """
         self.name = name
         self.root_dir = root_dir
         self.zkdump = zkdump
         self.mysql = mysql
         self.zk_server = zk_server
         self.mysql_cred = (mysql_user, mysql_pass)
+        self.mysql_database = mysql_database
+        self.mysql_data_only = mysql_data_only
         self.debug = debug
         self.LOG = logging.getLogger(name="midonet_backup")
         self.LOG.setLevel(1)
-        file_handler = logging.StreamHandler()
-        file_handler.setLevel(logging.DEBUG if self.debug else logging.INFO)
-        self.LOG.addHandler(file_handler)
+        if len(self.LOG.handlers) == 0:
+            file_handler = logging.StreamHandler()
+            file_handler.setLevel(
+                logging.DEBUG if self.debug else logging.INFO)
+            self.LOG.addHandler(file_handler)
         self.cli = cli.LinuxCLI(priv=False,
                                 log_cmd=self.debug, print_cmd_out=self.debug,
                                 logger=self.LOG)
 
+    def mysql_file(self):
+        return self.root_dir + '/' + self.name + '.mysql'
+
+    def has_mysql_file(self):
+        return self.cli.exists(self.mysql_file())
+
+    def mysql_args(self):
+        return (' -u ' + self.mysql_cred[0] +
+                (' --password=' + self.mysql_cred[1]
+                 if self.mysql_cred[1] else ''))
+
     def save(self):
         if self.zkdump:
             self.LOG.debug('Saving zkdump data')
@@ -59,13 +81,17 @@ class MidonetBackup(object):
 
         if self.mysql:
             self.LOG.debug('Saving mysql data')
+            # Written to a temporary file and moved into place, so a
+            # failed dump never leaves a partial one to be loaded later
             cmd_out = self.cli.cmd(
-                'mysqldump'
-                ' -u ' + self.mysql_cred[0] +
-                ' --password=' + self.mysql_cred[1] +
-                ' neutron' +
-                ' > ' + self.root_dir + '/' + self.name + '.mysql')
+                'mysqldump' + self.mysql_args() +
+                (' --no-create-info --skip-triggers --complete-insert'
+                 if self.mysql_data_only else '') +
+                ' ' + self.mysql_database +
+                ' > ' + self.mysql_file() + '.tmp'
+                ' && mv ' + self.mysql_file() + '.tmp ' + self.mysql_file())
             if cmd_out.ret_code != 0:
+                self.cli.rm(self.mysql_file() + '.tmp')
                 raise exceptions.SubprocessFailedException(
                     "mysqldump failed")
 
@@ -82,14 +108,30 @@ class MidonetBackup(object):
                 raise exceptions.SubprocessFailedException(
                     "zkdump failed")
 
-        if self.mysql:
+        if self.mysql and self.mysql_data_only:
+            self.LOG.debug('Truncating mysql tables and loading mysql data')
+            # Emptying every table and loading the rows in one session
+            # keeps foreign key checks off throughout
+            cmd_out = self.cli.cmd(
+                '(echo "SET FOREIGN_KEY_CHECKS=0;";'
+                ' mysql' + self.mysql_args() + ' -N -e "'
+                "SELECT CONCAT('TRUNCATE TABLE \\`', table_name, '\\`;')"
+                ' FROM information_schema.tables'
+                " WHERE table_schema='" + self.mysql_database + "'"
+                " AND table_type='BASE TABLE'\";"
+                ' cat ' + self.mysql_file() + ';'
+                ' echo "SET FOREIGN_KEY_CHECKS=1;") |'
+                ' mysql' + self.mysql_args() + ' ' + self.mysql_database)
+            self.LOG.debug(cmd_out.stdout)
+            if cmd_out.ret_code != 0:
+                raise exceptions.SubprocessFailedException(
+                    "mysql load failed")
+        elif self.mysql:
             self.LOG.debug('Loading mysql data')
             cmd_out = self.cli.cmd(
-                'mysql'
-                ' -u ' + self.mysql_cred[0] +
-                ' --password=' + self.mysql_cred[1] +
-                ' -U neutron'
-                ' < ' + self.root_dir + '/' + self.name + '.mysql')
+                'mysql' + self.mysql_args() +
+                ' ' + self.mysql_database +
+                ' < ' + self.mysql_file())
             self.LOG.debug(cmd_out.stdout)
             if cmd_out.ret_code != 0:
                 raise exceptions.SubprocessFailedException(
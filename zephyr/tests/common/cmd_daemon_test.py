@@ -0,0 +1,177 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import stat
+import threading
+import unittest
+from zephyr.common.cli import LinuxCLI
+from zephyr.common.cli import NetNSCLI
+from zephyr.common.cli import REMOVENSCMD
+from zephyr.common import cmd_daemon
+from zephyr.common.exceptions import *
+from zephyr.common.process_table import process_table
+from zephyr.common.utils import run_unit_test
+
+
+class CommandDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.daemon = cmd_daemon.start_cmd_daemon()
+        self.client = cmd_daemon.get_client()
+        self.socket_path = self.client.socket_path
+
+    def test_socket_dir(self):
+        socket_dir = os.path.dirname(self.socket_path)
+        self.assertEqual(0o700, stat.S_IMODE(os.stat(socket_dir).st_mode))
+        self.assertEqual(os.getuid(), os.stat(self.socket_path).st_uid)
+
+        # A socket in a directory other users can write to is refused
+        self.assertRaises(ArgMismatchException,
+                          cmd_daemon.CommandDaemonServer,
+                          '/tmp/zephyr-cmd-daemon-test.sock')
+
+    def test_execute(self):
+        ret, out, err = self.client.execute('echo foo; echo bar >&2',
+                                            shell=True)
+        self.assertEqual(0, ret)
+        self.assertEqual('foo\n', out)
+        self.assertEqual('bar\n', err)
+
+        ret, out, err = self.client.execute('exit 3', shell=True)
+        self.assertEqual(3, ret)
+
+        ret, out, err = self.client.execute(
+            [['printf', '\\x00\\xff\\n'], ['cat']])
+        self.assertEqual(0, ret)
+        self.assertEqual('\x00\xff\n', out)
+
+        ret, out, err = self.client.execute('echo $ZEPHYR_TEST_VAR',
+                                            shell=True,
+                                            env={'ZEPHYR_TEST_VAR': 'bar'})
+        self.assertEqual('bar\n', out)
+
+        try:
+            self.client.execute([['/nonexistent-zephyr-cmd']])
+        except SubprocessFailedException:
+            pass
+        else:
+            self.fail('Running a missing binary should fail')
+
+    def test_concurrent_clients(self):
+        results = []
+
+        def run():
+            results.append(self.client.execute('sleep 0.5; echo done',
+                                               shell=True))
+            self.client.close()
+
+        # One command first, from this thread: the first one imports the
+        # output codec, which the other threads can't do while the test
+        # module is still being imported
+        self.client.execute('true', shell=True)
+        threads = [threading.Thread(target=run) for _ in range(0, 5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(3)
+        self.assertEqual([(0, 'done\n', '')] * 5, results)
+
+    def test_linux_cli_routing(self):
+        cli = LinuxCLI(priv=True)
+        ret = cli.cmd('echo $PPID')
+        self.assertEqual(0, ret.ret_code)
+        self.assertIsNone(ret.process)
+        self.assertIn(ret.stdout.strip(),
+                      LinuxCLI(priv=False).cmd('pgrep -f cmd_daemon').stdout)
+
+        ret = cli.cmd_pipe([['echo', 'foo bar'], ['cut', '-d', ' ',
+                                                  '-f', '2']])
+        self.assertEqual('bar\n', ret.stdout)
+
+        try:
+            cli.cmd('false', verify=True)
+        except SubprocessFailedException:
+            pass
+        else:
+            self.fail('Failed command should fail verification')
+
+        try:
+            cli.cmd('sleep 5', timeout=1)
+        except SubprocessTimeoutException:
+            pass
+        else:
+            self.fail('Command should have timed out')
+
+        # Non-blocking commands still hand back a local process
+        ret = cli.cmd('echo foo', blocking=False)
+        self.assertIsNotNone(ret.process)
+        ret.process.communicate()
+
+    @unittest.skipUnless(os.geteuid() == 0, 'Requires root')
+    def test_netns_routing(self):
+        LinuxCLI().cmd('ip netns add zephyr-cmd-daemon-test')
+        try:
+            cli = NetNSCLI('zephyr-cmd-daemon-test')
+            ret = cli.cmd('ip -o link show')
+            self.assertEqual(0, ret.ret_code)
+            self.assertEqual(1, len(ret.stdout.splitlines()))
+            self.assertIn('lo', ret.stdout)
+
+            ret = cli.cmd_pipe([['ls', '/sys/class/net']])
+            self.assertEqual('lo\n', ret.stdout)
+        finally:
+            LinuxCLI().cmd('ip netns del zephyr-cmd-daemon-test')
+
+    @unittest.skipUnless(os.geteuid() == 0, 'Requires root')
+    def test_netns_helper(self):
+        ns = 'zephyr-cmd-daemon-test'
+        daemon_pid = LinuxCLI(priv=True).cmd('echo $PPID').stdout.strip()
+        LinuxCLI().cmd('ip netns add ' + ns)
+        try:
+            cli = NetNSCLI(ns)
+            # Every command in the namespace is run by the same helper
+            helper_pid = cli.cmd('echo $PPID').stdout.strip()
+            self.assertNotEqual(daemon_pid, helper_pid)
+            self.assertEqual(helper_pid, cli.cmd('echo $PPID').stdout.strip())
+            self.assertIn('-n ' + ns, process_table.snapshot(max_age=0).get(
+                int(helper_pid)).command())
+
+            # A namespace added again under the same name gets a new helper
+            LinuxCLI().cmd('ip netns del ' + ns)
+            LinuxCLI().cmd('ip netns add ' + ns)
+            LinuxCLI().cmd('ip link add zephyr-v0 type veth peer name '
+                           'zephyr-v1')
+            LinuxCLI().cmd('ip link set zephyr-v1 netns ' + ns)
+            new_helper_pid = cli.cmd('echo $PPID').stdout.strip()
+            self.assertNotEqual(helper_pid, new_helper_pid)
+            self.assertFalse(process_table.is_running(
+                int(helper_pid), include_exited=False))
+            self.assertEqual('lo\nzephyr-v1\n',
+                             cli.cmd('ls /sys/class/net').stdout)
+        finally:
+            REMOVENSCMD(ns)
+        # Removing the namespace stops its helper at once, so the namespace
+        # really goes, and its veth (and the peer outside) with it
+        self.assertFalse(process_table.is_running(
+            int(new_helper_pid), include_exited=False))
+        self.assertNotEqual(
+            0, LinuxCLI().cmd('ip link show zephyr-v0').ret_code)
+
+    def tearDown(self):
+        cmd_daemon.stop_cmd_daemon(self.daemon)
+        self.assertIsNone(cmd_daemon.get_client())
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertFalse(os.path.exists(os.path.dirname(self.socket_path)))
+
+run_unit_test(CommandDaemonTest)
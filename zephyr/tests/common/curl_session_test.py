@@ -0,0 +1,154 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import BaseHTTPServer
+import json
+import pycurl
+import SocketServer
+import threading
+import time
+import unittest
+
+from zephyr.common.curl_session import *
+from zephyr.common.utils import run_unit_test
+
+
+class EchoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep connections open between requests
+    protocol_version = 'HTTP/1.1'
+
+    def reply(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        body = self.rfile.read(length) if length else ''
+        if self.path.startswith('/slow'):
+            time.sleep(0.2)
+        self.server.client_ports.append(self.client_address[1])
+        data = json.dumps({'method': self.command, 'path': self.path,
+                           'body': body})
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = reply
+    do_POST = reply
+    do_PUT = reply
+    do_DELETE = reply
+
+    def log_message(self, *args):
+        pass
+
+
+class EchoHTTPServer(SocketServer.ThreadingMixIn,
+                     BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class CurlSessionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = EchoHTTPServer(('127.0.0.1', 0), EchoHandler)
+        cls.server.client_ports = []
+        cls.url = 'http://127.0.0.1:' + str(cls.server.server_port)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.client_ports[:] = []
+
+    def test_request(self):
+        session = CurlSession()
+        try:
+            reply = json.loads(session.request('GET', self.url + '/a'))
+            self.assertEqual({'method': 'GET', 'path': '/a', 'body': ''},
+                             reply)
+            reply = json.loads(session.request('POST', self.url + '/b',
+                                               {'x': 1}))
+            self.assertEqual('POST', reply['method'])
+            self.assertEqual({'x': 1}, json.loads(reply['body']))
+            reply = json.loads(session.request('PUT', self.url + '/c',
+                                               {'y': 2}))
+            self.assertEqual('PUT', reply['method'])
+            self.assertEqual({'y': 2}, json.loads(reply['body']))
+            reply = json.loads(session.request('DELETE', self.url + '/d'))
+            self.assertEqual('DELETE', reply['method'])
+            self.assertEqual('', reply['body'])
+
+            # All over the one kept-alive connection
+            self.assertEqual(4, len(self.server.client_ports))
+            self.assertEqual(1, len(set(self.server.client_ports)))
+            self.assertEqual(1, len(session.idle_handles))
+
+            self.assertRaises(pycurl.error, session.request, 'GET',
+                              'http://127.0.0.1:1/')
+            self.assertEqual(1, len(session.idle_handles))
+        finally:
+            session.close()
+
+    def test_request_all(self):
+        session = CurlSession()
+        try:
+            start = time.time()
+            replies = session.request_all(
+                [CurlRequest('DELETE', self.url + '/slow/' + str(i))
+                 for i in range(5)] +
+                [CurlRequest('POST', self.url + '/post', {'z': 3})])
+            # Made at once, rather than one after the other
+            self.assertLess(time.time() - start, 0.8)
+            self.assertEqual(['/slow/0', '/slow/1', '/slow/2', '/slow/3',
+                              '/slow/4', '/post'],
+                             [json.loads(r)['path'] for r in replies])
+            self.assertEqual({'z': 3},
+                             json.loads(json.loads(replies[5])['body']))
+
+            # The connections stay open for the next batch
+            ports = set(self.server.client_ports)
+            session.request_all([CurlRequest('GET', self.url + '/again')])
+            self.assertIn(self.server.client_ports[-1], ports)
+
+            self.assertRaises(pycurl.error, session.request_all,
+                              [CurlRequest('GET', self.url + '/ok'),
+                               CurlRequest('GET', 'http://127.0.0.1:1/')])
+            self.assertEqual([], session.request_all([]))
+        finally:
+            session.close()
+
+    def test_threads(self):
+        session = CurlSession()
+        replies = []
+
+        def get(i):
+            replies.append(json.loads(
+                session.request('GET', self.url + '/slow/' + str(i))))
+
+        try:
+            threads = [threading.Thread(target=get, args=(i,))
+                       for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(['/slow/0', '/slow/1', '/slow/2', '/slow/3'],
+                             sorted(r['path'] for r in replies))
+            self.assertEqual(4, len(session.idle_handles))
+        finally:
+            session.close()
+
+run_unit_test(CurlSessionTest)
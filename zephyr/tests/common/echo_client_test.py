@@ -0,0 +1,199 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import socket
+import unittest
+
+from zephyr.common.cli import LinuxCLI
+from zephyr.common.echo_client import *
+from zephyr.common.echo_server import EchoServer
+from zephyr.common.latency_histogram import LatencyHistogram
+from zephyr.common.utils import run_unit_test
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__)))))
+
+
+class BrokenPipe(object):
+    """
+    Stands in for a worker's stdin which can no longer be written.
+    """
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    @property
+    def closed(self):
+        return self.pipe.closed
+
+    def write(self, data):
+        raise IOError(32, 'Broken pipe')
+
+    def close(self):
+        self.pipe.close()
+
+
+class EchoClientTest(unittest.TestCase):
+    def test_send(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=15090,
+                        protocol=['tcp', 'udp'])
+        client = EchoClient()
+        try:
+            es.start()
+            self.assertEqual('ping:pong', client.send('127.0.0.1', 15090))
+            self.assertEqual('hi:pong', client.send('127.0.0.1', 15090, 'hi',
+                                                    protocol='udp'))
+        finally:
+            client.close()
+            es.stop()
+
+    def test_send_batch(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=15091, echo_data='vm1')
+        client = EchoClient()
+        try:
+            es.start()
+            replies = client.send_batch('127.0.0.1', 15091,
+                                        ['a', 'b', 'c'], concurrency=2)
+            self.assertEqual(['a:vm1', 'b:vm1', 'c:vm1'],
+                             [r['reply'] for r in replies])
+            for r in replies:
+                self.assertEqual('vm1', r['source'])
+                self.assertIsNone(r['error'])
+                self.assertGreaterEqual(r['latency'], 0.0)
+        finally:
+            client.close()
+            es.stop()
+
+    def test_send_batch_no_server(self):
+        replies = EchoClient().send_batch('127.0.0.1', 15092, ['ping'] * 2)
+        self.assertEqual(2, len(replies))
+        for r in replies:
+            self.assertEqual('', r['reply'])
+            self.assertEqual('', r['source'])
+            self.assertIsNotNone(r['error'])
+        self.assertRaises(socket.error,
+                          EchoClient().send, '127.0.0.1', 15092)
+
+    def test_keep_alive(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=15093)
+        client = EchoClient(keep_alive=True)
+        try:
+            es.start()
+            replies = client.send_batch('127.0.0.1', 15093, ['ping'] * 5)
+            self.assertEqual(['ping:pong'] * 5,
+                             [r['reply'] for r in replies])
+            # One connection carried every request
+            self.assertEqual(1, len(client.pool[('127.0.0.1', 15093)]))
+            self.assertEqual(1, len(es.connections))
+        finally:
+            client.close()
+            es.stop()
+
+    def test_worker(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=15094, echo_data='vm2')
+        cli = LinuxCLI(priv=False)
+        cli.add_environment_variable('PATH', os.environ['PATH'])
+        cli.add_environment_variable('PYTHONPATH', ROOT_DIR)
+        client = EchoWorkerClient(
+            cli, ['python', ROOT_DIR + '/echo-send.py', '-w'])
+        try:
+            es.start()
+            replies = client.send_batch('127.0.0.1', 15094, ['x', 'y'],
+                                        concurrency=2)
+            self.assertEqual(['x:vm2', 'y:vm2'],
+                             [r['reply'] for r in replies])
+            self.assertEqual(['vm2', 'vm2'], [r['source'] for r in replies])
+            pid = client.status.process.pid
+
+            # The same worker answers the next batch
+            replies = client.send_batch('127.0.0.1', 15094, ['z'])
+            self.assertEqual('z:vm2', replies[0]['reply'])
+            self.assertEqual(pid, client.status.process.pid)
+
+            replies = client.send_batch('127.0.0.1', 15095, ['z'],
+                                        timeout=1)
+            self.assertEqual('', replies[0]['reply'])
+            self.assertIsNotNone(replies[0]['error'])
+
+            # A worker that can't be talked to is stopped and reaped, and
+            # the next batch starts a new one
+            process = client.status.process
+            process.stdin = BrokenPipe(process.stdin)
+            self.assertRaises(SubprocessFailedException, client.send_batch,
+                              '127.0.0.1', 15094, ['z'])
+            self.assertIsNone(client.status)
+            self.assertIsNotNone(process.returncode)
+            replies = client.send_batch('127.0.0.1', 15094, ['z'])
+            self.assertEqual('z:vm2', replies[0]['reply'])
+            self.assertNotEqual(pid, client.status.process.pid)
+        finally:
+            client.stop()
+            es.stop()
+        self.assertIsNone(client.status)
+
+    def test_generate_load(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=15096)
+        client = EchoClient()
+        try:
+            es.start()
+            report = client.generate_load('127.0.0.1', 15096, connections=4,
+                                          rate=200, duration=0.5)
+            self.assertEqual(0, report['errors'])
+            # Paced at the rate, not as fast as possible
+            self.assertAlmostEqual(100, report['replies'], delta=5)
+            self.assertEqual(report['replies'], report['requests'])
+            self.assertGreater(report['throughput'], 0)
+            latency = report['latency']
+            self.assertLessEqual(latency['min'], latency['p50'])
+            self.assertLessEqual(latency['p50'], latency['p99'])
+            self.assertLessEqual(latency['p99'], latency['p999'])
+            self.assertLessEqual(latency['p999'], latency['max'])
+
+            report = EchoClient(keep_alive=True).generate_load(
+                '127.0.0.1', 15096, connections=2, duration=0.2)
+            self.assertEqual(0, report['errors'])
+            self.assertGreater(report['replies'], 0)
+        finally:
+            client.close()
+            es.stop()
+
+        report = client.generate_load('127.0.0.1', 15096, connections=2,
+                                      rate=50, duration=0.2)
+        self.assertEqual(0, report['replies'])
+        self.assertEqual(report['requests'], report['errors'])
+        self.assertEqual(report['errors'],
+                         sum(report['error_counts'].values()))
+
+    def test_worker_load(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=15097)
+        cli = LinuxCLI(priv=False)
+        cli.add_environment_variable('PATH', os.environ['PATH'])
+        cli.add_environment_variable('PYTHONPATH', ROOT_DIR)
+        client = EchoWorkerClient(
+            cli, ['python', ROOT_DIR + '/echo-send.py', '-w'])
+        try:
+            es.start()
+            report = client.generate_load('127.0.0.1', 15097, connections=2,
+                                          rate=100, duration=0.3)
+            self.assertEqual(0, report['errors'])
+            self.assertGreater(report['replies'], 0)
+            self.assertEqual(report['replies'],
+                             LatencyHistogram.from_dict(
+                                 report['histogram']).total)
+        finally:
+            client.stop()
+            es.stop()
+
+run_unit_test(EchoClientTest)
@@ -12,6 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
 import unittest
 
 from zephyr.common.echo_server import *
@@ -29,8 +36,6 @@ class EchoServerTest(unittest.TestCase):
         finally:
             es.stop()
 
-    # TODO(micucci): Get UDP working
-    @unittest.skip("UDP is still not working right")
     def test_echo_udp(self):
         es = EchoServer(protocol='udp')
         try:
@@ -65,16 +70,14 @@ class EchoServerTest(unittest.TestCase):
         finally:
             es.stop()
 
-    # TODO(micucci): Get UDP working
-    @unittest.skip("UDP is still not working right")
     def test_multiple_pings_udp(self):
         es = EchoServer(protocol='udp')
         try:
             es.start()
-            ret = es.send(es.ip_addr, es.port)
+            ret = es.send(es.ip_addr, es.port, protocol='udp')
             self.assertEqual('ping:pong', ret)
 
-            ret2 = es.send(es.ip_addr, es.port, 'ping2')
+            ret2 = es.send(es.ip_addr, es.port, 'ping2', protocol='udp')
             self.assertEqual('ping2:pong', ret2)
 
         finally:
@@ -91,14 +94,13 @@ class EchoServerTest(unittest.TestCase):
         finally:
             es.stop()
 
-    # TODO(micucci): Get UDP working
-    @unittest.skip("UDP is still not working right")
     def test_long_data_udp(self):
         es = EchoServer(protocol='udp')
         try:
             es.start()
             data = 300 * '0123456789'
-            ret = es.send(es.ip_addr, es.port, echo_request=data)
+            ret = es.send(es.ip_addr, es.port, echo_request=data,
+                          protocol='udp')
             self.assertEqual(data + ':pong', ret)
 
         finally:
@@ -123,4 +125,94 @@ class EchoServerTest(unittest.TestCase):
         finally:
             es.stop()
 
+    def test_concurrent_connections(self):
+        es = EchoServer()
+        try:
+            es.start()
+            # A connection that hasn't finished its request doesn't hold up
+            # anyone else
+            slow = socket.create_connection((es.ip_addr, es.port), 5)
+            slow.sendall('slow')
+
+            results = []
+            threads = [threading.Thread(
+                target=lambda i=i: results.append(
+                    es.send(es.ip_addr, es.port, 'ping' + str(i))))
+                for i in range(0, 20)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(sorted('ping' + str(i) + ':pong'
+                                    for i in range(0, 20)),
+                             sorted(results))
+
+            # Several requests may share a connection
+            slow.sendall(TERMINATION_STRING + 'again' + TERMINATION_STRING)
+            data = ''
+            while data.count(TERMINATION_STRING) < 2:
+                data += slow.recv(1024)
+            self.assertEqual('slow:pong' + TERMINATION_STRING +
+                             'again:pong' + TERMINATION_STRING, data)
+            slow.close()
+        finally:
+            es.stop()
+
+    def test_multi_port(self):
+        es = EchoServer(ip_addr='127.0.0.1', port=[15080, 15081],
+                        protocol=['tcp', 'udp'])
+        try:
+            es.start()
+            for port in (15080, 15081):
+                for protocol in ('tcp', 'udp'):
+                    self.assertEqual(
+                        'ping:pong',
+                        EchoServer.send('127.0.0.1', port,
+                                        protocol=protocol))
+        finally:
+            es.stop()
+
+    def test_idle(self):
+        es = EchoServer()
+        try:
+            es.start()
+            start = os.times()
+            time.sleep(0.5)
+            end = os.times()
+            # Blocked while idle, rather than polling
+            self.assertLess((end[0] + end[1]) - (start[0] + start[1]), 0.1)
+        finally:
+            es.stop()
+
+    def test_script(self):
+        root_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__)))))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = root_dir
+        log_dir = tempfile.mkdtemp()
+        process = subprocess.Popen(
+            ['python', root_dir + '/echo-server.py', '-i', '127.0.0.1',
+             '-p', '15082,15083', '-c', 'tcp,udp', '-o', 'pang',
+             '-r', log_dir], env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.time() + 10
+            while True:
+                try:
+                    self.assertEqual(
+                        'ping:pang', EchoServer.send('127.0.0.1', 15082))
+                    break
+                except socket.error:
+                    if time.time() > deadline:
+                        raise
+                    time.sleep(0.1)
+            self.assertEqual('ping:pang',
+                             EchoServer.send('127.0.0.1', 15083,
+                                             protocol='udp'))
+        finally:
+            process.terminate()
+            process.communicate()
+            shutil.rmtree(log_dir)
+        self.assertEqual(0, process.returncode)
+
 run_unit_test(EchoServerTest)
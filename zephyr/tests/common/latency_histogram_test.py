@@ -0,0 +1,84 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+
+from zephyr.common.latency_histogram import *
+from zephyr.common.utils import run_unit_test
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_empty(self):
+        hist = LatencyHistogram()
+        self.assertEqual(0, hist.total)
+        self.assertEqual(0.0, hist.percentile(99))
+        self.assertEqual(0.0, hist.mean())
+        self.assertEqual(0.0, hist.summary()['min'])
+
+    def test_percentiles(self):
+        hist = LatencyHistogram()
+        # 1ms to 1s, one of each millisecond
+        for ms in range(1, 1001):
+            hist.record(ms / 1000.0)
+        self.assertEqual(1000, hist.total)
+        for percent, expected in [(50, 0.5), (99, 0.99), (99.9, 0.999)]:
+            self.assertAlmostEqual(expected, hist.percentile(percent),
+                                   delta=expected / 128)
+        self.assertEqual(1.0, hist.percentile(100))
+        self.assertAlmostEqual(0.001, hist.percentile(0), delta=0.001 / 128)
+        self.assertAlmostEqual(0.5005, hist.mean())
+        summary = hist.summary()
+        self.assertEqual(0.001, summary['min'])
+        self.assertEqual(1.0, summary['max'])
+
+    def test_precision(self):
+        hist = LatencyHistogram()
+        for value in [0, 1, 127, 128, 255, 256, 1000, 123456, 98765432]:
+            index = hist.index_for(value)
+            high = hist.highest_value_for(index)
+            self.assertLessEqual(value, high)
+            self.assertLessEqual(high - value, max(1, value / 128))
+        # Bucket indexes only grow with the value
+        indexes = [hist.index_for(v) for v in range(0, 70000, 7)]
+        self.assertEqual(indexes, sorted(indexes))
+
+    def test_merge(self):
+        hist1 = LatencyHistogram()
+        hist2 = LatencyHistogram()
+        for i in range(100):
+            hist1.record(0.001)
+            hist2.record(0.1)
+        hist1.merge(hist2)
+        self.assertEqual(200, hist1.total)
+        self.assertAlmostEqual(0.001, hist1.percentile(50),
+                               delta=0.001 / 128)
+        self.assertAlmostEqual(0.1, hist1.percentile(51), delta=0.1 / 128)
+        self.assertEqual(0.1, hist1.summary()['max'])
+
+        coarse = LatencyHistogram(significant_bits=4)
+        coarse.merge(hist2)
+        self.assertEqual(100, coarse.total)
+        self.assertAlmostEqual(0.1, coarse.percentile(50), delta=0.1 / 8)
+
+    def test_to_from_dict(self):
+        hist = LatencyHistogram()
+        for ms in [1, 2, 3, 50, 1000]:
+            hist.record(ms / 1000.0)
+        copy = LatencyHistogram.from_dict(json.loads(json.dumps(
+            hist.to_dict())))
+        self.assertEqual(hist.summary(), copy.summary())
+        self.assertEqual(hist.counts, copy.counts)
+
+run_unit_test(LatencyHistogramTest)
@@ -13,13 +13,22 @@
 # limitations under the License.
 
 import datetime
+import gzip
+import json
 import logging
 import os
+import threading
+import time
 import unittest
 from zephyr.common.exceptions import ObjectAlreadyAddedException
 from zephyr.common.exceptions import ObjectNotFoundException
 from zephyr.common.file_location import *
+from zephyr.common.log_manager import compress_file
+from zephyr.common.log_manager import get_test_id
+from zephyr.common.log_manager import HOST_NAME
 from zephyr.common.log_manager import LogManager
+from zephyr.common.log_manager import QueueHandler
+from zephyr.common.log_manager import set_test_id
 from zephyr.common.utils import run_unit_test
 
 
@@ -253,6 +262,7 @@ class LogManagerTest(unittest.TestCase):
         # Now run a standard rollover with no params, default log dir should
         # be created and regular log files should be moved and zipped
         lm.rollover_logs_by_date()
+        lm.wait_for_rollover()
         try:
             self.assertTrue(LinuxCLI().exists('./logs/test.log'))
             self.assertTrue(LinuxCLI().exists('./logs/test2.log'))
@@ -271,6 +281,7 @@ class LogManagerTest(unittest.TestCase):
 
         # Same as no-params, just with a specified backup dir
         lm.rollover_logs_by_date(backup_dir='./logbak')
+        lm.wait_for_rollover()
         try:
             self.assertTrue(LinuxCLI().exists('./logs/test.log'))
             self.assertTrue(LinuxCLI().exists('./logs/test2.log'))
@@ -287,6 +298,7 @@ class LogManagerTest(unittest.TestCase):
         # Now use a specific pattern, making it easy to test for
         # the files' existence
         lm.rollover_logs_by_date(date_pattern='%Y')
+        lm.wait_for_rollover()
         try:
             current_year = str(datetime.datetime.now().year)
             self.assertTrue(LinuxCLI().exists('./logs/test.log'))
@@ -320,6 +332,166 @@ class LogManagerTest(unittest.TestCase):
         finally:
             LinuxCLI().rm('./logs')
 
+    def test_rollover_compress_and_prune(self):
+        LinuxCLI().rm('./logs')
+        lm = LogManager('./logs')
+        try:
+            LinuxCLI(priv=False).write_to_file('./logs/test.log',
+                                               'line\n' * 1000)
+            lm.rollover_logs_fresh(date_pattern='%Y')
+            backup = './logs/log_bak/test.log.' + str(
+                datetime.datetime.now().year)
+            self.assertEqual([backup + '.gz'], lm.wait_for_rollover())
+            self.assertFalse(os.path.exists('./logs/test.log'))
+            self.assertFalse(os.path.exists(backup))
+            self.assertEqual(['test.log.' + str(datetime.datetime.now().year) +
+                              '.gz'], os.listdir('./logs/log_bak'))
+            with gzip.open(backup + '.gz') as f:
+                self.assertEqual('line\n' * 1000, f.read())
+            self.assertEqual(None, compress_file(backup))
+
+            # Three old backups, each a second older than the next
+            now = time.time()
+            for i in range(3):
+                LinuxCLI(priv=False).write_to_file(
+                    './logs/log_bak/old.log.' + str(i), 'x' * 100)
+                os.utime('./logs/log_bak/old.log.' + str(i),
+                         (now - 100 + i, now - 100 + i))
+            self.assertEqual(['./logs/log_bak/old.log.0'],
+                             lm.prune_backups(max_age=99.5))
+            # The oldest goes until the rest fit
+            gz_size = os.path.getsize(backup + '.gz')
+            self.assertEqual(['./logs/log_bak/old.log.1'],
+                             lm.prune_backups(max_bytes=gz_size + 100))
+            self.assertEqual(
+                sorted(['old.log.2',
+                        os.path.basename(backup) + '.gz']),
+                sorted(os.listdir('./logs/log_bak')))
+            self.assertEqual([], lm.prune_backups(backup_dir='./nothing',
+                                                  max_bytes=0))
+        finally:
+            lm.stop()
+            LinuxCLI().rm('./logs')
+
+    def test_queued(self):
+        LinuxCLI().rm('./logs')
+
+        lm = LogManager('./logs', queued=True)
+        try:
+            lm.set_default_log_level(logging.DEBUG)
+            log1 = lm.add_file_logger('queued.log', name='queued1')
+            log2 = lm.add_split_logger('queued-split1.log',
+                                       'queued-split2.log', name='queued2',
+                                       file2_log_level=logging.WARNING)
+            self.assertEqual(1, len(log1.handlers))
+            self.assertIsInstance(log1.handlers[0], QueueHandler)
+
+            for i in range(0, 100):
+                log1.debug('line %d', i)
+            log2.info('info')
+            log2.warning('warning')
+            try:
+                raise ValueError('bad value')
+            except ValueError:
+                log1.exception('caught')
+
+            lm.flush()
+            lines = LinuxCLI().read_from_file(
+                './logs/queued.log').splitlines()
+            self.assertEqual(100, len([l for l in lines if ' - line ' in l]))
+            self.assertTrue(lines[0].endswith('DEBUG - line 0'))
+            self.assertTrue(lines[99].endswith('DEBUG - line 99'))
+            self.assertTrue(lines[100].endswith('ERROR - caught'))
+            self.assertEqual('ValueError: bad value', lines[-1])
+            self.assertEqual(2, len(LinuxCLI().read_from_file(
+                './logs/queued-split1.log').splitlines()))
+            self.assertEqual(1, len(LinuxCLI().read_from_file(
+                './logs/queued-split2.log').splitlines()))
+
+            # Rollover swaps the handlers behind the queue
+            lm.rollover_logs_by_date(date_pattern='%Y', zip_file=False)
+            current_year = str(datetime.datetime.now().year)
+            self.assertEqual(len(lines), len(LinuxCLI().read_from_file(
+                './logs/log_bak/queued.log.' + current_year).splitlines()))
+            log1.info('after rollover')
+            log2.info('info after rollover')
+            log2.debug('debug after rollover')
+
+            lm.collate_logs('./logs-all')
+            self.assertEqual(1, len(LinuxCLI().read_from_file(
+                './logs-all/queued.log').splitlines()))
+            # Rolled-over handlers keep their levels
+            self.assertEqual(2, len(LinuxCLI().read_from_file(
+                './logs-all/queued-split1.log').splitlines()))
+            self.assertEqual(0, len(LinuxCLI().read_from_file(
+                './logs-all/queued-split2.log').splitlines()))
+
+            # Once stopped, records are written straight away
+            lm.stop()
+            log1.info('after stop')
+            self.assertTrue(LinuxCLI().read_from_file(
+                './logs/queued.log').endswith('INFO - after stop\n'))
+        finally:
+            lm.stop()
+            LinuxCLI().rm('./logs')
+            LinuxCLI().rm('./logs-all')
+
+    def test_json_format(self):
+        LinuxCLI().rm('./logs')
+
+        lm = LogManager('./logs', queued=True)
+        try:
+            lm.set_default_log_level(logging.DEBUG)
+            log = lm.add_file_logger('json.log', name='json',
+                                     format_name='json')
+            self.assertEqual(('json', 0), lm.date_formats['json'])
+
+            log.info('before test')
+            set_test_id('tests.Sample.test_one')
+            log.info('in "test" %d', 1)
+            try:
+                raise ValueError('bad value')
+            except ValueError:
+                log.exception('caught')
+
+            # Other threads run their own tests (or none)
+            def other_thread():
+                self.assertIsNone(get_test_id())
+                set_test_id('tests.Sample.test_two')
+                log.warning('in other test')
+            t = threading.Thread(target=other_thread)
+            t.start()
+            t.join()
+            self.assertEqual('tests.Sample.test_one', get_test_id())
+
+            # The test id is taken when logged, not when written
+            set_test_id(None)
+            lm.flush()
+
+            lines = LinuxCLI().read_from_file('./logs/json.log').splitlines()
+            records = [json.loads(line) for line in lines]
+            self.assertEqual(4, len(records))
+            # The time comes first, for slicing without decoding lines
+            self.assertEqual(['time', 'name', 'level', 'host', 'test_id',
+                              'thread', 'message'],
+                             [k for k, v in json.loads(
+                                 lines[0], object_pairs_hook=list)])
+            self.assertIsNone(records[0]['test_id'])
+            self.assertEqual('tests.Sample.test_one', records[1]['test_id'])
+            self.assertEqual('in "test" 1', records[1]['message'])
+            self.assertEqual('INFO', records[1]['level'])
+            self.assertEqual('json', records[1]['name'])
+            self.assertEqual(HOST_NAME, records[1]['host'])
+            self.assertTrue(records[2]['exception'].endswith(
+                'ValueError: bad value'))
+            self.assertEqual('tests.Sample.test_two', records[3]['test_id'])
+            self.assertLessEqual(records[0]['time'], records[3]['time'])
+            self.assertAlmostEqual(time.time(), records[3]['time'], delta=60)
+        finally:
+            set_test_id(None)
+            lm.stop()
+            LinuxCLI().rm('./logs')
+
     def test_collate(self):
         LinuxCLI().rm('./logs-all')
         LinuxCLI().rm('./logs')
@@ -355,6 +527,21 @@ class LogManagerTest(unittest.TestCase):
             self.assertTrue(LinuxCLI().exists('./logs-all/test2.log'))
             self.assertTrue(LinuxCLI().exists('./logs-all/test3.log.0'))
             self.assertTrue(LinuxCLI().exists('./logs-all/test3.log.1'))
+
+            self.assertEqual(
+                5, lm.merge_collated_logs('./logs-all/merged.log',
+                                          collated_dir='./logs-all'))
+            lines = LinuxCLI().read_from_file(
+                './logs-all/merged.log').splitlines()
+            # The external logs have no timestamps, so they come first
+            self.assertEqual(['[test2.log] data', '[test3.log.0] data2',
+                              '[test3.log.1] data3'], lines[0:3])
+            self.assertTrue(lines[3].startswith('[test-log.log] '))
+            self.assertTrue(lines[3].endswith(' - INFO - test'))
+            self.assertTrue(lines[4].startswith('[test-log2.log] '))
+            self.assertTrue(lines[4].endswith(' - INFO - test2'))
+            self.assertEqual(0, lm.merge_collated_logs(
+                './logs-all/merged.log', collated_dir='./logs'))
         finally:
             LinuxCLI().rm('./logs-all')
             LinuxCLI().rm('./logs')
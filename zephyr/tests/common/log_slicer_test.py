@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import datetime
+import json
 import logging
 import os
 import time
@@ -129,6 +130,231 @@ class LogSlicerTest(unittest.TestCase):
             LinuxCLI().rm('./sliced-logs')
             pass
 
+    def test_log_index(self):
+        LinuxCLI().rm('./logs')
+        LinuxCLI().mkdir('./logs')
+
+        try:
+            base = datetime.datetime(2016, 1, 1, 12, 0, 0)
+            with open('./logs/index-log', 'w') as f:
+                for i in range(0, 200):
+                    f.write((base + datetime.timedelta(seconds=i)).strftime(
+                        '%Y-%m-%d %H:%M:%S,%f')[:-3] +
+                        ' INFO line ' + str(i) + '\n')
+                    if i % 10 == 0:
+                        f.write('Traceback of line ' + str(i) + '\n')
+
+            index = log_slicer.LogIndex('./logs/index-log',
+                                        index_interval=512)
+            index.refresh()
+            self.assertTrue(index.usable())
+            self.assertEqual(('%Y-%m-%d %H:%M:%S,%f', 0),
+                             (index.date_format, index.date_position))
+            self.assertGreater(len(index.offsets), 10)
+            self.assertEqual(index.times, sorted(index.times))
+
+            def slice_lines(start, stop):
+                start_off, end_off = index.byte_range(
+                    base + datetime.timedelta(seconds=start),
+                    base + datetime.timedelta(seconds=stop))
+                with open('./logs/index-log', 'rb') as f:
+                    f.seek(start_off)
+                    return f.read(end_off - start_off).splitlines()
+
+            lines = slice_lines(50, 60)
+            self.assertTrue(lines[0].endswith('INFO line 50'))
+            self.assertTrue(lines[-2].endswith('INFO line 60'))
+            # Untimestamped lines go with the line before them
+            self.assertEqual('Traceback of line 60', lines[-1])
+            self.assertEqual(11 + 2, len(lines))
+
+            self.assertEqual(200 + 20, len(slice_lines(-10, 500)))
+            self.assertEqual([], slice_lines(300, 400))
+            self.assertEqual([], slice_lines(10.5, 10.6))
+
+            # Appended lines are indexed on the next refresh
+            offsets = list(index.offsets)
+            with open('./logs/index-log', 'a') as f:
+                for i in range(200, 300):
+                    f.write((base + datetime.timedelta(seconds=i)).strftime(
+                        '%Y-%m-%d %H:%M:%S,%f')[:-3] +
+                        ' INFO line ' + str(i) + '\n')
+            index.refresh()
+            self.assertEqual(offsets, index.offsets[:len(offsets)])
+            self.assertGreater(len(index.offsets), len(offsets))
+            lines = slice_lines(250, 251)
+            self.assertEqual(2, len(lines))
+            self.assertTrue(lines[0].endswith('INFO line 250'))
+
+            with open('./logs/no-format-log', 'w') as f:
+                f.write('no timestamps here\n')
+            index = log_slicer.get_log_index('./logs/no-format-log')
+            self.assertFalse(index.usable())
+            self.assertIs(index,
+                          log_slicer.get_log_index('./logs/no-format-log'))
+
+            log_slicer.slice_log_files_by_time(
+                log_files=[FileLocation('./logs/index-log'),
+                           FileLocation('./logs/no-format-log')],
+                out_dir='./sliced-logs',
+                slice_start_time=base + datetime.timedelta(seconds=100),
+                slice_stop_time=base + datetime.timedelta(seconds=104),
+                leeway=1)
+            with open('./sliced-logs/index-log.slice') as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines[0].startswith('SLICE OF LOG'))
+            self.assertTrue(lines[1].endswith('INFO line 99'))
+            self.assertTrue(lines[-1].endswith('INFO line 105'))
+            self.assertFalse(os.path.exists(
+                './sliced-logs/no-format-log.slice'))
+
+        finally:
+            LinuxCLI().rm('./logs')
+            LinuxCLI().rm('./sliced-logs')
+
+    def test_slicing_windows(self):
+        LinuxCLI().rm('./logs')
+        LinuxCLI().rm('./sliced-logs')
+        LinuxCLI().mkdir('./logs')
+
+        try:
+            base = datetime.datetime(2016, 1, 1, 12, 0, 0)
+            for name in ['win-log1', 'win-log2']:
+                with open('./logs/' + name, 'w') as f:
+                    for i in range(0, 100):
+                        f.write((base + datetime.timedelta(seconds=i))
+                                .strftime('%Y-%m-%d %H:%M:%S,%f')[:-3] +
+                                ' INFO ' + name + ' line ' + str(i) + '\n')
+            log_files = [FileLocation('./logs/win-log1'),
+                         FileLocation('./logs/win-log2'),
+                         FileLocation('./logs/missing-log')]
+
+            def seconds(i):
+                return base + datetime.timedelta(seconds=i)
+
+            # Overlapping, nested, empty and unordered windows
+            windows = [('./sliced-logs/tc3', seconds(40), seconds(60)),
+                       ('./sliced-logs/tc1', seconds(10), seconds(30)),
+                       ('./sliced-logs/tc2', seconds(20), seconds(50)),
+                       ('./sliced-logs/tc4', seconds(45), seconds(46)),
+                       ('./sliced-logs/tc5', seconds(200), seconds(300))]
+            slices = log_slicer.slice_log_files_by_windows(
+                log_files, windows, leeway=2, processes=2)
+            self.assertEqual(8, len(slices))
+            self.assertFalse(os.path.exists('./sliced-logs/tc5'))
+
+            # The same as slicing each window on its own
+            for out_dir, start, stop in windows[:4]:
+                log_slicer.slice_log_files_by_time(
+                    log_files, out_dir + '-single', start, stop, leeway=2)
+                for name in ['win-log1', 'win-log2']:
+                    with open(out_dir + '/' + name + '.slice') as f:
+                        multi = f.read()
+                    with open(out_dir + '-single/' + name + '.slice') as f:
+                        single = f.read()
+                    self.assertEqual(single, multi)
+
+            with open('./sliced-logs/tc4/win-log2.slice') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(1 + 6, len(lines))
+            self.assertTrue(lines[1].endswith('win-log2 line 43'))
+            self.assertTrue(lines[-1].endswith('win-log2 line 48'))
+
+            self.assertEqual(slices, log_slicer.slice_log_files_by_windows(
+                log_files, windows, leeway=2, processes=1))
+
+        finally:
+            LinuxCLI().rm('./logs')
+            LinuxCLI().rm('./sliced-logs')
+
+    def test_merge_logs(self):
+        LinuxCLI().rm('./logs')
+        LinuxCLI().mkdir('./logs')
+
+        try:
+            base = datetime.datetime(2016, 1, 1, 12, 0, 0)
+            with open('./logs/merge-log1', 'w') as f:
+                for i in range(0, 10, 2):
+                    f.write((base + datetime.timedelta(seconds=i)).strftime(
+                        '%Y-%m-%d %H:%M:%S,%f')[:-3] + ' log1 ' + str(i) +
+                        '\n')
+                f.write('Traceback of log1 8')
+            with open('./logs/merge-log2', 'w') as f:
+                for i in range(1, 10, 2):
+                    f.write((base + datetime.timedelta(seconds=i)).strftime(
+                        '%Y.%m.%d %H:%M:%S.%f') + ' log2 ' + str(i) + '\n')
+            with open('./logs/merge-log3', 'w') as f:
+                f.write('no timestamps here\n')
+
+            count = log_slicer.merge_log_files(
+                [(FileLocation('./logs/merge-log1'), None, 0),
+                 (FileLocation('./logs/merge-log2'),
+                  '%Y.%m.%d %H:%M:%S.%f', 0),
+                 (FileLocation('./logs/merge-log3'), None, 0),
+                 (FileLocation('./logs/missing-log'), None, 0)],
+                './logs/merged/merged.log')
+            self.assertEqual(10, count)
+
+            with open('./logs/merged/merged.log') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(11, len(lines))
+            for i in range(0, 9):
+                tag = '[merge-log' + ('1' if i % 2 == 0 else '2') + '] '
+                self.assertTrue(lines[i].startswith(tag))
+                self.assertTrue(lines[i].endswith(' ' + str(i)))
+            # Untimestamped lines stay with the line before them
+            self.assertEqual('[merge-log1] Traceback of log1 8', lines[9])
+            self.assertTrue(lines[10].endswith('log2 9'))
+
+        finally:
+            LinuxCLI().rm('./logs')
+
+    def test_json_logs(self):
+        LinuxCLI().rm('./logs')
+        LinuxCLI().rm('./sliced-logs')
+
+        try:
+            lm = log_manager.LogManager('./logs')
+            lm.set_default_log_level(logging.DEBUG)
+            log = lm.add_file_logger('json-log', name='json-slicer',
+                                     format_name='json')
+            for i in range(0, 6):
+                log_manager.set_test_id('tests.T.test_' + str(i % 2))
+                log.info('line ' + str(i))
+            log_manager.set_test_id(None)
+            log.info('no test')
+
+            self.assertTrue(log_slicer.is_json_log('./logs/json-log'))
+            index = log_slicer.get_log_index('./logs/json-log')
+            self.assertEqual(log_slicer.JSON_LOG_FORMAT, index.date_format)
+
+            # Slices of JSON logs have no header, so stay JSON lines
+            log_slicer.slice_log_files_by_time(
+                log_files=[FileLocation('./logs/json-log')],
+                out_dir='./sliced-logs/by-time',
+                slice_start_time=datetime.datetime.now() -
+                datetime.timedelta(seconds=60),
+                slice_stop_time=datetime.datetime.now() +
+                datetime.timedelta(seconds=60))
+            with open('./sliced-logs/by-time/json-log.slice') as f:
+                self.assertEqual(7, len([json.loads(l) for l in f]))
+
+            slices = log_slicer.slice_json_logs_by_test(
+                [FileLocation('./logs/json-log'),
+                 FileLocation('./logs/missing-log')],
+                {'tests.T.test_1': './sliced-logs/test_1',
+                 'tests.T.test_3': './sliced-logs/test_3'})
+            self.assertEqual(['./sliced-logs/test_1/json-log.slice'], slices)
+            with open(slices[0]) as f:
+                records = [json.loads(l) for l in f]
+            self.assertEqual(['line 1', 'line 3', 'line 5'],
+                             [r['message'] for r in records])
+
+        finally:
+            log_manager.set_test_id(None)
+            LinuxCLI().rm('./logs')
+            LinuxCLI().rm('./sliced-logs')
+
     @classmethod
     def tearDownClass(cls):
         LinuxCLI().rm('log_file.txt')
@@ -0,0 +1,130 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import os
+import unittest
+from zephyr.common.cli import LinuxCLI
+from zephyr.common.cli import NetNSCLI
+from zephyr.common.exceptions import *
+from zephyr.common.ip import IP
+from zephyr.common import netlink
+from zephyr.common.utils import run_unit_test
+
+
+class NetlinkTest(unittest.TestCase):
+    def test_rtattr(self):
+        self.assertEqual('\x09\x00\x03\x00eth0\x00\x00\x00\x00',
+                         netlink.rtattr_str(netlink.IFLA_IFNAME, 'eth0'))
+        # Unicode names (as read from JSON) mustn't taint the binary data
+        self.assertEqual(
+            str, type(netlink.rtattr_str(netlink.IFLA_IFNAME, u'eth0') +
+                      netlink.rtattr_u32(netlink.IFLA_MASTER, 255)))
+        self.assertEqual('\x08\x00\x0a\x00\x05\x00\x00\x00',
+                         netlink.rtattr_u32(netlink.IFLA_MASTER, 5))
+        self.assertEqual(
+            {netlink.IFLA_IFNAME: 'eth0\x00', netlink.IFLA_MASTER:
+             '\x05\x00\x00\x00'},
+            netlink.parse_rtattrs(
+                netlink.rtattr_str(netlink.IFLA_IFNAME, 'eth0') +
+                netlink.rtattr_u32(netlink.IFLA_MASTER, 5)))
+
+    def test_route_dest(self):
+        self.assertEqual(('0.0.0.0', 0), netlink.route_dest('default'))
+        self.assertEqual(('0.0.0.0', 0),
+                         netlink.route_dest(IP('0.0.0.0', '0')))
+        self.assertEqual(('10.0.0.0', 8), netlink.route_dest('10.0.0.0/8'))
+        self.assertEqual(('10.0.0.1', 32), netlink.route_dest('10.0.0.1'))
+
+    @unittest.skipUnless(os.geteuid() == 0, 'Requires root')
+    def test_batch_configure(self):
+        LinuxCLI().cmd('ip netns add nltest')
+        root = netlink.IPRoute()
+        ns = netlink.IPRoute('nltest')
+        try:
+            with root.batch():
+                root.add_bridge('nltestbr')
+                root.add_veth('nltesti', 'eth0', peer_netns='nltest')
+                root.set_link('nltesti', up=True, master='nltestbr')
+                root.set_link('nltestbr', up=True)
+                root.add_addr('nltestbr', IP('172.31.250.1', '24'))
+
+            with ns.batch():
+                ns.set_link('eth0', up=True, mac='02:00:00:00:00:05')
+                ns.add_addr('eth0', IP('172.31.250.2', '24'))
+                ns.add_route('default', IP('172.31.250.1'))
+                ns.add_route(IP('172.31.0.0', '16'), dev='eth0')
+
+            ns_cli = NetNSCLI('nltest')
+            self.assertIn('nltestbr',
+                          LinuxCLI().cmd('ip l show nltesti').stdout)
+            self.assertIn('172.31.250.1/24',
+                          LinuxCLI().cmd('ip a show nltestbr').stdout)
+            self.assertIsNotNone(root.link_index('nltesti'))
+            self.assertIsNone(root.link_index('eth0.nltest'))
+
+            eth0 = ns_cli.cmd('ip a show eth0').stdout
+            self.assertIn('02:00:00:00:00:05', eth0)
+            self.assertIn('172.31.250.2/24', eth0)
+            routes = ns_cli.cmd('ip route').stdout
+            self.assertIn('default via 172.31.250.1 dev eth0', routes)
+            self.assertIn('172.31.0.0/16 dev eth0', routes)
+
+            with ns.batch():
+                ns.del_route('default')
+                ns.del_addr('eth0', IP('172.31.250.2', '24'))
+                ns.set_link('eth0', up=False, new_name='eth1')
+
+            self.assertNotIn('default', ns_cli.cmd('ip route').stdout)
+            self.assertNotIn('172.31.250.2',
+                             ns_cli.cmd('ip a show eth1').stdout)
+            self.assertNotIn('UP', ns_cli.cmd('ip l show eth1').stdout)
+
+            root.del_link('nltesti')
+            self.assertIsNone(root.link_index('nltesti'))
+        finally:
+            root.close()
+            ns.close()
+            LinuxCLI().cmd('ip l del nltestbr')
+            LinuxCLI().cmd('ip l del nltesti')
+            LinuxCLI().cmd('ip netns del nltest')
+
+    @unittest.skipUnless(os.geteuid() == 0, 'Requires root')
+    def test_errors(self):
+        checked = netlink.IPRoute()
+        try:
+            checked.del_link('nltest-none')
+        except SubprocessFailedException:
+            pass
+        else:
+            self.fail('Deleting a missing interface should fail')
+        finally:
+            checked.close()
+
+        # Unchecked failures are only recorded, and don't stop the rest of
+        # the batch
+        unchecked = netlink.IPRoute(check=False)
+        try:
+            with unchecked.batch():
+                unchecked.del_link('nltest-none')
+                unchecked.add_bridge('nltestbr')
+            self.assertEqual([('del link nltest-none', errno.ENODEV)],
+                             unchecked.errors)
+            self.assertIsNotNone(unchecked.link_index('nltestbr'))
+        finally:
+            unchecked.del_link('nltestbr')
+            unchecked.close()
+
+
+run_unit_test(NetlinkTest)
@@ -0,0 +1,117 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from zephyr.common.packet_builder import *
+from zephyr.common.pcap_packet import PCAPPacket
+from zephyr.common.utils import run_unit_test
+
+MAC1 = '00:11:22:33:44:55'
+MAC2 = '66:77:88:99:aa:bb'
+
+
+def parse(frame):
+    return PCAPPacket(frame, '').parse()
+
+
+class PacketBuilderTest(unittest.TestCase):
+    def test_checksum(self):
+        # Example header from RFC 1071 discussions (checksum field zeroed)
+        header = ('\x45\x00\x00\x73\x00\x00\x40\x00\x40\x11\x00\x00'
+                  '\xc0\xa8\x00\x01\xc0\xa8\x00\xc7')
+        self.assertEqual(0xb861, checksum(header))
+        self.assertEqual(0, checksum(header[:10] + '\xb8\x61' + header[12:]))
+        self.assertEqual(0xfeff, checksum('\x01'))
+
+    def test_ethernet_arp(self):
+        frame = build_frame([Ethernet(MAC1),
+                             ARP(MAC1, '10.0.0.1', '10.0.0.2')])
+        self.assertEqual(ETHERNET_MIN_FRAME_SIZE, len(frame))
+        layers = parse(frame)
+        self.assertEqual(BROADCAST_MAC, layers['ethernet'].dest_mac)
+        self.assertEqual(MAC1, layers['ethernet'].source_mac)
+        self.assertEqual(ETHERNET_PROTOCOL_TYPE_ARP, layers['ethernet'].type)
+        arp = layers['arp']
+        self.assertEqual(ARP_PROTOCOL_OPERATION_REQUEST, arp.operation)
+        self.assertEqual(MAC1, arp.sender_hw_addr_ether)
+        self.assertEqual('10.0.0.1', arp.sender_ip_addr)
+        self.assertEqual(ZERO_MAC, arp.target_hw_addr_ether)
+        self.assertEqual('10.0.0.2', arp.target_ip_addr)
+
+    def test_ip4_tcp(self):
+        ip = IP4('10.0.0.1', '10.0.0.2', ttl=12)
+        frame = build_frame(
+            [Ethernet(MAC1, MAC2), ip,
+             TCP(1234, 80, seq=7, flags=parse_tcp_flags('syn|ack'))],
+            'data')
+        layers = parse(frame)
+        self.assertEqual(MAC2, layers['ethernet'].dest_mac)
+        self.assertEqual(IP4_PROTOCOL_TCP, layers['ip'].protocol)
+        self.assertEqual('10.0.0.1', layers['ip'].source_ip)
+        self.assertEqual('10.0.0.2', layers['ip'].dest_ip)
+        tcp = layers['tcp']
+        self.assertEqual(1234, tcp.source_port)
+        self.assertEqual(80, tcp.dest_port)
+        self.assertEqual(7, tcp.seq)
+        self.assertEqual(TCP_PROTOCOL_FLAG_SYN | TCP_PROTOCOL_FLAG_ACK,
+                         tcp.flags & 0x1ff)
+        # Padded up to the Ethernet minimum after the payload
+        self.assertEqual(ETHERNET_MIN_FRAME_SIZE, len(frame))
+        self.assertEqual('data', frame[54:58])
+
+        ip_packet = frame[14:]
+        self.assertEqual(0, checksum(ip_packet[0:20]))
+        self.assertEqual(12, ord(ip_packet[8]))
+        segment = ip_packet[20:44]
+        self.assertEqual(
+            0, checksum(ip.pseudo_header(IP4_PROTOCOL_TCP, len(segment)) +
+                        segment))
+
+    def test_ip4_udp_icmp(self):
+        ip = IP4('10.0.0.1', '10.0.0.2')
+        frame = build_frame([Ethernet(MAC1, MAC2), ip, UDP(53, 5353)], 'x')
+        layers = parse(frame)
+        self.assertEqual(53, layers['udp'].source_port)
+        self.assertEqual(5353, layers['udp'].dest_port)
+        self.assertEqual(9, layers['udp'].length)
+        datagram = frame[34:34 + 9]
+        self.assertEqual(
+            0, checksum(ip.pseudo_header(IP4_PROTOCOL_UDP, 9) + datagram))
+
+        frame = build_frame([Ethernet(MAC1, MAC2), ip, ICMP(id=3, seq=4)],
+                            'ping')
+        layers = parse(frame)
+        self.assertEqual(ICMP_PROTOCOL_TYPE_ECHO_REQUEST,
+                         layers['icmp'].type)
+        self.assertEqual(0, checksum(frame[34:34 + 12]))
+
+    def test_ip4_total_length(self):
+        frame = build_frame([Ethernet(MAC1, MAC2, pad=False),
+                             IP4('10.0.0.1', '10.0.0.2', protocol=99,
+                                 total_length=30)])
+        self.assertEqual(14 + 30, len(frame))
+        # Total length and protocol fields
+        self.assertEqual('\x00\x1e', frame[16:18])
+        self.assertEqual(99, ord(frame[23]))
+
+    def test_bad_input(self):
+        self.assertRaises(ArgMismatchException, encode_mac_address, '00:11')
+        self.assertRaises(ArgMismatchException, encode_mac_address,
+                          'zz:11:22:33:44:55')
+        self.assertRaises(ArgMismatchException, encode_ip4, '1.2.3')
+        self.assertRaises(ArgMismatchException, parse_tcp_flags, 'syn|bogus')
+        self.assertEqual(TCP_PROTOCOL_FLAG_FINAL | TCP_PROTOCOL_FLAG_ACK,
+                         parse_tcp_flags('FIN, ack'))
+
+run_unit_test(PacketBuilderTest)
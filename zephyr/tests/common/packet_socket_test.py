@@ -0,0 +1,91 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+import time
+import unittest
+from zephyr.common.exceptions import *
+from zephyr.common import packet_socket
+from zephyr.common.utils import run_unit_test
+
+
+def send_udp():
+    time.sleep(0.5)
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.sendto('test', ('127.0.0.1', 6055))
+    s.close()
+
+
+class PacketSocketTest(unittest.TestCase):
+    def test_parse_bpf_program(self):
+        prog = packet_socket.parse_bpf_program(
+            '4\n40 0 0 12\n21 0 1 2048\n6 0 0 262144\n6 0 0 0\n')
+        self.assertEqual(4, len(prog))
+        self.assertEqual((40, 0, 0, 12), prog[0])
+        self.assertEqual((21, 0, 1, 2048), prog[1])
+        self.assertEqual((6, 0, 0, 0), prog[3])
+
+        try:
+            packet_socket.parse_bpf_program('3\n40 0 0 12\n6 0 0 0\n')
+        except ArgMismatchException:
+            pass
+        else:
+            self.fail('Truncated BPF program should fail to parse')
+
+    def test_make_sll_header(self):
+        header = packet_socket.make_sll_header(
+            0, 1, '\x0a\xdb\x0a\xdb\x0a\xdb', 0x0800)
+        self.assertEqual(16, len(header))
+        self.assertEqual(
+            [0x00, 0x00, 0x00, 0x01, 0x00, 0x06,
+             0x0a, 0xdb, 0x0a, 0xdb, 0x0a, 0xdb, 0x00, 0x00,
+             0x08, 0x00],
+            list(bytearray(header)))
+
+    def test_recv_packet(self):
+        psock = packet_socket.PacketSocket(interface='lo')
+        psock.open()
+        try:
+            threading.Thread(target=send_udp).start()
+            ret = None
+            deadline = time.time() + 3
+            while ret is None and time.time() < deadline:
+                ret = psock.recv_packet(timeout=1)
+                if ret is not None and '\x17\xa7' not in ret[0][34:38]:
+                    ret = None
+            self.assertIsNotNone(ret)
+            data, (sec, usec) = ret
+            self.assertIsInstance(sec, (int, long))
+            self.assertIsInstance(usec, (int, long))
+            self.assertTrue(0 <= usec < 1000000)
+            self.assertAlmostEqual(time.time(), sec, delta=5)
+            # Ethernet + IP + UDP headers + payload
+            self.assertEqual(14 + 20 + 8 + 4, len(data))
+            self.assertEqual('test', data[-4:])
+        finally:
+            psock.close()
+
+    def test_reject_filter(self):
+        # A single "ret #0" instruction drops every frame
+        psock = packet_socket.PacketSocket(interface='lo',
+                                           bpf_program=[(6, 0, 0, 0)])
+        psock.open()
+        try:
+            threading.Thread(target=send_udp).start()
+            self.assertIsNone(psock.recv_packet(timeout=1.5))
+        finally:
+            psock.close()
+
+run_unit_test(PacketSocketTest)
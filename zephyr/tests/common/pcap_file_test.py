@@ -0,0 +1,134 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import struct
+import unittest
+from zephyr.common.exceptions import *
+from zephyr.common import pcap_file
+from zephyr.common import pcap_packet
+from zephyr.common.utils import run_unit_test
+
+TCP_PACKET_DATA = \
+    [0x52, 0x54, 0x00, 0x12, 0x35, 0x02, 0x08, 0x00,
+     0x27, 0xc6, 0x25, 0x01, 0x08, 0x00, 0x45, 0x10,
+     0x00, 0x5c, 0x93, 0x06, 0x40, 0x00, 0x40, 0x06,
+     0x8f, 0x75, 0x0a, 0x00, 0x02, 0x0f, 0x0a, 0x00,
+     0x02, 0x02, 0x00, 0x16, 0xd1, 0xf4, 0x52, 0x1a,
+     0x58, 0x7c, 0x58, 0x25, 0x2e, 0x9b, 0x50, 0x18,
+     0x9f, 0xb0, 0x18, 0x5f, 0x00, 0x00, 0x00, 0x00,
+     0x00]
+
+SLL_ARP_PACKET_DATA = \
+    [0x00, 0x04, 0x00, 0x01, 0x00, 0x06, 0x08, 0x00,
+     0x27, 0xc6, 0x25, 0x01, 0x00, 0x00, 0x08, 0x06,
+     0x00, 0x01, 0x08, 0x00, 0x06, 0x04, 0x00, 0x01,
+     0x08, 0x00, 0x27, 0x7a, 0x9d, 0xff, 0xc0, 0xa8,
+     0x01, 0x0a, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+     0xc0, 0xa8, 0x01, 0x01]
+
+TEST_FILE = 'test.pcap'
+
+
+class PCAPFileTest(unittest.TestCase):
+    def write_packets(self, pcapng, link_type=pcap_file.LINKTYPE_ETHERNET,
+                      data=TCP_PACKET_DATA, count=3, snaplen=None):
+        with pcap_file.PCAPFileWriter(
+                TEST_FILE, link_type=link_type, pcapng=pcapng,
+                snaplen=(snaplen if snaplen is not None
+                         else pcap_file.DEFAULT_SNAPLEN)) as writer:
+            for i in range(0, count):
+                writer.write_packet(pcap_packet.PCAPPacket(
+                    data, '', epoch_time=1460000000.000001 + i))
+
+    def check_read_packets(self):
+        with pcap_file.PCAPFileReader(TEST_FILE) as reader:
+            packets = list(reader)
+            self.assertEqual(pcap_file.LINKTYPE_ETHERNET, reader.link_type)
+
+        self.assertEqual(3, len(packets))
+        for i, packet in enumerate(packets):
+            self.assertEqual(bytes(bytearray(TCP_PACKET_DATA)),
+                             packet.packet_data)
+            self.assertAlmostEqual(1460000000.000001 + i, packet.epoch_time,
+                                   places=5)
+            self.assertEqual(
+                pcap_packet.format_timestamp(packet.epoch_time),
+                packet.timestamp)
+            pmap = packet.parse()
+            self.assertEqual('10.0.2.15', pmap['ip'].source_ip)
+            self.assertEqual(53748, pmap['tcp'].dest_port)
+
+    def test_pcap_round_trip(self):
+        self.write_packets(pcapng=False)
+        self.check_read_packets()
+
+    def test_pcapng_round_trip(self):
+        self.write_packets(pcapng=True)
+        self.check_read_packets()
+
+    def test_sll_link_type(self):
+        self.write_packets(pcapng=True,
+                           link_type=pcap_file.LINKTYPE_LINUX_SLL,
+                           data=SLL_ARP_PACKET_DATA, count=1)
+        with pcap_file.PCAPFileReader(TEST_FILE) as reader:
+            packet = next(iter(reader))
+            pmap = packet.parse(
+                pcap_file.link_type_parse_stack(reader.link_type))
+        self.assertEqual(pcap_packet.PCAPSLL, type(pmap['ethernet']))
+        self.assertEqual('192.168.1.10', pmap['arp'].sender_ip_addr)
+
+    def test_snaplen(self):
+        self.write_packets(pcapng=False, count=1, snaplen=34)
+        with pcap_file.PCAPFileReader(TEST_FILE) as reader:
+            packet = next(iter(reader))
+        self.assertEqual(34, len(packet.packet_data))
+        pmap = packet.parse(
+            [None, pcap_packet.PCAPIP4, pcap_packet.PCAPEthernet])
+        self.assertEqual('10.0.2.2', pmap['ip'].dest_ip)
+
+    def test_nanosecond_big_endian_pcap(self):
+        data = bytes(bytearray(TCP_PACKET_DATA))
+        with open(TEST_FILE, 'wb') as f:
+            f.write(struct.pack('>IHHiIII', pcap_file.PCAP_MAGIC_NSEC,
+                                2, 4, 0, 0, 65535, 1))
+            f.write(struct.pack('>IIII', 1460000000, 500000000,
+                                len(data), len(data)) + data)
+        with pcap_file.PCAPFileReader(TEST_FILE) as reader:
+            packets = list(reader)
+        self.assertEqual(1, len(packets))
+        self.assertAlmostEqual(1460000000.5, packets[0].epoch_time)
+
+    def test_truncated_file(self):
+        self.write_packets(pcapng=False)
+        with open(TEST_FILE, 'r+b') as f:
+            f.truncate(os.path.getsize(TEST_FILE) - 10)
+        with pcap_file.PCAPFileReader(TEST_FILE) as reader:
+            self.assertEqual(2, len(list(reader)))
+
+    def test_bad_file(self):
+        with open(TEST_FILE, 'wb') as f:
+            f.write('not a capture file')
+        try:
+            list(pcap_file.PCAPFileReader(TEST_FILE))
+        except ArgMismatchException:
+            pass
+        else:
+            self.fail('Reading a non-capture file should fail')
+
+    def tearDown(self):
+        if os.path.exists(TEST_FILE):
+            os.remove(TEST_FILE)
+
+run_unit_test(PCAPFileTest)
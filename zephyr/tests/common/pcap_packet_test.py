@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import pickle
 import unittest
 from zephyr.common import pcap_packet
 from zephyr.common.utils import run_unit_test
@@ -723,5 +724,61 @@ class PCAPPacketTest(unittest.TestCase):
         self.assertEqual(
             pcap_packet.PCAPIP4, pmap['ethernet'].next_parse_recommendation)
 
+    def test_bytes_packet_lazy_decoding(self):
+        full_eii_packet_data = bytes(bytearray(
+            [0x52, 0x54, 0x00, 0x12, 0x35, 0x02, 0x08, 0x00,
+             0x27, 0xc6, 0x25, 0x01, 0x08, 0x00, 0x45, 0x10,
+             0x00, 0x20, 0x93, 0x06, 0x40, 0x00, 0x40, 0x11,
+             0x8f, 0x75, 0x0a, 0x00, 0x02, 0x0f, 0x0a, 0x00,
+             0x02, 0x02, 0x00, 0x16, 0x00, 0x1c, 0x00, 0x0c,
+             0x00, 0x00, 0xDE, 0xAD, 0xBE, 0xEF]))
+
+        packet = pcap_packet.PCAPPacket(full_eii_packet_data, '13:00')
+        self.assertIs(full_eii_packet_data, packet.packet_data)
+        pmap = packet.parse()
+
+        ip_layer = pmap['ip']
+        # Address strings are only decoded when first read
+        self.assertFalse(hasattr(ip_layer, '_source_ip'))
+        self.assertEqual('10.0.2.15', ip_layer.source_ip)
+        self.assertTrue(hasattr(ip_layer, '_source_ip'))
+        self.assertFalse(hasattr(ip_layer, '_dest_ip'))
+
+        self.assertEqual(
+            pcap_packet.PCAPUDP, type(pmap['udp']))
+        self.assertEqual(
+            22, pmap['udp'].source_port)
+        self.assertEqual(
+            28, pmap['udp'].dest_port)
+        self.assertEqual(
+            '52:54:00:12:35:02', pmap['ethernet'].dest_mac)
+
+        # Layers hold views on the packet, not copies
+        self.assertEqual(memoryview, type(pmap['udp'].data))
+        self.assertEqual('\xde\xad\xbe\xef', pmap['udp'].data[8:].tobytes())
+
+    def test_unparsed_layer_defaults(self):
+        ip_layer = pcap_packet.PCAPIP4()
+        self.assertEqual('', ip_layer.source_ip)
+        tcp_layer = pcap_packet.PCAPTCP()
+        self.assertEqual(0, tcp_layer.source_port)
+        self.assertFalse(tcp_layer.is_flag_set(
+            pcap_packet.TCP_PROTOCOL_FLAG_SYN))
+
+    def test_pickle_parsed_packet(self):
+        packet = pcap_packet.PCAPPacket(
+            [0x52, 0x54, 0x00, 0x12, 0x35, 0x02, 0x08, 0x00,
+             0x27, 0xc6, 0x25, 0x01, 0x08, 0x06, 0x00, 0x01,
+             0x08, 0x00, 0x06, 0x04, 0x00, 0x01, 0x08, 0x00,
+             0x27, 0x7a, 0x9d, 0xff, 0xc0, 0xa8, 0x01, 0x0a,
+             0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xc0, 0xa8,
+             0x01, 0x01], '13:00')
+        packet.parse()
+
+        new_packet = pickle.loads(pickle.dumps(packet, 2))
+        self.assertEqual('13:00', new_packet.timestamp)
+        self.assertEqual(packet.packet_data, new_packet.packet_data)
+        self.assertEqual(
+            '192.168.1.10', new_packet.parse()['arp'].sender_ip_addr)
 
 run_unit_test(PCAPPacketTest)
@@ -0,0 +1,120 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+import unittest
+from zephyr.common.cli import LinuxCLI
+from zephyr.common import process_table
+from zephyr.common.utils import run_unit_test
+
+
+class ProcessTableTest(unittest.TestCase):
+    def test_read_process(self):
+        proc_dir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(proc_dir, '123'))
+            with open(os.path.join(proc_dir, '123', 'stat'), 'w') as f:
+                f.write('123 (odd (name) here) S 45 123 120 0 -1 4194560\n')
+            with open(os.path.join(proc_dir, '123', 'cmdline'), 'w') as f:
+                f.write('/bin/odd\0--flag\0')
+            os.mkdir(os.path.join(proc_dir, 'self'))
+
+            p = process_table.read_process(123, proc_dir)
+            self.assertEqual(123, p.pid)
+            self.assertEqual(45, p.ppid)
+            self.assertEqual(123, p.pgid)
+            self.assertEqual(120, p.sid)
+            self.assertEqual('S', p.state)
+            self.assertEqual('odd (name) here', p.name)
+            self.assertEqual('/bin/odd --flag', p.command())
+            self.assertIsNone(process_table.read_process(124, proc_dir))
+
+            snapshot = process_table.ProcessTable(proc_dir).snapshot()
+            self.assertEqual([123], snapshot.pids())
+            self.assertEqual([123], snapshot.children(45))
+            self.assertEqual([123], snapshot.session(120))
+            self.assertEqual([123], snapshot.named('odd (name) here'))
+            self.assertEqual([123], snapshot.find('--fl'))
+        finally:
+            shutil.rmtree(proc_dir)
+
+    def test_snapshot(self):
+        table = process_table.ProcessTable(max_age=60)
+        process = subprocess.Popen(['sleep', '5'])
+        try:
+            snapshot = table.snapshot()
+            self.assertIn(os.getpid(), snapshot.pids())
+            self.assertIn(process.pid, snapshot.children(os.getpid()))
+            self.assertIn(process.pid, snapshot.named('sleep'))
+            self.assertIn(process.pid, snapshot.find('sleep 5'))
+            self.assertIn(process.pid,
+                          snapshot.session(snapshot.get(os.getpid()).sid))
+            self.assertEqual(['sleep', '5'],
+                             snapshot.get(process.pid).cmdline)
+
+            # Reused until invalidated
+            self.assertIs(snapshot, table.snapshot())
+            table.invalidate()
+            self.assertIsNot(snapshot, table.snapshot())
+            self.assertIsNot(snapshot, table.snapshot(max_age=0))
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_is_running(self):
+        table = process_table.ProcessTable()
+        process = subprocess.Popen(['sleep', '0.1'])
+        self.assertTrue(table.is_running(process.pid))
+        self.assertTrue(table.is_running(str(process.pid)))
+        time.sleep(0.5)
+
+        # Exited, but not reaped yet
+        self.assertTrue(table.is_running(process.pid))
+        self.assertFalse(table.is_running(process.pid, include_exited=False))
+        process.wait()
+        self.assertFalse(table.is_running(process.pid))
+
+    def test_linux_cli(self):
+        cli = LinuxCLI()
+        ps_pids = set(cli.cmd('ps -e -o pid=').stdout.split())
+        pids = cli.get_running_pids()
+        # Only 'ps' itself (and its shell) may differ
+        self.assertLessEqual(len(ps_pids.symmetric_difference(pids)), 2)
+        self.assertIn(str(os.getpid()), pids)
+        self.assertTrue(cli.is_pid_running(os.getpid()))
+        self.assertFalse(cli.is_pid_running(2 ** 22 + 1))
+
+        # The shell only starts its child once it reads a line
+        process = subprocess.Popen(['sh', '-c', 'read x; sleep 5'],
+                                   stdin=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        children = []
+        try:
+            self.assertEqual([], cli.get_parent_pids(process.pid))
+            process.stdin.write('\n')
+            process.stdin.flush()
+            children = cli.get_parent_pids(process.pid, timeout=5)
+            self.assertEqual(1, len(children))
+            self.assertIn(children[0], cli.get_process_pids('sleep 5'))
+        finally:
+            for pid in children:
+                os.kill(int(pid), signal.SIGTERM)
+            process.communicate()
+
+run_unit_test(ProcessTableTest)
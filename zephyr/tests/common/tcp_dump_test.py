@@ -14,6 +14,7 @@
 
 import unittest
 from zephyr.common import pcap
+from zephyr.common.pcap_file import PCAPFileReader
 from zephyr.common.tcp_dump import *
 from zephyr.common.tcp_sender import TCPSender
 from zephyr.common.utils import run_unit_test
@@ -282,6 +283,57 @@ class TCPDumpTest(unittest.TestCase):
         finally:
             tcpd.stop_capture()
 
+    def test_sniff_host_packet_socket(self):
+        tcpd = TCPDump(engine=CAPTURE_ENGINE_PACKET_SOCKET)
+        tcps = TCPSender()
+        try:
+            out = LinuxCLI().cmd(
+                'ip l | grep "LOOPBACK" | cut -f 2 -d " "| cut -f 1 -d ":"')\
+                .stdout
+            lo_iface = out.split()[0].rstrip()
+            tcpd.start_capture(
+                interface=lo_iface, count=1,
+                pcap_filter=pcap.And(
+                    [pcap.Port(6015, proto='tcp', source=True),
+                     pcap.Port(6055, proto='tcp', dest=True)]))
+            tcps.start_send(interface=lo_iface, packet_type='tcp', count=1,
+                            source_ip='127.0.0.1', dest_ip='127.0.0.1',
+                            dest_port=6055, source_port=6015)
+
+            ret = tcpd.wait_for_packets(count=1, timeout=3)
+            self.assertEqual(1, len(ret))
+            pmap = ret[0].parse()
+            self.assertEqual(6015, pmap['tcp'].source_port)
+            self.assertEqual(6055, pmap['tcp'].dest_port)
+        finally:
+            tcpd.stop_capture()
+
+    def test_save_dump_file_packet_socket(self):
+        tcpd = TCPDump(engine=CAPTURE_ENGINE_PACKET_SOCKET)
+        tcps = TCPSender()
+        try:
+            # No filter, so the BPF compile (through tcpdump) isn't needed
+            tcpd.start_capture(interface='lo', count=1,
+                               save_dump_file=True,
+                               save_dump_filename='tcp.out')
+            tcps.start_send(interface='lo', packet_type='tcp', count=1,
+                            source_ip='127.0.0.1', dest_ip='127.0.0.1',
+                            dest_port=6055, source_port=6015)
+
+            ret = tcpd.wait_for_packets(count=1, timeout=3)
+            self.assertEqual(1, len(ret))
+        finally:
+            tcpd.stop_capture()
+
+        with PCAPFileReader('tcp.out') as reader:
+            saved = list(reader)
+        self.assertEqual(1, len(saved))
+        self.assertEqual(bytes(ret[0].packet_data), saved[0].packet_data)
+        self.assertEqual(ret[0].timestamp, saved[0].timestamp)
+        self.assertAlmostEqual(ret[0].epoch_time, saved[0].epoch_time,
+                               places=5)
+        self.assertAlmostEqual(time.time(), saved[0].epoch_time, delta=10)
+
     def tearDown(self):
         time.sleep(2)
         LinuxCLI().rm('tcp.callback.out')
@@ -12,11 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 import unittest
+from zephyr.common.pcap_packet import PCAPPacket
+from zephyr.common import packet_socket
 from zephyr.common.tcp_sender import *
 from zephyr.common.utils import run_unit_test
 
 
+def capture_udp(psock, port, count, timeout=3):
+    packets = []
+    deadline = time.time() + timeout
+    while len(packets) < count and time.time() < deadline:
+        ret = psock.recv_packet(timeout=0.1)
+        if ret is None:
+            continue
+        packet = PCAPPacket(ret[0], '')
+        layers = packet.parse()
+        if 'udp' in layers and layers['udp'].dest_port == port:
+            packets.append(layers)
+    return packets
+
+
 class TCPSenderTest(unittest.TestCase):
     def test_send_packet_default(self):
         cli = LinuxCLI(debug=True)
@@ -119,4 +136,94 @@ class TCPSenderTest(unittest.TestCase):
         self.assertTrue('icmp' not in out)
         self.assertTrue('targetip' not in out)
 
+    def test_build_packet(self):
+        psock = packet_socket.PacketSocket(interface='lo')
+        psock.open()
+        try:
+            frame = build_packet(
+                psock, packet_type='tcp', dest_ip='127.0.0.2',
+                dest_mac='00:11:22:33:44:55', source_port=22, dest_port=80,
+                packet_options={'flags': 'syn|ack', 'ttl': '5'},
+                payload='hello')
+            layers = PCAPPacket(frame, '').parse()
+            self.assertEqual('00:11:22:33:44:55',
+                             layers['ethernet'].dest_mac)
+            # Source MAC and IP default to the interface's
+            self.assertEqual(psock.hw_address(),
+                             layers['ethernet'].source_mac)
+            self.assertEqual('127.0.0.1', layers['ip'].source_ip)
+            self.assertEqual('127.0.0.2', layers['ip'].dest_ip)
+            self.assertEqual(22, layers['tcp'].source_port)
+            self.assertEqual(80, layers['tcp'].dest_port)
+            self.assertEqual(0x12, layers['tcp'].flags & 0x1ff)
+            self.assertEqual(5, ord(frame[22]))
+
+            options = {'command': 'reply', 'sip': '1.1.1.1'}
+            frame = build_packet(
+                psock, packet_type='arp', dest_ip='2.2.2.2',
+                dest_mac='00:11:22:33:44:55', packet_options=options)
+            layers = PCAPPacket(frame, '').parse()
+            self.assertEqual('1.1.1.1', layers['arp'].sender_ip_addr)
+            self.assertEqual('2.2.2.2', layers['arp'].target_ip_addr)
+            self.assertEqual('00:11:22:33:44:55',
+                             layers['arp'].target_hw_addr_ether)
+            # The caller's options are left alone, for an mz fallback
+            self.assertEqual('reply', options['command'])
+
+            frame = build_packet(psock, dest_mac='00:11:22:33:44:55',
+                                 byte_data='ff:ff:ff:ff:ff:ff 00 00 00 00 '
+                                           '00 00 08 06')
+            self.assertEqual('\x00\x11\x22\x33\x44\x55', frame[0:6])
+            self.assertEqual(14, len(frame))
+
+            self.assertRaises(ArgMismatchException, build_packet, psock,
+                              packet_type='icmp', dest_ip='127.0.0.1',
+                              packet_options={'sip': '1.1.1.1'})
+            self.assertRaises(ArgMismatchException, build_packet, psock,
+                              packet_type='dns', dest_ip='127.0.0.1')
+            self.assertRaises(ArgMismatchException, build_packet, psock,
+                              packet_type='udp', dest_ip='127.0.0.1',
+                              packet_options={'bogus': '1'})
+        finally:
+            psock.close()
+
+    def test_inject_packet(self):
+        psock = packet_socket.PacketSocket(interface='lo')
+        psock.open()
+        try:
+            out = TCPSender.send_packet(
+                LinuxCLI(), interface='lo', packet_type='udp',
+                source_ip='127.0.0.1', dest_ip='127.0.0.1',
+                dest_mac='00:00:00:00:00:00', source_port=6058,
+                dest_port=6057, count=3, rate=1000, payload='data',
+                engine=SEND_ENGINE_PACKET_SOCKET)
+            self.assertTrue('Sent 3 frame(s) on lo' in out.stdout)
+            packets = capture_udp(psock, 6057, 3)
+            self.assertEqual(3, len(packets))
+            self.assertEqual(6058, packets[0]['udp'].source_port)
+        finally:
+            psock.close()
+
+    def test_start_stop_send(self):
+        psock = packet_socket.PacketSocket(interface='lo')
+        psock.open()
+        tcps = TCPSender(engine=SEND_ENGINE_PACKET_SOCKET)
+        try:
+            tcps.start_send(
+                blocking=False, cli=LinuxCLI(), interface='lo',
+                packet_type='udp', source_ip='127.0.0.1',
+                dest_ip='127.0.0.1', dest_mac='00:00:00:00:00:00',
+                dest_port=6059, count=0, rate=100)
+            # Keeps sending until stopped
+            self.assertEqual(5, len(capture_udp(psock, 6059, 5)))
+            tcps.stop_send(term=True)
+            self.assertIsNone(tcps.process)
+        finally:
+            psock.close()
+
+        self.assertRaises(SubprocessFailedException, tcps.start_send,
+                          blocking=False, cli=LinuxCLI(), interface='lo',
+                          packet_type='udp', dest_ip='bad-ip',
+                          dest_mac='00:00:00:00:00:00')
+
 run_unit_test(TCPSenderTest)
@@ -12,11 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import BaseHTTPServer
+import logging
+import threading
+import time
 import unittest
 
+from zephyr.common.exceptions import ArgMismatchException
 from zephyr.common.utils import run_unit_test
 from zephyr.tsm.neutron_test_case import NeutronTestCase
 from zephyr.tsm.neutron_test_case import require_extension
+from zephyr.tsm.test_case import TestWorker
 from zephyr.vtm import neutron_api
 from zephyr.vtm.virtual_topology_manager import VirtualTopologyManager
 
@@ -31,6 +37,57 @@ class SampleTestCase(NeutronTestCase):
         self.fail("This test shouldn't be run!")
 
 
+class MockWorker(object):
+    name_prefix = 'w0_'
+    tenant_id = 'tenant'
+
+
+class MockVM(object):
+    def __init__(self, name):
+        self.name = name
+        self.ports = []
+        self.terminated = False
+
+    def plugin_port(self, iface, port_id, mac=None):
+        self.ports.append(port_id)
+
+    def setup_vm_network(self, ip_addr=None, gw_ip=None):
+        time.sleep(0.1)
+        if self.name.endswith('bad'):
+            raise Exception('no DHCP lease for ' + self.name)
+
+    def get_ip(self, iface):
+        return '10.0.0.' + str(len(self.name))
+
+    def terminate(self):
+        self.terminated = True
+
+
+class MockVTM(object):
+    def __init__(self):
+        self.vms = []
+
+    def create_vms(self, vm_list, max_workers=None):
+        vms = [MockVM(vm['name']) for vm in vm_list]
+        self.vms += vms
+        return vms
+
+
+class MockNeutronAPI(object):
+    def __init__(self):
+        self.bulk_creates = 0
+        self.deleted_ports = []
+
+    def create_port(self, body):
+        self.bulk_creates += 1
+        return {'ports': [dict(port, id='p_' + port['name'],
+                               mac_address='00:00:00:00:00:01')
+                          for port in body['ports']]}
+
+    def delete_port(self, port_id):
+        self.deleted_ports.append(port_id)
+
+
 # TODO(micucci) Expand to include all features of NeutronTestCase
 class NeutronTestCaseTest(unittest.TestCase):
     def test_require_extension(self):
@@ -55,5 +112,154 @@ class NeutronTestCaseTest(unittest.TestCase):
         self.assertNotEqual(-1, str(
             tr.skipped[0][1]).find('Skipping because extension'))
 
+    def test_clean_resource_tiers(self):
+        tc = SampleTestCase('test_needs_agent')
+        tc.LOG = logging.getLogger()
+        deleted = []
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def delete(tier):
+            def delete_item(item, fail=False):
+                with lock:
+                    running[0] += 1
+                    running[1] = max(running[0], running[1])
+                time.sleep(0.05)
+                with lock:
+                    running[0] -= 1
+                    deleted.append((tier, item))
+                if fail:
+                    raise Exception('cannot delete ' + item)
+            return delete_item
+
+        ports = ['p' + str(i) for i in range(8)]
+        nets = ['n1', 'n2']
+        fw_ras = ['r1', 'r2']
+        errors = tc.clean_resource_tiers(
+            [(ports, 'port', delete('port')),
+             ([], 'router', delete('router')),
+             ([('n1', False), ('bad', True)], 'subnet', delete('subnet')),
+             (fw_ras, 'firewall policy rule',
+              delete('firewall policy rule')),
+             (nets, 'network', delete('network'))],
+            max_workers=4)
+
+        # Tiers run in order, each one finishing before the next starts
+        self.assertEqual(['port'] * 8 + ['subnet'] * 2 +
+                         ['firewall policy rule'] * 2 + ['network'] * 2,
+                         [tier for tier, item in deleted])
+        self.assertEqual(4, running[1])
+        self.assertEqual([], ports)
+        self.assertEqual([], nets)
+        self.assertEqual(1, len(errors))
+        self.assertIn('bad', errors[0][0])
+        self.assertEqual('cannot delete bad', errors[0][1])
+        self.assertEqual(['port', 'subnet', 'firewall policy rule',
+                          'network'],
+                         [t[0] for t in tc.cleanup_timings])
+        self.assertEqual([8, 2, 2, 2], [t[1] for t in tc.cleanup_timings])
+        # Eight ports on four threads take two rounds
+        self.assertLess(tc.cleanup_timings[0][2], 8 * 0.05)
+
+    def test_clean_resource_tiers_curl(self):
+        tc = SampleTestCase('test_needs_agent')
+        tc.LOG = logging.getLogger()
+        tc.api = MockNeutronAPI()
+        paths = []
+
+        class DeleteHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_DELETE(self):
+                paths.append(self.path)
+                self.send_response(204)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), DeleteHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = 'http://127.0.0.1:' + str(server.server_port)
+        deleted = []
+
+        def delete(res_id, sub_id):
+            deleted.append((res_id, sub_id))
+
+        try:
+            # Deleted in one batch of DELETEs to each resource's URL
+            fwlogs = [('r1', 'f1'), ('r1', 'f2'), ('r2', 'f3')]
+            errors = tc.clean_resource_tiers(
+                [(fwlogs, 'fw logging object', delete,
+                  lambda res_id, sub_id: url + '/' + res_id + '/' + sub_id)])
+            self.assertEqual([], errors)
+            self.assertEqual([], fwlogs)
+            self.assertEqual([], deleted)
+            self.assertEqual(['/r1/f1', '/r1/f2', '/r2/f3'], sorted(paths))
+
+            # When the batch fails, the items are deleted one at a time
+            fwlogs = [('r3', 'f4')]
+            errors = tc.clean_resource_tiers(
+                [(fwlogs, 'fw logging object', delete,
+                  lambda res_id, sub_id: 'http://127.0.0.1:1/')])
+            self.assertEqual([], errors)
+            self.assertEqual([], fwlogs)
+            self.assertEqual([('r3', 'f4')], deleted)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_shared_underlay_in_parallel(self):
+        tc = SampleTestCase('test_needs_agent')
+        tc.LOG = logging.getLogger()
+        tc.api = MockNeutronAPI()
+        tc.worker = TestWorker(1, 2)
+        # Nothing is created in neutron before the check fails
+        self.assertRaises(ArgMismatchException, tc.create_edge_router)
+        self.assertRaises(ArgMismatchException, tc.create_port, 'p', 'n1',
+                          host='cmp1', host_iface='eth1')
+        self.assertEqual(0, tc.api.bulk_creates)
+
+    def test_create_vm_servers(self):
+        tc = SampleTestCase('test_needs_agent')
+        tc.LOG = logging.getLogger()
+        tc.api = MockNeutronAPI()
+        tc.vtm = MockVTM()
+        tc.worker = MockWorker()
+
+        existing_port = {'id': 'p_existing', 'mac_address': 'aa',
+                         'fixed_ips': [{'ip_address': '10.0.0.99'}]}
+        start = time.time()
+        servers = tc.create_vm_servers(
+            [{'name': 'vm' + str(i), 'net_id': 'net1'} for i in range(4)] +
+            [{'name': 'vm_fixed', 'neutron_port': existing_port,
+              'use_dhcp': False}])
+        # One bulk request for the new ports, and networks set up at once
+        self.assertEqual(1, tc.api.bulk_creates)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual(['p_vm0', 'p_vm1', 'p_vm2', 'p_vm3', 'p_existing'],
+                         [port['id'] for port, vm, ip in servers])
+        self.assertEqual(['w0_vm0', 'w0_vm1', 'w0_vm2', 'w0_vm3',
+                          'w0_vm_fixed'],
+                         [vm.name for port, vm, ip in servers])
+        self.assertEqual([['p_vm0'], ['p_vm1'], ['p_vm2'], ['p_vm3'],
+                          ['p_existing']],
+                         [vm.ports for port, vm, ip in servers])
+        self.assertEqual(5, len(tc.servers))
+        self.assertEqual([None] * 4 + ['10.0.0.11'],
+                         [ip for vm, ip, port in tc.servers])
+
+        # Everything created for the servers is removed if any fails
+        self.assertRaises(
+            Exception, tc.create_vm_servers,
+            [{'name': 'vm_ok', 'net_id': 'net1'},
+             {'name': 'vm_bad', 'net_id': 'net1'},
+             {'name': 'vm_existing', 'neutron_port': existing_port}])
+        self.assertEqual(['p_vm_ok', 'p_vm_bad'], tc.api.deleted_ports)
+        self.assertEqual([True, True, True],
+                         [vm.terminated for vm in tc.vtm.vms[5:]])
+        self.assertEqual(5, len(tc.servers))
+
 
 run_unit_test(NeutronTestCaseTest)
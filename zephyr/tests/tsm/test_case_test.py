@@ -15,10 +15,13 @@
 import operator
 import unittest
 
+from zephyr.common.exceptions import ArgMismatchException
+from zephyr.common import log_manager
 from zephyr.common.utils import run_unit_test
 from zephyr.tsm.test_case import expected_failure
 from zephyr.tsm.test_case import require_topology_feature
 from zephyr.tsm.test_case import TestCase
+from zephyr.tsm.test_case import TestWorker
 
 
 class SampleVTM(object):
@@ -36,8 +39,10 @@ class SampleUnderlay(object):
 
 
 class SampleTestCase(TestCase):
+    running_test_id = None
+
     def test_basic(self):
-        pass
+        SampleTestCase.running_test_id = log_manager.get_test_id()
 
     def test_a_failure(self):
         self.assertFalse(True)
@@ -118,6 +123,10 @@ class TestCaseTest(unittest.TestCase):
         tc1.run(tr)
         self.assertEqual(0, len(tr.errors))
         self.assertEqual(0, len(tr.failures))
+        # Logs from the test are tagged with its id, until it ends
+        self.assertEqual(tc1.id(), SampleTestCase.running_test_id)
+        self.assertTrue(tc1.id().endswith('SampleTestCase.test_basic'))
+        self.assertIsNone(log_manager.get_test_id())
 
         tc2 = SampleTestCase('test_a_failure')
         tc2._prepare_class(None, None)
@@ -218,5 +227,38 @@ class TestCaseTest(unittest.TestCase):
         self.assertEqual(0, len(tr.failures))
         self.assertEqual(5, len(tr.skipped))
 
+    def test_worker(self):
+        serial = TestWorker()
+        self.assertEqual('admin', serial.tenant_id)
+        self.assertEqual('', serial.name_prefix)
+        self.assertEqual('192.168.0.0/24', serial.cidr('192.168.0.0/24'))
+        self.assertIs(TestCase.worker.tenant_id, serial.tenant_id)
+
+        worker = TestWorker(2)
+        self.assertEqual('admin_w2', worker.tenant_id)
+        self.assertEqual('w2_', worker.name_prefix)
+        self.assertEqual('192.168.32.0/24', worker.cidr('192.168.0.0/24'))
+        self.assertEqual('200.200.33.5', worker.cidr('200.200.1.5'))
+
+    def test_worker_public_cidr(self):
+        # The whole routed public CIDR when running serially
+        self.assertEqual('200.200.0.0/24',
+                         TestWorker().public_cidr('200.200.0.0/24'))
+
+        # Split between the workers, inside the routed /24 and with no
+        # overlaps
+        workers = [TestWorker(i, 2) for i in range(0, 2)]
+        self.assertEqual(['200.200.0.0/25', '200.200.0.128/25'],
+                         [w.public_cidr('200.200.0.0/24') for w in workers])
+
+        blocks = [TestWorker(i, 5).public_cidr('200.200.0.0/24')
+                  for i in range(0, 5)]
+        self.assertEqual(['200.200.0.0/27', '200.200.0.32/27',
+                          '200.200.0.64/27', '200.200.0.96/27',
+                          '200.200.0.128/27'], blocks)
+
+        self.assertRaises(ArgMismatchException,
+                          TestWorker(0, 17).public_cidr, '200.200.0.0/24')
+
 
 run_unit_test(TestCaseTest)
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 import unittest
 
 from zephyr.common.log_manager import LogManager
@@ -20,6 +21,54 @@ from zephyr.tsm.test_case import TestCase
 from zephyr.tsm.test_system_manager import TestSystemManager
 
 
+class SampleWorkerTestCase(TestCase):
+    workers_seen = []
+
+    def test_sleep(self):
+        self.workers_seen.append(self.worker)
+        time.sleep(0.3)
+
+    def test_failure(self):
+        self.assertFalse(True)
+
+
+class SampleOtherWorkerTestCase(SampleWorkerTestCase):
+    pass
+
+
+underlay_runs = []
+
+
+def record_run(test):
+    start = time.time()
+    time.sleep(0.2)
+    underlay_runs.append((type(test), test.worker, start, time.time()))
+
+
+class SampleParallelTestCase(TestCase):
+    def test_one(self):
+        record_run(self)
+
+    def test_two(self):
+        record_run(self)
+
+
+class SampleOtherParallelTestCase(SampleParallelTestCase):
+    pass
+
+
+class SampleUnderlayTestCase(TestCase):
+    # Stands in for a class using the edge router
+    parallel_safe = False
+
+    def test_underlay(self):
+        record_run(self)
+
+
+class SampleOtherUnderlayTestCase(SampleUnderlayTestCase):
+    pass
+
+
 class TestSystemManagerTest(unittest.TestCase):
     def test_add_test_from_pkg_module_class(self):
 
@@ -166,6 +215,66 @@ class TestSystemManagerTest(unittest.TestCase):
         self.assertEqual(2, len(result.successes))
         self.assertEqual(0, len(result.errors))
 
+    def test_run_parallel(self):
+        lm = LogManager(root_dir="test-logs")
+        tsm = TestSystemManager(None, log_manager=lm, workers=4)
+        tsm.configure_logging(debug=True)
+
+        tsm.add_test_from_pkg_mod_cls_func('', SampleWorkerTestCase, None)
+        tsm.add_test_from_pkg_mod_cls_func('', SampleOtherWorkerTestCase,
+                                           None)
+
+        start = time.time()
+        result = tsm.run_all_tests('test1', 'foo-topo')
+        # Both classes slept at the same time
+        self.assertLess(time.time() - start, 0.55)
+
+        self.assertEqual(4, result.testsRun)
+        self.assertEqual(2, len(result.failures))
+        self.assertEqual(2, len(result.successes))
+        self.assertEqual(0, len(result.errors))
+        self.assertIn('<testsuite errors="0" failures="2" name="test1" '
+                      'tests="4"', result.to_junit_xml())
+
+        # Each class ran in its own worker, and was reset afterwards
+        self.assertEqual(
+            2, len(set(w.tenant_id for w in
+                       SampleWorkerTestCase.workers_seen)))
+        self.assertEqual(0, SampleWorkerTestCase.worker.index)
+        self.assertEqual(0, SampleOtherWorkerTestCase.worker.index)
+
+    def test_run_parallel_serial_classes(self):
+        lm = LogManager(root_dir="test-logs")
+        tsm = TestSystemManager(None, log_manager=lm, workers=4)
+        tsm.configure_logging(debug=True)
+
+        for test_class in [SampleUnderlayTestCase, SampleParallelTestCase,
+                           SampleOtherUnderlayTestCase,
+                           SampleOtherParallelTestCase]:
+            tsm.add_test_from_pkg_mod_cls_func('', test_class, None)
+
+        result = tsm.run_all_tests('test1', 'foo-topo')
+        self.assertEqual(6, result.testsRun)
+        self.assertEqual(6, len(result.successes))
+        self.assertEqual(6, len(underlay_runs))
+
+        parallel = [r for r in underlay_runs if r[0].parallel_safe]
+        serial = [r for r in underlay_runs if not r[0].parallel_safe]
+        self.assertEqual(2, len(serial))
+        # The parallel classes ran in workers at the same time...
+        self.assertEqual(2, len(set(r[1].index for r in parallel)))
+        self.assertTrue(any(a[1].index != b[1].index and
+                            a[2] < b[3] and b[2] < a[3]
+                            for a in parallel for b in parallel))
+        # ...but the underlay classes had it all to themselves, with the
+        # whole of the serial run's resources
+        for test_class, worker, start, end in serial:
+            self.assertEqual(1, worker.count)
+            self.assertEqual('admin', worker.tenant_id)
+            for other in underlay_runs:
+                if other[2] != start:
+                    self.assertTrue(other[3] <= start or other[2] >= end)
+
     def test_multi_suite_run(self):
 
         lm = LogManager(root_dir="test-logs")
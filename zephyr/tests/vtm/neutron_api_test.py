@@ -14,6 +14,8 @@
 
 import logging
 import os
+import shutil
+import tempfile
 import unittest
 
 from zephyr.common.cli import LinuxCLI
@@ -195,4 +197,35 @@ class NeutronAPITest(unittest.TestCase):
         LinuxCLI().cmd('ip netns del vm1')
 
 
+class NeutronDBSnapshotTest(unittest.TestCase):
+    def test_snapshot_dir(self):
+        log = logging.getLogger()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            snapshot_dir = tmp_dir + '/snapshots'
+            self.assertTrue(
+                neutron_api.make_neutron_db_snapshot_dir(snapshot_dir, log))
+            self.assertEqual(0o700, os.stat(snapshot_dir).st_mode & 0o777)
+            self.assertTrue(
+                neutron_api.make_neutron_db_snapshot_dir(snapshot_dir, log))
+
+            # Nothing anyone else could have written to is used
+            os.chmod(snapshot_dir, 0o777)
+            self.assertFalse(
+                neutron_api.make_neutron_db_snapshot_dir(snapshot_dir, log))
+            os.rmdir(snapshot_dir)
+            os.symlink(tmp_dir, snapshot_dir)
+            self.assertFalse(
+                neutron_api.make_neutron_db_snapshot_dir(snapshot_dir, log))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_snapshot_name(self):
+        snapshot = neutron_api.get_neutron_db_snapshot(
+            '/snapshots', ('kilo', 'abc/1.0'))
+        self.assertEqual('/snapshots/neutron-db-kilo-abc_1_0.mysql',
+                         snapshot.mysql_file())
+
+
 run_unit_test(NeutronAPITest)
+run_unit_test(NeutronDBSnapshotTest)
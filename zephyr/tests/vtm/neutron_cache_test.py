@@ -0,0 +1,143 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from zephyr.common.utils import run_unit_test
+from zephyr.vtm.neutron_cache import *
+
+
+class NotFound(Exception):
+    pass
+
+
+class MockNeutronClient(object):
+    def __init__(self):
+        self.version = '2.0'
+        self.calls = []
+        self.ports = {
+            'p1': {'id': 'p1', 'name': 'vm1', 'network_id': 'n1',
+                   'device_owner': 'compute:nova', 'admin_state_up': True,
+                   'fixed_ips': [{'ip_address': '10.0.0.3'}]},
+            'p2': {'id': 'p2', 'name': 'gw', 'network_id': 'n1',
+                   'device_owner': 'network:router_interface',
+                   'admin_state_up': False,
+                   'fixed_ips': [{'ip_address': '10.0.0.1'}]},
+            'p3': {'id': 'p3', 'name': 'vm2', 'network_id': 'n2',
+                   'device_owner': 'compute:nova', 'admin_state_up': True,
+                   'fixed_ips': [{'ip_address': '10.0.1.3'}]}}
+
+    def list_ports(self, retrieve_all=True, **params):
+        self.calls.append(('list_ports', params))
+        return {'ports': [p for p in self.ports.values()
+                          if all(p.get(k) == v
+                                 for k, v in params.iteritems())]}
+
+    def show_port(self, port_id, **params):
+        self.calls.append(('show_port', port_id))
+        if port_id not in self.ports:
+            raise NotFound(port_id)
+        return {'port': self.ports[port_id]}
+
+    def add_interface_router(self, router_id, body):
+        self.calls.append(('add_interface_router', router_id))
+        self.ports['p4'] = {'id': 'p4', 'name': '', 'network_id': 'n2',
+                            'device_owner': 'network:router_interface'}
+        return {'port_id': 'p4'}
+
+    def list_extensions(self):
+        self.calls.append(('list_extensions', {}))
+        return {'extensions': []}
+
+
+class NeutronClientCacheTest(unittest.TestCase):
+    def test_list_and_show(self):
+        client = MockNeutronClient()
+        api = NeutronClientCache(client, ttl=60)
+
+        self.assertEqual(['p1', 'p2', 'p3'],
+                         sorted(p['id'] for p in api.list_ports()['ports']))
+        self.assertEqual(
+            ['p1', 'p3'],
+            sorted(p['id'] for p in
+                   api.list_ports(device_owner='compute:nova')['ports']))
+        self.assertEqual(['p1'], [p['id'] for p in api.list_ports(
+            device_owner='compute:nova', network_id='n1')['ports']])
+        self.assertEqual(['p3'], [p['id'] for p in
+                                  api.list_ports(name='vm2')['ports']])
+        self.assertEqual(['p2'], [p['id'] for p in api.list_ports(
+            admin_state_up='False')['ports']])
+        self.assertEqual(['p1', 'p2'], sorted(
+            p['id'] for p in api.list_ports(id=['p1', 'p2'])['ports']))
+        self.assertEqual([], api.list_ports(name='nothing')['ports'])
+        self.assertEqual('vm1', api.show_port('p1')['port']['name'])
+
+        # Only the first listing went to neutron
+        self.assertEqual([('list_ports', {})], client.calls)
+        self.assertEqual({'hits': 7, 'misses': 1, 'invalidations': 0},
+                         api.cache_stats())
+
+        # Results are copies, so callers can't change the cache
+        api.show_port('p1')['port']['name'] = 'changed'
+        self.assertEqual('vm1', api.show_port('p1')['port']['name'])
+
+        # Filters or parameters the cache can't answer go to neutron
+        api.list_ports(fields='id')
+        api.list_ports(fixed_ips='ip_address=10.0.0.3')
+        self.assertEqual([('list_ports', {'fields': 'id'}),
+                          ('list_ports',
+                           {'fixed_ips': 'ip_address=10.0.0.3'})],
+                         client.calls[1:])
+        self.assertRaises(NotFound, api.show_port, 'p9')
+        self.assertEqual(('show_port', 'p9'), client.calls[-1])
+
+        # Other reads and attributes pass through
+        self.assertEqual({'extensions': []}, api.list_extensions())
+        self.assertEqual('2.0', api.version)
+        self.assertEqual(0, api.cache_stats()['invalidations'])
+
+    def test_invalidation(self):
+        client = MockNeutronClient()
+        api = NeutronClientCache(client, ttl=60)
+        self.assertEqual([], api.list_ports(
+            device_owner='network:router_interface', network_id='n2')[
+            'ports'])
+
+        # A change through the client drops the cache
+        api.add_interface_router('r1', {'subnet_id': 's2'})
+        self.assertEqual(['p4'], [p['id'] for p in api.list_ports(
+            device_owner='network:router_interface',
+            network_id='n2')['ports']])
+        self.assertEqual(2, len([c for c in client.calls
+                                 if c[0] == 'list_ports']))
+        self.assertEqual(1, api.cache_stats()['invalidations'])
+
+        # As does invalidating it directly, after outside changes
+        client.ports.pop('p4')
+        api.invalidate_cache()
+        self.assertRaises(NotFound, api.show_port, 'p4')
+
+    def test_ttl(self):
+        client = MockNeutronClient()
+        api = NeutronClientCache(client, ttl=0.2)
+        api.show_port('p1')
+        client.ports['p1'] = dict(client.ports['p1'], name='renamed')
+        self.assertEqual('vm1', api.show_port('p1')['port']['name'])
+        time.sleep(0.3)
+        self.assertEqual('renamed', api.show_port('p1')['port']['name'])
+        self.assertEqual({'hits': 1, 'misses': 2, 'invalidations': 0},
+                         api.cache_stats())
+
+run_unit_test(NeutronClientCacheTest)
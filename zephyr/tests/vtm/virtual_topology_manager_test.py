@@ -12,9 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+import time
 import unittest
 
+from zephyr.common.cli import LinuxCLI
+from zephyr.common import exceptions
+from zephyr.common.log_manager import LogManager
 from zephyr.common.utils import run_unit_test
+from zephyr.vtm.underlay.underlay_system import UnderlaySystem
 from zephyr.vtm.virtual_topology_manager import VirtualTopologyManager
 
 
@@ -52,6 +58,43 @@ class MockClient(object):
         return None
 
 
+class MockVM(object):
+    def __init__(self, name, hypervisor):
+        self.name = name
+        self.hypervisor = hypervisor
+
+    def terminate(self):
+        with self.hypervisor.lock:
+            self.hypervisor.vms.pop(self.name)
+
+
+class MockHypervisor(object):
+    def __init__(self, name):
+        self.name = name
+        self.vms = {}
+        self.lock = threading.Lock()
+
+    def create_vm(self, name=None):
+        time.sleep(0.2)
+        if name.startswith('bad'):
+            raise exceptions.ArgMismatchException('Cannot start: ' + name)
+        with self.lock:
+            self.vms[name] = MockVM(name, self)
+            return self.vms[name]
+
+
+class MockUnderlaySystem(UnderlaySystem):
+    def __init__(self, log_manager):
+        super(MockUnderlaySystem, self).__init__(log_manager=log_manager)
+        self.hypervisors = {'hv1': MockHypervisor('hv1'),
+                            'hv2': MockHypervisor('hv2')}
+
+    def create_vm(self, hv_host=None, name=None):
+        return self.provision_vm_on_most_open_hv(
+            hv_map=self.hypervisors, vm_count_fn=lambda hv: len(hv.vms),
+            name=name, requested_host=hv_host)
+
+
 class VirtualTopologyManagerUnitTest(unittest.TestCase):
     def test_creation(self):
         api = VirtualTopologyManager(
@@ -87,5 +130,38 @@ class VirtualTopologyManagerUnitTest(unittest.TestCase):
         api.get_client().set_subnet(subnet)
         self.assertEqual(api.get_client().show_subnet(), subnet)
 
+    def test_create_vms(self):
+        lm = LogManager('./logs')
+        try:
+            api = VirtualTopologyManager(client_api_impl=MockClient(),
+                                         log_manager=lm)
+            api.underlay_system = MockUnderlaySystem(lm)
+            hvs = api.underlay_system.hypervisors
+
+            start = time.time()
+            vms = api.create_vms([{'name': 'vm' + str(i)}
+                                  for i in range(4)])
+            # Started together, and spread over the hypervisors
+            self.assertLess(time.time() - start, 0.6)
+            self.assertEqual(['vm0', 'vm1', 'vm2', 'vm3'],
+                             [vm.name for vm in vms])
+            self.assertEqual(2, len(hvs['hv1'].vms))
+            self.assertEqual(2, len(hvs['hv2'].vms))
+
+            # The VMs that did start are terminated if any fails
+            self.assertRaises(
+                exceptions.ArgMismatchException, api.create_vms,
+                [{'name': 'vm4'}, {'name': 'bad'},
+                 {'name': 'vm5', 'hv_host': 'hv1'}])
+            self.assertEqual(['vm0', 'vm1', 'vm2', 'vm3'],
+                             sorted(hvs['hv1'].vms.keys() +
+                                    hvs['hv2'].vms.keys()))
+            self.assertEqual({}, {hv: n for hv, n in
+                                  api.underlay_system.pending_vms.items()
+                                  if n != 0})
+            self.assertEqual([], api.create_vms([]))
+        finally:
+            LinuxCLI().rm('./logs')
+
 
 run_unit_test(VirtualTopologyManagerUnitTest)
@@ -13,11 +13,18 @@
 # limitations under the License.
 
 from collections import namedtuple
+from concurrent import futures
 import json
 import logging
+import pycurl
+import sys
+import time
 
 from zephyr.common import exceptions
+from zephyr.common import log_manager
+from zephyr.common.curl_session import CurlRequest
 from zephyr.common.ip import IP
+from zephyr.common.utils import curl_all
 from zephyr.common.utils import curl_delete
 from zephyr.common.utils import curl_post
 from zephyr.common.utils import curl_put
@@ -30,6 +37,14 @@ EdgeData = namedtuple('EdgeData', "edge_net router")
 MAIN_NET_CIDR = '192.168.0.0/24'
 PUB_NET_CIDR = '200.200.0.0/24'
 
+# Resources of one type are deleted at once on up to this many threads
+CLEANUP_MAX_WORKERS = 8
+# VM servers are set up at once on up to this many threads
+VM_SETUP_MAX_WORKERS = 8
+# Resource types whose deletes touch the same parent object, and so are
+# still deleted one at a time
+SERIAL_CLEANUP_RESOURCES = {'firewall policy rule'}
+
 # TODO(joe+micucci): Move non-standard extensions to extension-helper modules
 # Things like firewall, bgp, router_peering, etc. should all be moved
 # out of the base "NeutronTestCase" and moved to their own module helper
@@ -44,30 +59,34 @@ PUB_NET_CIDR = '200.200.0.0/24'
 
 
 class NeutronTestCase(TestCase):
-    servers = list()
-    bgp_speakers = list()
-    bgp_peers = list()
-    sgs = list()
-    sgrs = list()
-    rmacs = list()
-    l2gws = list()
-    l2gw_conns = list()
-    gws = list()
-    fws = list()
-    fwps = list()
-    fwprs = list()
-    fw_ras = list()
-    fips = list()
-    nports = list()
-    nnets = list()
-    nsubs = list()
-    nrouters = list()
-    nr_ifaces = list()
-    logging_resources = list()
-    firewall_logs = list()
-
     def __init__(self, method_name='runTest'):
         super(NeutronTestCase, self).__init__(method_name)
+        # Resources are tracked per test, so tests running in parallel
+        # (in other workers) never clean up each other's
+        self.servers = list()
+        self.bgp_speakers = list()
+        self.bgp_peers = list()
+        self.sgs = list()
+        self.sgrs = list()
+        self.rmacs = list()
+        self.l2gws = list()
+        self.l2gw_conns = list()
+        self.gws = list()
+        self.fws = list()
+        self.fwps = list()
+        self.fwprs = list()
+        self.fw_ras = list()
+        self.fips = list()
+        self.nports = list()
+        self.nnets = list()
+        self.nsubs = list()
+        self.nrouters = list()
+        self.nr_ifaces = list()
+        self.logging_resources = list()
+        self.firewall_logs = list()
+        self.cleanup_timings = list()
+        """ :type: list[(str, int, float)]"""
+        self.cleanup_max_workers = CLEANUP_MAX_WORKERS
         self.main_subnet = None
         self.pub_network = None
         self.pub_subnet = None
@@ -96,6 +115,9 @@ class NeutronTestCase(TestCase):
         finally:
             cleanup_errors = self.clean_vm_servers()
             cleanup_errors += self.clean_topo()
+            cache_stats = getattr(self.api, 'cache_stats', None)
+            if cache_stats is not None:
+                self.LOG.debug('Neutron client cache: ' + str(cache_stats()))
 
             if len(cleanup_errors) > 0:
                 error_list = ['Item (' + i + ') - Reason (' + r + ')'
@@ -113,10 +135,12 @@ class NeutronTestCase(TestCase):
             "Initializing Main and Public Networks")
         self.main_network = self.create_network('main')
         self.main_subnet = self.create_subnet(
-            'main_sub', net_id=self.main_network['id'], cidr=MAIN_NET_CIDR)
+            'main_sub', net_id=self.main_network['id'],
+            cidr=self.worker.cidr(MAIN_NET_CIDR))
         self.pub_network = self.create_network('public', external=True)
         self.pub_subnet = self.create_subnet(
-            'public_sub', net_id=self.pub_network['id'], cidr=PUB_NET_CIDR)
+            'public_sub', net_id=self.pub_network['id'],
+            cidr=self.worker.public_cidr(PUB_NET_CIDR))
         self.public_router = self.create_router(
             'main_pub_router', pub_net_id=self.pub_network['id'],
             priv_sub_ids=[self.main_subnet['id']])
@@ -147,16 +171,16 @@ class NeutronTestCase(TestCase):
              self.api.delete_security_group_rule),
 
             (self.logging_resources, 'log resource',
-             self.curl_delete_logging_resource),
+             self.curl_delete_logging_resource, self.logging_resource_url),
 
             (self.firewall_logs, 'fw logging object',
-             self.curl_delete_firewall_log),
+             self.curl_delete_firewall_log, self.firewall_log_url),
 
             (self.bgp_peers, 'bgp peer',
-             self.curl_delete_bgp_peer),
+             self.curl_delete_bgp_peer, self.bgp_peer_url),
 
             (self.bgp_speakers, 'bgp speaker',
-             self.curl_delete_bgp_speaker),
+             self.curl_delete_bgp_speaker, self.bgp_speaker_url),
 
             (self.fw_ras, 'firewall policy rule',
              self.neutron_remove_firewall_policy_rule),
@@ -171,13 +195,13 @@ class NeutronTestCase(TestCase):
              self.api.delete_firewall_policy),
 
             (self.rmacs, 'remote mac entry',
-             self.curl_delete_remote_mac_entry),
+             self.curl_delete_remote_mac_entry, self.remote_mac_entry_url),
 
             (self.l2gw_conns, 'l2 gateway conn',
-             self.curl_delete_l2_gateway_conn),
+             self.curl_delete_l2_gateway_conn, self.l2_gateway_conn_url),
 
             (self.l2gws, 'l2 gateway',
-             self.curl_delete_l2_gateway),
+             self.curl_delete_l2_gateway, self.l2_gateway_url),
 
             (self.fips, 'floating ips',
              self.api.delete_floatingip),
@@ -189,7 +213,7 @@ class NeutronTestCase(TestCase):
              self.neutron_remove_router_interface),
 
             (self.gws, 'gateway',
-             self.curl_delete_gateway_device),
+             self.curl_delete_gateway_device, self.gateway_device_url),
 
             (self.nports, 'port',
              self.api.delete_port),
@@ -206,15 +230,60 @@ class NeutronTestCase(TestCase):
             (self.nnets, 'network',
              self.api.delete_network)]
 
-        for (items, res_name, del_func) in topo_info:
-            cleanup_errors += self.clean_resource(
-                items, res_name, del_func)
+        return self.clean_resource_tiers(topo_info)
+
+    def clean_resource_tiers(self, tiers, max_workers=None):
+        """
+        Delete resources one tier (resource type) at a time, in the given
+        order, so nothing is deleted before the resources that depend on
+        it.  All of the resources in a tier are deleted at once, on at
+        most max_workers threads, or, for a tier which also gives a URL
+        function (resources deleted through curl), in one batch of curl
+        requests.  How long each tier took is added to cleanup_timings.
+        :type tiers: list[(list, str, callable[, callable])] Resources,
+        resource name, delete function and (optionally) the function
+        giving a resource's URL for each tier
+        :type max_workers: int Defaults to cleanup_max_workers
+        :return: list[(str, str)] Failed resources and their errors
+        """
+        if max_workers is None:
+            max_workers = self.cleanup_max_workers
+        cleanup_errors = []
+        with futures.ThreadPoolExecutor(
+                max_workers=max(1, max_workers)) as pool:
+            for tier in tiers:
+                items, res_name, del_func = tier[0:3]
+                url_func = tier[3] if len(tier) > 3 else None
+                if len(items) == 0:
+                    continue
+                tier_start = time.time()
+                count = len(items)
+                if res_name in SERIAL_CLEANUP_RESOURCES:
+                    cleanup_errors += self.clean_resource(
+                        items, res_name, del_func)
+                elif url_func is not None:
+                    cleanup_errors += self.curl_delete_resources(
+                        items, res_name, del_func, url_func)
+                else:
+                    cleanup_errors += self.clean_resource(
+                        items, res_name, del_func, pool=pool)
+                elapsed = time.time() - tier_start
+                self.cleanup_timings.append((res_name, count, elapsed))
+                self.LOG.debug('Cleaned ' + str(count) + ' ' + res_name +
+                               '(s) in ' + ('%.3f' % elapsed) + 's')
 
         return cleanup_errors
 
-    def clean_resource(self, items, res_name, del_func):
-        cleanup_errors = []
-        for item in items:
+    def clean_resource(self, items, res_name, del_func, pool=None):
+        """
+        :type items: list
+        :type res_name: str
+        :type del_func: callable
+        :type pool: futures.Executor Delete the items at once on this pool,
+        or one at a time if None
+        :return: list[(str, str)] Failed resources and their errors
+        """
+        def delete_item(item):
             try:
                 self.LOG.debug('Deleting ' + res_name + ' ' + str(item))
                 if isinstance(item, basestring):
@@ -224,14 +293,89 @@ class NeutronTestCase(TestCase):
             except Exception as e:
                 self.LOG.error(
                     'Error cleaning: ' + str(item) + ': ' + str(e.message))
-                cleanup_errors.append(
-                    (res_name + ": " + str(item), e.message))
+                return res_name + ": " + str(item), e.message
+            return None
+
+        if pool is None:
+            results = [delete_item(item) for item in items]
+        else:
+            # Keep the records logged on the pool's threads tagged with
+            # this thread's test
+            test_id = log_manager.get_test_id()
+
+            def delete_item_in_pool(item):
+                log_manager.set_test_id(test_id)
+                try:
+                    return delete_item(item)
+                finally:
+                    log_manager.set_test_id(None)
+
+            results = [job.result() for job in
+                       [pool.submit(delete_item_in_pool, item)
+                        for item in items]]
+        cleanup_errors = [r for r in results if r is not None]
 
         if res_name != 'router route':
             del items[:]
 
         return cleanup_errors
 
+    def curl_delete_resources(self, items, res_name, del_func, url_func):
+        """
+        Delete the items with one batch of concurrent curl DELETEs.  If the
+        batch fails, whatever is left is deleted one at a time with
+        del_func, so each failure is reported against its own item.
+        :type items: list
+        :type res_name: str
+        :type del_func: callable
+        :type url_func: callable Gives an item's URL, from the same
+        arguments as del_func
+        :return: list[(str, str)] Failed resources and their errors
+        """
+        self.LOG.debug('Deleting ' + str(len(items)) + ' ' + res_name +
+                       '(s): ' + str(items))
+        try:
+            curl_all([CurlRequest('DELETE',
+                                  url_func(item)
+                                  if isinstance(item, basestring)
+                                  else url_func(*item))
+                      for item in items])
+        except pycurl.error as e:
+            self.LOG.warning('Batch delete of ' + res_name + '(s) failed: ' +
+                             str(e) + ', deleting them one at a time')
+            return self.clean_resource(items, res_name, del_func)
+        finally:
+            self.api_changed()
+        del items[:]
+        return []
+
+    def api_changed(self):
+        """
+        Drop anything the neutron client has cached (if it caches at all)
+        after a change made to neutron without it, through curl, say.
+        """
+        invalidate = getattr(self.api, 'invalidate_cache', None)
+        if invalidate is not None:
+            invalidate()
+
+    def neutron_curl_post(self, url, json_data=None):
+        try:
+            return curl_post(url, json_data)
+        finally:
+            self.api_changed()
+
+    def neutron_curl_put(self, url, json_data=None):
+        try:
+            return curl_put(url, json_data)
+        finally:
+            self.api_changed()
+
+    def neutron_curl_delete(self, url):
+        try:
+            return curl_delete(url)
+        finally:
+            self.api_changed()
+
     def cleanup_vms(self, vm_port_list):
         """
         :type vm_port_list: list[(zephyr.vtm.guest.Guest, port)]
@@ -282,30 +426,11 @@ class NeutronTestCase(TestCase):
         :rtype: (dict[str, str], zephyr.vtm.guest.Guest, str)
         """
         if not neutron_port:
-            if not net_id:
-                raise exceptions.ArgMismatchException(
-                    "If no existing port is specified, a network "
-                    "ID on which to create a new port MUST be provided")
-
-            port_data = {'name': name,
-                         'network_id': net_id,
-                         'admin_state_up': True,
-                         'tenant_id': 'admin'}
-            if sgs:
-                port_data['security_groups'] = sgs
-            if port_security_enabled is not None:
-                port_data['port_security_enabled'] = port_security_enabled
-            if allowed_address_pairs:
-                port_data['allowed_address_pairs'] = (
-                    [{'ip_address': pair[0],
-                      'mac_address': pair[1]} if len(pair) > 1
-                     else {'ip_address': pair[0]}
-                     for pair in allowed_address_pairs])
-            if router_ip:
-                opt = {"opt_value": router_ip,
-                       "ip_version": 4,
-                       "opt_name": "3"}
-                port_data['extra_dhcp_opts'] = [opt]
+            port_data = self.make_vm_port_data(
+                name, net_id, sgs=sgs,
+                allowed_address_pairs=allowed_address_pairs,
+                port_security_enabled=port_security_enabled,
+                router_ip=router_ip)
             port = self.api.create_port({'port': port_data})['port']
             self.LOG.debug("Created port for VM: " + str(port))
         else:
@@ -313,13 +438,12 @@ class NeutronTestCase(TestCase):
             self.LOG.debug("Using existing port for VM: " + str(port))
         vm = None
         try:
-            vm = self.vtm.create_vm(name=name,
+            vm = self.vtm.create_vm(name=self.worker.name_prefix + name,
                                     hv_host=hv_host)
-            vm.plugin_port('eth0', port['id'], mac=port['mac_address'])
-            ip_addr = None if use_dhcp else port['fixed_ips'][0]['ip_address']
-            vm.setup_vm_network(ip_addr=ip_addr, gw_ip=gw_ip)
-            self.servers.append((vm, ip_addr, port))
-            ip_addr = vm.get_ip('eth0')
+            ip_addr = self.setup_vm_server(vm, port, gw_ip=gw_ip,
+                                           use_dhcp=use_dhcp)
+            self.servers.append(
+                (vm, None if use_dhcp else ip_addr, port))
             return port, vm, ip_addr
 
         except Exception:
@@ -329,6 +453,131 @@ class NeutronTestCase(TestCase):
                 vm.terminate()
             raise
 
+    def create_vm_servers(self, server_list,
+                          max_workers=VM_SETUP_MAX_WORKERS):
+        """
+        Create several VM servers at once.  Each server takes the same
+        arguments as create_vm_server.  Any new ports are created in one
+        bulk request, then the VMs are started and their networks set up
+        (waiting on their DHCP leases) in parallel, on at most max_workers
+        threads.  If any server fails, the VMs and ports created for all
+        of them are removed again, and the first error is raised.
+        :type server_list: list[dict[str, any]] create_vm_server args for
+        each server
+        :type max_workers: int
+        :rtype: list[(dict[str, str], zephyr.vtm.guest.Guest, str)]
+        """
+        if len(server_list) == 0:
+            return []
+        ports = [server.get('neutron_port') for server in server_list]
+        new_port_indexes = [i for i, port in enumerate(ports) if not port]
+        if len(new_port_indexes) > 0:
+            port_data_list = []
+            for i in new_port_indexes:
+                args = server_list[i]
+                port_data_list.append(self.make_vm_port_data(
+                    args['name'], args.get('net_id'),
+                    sgs=args.get('sgs'),
+                    allowed_address_pairs=args.get(
+                        'allowed_address_pairs'),
+                    port_security_enabled=args.get(
+                        'port_security_enabled'),
+                    router_ip=args.get('router_ip')))
+            new_ports = self.api.create_port(
+                {'ports': port_data_list})['ports']
+            self.LOG.debug("Created ports for VMs: " + str(new_ports))
+            for i, port in zip(new_port_indexes, new_ports):
+                ports[i] = port
+
+        vms = []
+        try:
+            vms = self.vtm.create_vms(
+                [{'name': self.worker.name_prefix + server['name'],
+                  'hv_host': server.get('hv_host')}
+                 for server in server_list],
+                max_workers=max_workers)
+
+            with futures.ThreadPoolExecutor(
+                    max_workers=max(1, min(max_workers,
+                                           len(server_list)))) as pool:
+                jobs = [pool.submit(self.setup_vm_server, vm, port,
+                                    gw_ip=server.get('gw_ip'),
+                                    use_dhcp=server.get('use_dhcp', True))
+                        for vm, port, server in
+                        zip(vms, ports, server_list)]
+                futures.wait(jobs)
+            ip_addrs = [job.result() for job in jobs]
+
+        except Exception:
+            error = sys.exc_info()
+            for vm in vms:
+                try:
+                    vm.terminate()
+                except Exception as e:
+                    self.LOG.error(
+                        "Error terminating VM: " + str(e.message))
+            for i in new_port_indexes:
+                try:
+                    self.api.delete_port(ports[i]['id'])
+                except Exception as e:
+                    self.LOG.error(
+                        "Error deleting port: " + str(e.message))
+            raise error[0], error[1], error[2]
+
+        for vm, port, ip_addr, server in zip(vms, ports, ip_addrs,
+                                             server_list):
+            self.servers.append(
+                (vm, None if server.get('use_dhcp', True) else ip_addr,
+                 port))
+        return zip(ports, vms, ip_addrs)
+
+    def make_vm_port_data(self, name, net_id, sgs=None,
+                          allowed_address_pairs=None,
+                          port_security_enabled=None, router_ip=None):
+        """
+        :rtype: dict[str, any] The neutron port to create for a VM server
+        """
+        if not net_id:
+            raise exceptions.ArgMismatchException(
+                "If no existing port is specified, a network "
+                "ID on which to create a new port MUST be provided")
+
+        port_data = {'name': name,
+                     'network_id': net_id,
+                     'admin_state_up': True,
+                     'tenant_id': self.worker.tenant_id}
+        if sgs:
+            port_data['security_groups'] = sgs
+        if port_security_enabled is not None:
+            port_data['port_security_enabled'] = port_security_enabled
+        if allowed_address_pairs:
+            port_data['allowed_address_pairs'] = (
+                [{'ip_address': pair[0],
+                  'mac_address': pair[1]} if len(pair) > 1
+                 else {'ip_address': pair[0]}
+                 for pair in allowed_address_pairs])
+        if router_ip:
+            opt = {"opt_value": router_ip,
+                   "ip_version": 4,
+                   "opt_name": "3"}
+            port_data['extra_dhcp_opts'] = [opt]
+        return port_data
+
+    def setup_vm_server(self, vm, port, gw_ip=None, use_dhcp=True):
+        """
+        Plug a VM into its port and set up its network, from DHCP or with
+        the port's fixed IP.
+        :type vm: zephyr.vtm.guest.Guest
+        :type port: dict[str, any]
+        :type gw_ip: str
+        :type use_dhcp: bool
+        :return: str The VM's IP
+        """
+        vm.plugin_port('eth0', port['id'], mac=port['mac_address'])
+        ip_addr = None if use_dhcp else port['fixed_ips'][0]['ip_address']
+        vm.setup_vm_network(ip_addr=ip_addr, gw_ip=gw_ip)
+        return vm.get_ip('eth0')
+
     def clean_vm_servers(self):
         cleanup_errors = []
         for (vm, ip_addr, port) in self.servers:
@@ -346,9 +595,9 @@ class NeutronTestCase(TestCase):
         del self.servers[:]
         return cleanup_errors
 
-    def create_security_group(self, name, tenant_id='admin'):
+    def create_security_group(self, name, tenant_id=None):
         sg_data = {'name': name,
-                   'tenant_id': tenant_id}
+                   'tenant_id': tenant_id or self.worker.tenant_id}
         sg = self.api.create_security_group({'security_group': sg_data})
         self.LOG.debug('Created security group: ' + str(sg))
         self.sgs.append(sg['security_group']['id'])
@@ -359,7 +608,7 @@ class NeutronTestCase(TestCase):
         self.sgs.remove(sg_id)
 
     def create_security_group_rule(self, sg_id, remote_group_id=None,
-                                   tenant_id='admin', direction='ingress',
+                                   tenant_id=None, direction='ingress',
                                    protocol=None, port_range_min=None,
                                    port_range_max=None, ethertype='IPv4',
                                    remote_ip_prefix=None):
@@ -371,7 +620,7 @@ class NeutronTestCase(TestCase):
                     'port_range_max': port_range_max,
                     'ethertype': ethertype,
                     'remote_ip_prefix': remote_ip_prefix,
-                    'tenant_id': tenant_id}
+                    'tenant_id': tenant_id or self.worker.tenant_id}
         sgr = self.api.create_security_group_rule(
             {'security_group_rule': sgr_data})
         self.LOG.debug('Created security group rule: ' + str(sgr))
@@ -382,9 +631,9 @@ class NeutronTestCase(TestCase):
         self.api.delete_security_group_rule(sgr_id)
         self.sgrs.remove(sgr_id)
 
-    def create_floating_ip(self, pub_net_id, port_id=None, tenant_id='admin'):
+    def create_floating_ip(self, pub_net_id, port_id=None, tenant_id=None):
         fip_data = {
-            'tenant_id': tenant_id,
+            'tenant_id': tenant_id or self.worker.tenant_id,
             'floating_network_id': pub_net_id}
         if port_id:
             fip_data['port_id'] = port_id
@@ -408,13 +657,16 @@ class NeutronTestCase(TestCase):
         self.api.delete_floating_ip(fip_id)
         self.fips.remove(fip_id)
 
-    def create_port(self, name, net_id, tenant_id='admin', host=None,
+    def create_port(self, name, net_id, tenant_id=None, host=None,
                     host_iface=None, sub_id=None, ip_addr=None, mac=None,
                     port_security_enabled=None, device_owner=None,
                     device_id=None, sg_ids=None, allowed_address_pairs=None):
+        if host_iface:
+            self.require_whole_underlay(
+                'host interface ' + str(host) + '/' + host_iface)
         port_data = {'name': name,
                      'network_id': net_id,
-                     'tenant_id': tenant_id}
+                     'tenant_id': tenant_id or self.worker.tenant_id}
         if host:
             port_data['binding:host_id'] = host
         if host_iface:
@@ -480,12 +732,12 @@ class NeutronTestCase(TestCase):
         self.api.delete_port(port_id)
         self.nports.remove(port_id)
 
-    def create_network(self, name, admin_state_up=True, tenant_id='admin',
+    def create_network(self, name, admin_state_up=True, tenant_id=None,
                        external=False, uplink=False,
                        port_security_enabled=True):
         net_data = {'name': 'net_' + name,
                     'admin_state_up': admin_state_up,
-                    'tenant_id': tenant_id}
+                    'tenant_id': tenant_id or self.worker.tenant_id}
         if external:
             net_data['router:external'] = True
         if uplink:
@@ -516,14 +768,14 @@ class NeutronTestCase(TestCase):
         self.api.delete_network(net_id)
         self.nnets.remove(net_id)
 
-    def create_subnet(self, name, net_id, cidr, tenant_id='admin',
+    def create_subnet(self, name, net_id, cidr, tenant_id=None,
                       enable_dhcp=True):
         sub_data = {'name': 'sub_' + name,
                     'network_id': net_id,
                     'ip_version': 4,
                     'enable_dhcp': enable_dhcp,
                     'cidr': cidr,
-                    'tenant_id': tenant_id}
+                    'tenant_id': tenant_id or self.worker.tenant_id}
         sub = self.api.create_subnet({'subnet': sub_data})
         self.nsubs.append(sub['subnet']['id'])
         self.LOG.debug('Created Neutron subnet: ' + str(sub))
@@ -544,11 +796,11 @@ class NeutronTestCase(TestCase):
         self.api.delete_subnet(sub_id)
         self.nsubs.remove(sub_id)
 
-    def create_router(self, name, tenant_id='admin', pub_net_id=None,
+    def create_router(self, name, tenant_id=None, pub_net_id=None,
                       admin_state_up=True, priv_sub_ids=list()):
         router_data = {'name': name,
                        'admin_state_up': admin_state_up,
-                       'tenant_id': tenant_id}
+                       'tenant_id': tenant_id or self.worker.tenant_id}
         if pub_net_id:
             router_data['external_gateway_info'] = {'network_id': pub_net_id}
         router = self.api.create_router({'router': router_data})['router']
@@ -615,11 +867,23 @@ class NeutronTestCase(TestCase):
         if 'extraroute' in self.api_extension_map:
             self.api.update_router(rid, {'router': {'routes': None}})
 
+    def require_whole_underlay(self, what):
+        """
+        Fail at once, rather than racing the other workers, when a class
+        running in parallel uses part of the underlay they all share.
+        :type what: str
+        """
+        if self.worker.count > 1:
+            raise exceptions.ArgMismatchException(
+                self.get_name() + ' uses ' + what + ', which all workers '
+                'share, so it must set parallel_safe = False')
+
     def create_edge_router(self, pub_subnets=None, router_host_name='router1',
                            edge_host_name='edge1', edge_iface_name='eth1',
                            edge_subnet_cidr='172.16.2.0/24', gateway=True,
                            gateway_networks=None):
 
+        self.require_whole_underlay('edge router on ' + edge_host_name)
         if not pub_subnets:
             pub_subnets = [self.pub_subnet]
 
@@ -721,16 +985,17 @@ class NeutronTestCase(TestCase):
                                 ip_addr=tunnel_ip)
 
     def create_bgp_speaker(self, name, local_as, router_id,
-                           tenant_id='admin', ip_version=4):
+                           tenant_id=None, ip_version=4):
         speaker_data = {'name': name,
                         'logical_router': router_id,
-                        'tenant_id': tenant_id,
+                        'tenant_id': tenant_id or self.worker.tenant_id,
                         'local_as': local_as,
                         'ip_version': ip_version}
         curl_url = (neutron_api.get_neutron_api_url(self.api) +
                     '/bgp-speakers.json')
         self.LOG.debug("create bgp speaker JSON: " + str(speaker_data))
-        post_ret = curl_post(curl_url, {'bgp_speaker': speaker_data})
+        post_ret = self.neutron_curl_post(curl_url,
+                                          {'bgp_speaker': speaker_data})
         self.LOG.debug('Adding BGP speaker: ' + str(speaker_data) +
                        ', return data: ' + str(post_ret))
         speaker = json.loads(post_ret)
@@ -741,22 +1006,24 @@ class NeutronTestCase(TestCase):
         self.bgp_speakers.remove(bgp_speaker_id)
         self.curl_delete_bgp_speaker(bgp_speaker_id)
 
+    def bgp_speaker_url(self, bgp_speaker_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                '/bgp-speakers/' + bgp_speaker_id)
+
     def curl_delete_bgp_speaker(self, bgp_speaker_id):
-        curl_url = (neutron_api.get_neutron_api_url(self.api) +
-                    '/bgp-speakers/')
-        curl_delete(curl_url + bgp_speaker_id)
+        self.neutron_curl_delete(self.bgp_speaker_url(bgp_speaker_id))
 
     def create_bgp_peer(self, name, peer_ip, remote_as, auth_type='none',
-                        tenant_id='admin'):
+                        tenant_id=None):
         peer_data = {'name': name,
-                     'tenant_id': tenant_id,
+                     'tenant_id': tenant_id or self.worker.tenant_id,
                      'peer_ip': peer_ip,
                      'auth_type': auth_type,
                      'remote_as': remote_as}
         curl_url = (neutron_api.get_neutron_api_url(self.api) +
                     '/bgp-peers.json')
         self.LOG.debug("create bgp peer JSON: " + str(peer_data))
-        post_ret = curl_post(curl_url, {'bgp_peer': peer_data})
+        post_ret = self.neutron_curl_post(curl_url, {'bgp_peer': peer_data})
         self.LOG.debug('Adding BGP peer: ' + str(peer_data) +
                        ', return data: ' + str(post_ret))
         peer = json.loads(post_ret)
@@ -767,36 +1034,38 @@ class NeutronTestCase(TestCase):
         self.bgp_peers.remove(bgp_peer_id)
         self.curl_delete_bgp_peer(bgp_peer_id)
 
+    def bgp_peer_url(self, bgp_peer_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                '/bgp-peers/' + bgp_peer_id)
+
     def curl_delete_bgp_peer(self, bgp_peer_id):
-        curl_url = (neutron_api.get_neutron_api_url(self.api) +
-                    '/bgp-peers/')
-        curl_delete(curl_url + bgp_peer_id)
+        self.neutron_curl_delete(self.bgp_peer_url(bgp_peer_id))
 
     def add_bgp_speaker_peer(self, bgp_speaker_id, bgp_peer_id):
         curl_url = (neutron_api.get_neutron_api_url(self.api) +
                     '/bgp-speakers/' +
                     bgp_speaker_id + '/add_bgp_peer.json')
-        curl_put(curl_url, {'bgp_peer_id': bgp_peer_id})
+        self.neutron_curl_put(curl_url, {'bgp_peer_id': bgp_peer_id})
 
     def remove_bgp_speaker_peer(self, bgp_speaker_id, bgp_peer_id):
         curl_url = (neutron_api.get_neutron_api_url(self.api) +
                     '/bgp-speakers/' +
                     bgp_speaker_id + '/remove_bgp_peer.json')
-        curl_put(curl_url, {'bgp_peer_id': bgp_peer_id})
+        self.neutron_curl_put(curl_url, {'bgp_peer_id': bgp_peer_id})
 
     def create_remote_mac_entry(self, ip, mac, segment_id, gwdev_id):
         curl_url = neutron_api.get_neutron_api_url(self.api)
         mac_add_data_far = \
             {"remote_mac_entry": {
-                "tenant_id": "admin",
+                "tenant_id": self.worker.tenant_id,
                 "vtep_address": ip,
                 "mac_address": mac,
                 "segmentation_id": segment_id}}
         self.LOG.debug("RMAC JSON: " + str(mac_add_data_far))
         rmac_json_far_ret = \
-            curl_post(curl_url + '/gw/gateway_devices/' +
-                      str(gwdev_id) + "/remote_mac_entries",
-                      json_data=mac_add_data_far)
+            self.neutron_curl_post(curl_url + '/gw/gateway_devices/' +
+                                   str(gwdev_id) + "/remote_mac_entries",
+                                   json_data=mac_add_data_far)
         self.LOG.debug("Adding RMAC JSON: " + str(mac_add_data_far) +
                        ', return data: ' + str(rmac_json_far_ret))
         rmac = json.loads(rmac_json_far_ret)
@@ -808,11 +1077,13 @@ class NeutronTestCase(TestCase):
         self.curl_delete_remote_mac_entry(gwdev_id, rme_id)
         self.rmacs.remove((gwdev_id, rme_id))
 
+    def remote_mac_entry_url(self, gwdev_id, rme_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                "/gw/gateway_devices/" + str(gwdev_id) +
+                "/remote_mac_entries/" + str(rme_id))
+
     def curl_delete_remote_mac_entry(self, gwdev_id, rme_id):
-        curl_url = neutron_api.get_neutron_api_url(self.api)
-        curl_delete(curl_url +
-                    "/gw/gateway_devices/" + str(gwdev_id) +
-                    "/remote_mac_entries/" + str(rme_id))
+        self.neutron_curl_delete(self.remote_mac_entry_url(gwdev_id, rme_id))
 
     def create_gateway_device(self, resource_id, dev_type='router_vtep',
                               tunnel_ip=None, name=None):
@@ -820,7 +1091,7 @@ class NeutronTestCase(TestCase):
                     '/gw/gateway_devices')
         gw_dict = {"type": dev_type,
                    "resource_id": resource_id,
-                   "tenant_id": 'admin'}
+                   "tenant_id": self.worker.tenant_id}
 
         if dev_type == 'router_vtep':
             gw_dict["name"] = 'gwdev_' + name
@@ -829,7 +1100,7 @@ class NeutronTestCase(TestCase):
         gw_dev_dict = {"gateway_device": gw_dict}
 
         self.LOG.debug("create gateway device JSON: " + str(gw_dev_dict))
-        post_ret = curl_post(curl_url, gw_dev_dict)
+        post_ret = self.neutron_curl_post(curl_url, gw_dev_dict)
         self.LOG.debug('Adding gateway device: ' + str(gw_dev_dict) +
                        ', return data: ' + str(post_ret))
         gw = json.loads(post_ret)
@@ -846,7 +1117,7 @@ class NeutronTestCase(TestCase):
         curl_req = {"gateway_device": gwdict}
 
         curl_url = neutron_api.get_neutron_api_url(self.api)
-        device_json_ret = curl_put(
+        device_json_ret = self.neutron_curl_put(
             curl_url + '/gw/gateway_devices/' + gwdev_id, curl_req)
         self.LOG.debug("Update gateway device" + device_json_ret)
 
@@ -854,20 +1125,22 @@ class NeutronTestCase(TestCase):
         self.curl_delete_gateway_device(gwdev_id)
         self.gws.remove(gwdev_id)
 
+    def gateway_device_url(self, gwdev_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                '/gw/gateway_devices/' + gwdev_id)
+
     def curl_delete_gateway_device(self, gwdev_id):
-        curl_url = (neutron_api.get_neutron_api_url(self.api) +
-                    '/gw/gateway_devices/')
-        curl_delete(curl_url + gwdev_id)
+        self.neutron_curl_delete(self.gateway_device_url(gwdev_id))
 
     def create_l2_gateway(self, name, gwdev_id):
         curl_url = (neutron_api.get_neutron_api_url(self.api) +
                     '/l2-gateways')
         l2gw_data = {"l2_gateway": {"name": 'l2gw_' + name,
                                     "devices": [{"device_id": gwdev_id}],
-                                    "tenant_id": "admin"}}
+                                    "tenant_id": self.worker.tenant_id}}
 
         self.LOG.debug("L2GW JSON: " + str(l2gw_data))
-        l2_json_ret = curl_post(curl_url, l2gw_data)
+        l2_json_ret = self.neutron_curl_post(curl_url, l2gw_data)
         self.LOG.debug('Adding L2GW ' + name + ': ' + str(l2gw_data) +
                        ', return data: ' + str(l2_json_ret))
         l2gw = json.loads(l2_json_ret)
@@ -879,9 +1152,12 @@ class NeutronTestCase(TestCase):
         self.curl_delete_l2_gateway(l2gw_id)
         self.l2gws.remove(l2gw_id)
 
+    def l2_gateway_url(self, l2gw_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                "/l2-gateways/" + str(l2gw_id))
+
     def curl_delete_l2_gateway(self, l2gw_id):
-        curl_url = neutron_api.get_neutron_api_url(self.api)
-        curl_delete(curl_url + "/l2-gateways/" + str(l2gw_id))
+        self.neutron_curl_delete(self.l2_gateway_url(l2gw_id))
 
     def create_l2_gateway_connection(self, net_id, segment_id, l2gw_id):
         curl_url = (neutron_api.get_neutron_api_url(self.api) +
@@ -890,10 +1166,10 @@ class NeutronTestCase(TestCase):
             "network_id": net_id,
             "segmentation_id": segment_id,
             "l2_gateway_id": l2gw_id,
-            "tenant_id": "admin"}}
+            "tenant_id": self.worker.tenant_id}}
 
         self.LOG.debug("L2 Conn JSON: " + str(l2gw_conn_curl))
-        l2_conn_json_ret = curl_post(curl_url, l2gw_conn_curl)
+        l2_conn_json_ret = self.neutron_curl_post(curl_url, l2gw_conn_curl)
 
         self.LOG.debug('Adding L2 Conn: ' + str(l2_conn_json_ret))
 
@@ -906,9 +1182,12 @@ class NeutronTestCase(TestCase):
         self.curl_delete_l2_gateway_conn(l2gwconn_id)
         self.l2gw_conns.remove(l2gwconn_id)
 
+    def l2_gateway_conn_url(self, l2gwconn_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                "/l2-gateway-connections/" + l2gwconn_id)
+
     def curl_delete_l2_gateway_conn(self, l2gwconn_id):
-        curl_url = neutron_api.get_neutron_api_url(self.api)
-        curl_delete(curl_url + "/l2-gateway-connections/" + l2gwconn_id)
+        self.neutron_curl_delete(self.l2_gateway_conn_url(l2gwconn_id))
 
     def create_logging_resource(
             self, name, description='Logger resource', enabled=True):
@@ -920,12 +1199,12 @@ class NeutronTestCase(TestCase):
                 'name': name,
                 'description': description,
                 'enabled': enabled,
-                'tenant_id': 'admin'
+                'tenant_id': self.worker.tenant_id
             }
         }
 
         self.LOG.debug("Log Resource JSON: " + str(curl_data))
-        json_ret = curl_post(curl_url, curl_data)
+        json_ret = self.neutron_curl_post(curl_url, curl_data)
 
         self.LOG.debug('Adding Log Resource: ' + str(json_ret))
 
@@ -943,7 +1222,7 @@ class NeutronTestCase(TestCase):
             }
         }
         self.LOG.debug("Log Resource JSON: " + str(curl_data))
-        json_ret = curl_put(curl_url, curl_data)
+        json_ret = self.neutron_curl_put(curl_url, curl_data)
 
         self.LOG.debug('Updating Log Resource: ' + str(json_ret))
 
@@ -955,16 +1234,18 @@ class NeutronTestCase(TestCase):
         self.curl_delete_logging_resource(lgr_id)
         self.logging_resources.remove(lgr_id)
 
+    def logging_resource_url(self, lgr_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                '/logging/logging_resources/' + str(lgr_id))
+
     def curl_delete_logging_resource(self, lgr_id):
-        curl_url = (neutron_api.get_neutron_api_url(self.api) +
-                    '/logging/logging_resources/' + str(lgr_id))
-        curl_delete(curl_url)
+        self.neutron_curl_delete(self.logging_resource_url(lgr_id))
         self.LOG.debug('Deleted logging resource: ' + str(lgr_id))
 
-    def create_firewall(self, fw_policy_id, tenant_id="admin",
+    def create_firewall(self, fw_policy_id, tenant_id=None,
                         router_ids=list()):
         fw_data = {'firewall_policy_id': fw_policy_id,
-                   'tenant_id': tenant_id,
+                   'tenant_id': tenant_id or self.worker.tenant_id,
                    'router_ids': router_ids}
         fw = self.api.create_firewall({'firewall': fw_data})['firewall']
         self.fws.append(fw['id'])
@@ -974,9 +1255,9 @@ class NeutronTestCase(TestCase):
         self.api.delete_firewall(fw_id)
         self.fws.remove(fw_id)
 
-    def create_firewall_policy(self, name, tenant_id='admin'):
+    def create_firewall_policy(self, name, tenant_id=None):
         fwp_data = {'name': name,
-                    'tenant_id': tenant_id}
+                    'tenant_id': tenant_id or self.worker.tenant_id}
         fwp = self.api.create_firewall_policy({'firewall_policy': fwp_data})
         self.fwps.append(fwp['firewall_policy']['id'])
         return fwp['firewall_policy']
@@ -988,7 +1269,7 @@ class NeutronTestCase(TestCase):
     def create_firewall_rule(self, source_ip=None, dest_ip=None,
                              src_port=None, dest_port=None,
                              action='allow', protocol='tcp',
-                             tenant_id='admin'):
+                             tenant_id=None):
 
         fwpr_data = {'action': action,
                      'protocol': protocol,
@@ -996,7 +1277,7 @@ class NeutronTestCase(TestCase):
                      'shared': False,
                      'source_ip_address': source_ip,
                      'destination_ip_address': dest_ip,
-                     'tenant_id': tenant_id}
+                     'tenant_id': tenant_id or self.worker.tenant_id}
 
         if dest_port is not None:
             fwpr_data['destination_port'] = dest_port
@@ -1034,12 +1315,12 @@ class NeutronTestCase(TestCase):
                 'fw_event': fw_event,
                 'description': description,
                 'firewall_id': fw_id,
-                'tenant_id': 'admin'
+                'tenant_id': self.worker.tenant_id
             }
         }
 
         self.LOG.debug("FW log JSON: " + str(curl_data))
-        json_ret = curl_post(curl_url, curl_data)
+        json_ret = self.neutron_curl_post(curl_url, curl_data)
 
         self.LOG.debug('Adding FW log: ' + str(json_ret))
 
@@ -1063,7 +1344,7 @@ class NeutronTestCase(TestCase):
         }
 
         self.LOG.debug("FW log JSON: " + str(curl_data))
-        json_ret = curl_put(curl_url, curl_data)
+        json_ret = self.neutron_curl_put(curl_url, curl_data)
 
         self.LOG.debug('Adding FW log: ' + str(json_ret))
 
@@ -1076,11 +1357,13 @@ class NeutronTestCase(TestCase):
         self.curl_delete_firewall_log(res_id, fwlog_id)
         self.firewall_logs.remove((res_id, fwlog_id))
 
+    def firewall_log_url(self, res_id, fwlog_id):
+        return (neutron_api.get_neutron_api_url(self.api) +
+                '/logging/logging_resources/' + str(res_id) +
+                '/firewall_logs/' + str(fwlog_id))
+
     def curl_delete_firewall_log(self, res_id, fwlog_id):
-        curl_url = (neutron_api.get_neutron_api_url(self.api) +
-                    '/logging/logging_resources/' + str(res_id) +
-                    '/firewall_logs/' + str(fwlog_id))
-        curl_delete(curl_url)
+        self.neutron_curl_delete(self.firewall_log_url(res_id, fwlog_id))
         self.LOG.debug('Deleted firewall log object: ' + str(fwlog_id))
 
 
@@ -15,9 +15,23 @@
 import datetime
 import importlib
 import logging
+import socket
+import struct
 import sys
 import unittest
 from zephyr.common.exceptions import ArgMismatchException
+from zephyr.common import log_manager
+
+
+DEFAULT_TENANT_ID = 'admin'
+
+# How far apart (in the third octet) each worker's networks are placed, so
+# tests may use a few /24s of their own without reaching the next worker's
+WORKER_CIDR_STRIDE = 16
+
+# Smallest block of a public CIDR a worker may be given (a /28 leaves room
+# for a gateway and a dozen floating IPs)
+WORKER_MIN_PUBLIC_BLOCK_PREFIX = 28
 
 
 class EFException(unittest.case._ExpectedFailure):  # noqa
@@ -26,6 +40,69 @@ class EFException(unittest.case._ExpectedFailure):  # noqa
         self.issue_id = issue_id
 
 
+class TestWorker(object):
+    """
+    The slice of the shared underlay and API that the test classes run by
+    one worker use, so tests running in parallel don't trip over each
+    other's resources.  Worker 0 uses the same tenant, private networks
+    and names a serial run always has.
+    """
+
+    def __init__(self, index=0, count=1):
+        """
+        :type index: int
+        :type count: int How many workers are running
+        """
+        self.index = index
+        self.count = count
+        self.tenant_id = (DEFAULT_TENANT_ID if index == 0
+                          else DEFAULT_TENANT_ID + '_w' + str(index))
+        self.name_prefix = '' if index == 0 else 'w' + str(index) + '_'
+
+    def cidr(self, cidr):
+        """
+        Move an IPv4 CIDR into this worker's range, by adding a multiple
+        of WORKER_CIDR_STRIDE to its third octet.
+        :type cidr: str
+        :return: str
+        """
+        if self.index == 0:
+            return cidr
+        addr, _, prefix = cidr.partition('/')
+        octets = addr.split('.')
+        octets[2] = str(
+            (int(octets[2]) + self.index * WORKER_CIDR_STRIDE) % 256)
+        return '.'.join(octets) + ('/' + prefix if prefix else '')
+
+    def public_cidr(self, cidr):
+        """
+        This worker's block of a public IPv4 CIDR.  The underlay only routes
+        the public CIDR itself to the edge, so rather than being moved like
+        other networks, it is split into equal, non-overlapping blocks, one
+        per running worker (the whole CIDR when there's just the one).
+        :type cidr: str
+        :return: str
+        """
+        if self.count == 1:
+            return cidr
+        addr, _, prefix = cidr.partition('/')
+        prefix = int(prefix) if prefix else 32
+        bits = (self.count - 1).bit_length()
+        if prefix + bits > WORKER_MIN_PUBLIC_BLOCK_PREFIX:
+            raise ArgMismatchException(
+                'Public CIDR ' + cidr + ' is too small to split between ' +
+                str(self.count) + ' workers')
+        block_size = 1 << (32 - prefix - bits)
+        base = struct.unpack('!I', socket.inet_aton(addr))[0]
+        base &= ~((1 << (32 - prefix)) - 1) & 0xffffffff
+        return (socket.inet_ntoa(struct.pack(
+            '!I', base + self.index * block_size)) +
+            '/' + str(prefix + bits))
+
+    def __repr__(self):
+        return 'TestWorker(' + str(self.index) + ')'
+
+
 class TestCase(unittest.TestCase):
 
     vtm = None
@@ -34,6 +111,12 @@ class TestCase(unittest.TestCase):
     """ :type: zephyr.vtm.underlay.underlay_system.UnderlaySystem"""
     LOG = None
     """ :type: logging.Logger"""
+    worker = TestWorker()
+    """ :type: TestWorker"""
+    # False for classes which use parts of the underlay no worker has a
+    # slice of (edge router bindings, host routes, fixed uplink CIDRs), so
+    # run_parallel runs them on their own
+    parallel_safe = True
 
     @staticmethod
     def get_class(fqn):
@@ -82,6 +165,8 @@ class TestCase(unittest.TestCase):
 
     def run(self, result=None):
         self.start_time = datetime.datetime.utcnow()
+        # Tag everything logged from this thread with the test's id
+        log_manager.set_test_id(self.id())
         self.LOG.info('==================================================='
                       '=======================')
         self.LOG.info('Running test case: ' + self.get_name() + ' - ' +
@@ -107,9 +192,12 @@ class TestCase(unittest.TestCase):
                           '---------------------------')
             self.stop_time = datetime.datetime.utcnow()
             self.run_time = (self.stop_time - self.start_time)
+            log_manager.set_test_id(None)
 
     def debug(self):
         self.start_time = datetime.datetime.utcnow()
+        # Tag everything logged from this thread with the test's id
+        log_manager.set_test_id(self.id())
         self.LOG.info('==================================================='
                       '=======================')
         self.LOG.info('Running test case: ' + self.get_name() + ' - ' +
@@ -134,6 +222,7 @@ class TestCase(unittest.TestCase):
                           '---------------------------')
             self.stop_time = datetime.datetime.utcnow()
             self.run_time = (self.stop_time - self.start_time)
+            log_manager.set_test_id(None)
 
     def set_logger(self, log, console=None):
         self.LOG = log
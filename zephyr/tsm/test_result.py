@@ -36,6 +36,22 @@ class TestResult(unittest.TestResult):
         super(TestResult, self).addSuccess(test)
         self.successes.append(test)
 
+    def merge(self, other):
+        """
+        Add the outcomes of another result (e.g. from a parallel worker)
+        to this one.
+        :type other: TestResult
+        """
+        self.testsRun += other.testsRun
+        self.successes += other.successes
+        self.failures += other.failures
+        self.errors += other.errors
+        self.skipped += other.skipped
+        self.expectedFailures += other.expectedFailures
+        self.unexpectedSuccesses += other.unexpectedSuccesses
+        if other.shouldStop:
+            self.shouldStop = True
+
     def all_tests(self):
         return ([tc for tc in
                  self.successes + self.unexpectedSuccesses] +
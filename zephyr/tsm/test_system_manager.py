@@ -12,11 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent import futures
 import datetime
 import importlib
 import inspect
 import logging
 import pkgutil
+import Queue
 import sys
 import traceback
 import unittest
@@ -25,6 +27,7 @@ from zephyr.common.exceptions import *
 from zephyr.common.log_manager import LogManager
 from zephyr.common import zephyr_constants
 from zephyr.tsm.test_case import TestCase
+from zephyr.tsm.test_case import TestWorker
 from zephyr.tsm.test_result import TestResult
 
 DEFAULT_TEST_LOADER = {'unittest': unittest.defaultTestLoader}
@@ -34,7 +37,7 @@ DEFAULT_TEST_RUNNER = 'unittest'
 
 class TestSystemManager(object):
     def __init__(self, vtm, log_manager=None,
-                 test_system=DEFAULT_TEST_RUNNER, debug=False):
+                 test_system=DEFAULT_TEST_RUNNER, debug=False, workers=1):
         self.vtm = vtm
         """ :type: VirtualTopologyManager"""
         self.test_cases = {}
@@ -45,6 +48,8 @@ class TestSystemManager(object):
         """ :type: bool"""
         self.test_debug = False
         """ :type: bool"""
+        self.workers = workers
+        """ :type: int"""
         self.log_manager = (log_manager
                             if log_manager is not None
                             else LogManager('logs'))
@@ -367,6 +372,11 @@ class TestSystemManager(object):
             suite = unittest.TestSuite()
             """ :type suite: unittest.TestSuite"""
 
+        # Tests of each class, kept together so a class only ever runs in
+        # one worker
+        class_tests = []
+        """ :type: list[(type, list[TestCase])]"""
+
         # Prepare all of the test classes in this topology before run.
         # This will set up the entire class type with certain
         # class-globals so that any instances of the class will have
@@ -391,9 +401,12 @@ class TestSystemManager(object):
 
             test_loader = DEFAULT_TEST_LOADER[self.test_system]
             if func_set is None:
-                suite.addTest(test_loader.loadTestsFromTestCase(test_class))
+                class_suite = test_loader.loadTestsFromTestCase(test_class)
             else:
-                suite.addTest(test_loader.loadTestsFromNames(func_set))
+                class_suite = test_loader.loadTestsFromNames(func_set)
+            suite.addTest(class_suite)
+            class_tests.append(
+                (test_class, self.test_suite_to_flat_list(class_suite)))
 
         # Flatten the tests
         running_suite = unittest.TestSuite(self.test_suite_to_flat_list(suite))
@@ -419,7 +432,10 @@ class TestSystemManager(object):
                        '] at timestamp[' +
                        str(result.start_time) + ']')
         if self.test_system == 'unittest':
-            running_suite.run(result, debug=self.test_debug)
+            if self.workers > 1 and not self.test_debug:
+                self.run_parallel(suite_name, class_tests, result)
+            else:
+                running_suite.run(result, debug=self.test_debug)
         result.stop_time = datetime.datetime.utcnow()
         self.LOG.debug('Finished suite [' + suite_name +
                        '] at timestamp[' +
@@ -429,6 +445,66 @@ class TestSystemManager(object):
         self.result_map[suite_name] = result
         return result
 
+    def run_parallel(self, suite_name, class_tests, result):
+        """
+        Run the test classes across the workers, each worker with its own
+        tenant, networks and VM names (see TestWorker), and merge what
+        they report into the given result.  Workers take whole classes
+        (so class fixtures and class-level state stay in one thread) off
+        a shared queue, biggest classes first, so a long class doesn't
+        start last and hold up the end of the run.  Classes which aren't
+        parallel_safe are run afterwards, one at a time, with the whole
+        underlay to themselves.
+        :type suite_name: str
+        :type class_tests: list[(type, list[TestCase])]
+        :type result: TestResult
+        """
+        parallel_tests = [ct for ct in class_tests if ct[0].parallel_safe]
+        serial_tests = [ct for ct in class_tests if not ct[0].parallel_safe]
+
+        pending = Queue.Queue()
+        for test_class, tests in sorted(parallel_tests,
+                                        key=lambda ct: len(ct[1]),
+                                        reverse=True):
+            pending.put((test_class, tests))
+
+        def run_worker(worker, worker_result):
+            while not worker_result.shouldStop:
+                try:
+                    test_class, tests = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                self.LOG.debug('tsm: Worker ' + str(worker.index) +
+                               ' running test class: ' +
+                               test_class.get_name())
+                test_class.worker = worker
+                try:
+                    unittest.TestSuite(tests).run(worker_result)
+                finally:
+                    # Back to the serial defaults for any later run
+                    del test_class.worker
+
+        num_workers = min(self.workers, len(parallel_tests))
+        if num_workers > 0:
+            worker_results = [TestResult(suite_name)
+                              for _ in range(0, num_workers)]
+            with futures.ThreadPoolExecutor(
+                    max_workers=num_workers) as pool:
+                jobs = [pool.submit(run_worker, TestWorker(i, num_workers),
+                                    worker_results[i])
+                        for i in range(0, num_workers)]
+            for job in jobs:
+                job.result()
+            for worker_result in worker_results:
+                result.merge(worker_result)
+
+        for test_class, tests in serial_tests:
+            if result.shouldStop:
+                break
+            self.LOG.debug('tsm: Running test class on its own: ' +
+                           test_class.get_name())
+            unittest.TestSuite(tests).run(result)
+
     def create_results(self, results_dir='./results'):
         self.LOG.debug("Creating test_results")
         cli = LinuxCLI(priv=False)
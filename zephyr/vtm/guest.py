@@ -222,6 +222,20 @@ class Guest(object):
         return self.vm_underlay.start_echo_server(
             ip_addr, port, echo_data, protocol)
 
+    def start_echo_servers(self, ip_addr='localhost', ports=None,
+                           echo_data="pong", protocol='tcp'):
+        """
+        Start echo servers on all of the given ports at once, served by a
+        single process where the underlay supports it.
+        :param ip_addr: str
+        :param ports: list[int]
+        :param echo_data: str
+        :param protocol: str
+        :return: bool
+        """
+        return self.vm_underlay.start_echo_servers(
+            ip_addr, ports, echo_data, protocol)
+
     def stop_echo_server(self, ip_addr='localhost', port=DEFAULT_ECHO_PORT):
         """
         Stop an echo server that has been started on given ip/port (defaults to
@@ -251,6 +265,52 @@ class Guest(object):
             echo_request=echo_request, protocol=protocol,
             timeout=timeout)
 
+    def send_echo_requests(self, dest_ip='localhost',
+                           dest_port=DEFAULT_ECHO_PORT,
+                           echo_requests=list(['ping']), protocol='tcp',
+                           timeout=10, concurrency=1, keep_alive=False):
+        """
+        Send a batch of echo requests over the specified protocol to dest_ip
+        on dest_port, up to concurrency of them at a time, and return the
+        outcome of each (see UnderlayHost.send_echo_requests), in order.
+        :param dest_ip: str
+        :param dest_port: int
+        :param echo_requests: list[str]
+        :param protocol: str
+        :param concurrency: int
+        :param keep_alive: bool
+        :return: list[dict[str, any]]
+        """
+        return self.vm_underlay.send_echo_requests(
+            dest_ip=dest_ip, dest_port=dest_port,
+            echo_requests=echo_requests, protocol=protocol,
+            timeout=timeout, concurrency=concurrency, keep_alive=keep_alive)
+
+    def generate_echo_load(self, dest_ip='localhost',
+                           dest_port=DEFAULT_ECHO_PORT, connections=1,
+                           rate=None, duration=10, echo_request='ping',
+                           protocol='tcp', timeout=10, keep_alive=False):
+        """
+        Send echo requests from this guest to dest_ip on dest_port over
+        the given number of concurrent connections, at the given total
+        rate per second (or as fast as they are answered), for the
+        duration in seconds, and return a report of the throughput, errors
+        and latency percentiles (see UnderlayHost.generate_echo_load).
+        :param dest_ip: str
+        :param dest_port: int
+        :param connections: int
+        :param rate: float
+        :param duration: float
+        :param echo_request: str
+        :param protocol: str
+        :param keep_alive: bool
+        :return: dict[str, any]
+        """
+        return self.vm_underlay.generate_echo_load(
+            dest_ip=dest_ip, dest_port=dest_port, connections=connections,
+            rate=rate, duration=duration, echo_request=echo_request,
+            protocol=protocol, timeout=timeout, keep_alive=keep_alive)
+
     def execute(self, cmd_line, timeout=None, blocking=True):
         """
         Execute the given cmd_line command on this guest, using an optional
@@ -14,26 +14,46 @@
 
 
 from collections import namedtuple
+import errno
 import logging
 import neutronclient.v2_0.client as neutron_client
+import os
+import stat
 
 from zephyr.common.cli import LinuxCLI
+from zephyr.common import exceptions
+from zephyr.midonet.mn_backup import MidonetBackup
+from zephyr.vtm.neutron_cache import NeutronClientCache
 
 NetData = namedtuple('NetData', 'network subnet')
 RouterData = namedtuple('RouterData', 'router if_list')
 BasicTopoData = namedtuple('BasicTopoData', 'main_net pub_net router')
 
+NEUTRON_DB_USER = 'root'
+NEUTRON_DB_PASS = 'cat'
+# Where clean_neutron keeps its snapshots of the clean neutron database
+# (lost on reboot, after which the next clean takes a new one).  The
+# directory is created private to this user, and not used otherwise, as
+# the snapshots are loaded as the mysql root user.
+NEUTRON_DB_SNAPSHOT_DIR = '/tmp/zephyr-neutron-db-snapshots'
+
 
 def create_neutron_client(api_version='2.0',
                           endpoint_url='http://localhost:9696',
                           auth_strategy='noauth', tenant_name='admin',
-                          token='cat', **kwargs):
+                          token='cat', cache_ttl=None, **kwargs):
+    """
+    :type cache_ttl: float Wrap the client in a NeutronClientCache which
+    keeps listings for this many seconds (no cache if None)
+    """
     import neutronclient.neutron.client
     client = neutronclient.neutron.client.Client(
         api_version, endpoint_url=endpoint_url,
         auth_strategy=auth_strategy,
         token=token, tenant_name=tenant_name, **kwargs)
     """ :type: neutronclient.v2_0.client.Client"""
+    if cache_ttl is not None:
+        return NeutronClientCache(client, ttl=float(cache_ttl))
     return client
 
 
@@ -62,43 +82,137 @@ def setup_neutron(api, tenant_id='admin', log=None):
                                            'vip': -1}})
 
 
-def clean_neutron(log=None):
+def get_neutron_db_versions(cli, log):
     """
-    Deletes the network named 'main' in the 'admin' tenant along with the
-    subnet. Deletes the default secutiry group.
+    :type cli: LinuxCLI
     :type log: logging.Logger
-    :return:
+    :return: (str, str) The current neutron and midonet DB versions
+    (empty if not found)
     """
-
-    log.debug('Clearing neutron database')
-    cli = LinuxCLI(log_cmd=True)
     cmdout = cli.cmd(
         r"neutron-db-manage current 2>&1 | grep '(.*)' | "
         r"awk '{ print $2 }' | sed 's/(\(.*\))/\1/g'")
     log.debug(
         'neutron-db-manage-current out: ' +
         cmdout.stdout + '/' + cmdout.stderr)
-    current_neutron_db = cmdout.stdout.strip().split()[0]
+    current_neutron_db = ''.join(cmdout.stdout.split()[0:1])
     cmdout = cli.cmd(r"midonet-db-manage current 2>&1 | grep '(.*)' | "
                      r"awk '{ print $2 }' | sed 's/(\(.*\))/\1/g'")
     log.debug(
         'midoent-db-manage-current out: ' +
         cmdout.stdout + '/' + cmdout.stderr)
     current_midonet_db = cmdout.stdout.strip()
+    return current_neutron_db, current_midonet_db
+
+
+def make_neutron_db_snapshot_dir(snapshot_dir, log):
+    """
+    Create the snapshot directory (readable and writable only by this
+    user) if it is missing.
+    :type snapshot_dir: str
+    :type log: logging.Logger
+    :return: bool False if the directory can't be trusted with snapshots:
+    it is not a directory, is owned by someone else, or is writable by
+    anyone else
+    """
+    try:
+        os.mkdir(snapshot_dir, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            log.warning('Cannot create neutron database snapshot dir: ' +
+                        snapshot_dir + ': ' + str(e))
+            return False
+    st = os.lstat(snapshot_dir)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+            st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+        log.warning('Not using neutron database snapshot dir: ' +
+                    snapshot_dir + ': it must be a directory owned by, '
+                    'and only writable by, uid ' + str(os.getuid()))
+        return False
+    return True
+
+
+def get_neutron_db_snapshot(snapshot_dir, versions):
+    """
+    :type snapshot_dir: str
+    :type versions: (str, str) The neutron and midonet DB versions
+    :return: MidonetBackup The (data only) snapshot of the clean neutron
+    database for these DB versions
+    """
+    name = 'neutron-db-' + '-'.join(
+        ''.join(c if c.isalnum() else '_' for c in v) for v in versions)
+    return MidonetBackup(name, root_dir=snapshot_dir, zkdump=False,
+                         mysql_user=NEUTRON_DB_USER,
+                         mysql_pass=NEUTRON_DB_PASS,
+                         mysql_data_only=True)
+
+
+def clean_neutron(log=None, snapshot_dir=None):
+    """
+    Restores the neutron database to a zero-state.  With a snapshot_dir,
+    the clean database is saved there (keyed by the neutron and midonet DB
+    versions) the first time, and later cleans just empty the tables and
+    load that snapshot back, rather than re-creating the database and
+    running every migration and restarting neutron.  A change of either
+    version misses the snapshot, and so takes the full path again.  If
+    either version can't be found, or the snapshot_dir isn't private to
+    this user (see make_neutron_db_snapshot_dir), snapshots aren't used.
+    :type log: logging.Logger
+    :type snapshot_dir: str
+    :return:
+    """
+
+    cli = LinuxCLI(log_cmd=True)
+    versions = get_neutron_db_versions(cli, log)
+    snapshot = None
+    if snapshot_dir is not None and not all(versions):
+        log.warning('Not using neutron database snapshots, as the DB '
+                    'versions (neutron/mn) are not known: (' +
+                    versions[0] + '/' + versions[1] + ')')
+    elif (snapshot_dir is not None and
+            make_neutron_db_snapshot_dir(snapshot_dir, log)):
+        snapshot = get_neutron_db_snapshot(snapshot_dir, versions)
+        if snapshot.has_mysql_file():
+            log.debug('Restoring neutron database from snapshot: ' +
+                      snapshot.mysql_file())
+            try:
+                snapshot.load()
+                clean_dhcp_namespaces()
+                return
+            except exceptions.SubprocessFailedException as e:
+                log.warning('Restoring snapshot failed, re-creating the '
+                            'neutron database instead: ' + str(e))
+                cli.rm(snapshot.mysql_file())
+
+    log.debug('Clearing neutron database')
     cli.cmd(
-        'mysql -u root --password=cat neutron -e "DROP DATABASE neutron"')
+        'mysql -u ' + NEUTRON_DB_USER + ' --password=' + NEUTRON_DB_PASS +
+        ' neutron -e "DROP DATABASE neutron"')
     log.debug('Re-creating clean neutron database')
     cli.cmd(
-        'mysql --user=root --password=cat -e '
+        'mysql --user=' + NEUTRON_DB_USER +
+        ' --password=' + NEUTRON_DB_PASS + ' -e '
         '"CREATE DATABASE IF NOT EXISTS neutron"')
     log.debug(
         'Re-populating neutron and midonet tables '
         'for version (neutron/mn): (' +
-        current_neutron_db + '/' + current_midonet_db + ')')
-    cli.cmd("neutron-db-manage upgrade " + current_neutron_db)
-    cli.cmd("midonet-db-manage upgrade " + current_midonet_db)
+        versions[0] + '/' + versions[1] + ')')
+    cli.cmd("neutron-db-manage upgrade " + versions[0])
+    cli.cmd("midonet-db-manage upgrade " + versions[1])
+    if snapshot is not None:
+        # Taken before neutron starts up and adds anything of its own
+        log.debug('Saving neutron database snapshot: ' +
+                  snapshot.mysql_file())
+        try:
+            snapshot.save()
+        except exceptions.SubprocessFailedException as e:
+            log.warning('Saving snapshot failed: ' + str(e))
     log.debug('Restarting neutron')
     cli.cmd("service neutron-server restart")
+    clean_dhcp_namespaces()
+
+
+def clean_dhcp_namespaces():
     LinuxCLI(priv=False).cmd(
         'for i in `ip netns | grep qdhcp`; do sudo ip netns del $i; done')
 
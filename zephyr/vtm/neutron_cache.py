@@ -0,0 +1,253 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import functools
+import threading
+import time
+
+# Seconds a listing is trusted for, as a guard against changes made
+# outside of the client (by agents or other tools)
+DEFAULT_CACHE_TTL = 5.0
+
+# Cached resources, by collection name, with their single resource names
+CACHED_RESOURCES = {
+    'ports': 'port',
+    'networks': 'network',
+    'subnets': 'subnet',
+    'routers': 'router',
+    'floatingips': 'floatingip',
+    'security_groups': 'security_group'}
+CACHED_COLLECTIONS = {v: k for k, v in CACHED_RESOURCES.iteritems()}
+
+INDEXED_FIELDS = ('id', 'name', 'device_owner')
+
+# List parameters which aren't filters, so can't be answered from a
+# cached listing
+UNCACHED_LIST_PARAMS = {'fields', 'sort_key', 'sort_dir', 'limit',
+                        'marker', 'page_reverse', 'retrieve_all'}
+
+# Calls which only read, and so leave the cache as it is
+READ_PREFIXES = ('list_', 'show_', 'get_', 'find_', 'retrieve_')
+
+
+def filter_value_matches(actual, wanted):
+    """
+    Whether a resource's field matches a filter value as neutron's own
+    filtering would, where filter values given as strings ('True', '4')
+    match the booleans and numbers they name.
+    :type actual: any
+    :type wanted: any
+    :return: bool
+    """
+    if isinstance(wanted, (list, tuple, set)):
+        return any(filter_value_matches(actual, w) for w in wanted)
+    if actual == wanted:
+        return True
+    return (isinstance(wanted, basestring) and actual is not None and
+            not isinstance(actual, basestring) and
+            str(actual).lower() == wanted.lower())
+
+
+class ResourceIndex(object):
+    """
+    One listing of a type of resource, indexed by INDEXED_FIELDS.
+    """
+
+    def __init__(self, items, loaded_at):
+        """
+        :type items: list[dict[str, any]]
+        :type loaded_at: float
+        """
+        self.items = items
+        self.loaded_at = loaded_at
+        self.by_field = {field: {} for field in INDEXED_FIELDS}
+        """ :type: dict[str, dict[any, list[dict[str, any]]]]"""
+        for item in items:
+            for field in INDEXED_FIELDS:
+                if field in item:
+                    self.by_field[field].setdefault(
+                        item[field], []).append(item)
+
+    def find(self, filters):
+        """
+        :type filters: dict[str, any]
+        :return: list[dict[str, any]] The matching resources, or None if
+        the filters can't be answered from the listing (they name fields
+        holding lists or dicts, say)
+        """
+        candidates = self.items
+        for field, wanted in filters.iteritems():
+            if (field in self.by_field and
+                    not isinstance(wanted, (list, tuple, set))):
+                candidates = self.by_field[field].get(wanted, [])
+                break
+
+        matches = []
+        for item in candidates:
+            matched = True
+            for field, wanted in filters.iteritems():
+                actual = item.get(field)
+                if isinstance(actual, (list, dict)):
+                    return None
+                if not filter_value_matches(actual, wanted):
+                    matched = False
+            if matched:
+                matches.append(item)
+        return matches
+
+
+class NeutronClientCache(object):
+    """
+    A read-through cache wrapped around a neutron client.  The list_* and
+    show_* calls for the CACHED_RESOURCES are answered from one full
+    listing of each resource type, indexed by id, name and device_owner,
+    which is kept for at most ttl seconds.  Any call made through the
+    cache which isn't a read (create_*, update_*, delete_*,
+    add_interface_router and so on) drops all of the listings, as one
+    change can touch several types of resource (a router interface adds
+    a port, for one).  All other calls and attributes are passed through
+    to the client.
+    """
+
+    def __init__(self, client, ttl=DEFAULT_CACHE_TTL):
+        """
+        :type client: neutronclient.v2_0.client.Client
+        :type ttl: float
+        """
+        self.client = client
+        self.ttl = ttl
+        self.indexes = {}
+        """ :type: dict[str, ResourceIndex]"""
+        # Bumped on every invalidation, so a listing fetched across one
+        # isn't kept
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == 'client':
+            raise AttributeError(name)
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        if name.startswith('list_') and name[5:] in CACHED_RESOURCES:
+            return functools.partial(self.cached_list, name[5:])
+        if name.startswith('show_') and name[5:] in CACHED_COLLECTIONS:
+            return functools.partial(self.cached_show,
+                                     CACHED_COLLECTIONS[name[5:]])
+        if name.startswith(READ_PREFIXES):
+            return attr
+
+        @functools.wraps(attr)
+        def call_and_invalidate(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self.invalidate_cache()
+        return call_and_invalidate
+
+    def invalidate_cache(self):
+        """
+        Drop all cached listings (after a change made to neutron outside
+        of this client, say).
+        """
+        with self.lock:
+            self.indexes = {}
+            self.generation += 1
+            self.invalidations += 1
+
+    def cache_stats(self):
+        """
+        :return: dict[str, int] Counts of 'hits', 'misses' (calls which
+        went to neutron) and 'invalidations'
+        """
+        with self.lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'invalidations': self.invalidations}
+
+    def count(self, hit):
+        """
+        :type hit: bool
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_index(self, collection):
+        """
+        :type collection: str
+        :return: (ResourceIndex, bool) The listing of the collection, and
+        whether it was already cached
+        """
+        with self.lock:
+            index = self.indexes.get(collection)
+            if (index is not None and
+                    time.time() - index.loaded_at < self.ttl):
+                return index, True
+            generation = self.generation
+
+        loaded_at = time.time()
+        items = getattr(self.client, 'list_' + collection)()[collection]
+        index = ResourceIndex(items, loaded_at)
+        with self.lock:
+            if self.generation == generation:
+                self.indexes[collection] = index
+        return index, False
+
+    def cached_list(self, collection, retrieve_all=True, **params):
+        """
+        :type collection: str
+        :type retrieve_all: bool
+        :return: dict[str, list[dict[str, any]]]
+        """
+        list_func = getattr(self.client, 'list_' + collection)
+        if (not retrieve_all or
+                len(UNCACHED_LIST_PARAMS.intersection(params)) > 0):
+            self.count(False)
+            return list_func(retrieve_all=retrieve_all, **params)
+
+        index, cached = self.get_index(collection)
+        matches = index.find(params)
+        if matches is None:
+            self.count(False)
+            return list_func(**params)
+        self.count(cached)
+        return {collection: copy.deepcopy(matches)}
+
+    def cached_show(self, collection, resource_id, **params):
+        """
+        :type collection: str
+        :type resource_id: str
+        :return: dict[str, dict[str, any]]
+        """
+        resource = CACHED_RESOURCES[collection]
+        show_func = getattr(self.client, 'show_' + resource)
+        if len(params) > 0:
+            self.count(False)
+            return show_func(resource_id, **params)
+
+        index, cached = self.get_index(collection)
+        matches = index.by_field['id'].get(resource_id)
+        if not matches:
+            # Let neutron answer (or raise its not-found error)
+            self.count(False)
+            return show_func(resource_id)
+        self.count(cached)
+        return {resource: copy.deepcopy(matches[0])}
@@ -250,14 +250,14 @@ class DirectUnderlayHost(underlay_host.UnderlayHost):
         tcps = TCPSender()
         opt_map = {'command': command}
         if source_mac is not None:
-            opt_map = {'smac': source_mac}
+            opt_map['smac'] = source_mac
         if dest_mac is not None:
-            opt_map = {'tmac': dest_mac}
+            opt_map['tmac'] = dest_mac
         if source_ip is not None:
-            opt_map = {'sip': source_ip}
+            opt_map['sip'] = source_ip
         if dest_ip is not None:
-            opt_map = {'tip': dest_ip}
-        opt_map += packet_options
+            opt_map['tip'] = dest_ip
+        opt_map.update(packet_options or {})
         return tcps.send_packet(self.cli, interface=iface, dest_ip=dest_ip,
                                 packet_type='arp',
                                 packet_options=opt_map, count=count).stdout
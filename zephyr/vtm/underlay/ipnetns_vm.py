@@ -17,6 +17,7 @@ from zephyr.common import cli
 from zephyr.common import exceptions
 from zephyr.common import ip
 from zephyr.common import utils
+from zephyr.common import zephyr_constants
 from zephyr.vtm.underlay import direct_underlay_host
 from zephyr.vtm.underlay import vm_base
 
@@ -80,7 +81,7 @@ class IPNetnsVM(direct_underlay_host.DirectUnderlayHost,
                 self.stop_dhcp_client(iface)
                 raise exceptions.HostNotFoundException(
                     'No IP addr received from DHCP')
-            time.sleep(0)
+            time.sleep(zephyr_constants.DHCP_POLL_INTERVAL)
 
         ip_addr = self.get_ip(iface)
         self.dhcpcd_is_running.add(iface)
@@ -14,6 +14,7 @@
 
 import abc
 import time
+from zephyr.common.echo_client import echo_reply
 from zephyr.common import exceptions
 from zephyr.common.zephyr_constants import DEFAULT_ECHO_PORT
 
@@ -86,36 +87,55 @@ class UnderlayHost(object):
         :param protocol: str
         :rtype: bool
         """
+        return self.start_echo_servers(ip_addr, [port], echo_data, protocol)
+
+    def start_echo_servers(self, ip_addr='', ports=None,
+                           echo_data="pong", protocol='tcp'):
+        """
+        Start echo servers on all of the given ports (from one process,
+        where the underlay supports it) and wait until each one answers.
+        :param ip_addr: str
+        :param ports: list[int]
+        :param echo_data: str
+        :param protocol: str 'tcp', 'udp' or 'tcp,udp'
+        :rtype: bool
+        """
+        if ports is None:
+            ports = [DEFAULT_ECHO_PORT]
         self.LOG.debug('Starting echo server on host [' + self.name +
-                       '] on IP and port: ' +
+                       '] on IP and ports: ' +
                        (str(ip_addr) if ip_addr != '' else '*') +
-                       ':' + str(port))
-        self.do_start_echo_server(ip_addr, port, echo_data, protocol)
+                       ':' + ','.join(str(p) for p in ports))
+        self.do_start_echo_servers(ip_addr, ports, echo_data, protocol)
         timeout = time.time() + 5
-        conn_resp = ''
-        while conn_resp != 'connect-test:' + echo_data:
-            try:
-                conn_ip = ip_addr if ip_addr != '' else '127.0.0.1'
-                conn_resp = self.send_echo_request(
-                    dest_ip=conn_ip, dest_port=port,
-                    echo_request='connect-test', protocol=protocol)
-            except exceptions.SubprocessFailedException:
+        for port in ports:
+            for proto in protocol.split(','):
                 conn_resp = ''
-
-            if time.time() > timeout:
-                out = self.stop_echo_server(ip_addr, port)
-                stdout = out[0] if out else ''
-                stderr = out[1] if out else ''
-                self.LOG.error(
-                    'Echo server listener failed to bind to port '
-                    'within timeout (stdout/stderr): ' +
-                    str(stdout.replace('\\n', '\n')) + " / " +
-                    str(stderr.replace('\\n', '\n')))
-                raise exceptions.SubprocessTimeoutException(
-                    'Echo server listener failed to bind to port '
-                    'within timeout (stdout/stderr): ' +
-                    str(stdout.replace('\\n', '\n')) + " / " +
-                    str(stderr.replace('\\n', '\n')))
+                while conn_resp != 'connect-test:' + echo_data:
+                    try:
+                        conn_ip = ip_addr if ip_addr != '' else '127.0.0.1'
+                        conn_resp = self.send_echo_request(
+                            dest_ip=conn_ip, dest_port=port,
+                            echo_request='connect-test', protocol=proto)
+                    except exceptions.SubprocessFailedException:
+                        conn_resp = ''
+
+                    if time.time() > timeout:
+                        out = None
+                        for p in ports:
+                            out = self.stop_echo_server(ip_addr, p) or out
+                        stdout = out[0] if out else ''
+                        stderr = out[1] if out else ''
+                        self.LOG.error(
+                            'Echo server listener failed to bind to port '
+                            'within timeout (stdout/stderr): ' +
+                            str(stdout.replace('\\n', '\n')) + " / " +
+                            str(stderr.replace('\\n', '\n')))
+                        raise exceptions.SubprocessTimeoutException(
+                            'Echo server listener failed to bind to port '
+                            'within timeout (stdout/stderr): ' +
+                            str(stdout.replace('\\n', '\n')) + " / " +
+                            str(stderr.replace('\\n', '\n')))
         return True
 
     @abc.abstractmethod
@@ -123,6 +143,12 @@ class UnderlayHost(object):
                              echo_data="pong", protocol='tcp'):
         return None
 
+    def do_start_echo_servers(self, ip_addr='', ports=None,
+                              echo_data="pong", protocol='tcp'):
+        # Underlays without a multi-port echo server start one per port
+        for port in ports:
+            self.do_start_echo_server(ip_addr, port, echo_data, protocol)
+
     def stop_echo_server(self, ip_addr='', port=DEFAULT_ECHO_PORT):
         """
         Stop an echo server that has been started on given ip/port (defaults to
@@ -141,19 +167,13 @@ class UnderlayHost(object):
     def do_stop_echo_server(self, ip_addr='', port=DEFAULT_ECHO_PORT):
         return None
 
-    def send_echo_request(self, dest_ip='localhost',
-                          dest_port=DEFAULT_ECHO_PORT,
-                          echo_request='ping',
-                          protocol='tcp', timeout=10):
+    def pre_cache_ip(self, dest_ip, dest_port=DEFAULT_ECHO_PORT):
         """
-        Create a TCP connection to send specified request string to dest_ip
-        on dest_port (defaults to localhost:80) and return the response.
+        If the overlay needs it, send a first, throwaway echo request to
+        a far IP so the topology to it is cached before the requests whose
+        replies count.
         :param dest_ip: str
         :param dest_port: int
-        :param echo_request: str
-        :param protocol: str
-        :param timeout: int
-        :rtype: str
         """
         overlay_settings = self.get_overlay_settings()
         if (dest_ip != 'localhost' and
@@ -170,6 +190,22 @@ class UnderlayHost(object):
                 pass
             self.cached_ips.add(dest_ip)
 
+    def send_echo_request(self, dest_ip='localhost',
+                          dest_port=DEFAULT_ECHO_PORT,
+                          echo_request='ping',
+                          protocol='tcp', timeout=10):
+        """
+        Create a TCP connection to send specified request string to dest_ip
+        on dest_port (defaults to localhost:80) and return the response.
+        :param dest_ip: str
+        :param dest_port: int
+        :param echo_request: str
+        :param protocol: str
+        :param timeout: int
+        :rtype: str
+        """
+        self.pre_cache_ip(dest_ip, dest_port)
+
         self.LOG.debug(
             'Sending TCP echo [' + echo_request +
             '] to far host IP: ' + dest_ip + ' on port: ' + str(dest_port))
@@ -187,6 +223,109 @@ class UnderlayHost(object):
                              protocol='tcp', timeout=10):
         return None
 
+    def send_echo_requests(self, dest_ip='localhost',
+                           dest_port=DEFAULT_ECHO_PORT,
+                           echo_requests=list(['ping']),
+                           protocol='tcp', timeout=10, concurrency=1,
+                           keep_alive=False):
+        """
+        Send a batch of echo requests to dest_ip on dest_port, up to
+        concurrency of them at a time, and return the outcome of each, in
+        order, as a dict with the 'reply' ('' if none came), its 'source'
+        (the echo data of the server that answered), the 'latency' in
+        seconds, and the 'error' (None if it succeeded).
+        :param dest_ip: str
+        :param dest_port: int
+        :param echo_requests: list[str]
+        :param protocol: str
+        :param timeout: int
+        :param concurrency: int
+        :param keep_alive: bool Reuse TCP connections between requests
+        :rtype: list[dict[str, any]]
+        """
+        self.pre_cache_ip(dest_ip, dest_port)
+
+        self.LOG.debug(
+            'Sending ' + str(len(echo_requests)) + ' ' + protocol +
+            ' echoes to far host IP: ' + dest_ip + ' on port: ' +
+            str(dest_port))
+        replies = self.do_send_echo_requests(
+            dest_ip, dest_port, echo_requests, protocol, timeout,
+            concurrency, keep_alive)
+        self.LOG.debug(
+            'Got replies from IP/PORT: ' + dest_ip + '/' + str(dest_port) +
+            '= ' + str([r['reply'] for r in replies]))
+        return replies
+
+    def do_send_echo_requests(self, dest_ip='localhost',
+                              dest_port=DEFAULT_ECHO_PORT,
+                              echo_requests=list(['ping']),
+                              protocol='tcp', timeout=10, concurrency=1,
+                              keep_alive=False):
+        # Underlays without a batch echo client send one at a time
+        replies = []
+        for echo_request in echo_requests:
+            start = time.time()
+            try:
+                reply = self.do_send_echo_request(
+                    dest_ip, dest_port, echo_request, protocol, timeout)
+            except exceptions.SubprocessFailedException as e:
+                replies.append(echo_reply(latency=time.time() - start,
+                                          error=str(e)))
+            else:
+                replies.append(echo_reply(reply or '',
+                                          time.time() - start))
+        return replies
+
+    def generate_echo_load(self, dest_ip='localhost',
+                           dest_port=DEFAULT_ECHO_PORT, connections=1,
+                           rate=None, duration=10, echo_request='ping',
+                           protocol='tcp', timeout=10, keep_alive=False):
+        """
+        Send echo requests to dest_ip on dest_port over the given number of
+        concurrent connections, at the given total rate per second (or as
+        fast as they are answered), for the duration in seconds.  Return a
+        report with the 'requests', 'replies', 'errors' (and
+        'error_counts' by error), 'throughput' in replies per second, and
+        'latency' percentiles in seconds ('p50', 'p99', 'p999', etc.)
+        along with the full 'histogram'.
+        :param dest_ip: str
+        :param dest_port: int
+        :param connections: int
+        :param rate: float
+        :param duration: float
+        :param echo_request: str
+        :param protocol: str
+        :param timeout: int
+        :param keep_alive: bool Reuse TCP connections between requests
+        :rtype: dict[str, any]
+        """
+        self.pre_cache_ip(dest_ip, dest_port)
+
+        self.LOG.debug(
+            'Generating ' + protocol + ' echo load to far host IP: ' +
+            dest_ip + ' on port: ' + str(dest_port) + ' from ' +
+            str(connections) + ' connections at ' +
+            (str(rate) + '/s' if rate else 'full rate') + ' for ' +
+            str(duration) + 's')
+        report = self.do_generate_echo_load(
+            dest_ip, dest_port, connections, rate, duration, echo_request,
+            protocol, timeout, keep_alive)
+        if report is not None:
+            self.LOG.debug(
+                'Echo load to IP/PORT: ' + dest_ip + '/' + str(dest_port) +
+                ': ' + str(report['replies']) + ' replies, ' +
+                str(report['errors']) + ' errors, ' +
+                str(report['throughput']) + '/s, latency: ' +
+                str(report['latency']))
+        return report
+
+    def do_generate_echo_load(self, dest_ip='localhost',
+                              dest_port=DEFAULT_ECHO_PORT, connections=1,
+                              rate=None, duration=10, echo_request='ping',
+                              protocol='tcp', timeout=10, keep_alive=False):
+        return None
+
     def send_custom_packet(self, iface, **kwargs):
         return None
 
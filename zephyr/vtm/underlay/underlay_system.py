@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import logging
+import threading
 from zephyr.common import exceptions
 from zephyr.common import zephyr_constants as z_con
 
@@ -27,6 +28,12 @@ class UnderlaySystem(object):
         self.debug = debug
         self.log_manager = log_manager
         self.hypervisors = {}
+        # VMs may be requested by several test workers at once
+        self.vm_lock = threading.Lock()
+        # VMs still being created, by hypervisor, and their names
+        self.pending_vms = {}
+        """ :type: dict[UnderlayHost, int]"""
+        self.pending_vm_names = set()
         self.log_file_name = log_file
         self.log_level = (logging.DEBUG
                           if debug is True
@@ -69,44 +76,61 @@ class UnderlaySystem(object):
             (' on host: ' + str(requested_host) if requested_host else '') +
             (' with name: ' + name if name else ''))
 
-        if name is not None:
-            requested_vm_name = name
-        else:
-            requested_vm_name = 'vm_' + str(self.global_vm_id)
-            self.global_vm_id += 1
-
-        valid_host_map = hv_map.copy()
-        if requested_host:
-            if not isinstance(requested_host, list):
-                requested_host = [requested_host]
-            first_positive = True
-            for rh in requested_host:
-                if rh.startswith('!'):
-                    valid_host_map.pop(rh[1:])
-                else:
-                    if rh not in hv_map:
-                        raise exceptions.ArgMismatchException(
-                            "Cannot start VM, unknown hypervisor: " +
-                            rh)
-
-                    # If there is at least one requested host, then only
-                    # include it in the list of possible hosts.  Further
-                    # positive entries will add to this list, just as
-                    # negative entries will remove them from the list.
-                    if first_positive:
-                        valid_host_map = {rh: hv_map[rh]}
-                        first_positive = False
+        with self.vm_lock:
+            if name is not None:
+                requested_vm_name = name
+            else:
+                requested_vm_name = 'vm_' + str(self.global_vm_id)
+                self.global_vm_id += 1
+
+            valid_host_map = hv_map.copy()
+            if requested_host:
+                if not isinstance(requested_host, list):
+                    requested_host = [requested_host]
+                first_positive = True
+                for rh in requested_host:
+                    if rh.startswith('!'):
+                        valid_host_map.pop(rh[1:])
                     else:
-                        valid_host_map[rh] = hv_map[rh]
+                        if rh not in hv_map:
+                            raise exceptions.ArgMismatchException(
+                                "Cannot start VM, unknown hypervisor: " +
+                                rh)
+
+                        # If there is at least one requested host, then only
+                        # include it in the list of possible hosts.  Further
+                        # positive entries will add to this list, just as
+                        # negative entries will remove them from the list.
+                        if first_positive:
+                            valid_host_map = {rh: hv_map[rh]}
+                            first_positive = False
+                        else:
+                            valid_host_map[rh] = hv_map[rh]
+
+            if len(valid_host_map) == 0:
+                raise exceptions.ObjectNotFoundException(
+                    'No suitable hypervisor found to launch VM')
+            if requested_vm_name in self.pending_vm_names:
+                raise exceptions.ArgMismatchException(
+                    'VM already being created: ' + requested_vm_name)
+
+            def vm_load(hv):
+                return vm_count_fn(hv) + self.pending_vms.get(hv, 0)
 
-        if len(valid_host_map) == 0:
-            raise exceptions.ObjectNotFoundException(
-                'No suitable hypervisor found to launch VM')
+            start_hv_host = min(valid_host_map.values(), key=vm_load)
+            self.pending_vms[start_hv_host] = (
+                self.pending_vms.get(start_hv_host, 0) + 1)
+            self.pending_vm_names.add(requested_vm_name)
 
-        start_hv_host = reduce(
-            lambda a, b: a if vm_count_fn(a) <= vm_count_fn(b) else b,
-            valid_host_map.values())
-        return start_hv_host.create_vm(name=requested_vm_name)
+        # Starting the VM takes a while, so it is done outside the lock
+        # (letting several VMs start at once), with the VMs still starting
+        # counted toward their hypervisor's load
+        try:
+            return start_hv_host.create_vm(name=requested_vm_name)
+        finally:
+            with self.vm_lock:
+                self.pending_vms[start_hv_host] -= 1
+                self.pending_vm_names.discard(requested_vm_name)
 
     def restart_hosts(self):
         for h in self.hosts.values():
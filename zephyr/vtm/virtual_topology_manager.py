@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent import futures
 import json
 import logging
 
@@ -21,6 +22,8 @@ from zephyr.common import utils
 from zephyr.common import zephyr_constants
 from zephyr.vtm.guest import Guest
 
+VM_CREATE_MAX_WORKERS = 8
+
 
 class VirtualTopologyManager(object):
     def __init__(self,
@@ -90,6 +93,36 @@ class VirtualTopologyManager(object):
             hv_host=hv_host, name=name)
         return Guest(vm_underlay=vm_underlay)
 
+    def create_vms(self, vm_list, max_workers=VM_CREATE_MAX_WORKERS):
+        """
+        Creates several guest VMs at once, on at most max_workers threads.
+        If any VM can't be created, the ones that were are terminated, and
+        the first error is raised.
+        :param vm_list: list[dict[str, str]]: The create_vm args ('hv_host'
+        and 'name') for each VM.
+        :param max_workers: int
+        :return: list[Guest] In the order given
+        """
+        if len(vm_list) == 0:
+            return []
+        with futures.ThreadPoolExecutor(
+                max_workers=max(1, min(max_workers, len(vm_list)))) as pool:
+            jobs = [pool.submit(self.create_vm, **vm) for vm in vm_list]
+            futures.wait(jobs)
+
+        failed = [job for job in jobs if job.exception() is not None]
+        if len(failed) == 0:
+            return [job.result() for job in jobs]
+
+        for job in jobs:
+            if job.exception() is None:
+                try:
+                    job.result().terminate()
+                except Exception as e:
+                    self.LOG.error('Error terminating VM: ' + str(e))
+        # Raises the first failure, with its traceback
+        failed[0].result()
+
     def read_underlay_config(
             self,
             config_json=zephyr_constants.DEFAULT_UNDERLAY_CONFIG):
@@ -20,17 +20,20 @@ import sys
 import traceback
 
 from zephyr.common import cli
+from zephyr.common import cmd_daemon
 from zephyr.common import exceptions
 from zephyr.common.log_manager import LogManager
 from zephyr.common import zephyr_constants as zc
 from zephyr_ptm.ptm.config import version_config
 from zephyr_ptm.ptm.physical_topology_manager import PhysicalTopologyManager
+from zephyr_ptm.ptm import ptm_constants
 
 
 def usage(except_obj):
     und_file = zc.DEFAULT_UNDERLAY_CONFIG
-    print("Usage: ptm-ctl.py --startup [-c <config_file>] [-d]")
-    print("       ptm-ctl.py --shutdown [-d]")
+    print("Usage: ptm-ctl.py --startup [-c <config_file>] [-d] [-x] "
+          "[-w <workers>]")
+    print("       ptm-ctl.py --shutdown [-d] [-x] [-w <workers>]")
     print("       ptm-ctl.py --print")
     print("       ptm-ctl.py --features")
     print("       ptm-ctl.py --json")
@@ -52,6 +55,12 @@ def usage(except_obj):
     print("        used to shut down the system, so it must be accurate and")
     print("        current.")
     print("        Use -d or --debug for debug information to be logged.")
+    print("        Use -x or --cmd-daemon to run privileged commands through")
+    print("        a single long-lived root command daemon rather than a")
+    print("        separate sudo per command (much faster).")
+    print("        Use -w or --workers to set how many hosts are started or")
+    print("        shut down at the same time (default: " +
+          str(ptm_constants.PTM_MAX_WORKERS) + ").")
     print("    --print")
     print("        Prints the existing underlay topology defined in the")
     print("        zephyr underlay: " + und_file + ".  This file will be")
@@ -95,10 +104,10 @@ def print_json(ptm_imp, dbg_on, log_base_dir, output_file=None):
 
 try:
     arg_map, extra_args = getopt.getopt(
-        sys.argv[1:], 'hdpc:l:fju:',
+        sys.argv[1:], 'hdpc:l:fju:xw:',
         ['help', 'debug', 'startup', 'shutdown',
          'print', 'features', 'config-file=',
-         'log-dir=', 'json'])
+         'log-dir=', 'json', 'cmd-daemon', 'workers='])
 
     # Defaults
     ptm_ctl_dir = os.path.dirname(os.path.abspath(__file__))
@@ -112,6 +121,8 @@ try:
     neutron_command = ''
     log_dir = '/tmp/zephyr/logs'
     debug = False
+    use_cmd_daemon = False
+    max_workers = ptm_constants.PTM_MAX_WORKERS
     underlay_config_file = conf_dir + '/' + zc.DEFAULT_UNDERLAY_CONFIG
 
     for arg, value in arg_map:
@@ -134,6 +145,10 @@ try:
             command = 'features'
         elif arg in ('-j', '--json'):
             command = 'json'
+        elif arg in ('-x', '--cmd-daemon'):
+            use_cmd_daemon = True
+        elif arg in ('-w', '--workers'):
+            max_workers = int(value)
         else:
             usage(exceptions.ArgMismatchException('Invalid argument' + arg))
 
@@ -141,36 +156,45 @@ try:
         usage(exceptions.ArgMismatchException(
             'Must specify at least one command option'))
 
-    log_manager = LogManager(root_dir=log_dir)
-    if command == 'startup':
-        log_manager.rollover_logs_fresh(file_filter='ptm*.log')
-
-    ptm = PhysicalTopologyManager(root_dir=root_dir,
-                                  log_manager=log_manager)
-    ptm.configure_logging(debug=debug)
-
-    if cli.LinuxCLI().exists(underlay_config_file):
-        with open(underlay_config_file, "r") as f:
-            ptm_underlay_map = json.load(f)
-        ptm_topo = ptm_underlay_map['topology_config_file']
-
-    ptm.configure(ptm_topo)
-
-    if command == 'startup':
-        ptm.startup()
-        print_json(ptm, debug, log_dir, underlay_config_file)
-    elif command == 'shutdown':
-        ptm.shutdown()
-        cli.LinuxCLI().rm(underlay_config_file)
-    elif command == 'print':
-        ptm.print_config()
-    elif command == 'features':
-        ptm.print_features()
-    elif command == 'json':
-        print_json(ptm, debug, log_dir)
-    else:
-        usage(exceptions.ArgMismatchException(
-            'Command option not recognized: ' + command))
+    daemon_process = None
+    if use_cmd_daemon and command in ('startup', 'shutdown'):
+        daemon_process = cmd_daemon.start_cmd_daemon()
+
+    try:
+        log_manager = LogManager(root_dir=log_dir)
+        if command == 'startup':
+            log_manager.rollover_logs_fresh(file_filter='ptm*.log')
+
+        ptm = PhysicalTopologyManager(root_dir=root_dir,
+                                      log_manager=log_manager,
+                                      max_workers=max_workers)
+        ptm.configure_logging(debug=debug)
+
+        if cli.LinuxCLI().exists(underlay_config_file):
+            with open(underlay_config_file, "r") as f:
+                ptm_underlay_map = json.load(f)
+            ptm_topo = ptm_underlay_map['topology_config_file']
+
+        ptm.configure(ptm_topo)
+
+        if command == 'startup':
+            ptm.startup()
+            print_json(ptm, debug, log_dir, underlay_config_file)
+        elif command == 'shutdown':
+            ptm.shutdown()
+            cli.LinuxCLI().rm(underlay_config_file)
+        elif command == 'print':
+            ptm.print_config()
+        elif command == 'features':
+            ptm.print_features()
+        elif command == 'json':
+            print_json(ptm, debug, log_dir)
+        else:
+            usage(exceptions.ArgMismatchException(
+                'Command option not recognized: ' + command))
+    finally:
+        if daemon_process is not None:
+            cmd_daemon.stop_cmd_daemon(daemon_process)
 
 except exceptions.ExitCleanException:
     exit(1)
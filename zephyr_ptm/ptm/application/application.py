@@ -15,6 +15,7 @@
 import datetime
 import logging
 from zephyr.common import zephyr_constants
+from zephyr_ptm.ptm.application import readiness
 from zephyr_ptm.ptm import ptm_constants
 
 APPLICATION_TYPE_UNKNOWN = 0
@@ -139,11 +140,35 @@ class Application(object):
     def config_app_for_process_control(self, cfg_map):
         pass
 
-    def wait_for_process_start(self):
+    def before_start(self):
+        """
+        Called in the PTM (rather than the application control process)
+        just before the application is started, to note anything its start
+        probes must only look for after the start.
+        """
         pass
 
+    def get_start_probes(self):
+        """
+        The readiness probes which must all pass for this application to
+        count as started.
+        :rtype: list[readiness.ReadinessProbe]
+        """
+        return []
+
+    def get_stop_probes(self):
+        """
+        The probes which must all pass for this application to count as
+        stopped.
+        :rtype: list[readiness.ReadinessProbe]
+        """
+        return []
+
+    def wait_for_process_start(self):
+        readiness.wait_for_probes(self.get_start_probes(), self.LOG)
+
     def wait_for_process_stop(self):
-        pass
+        readiness.wait_for_probes(self.get_stop_probes(), self.LOG)
 
     def control_start(self):
         pass
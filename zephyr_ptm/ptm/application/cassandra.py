@@ -13,12 +13,12 @@
 # limitations under the License.
 
 from configuration_handler import FileConfigurationHandler
-import time
 
 from zephyr.common.file_location import *
 from zephyr.common.cli import *
 from zephyr.common.ip import IP
 from zephyr_ptm.ptm.application import application
+from zephyr_ptm.ptm.application import readiness
 
 
 class Cassandra(application.Application):
@@ -84,24 +84,11 @@ class Cassandra(application.Application):
         self.num_id = cfg_map['num_id']
         self.ip = IP.from_map(cfg_map['ip'])
 
-    def wait_for_process_start(self):
-        # Wait a couple seconds for the process to start before
-        # polling nodetool
-        time.sleep(2)
-        # Checking Cassandra status
-        retries = 0
-        max_retries = 10
-        connected = False
-        while not connected:
-            if self.cli.cmd('nodetool -h 127.0.0.1 status').ret_code == 0:
-                connected = True
-            else:
-                retries += 1
-                if retries > max_retries:
-                    raise SocketException(
-                        'Cassandra host ' + self.num_id +
-                        ' timed out while starting')
-                time.sleep(2)
+    def get_start_probes(self):
+        return [readiness.FunctionProbe(
+            'Cassandra host ' + self.num_id + ' status',
+            lambda: self.cli.cmd(
+                'nodetool -h 127.0.0.1 status').ret_code == 0)]
 
     def prepare_environment(self):
         self.configurator.mount_config(self.num_id)
@@ -16,7 +16,6 @@ import datetime
 import dateutil.parser
 from os import path
 import re
-import time
 import uuid
 
 from zephyr.common.cli import LinuxCLI
@@ -26,9 +25,9 @@ from zephyr.common.ip import IP
 from zephyr.midonet import midonet_mm_ctl
 from zephyr_ptm.ptm.application import application
 from zephyr_ptm.ptm.application import configuration_handler
+from zephyr_ptm.ptm.application import readiness
 from zephyr_ptm.ptm.config import version_config
 from zephyr_ptm.ptm.physical_topology_config import HostDef
-from zephyr_ptm.ptm import ptm_constants
 
 
 class Midolman(application.Application):
@@ -254,46 +253,31 @@ class Midolman(application.Application):
         self.zookeeper_ips = [IP.make_ip(s)
                               for s in cfg_map['zookeeper_ips'].split(',')]
 
-    def wait_for_process_start(self):
-        retries = 0
-        max_retries = ptm_constants.APPLICATION_START_TIMEOUT
-        connected = False
-        while not connected:
-            if self.cli.grep_cmd(
-                    version_config.ConfigMap.get_configured_parameter(
-                        'cmd_list_datapath'), 'midonet') is True:
-                connected = True
-            else:
-                retries += 1
-                if retries > max_retries:
-                    raise exceptions.SubprocessFailedException(
-                        'MidoNet Agent host ' + self.num_id +
-                        ' timed out while starting')
-                time.sleep(1)
+    def get_start_probes(self):
+        return [readiness.FunctionProbe(
+            'MidoNet Agent host ' + self.num_id + ' datapath',
+            lambda: self.cli.grep_cmd(
+                version_config.ConfigMap.get_configured_parameter(
+                    'cmd_list_datapath'), 'midonet') is True)]
 
     def wait_for_process_stop(self):
         if self.cli.exists('/run/midolman/pid'):
-            pid = self.cli.read_from_file('/run/midolman/pid')
+            pid = self.cli.read_from_file('/run/midolman/pid').strip()
             self.cli.cmd('kill ' + str(pid))
 
-            deadline = datetime.datetime.now() + datetime.timedelta(seconds=30)
-            while LinuxCLI().is_pid_running(pid):
-                if datetime.datetime.now() > deadline:
+            if not readiness.ProcessExitProbe(pid, timeout=30).wait():
+                self.LOG.error(
+                    "Process " + str(pid) +
+                    " not stopping, killing with extreme prejudice "
+                    "(kill -9)")
+                self.cli.cmd('kill -9 ' + str(pid))
+
+                if not readiness.ProcessExitProbe(pid, timeout=30).wait():
                     self.LOG.error(
                         "Process " + str(pid) +
-                        " not stopping, killing with extreme prejudice "
-                        "(kill -9)")
-                    self.cli.cmd('kill -9' + str(pid))
-
-                    deadline2 = (datetime.datetime.now() +
-                                 datetime.timedelta(seconds=30))
-                    while LinuxCLI().is_pid_running(pid):
-                        if datetime.datetime.now() > deadline2:
-                            self.LOG.error(
-                                "Process " + str(pid) +
-                                " not stopped, even with SIGKILL")
-                            raise exceptions.SubprocessTimeoutException(
-                                "Couldn't stop process: midolman")
+                        " not stopped, even with SIGKILL")
+                    raise exceptions.SubprocessTimeoutException(
+                        "Couldn't stop process: midolman")
 
             self.cli.rm('/run/midolman/pid')
 
@@ -364,7 +348,7 @@ class Midolman(application.Application):
             '/usr/share/midolman/midolman-start', blocking=False).process
         if process.pid == -1:
             raise exceptions.SubprocessFailedException('midolman')
-        real_pid = self.cli.get_parent_pids(process.pid)[-1]
+        real_pid = self.cli.get_parent_pids(process.pid, timeout=5)[-1]
         self.cli.write_to_file(self.runtime_dir + '/pid', str(real_pid))
 
     def control_stop(self):
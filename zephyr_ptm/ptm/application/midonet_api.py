@@ -12,18 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import time
 import uuid
 
 from zephyr.common.exceptions import *
 from zephyr.common.file_location import *
 from zephyr.common.ip import IP
 from zephyr_ptm.ptm.application import application
+from zephyr_ptm.ptm.application import readiness
 from zephyr_ptm.ptm.application.configuration_handler import (
     FileConfigurationHandler)
 from zephyr_ptm.ptm.config import version_config
 from zephyr_ptm.ptm.ptm_constants import APPLICATION_START_TIMEOUT
 
+CLUSTER_LOG_FILE = '/var/log/midonet-cluster/midonet-cluster.log'
+
 
 # TODO(micucci): This is really the controller and should be refactored in
 # case it's not on root or same host as a Compute
@@ -50,6 +52,8 @@ class MidonetAPI(application.Application):
         self.url = version_config.ConfigMap.get_configured_parameter(
             'param_midonet_api_url')
         self.ip = None
+        self.cluster_log_position = None
+        """ :type: (int, int)"""
 
     def get_resource(self, resource_name, **kwargs):
         """
@@ -61,7 +65,7 @@ class MidonetAPI(application.Application):
             # TODO(micucci) Use an SSH accessor here if this app is
             # on a remote host
             floc = FileLocation(
-                "/var/log/midonet-cluster/midonet-cluster.log"
+                CLUSTER_LOG_FILE
                 if self.use_cluster
                 else "/var/log/tomcat7/midonet-api.log")
             return floc.fetch_file()
@@ -118,31 +122,18 @@ class MidonetAPI(application.Application):
         print(('    ' * (indent + 1)) + 'Cassandra-IPs: ' +
               ', '.join(str(ip) for ip in self.cassandra_ips))
 
-    def wait_for_process_start(self):
-        # Checking MN-API status
-        connected = False
-        deadline = time.time() + APPLICATION_START_TIMEOUT + 2000
-        self.LOG.debug("Waiting for API to start on URL: " + self.url)
-        while not connected:
-            if self.use_cluster:
-                if self.cli.grep_cmd(
-                        'tac /var/log/midonet-cluster/midonet-cluster.log',
-                        "MidoNet Cluster \(started\|is up\)",
-                        options='-m1'):
-                    connected = True
-                else:
-                    if time.time() > deadline:
-                        raise SubprocessFailedException(
-                            'Cluster timed out while starting')
-            else:
-                if self.cli.cmd('midonet-cli --midonet-url="' + self.url +
-                                '" -A -e "host list"').ret_code == 0:
-                    connected = True
-                else:
-                    if time.time() > deadline:
-                        raise SubprocessFailedException(
-                            'Network host timed out while starting')
-                    time.sleep(1)
+    def before_start(self):
+        if self.use_cluster:
+            self.cluster_log_position = readiness.LogLineProbe.log_position(
+                CLUSTER_LOG_FILE)
+
+    def get_start_probes(self):
+        timeout = APPLICATION_START_TIMEOUT + 2000
+        if self.use_cluster:
+            return [readiness.LogLineProbe(
+                CLUSTER_LOG_FILE, 'MidoNet Cluster (started|is up)',
+                start_position=self.cluster_log_position, timeout=timeout)]
+        return [readiness.HTTPProbe(self.url, timeout=timeout)]
 
     def control_start(self):
         if self.use_cluster:
@@ -248,7 +239,7 @@ class ClusterConfiguration(FileConfigurationHandler):
         zkcli = LinuxCLI()
         zkcli.add_environment_variable('MIDO_ZOOKEEPER_HOSTS', z_ip_str)
 
-        self.cli.rm('/var/log/midonet-cluster/midonet-cluster.log')
+        self.cli.rm(CLUSTER_LOG_FILE)
         self.cli.rm('/etc/midonet_host_id.properties')
         uuid_str = 'host_uuid=' + str(unique_id) + '\n'
         self.cli.write_to_file('/etc/midolman/host_uuid.properties', uuid_str)
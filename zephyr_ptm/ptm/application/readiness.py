@@ -0,0 +1,444 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import ctypes
+import errno
+import os
+import re
+import select
+import socket
+import time
+import urllib2
+
+from zephyr.common.cli import LinuxCLI
+from zephyr.common.exceptions import *
+from zephyr.common.process_table import process_table
+from zephyr_ptm.ptm import ptm_constants
+
+# Retry delays start small, so a quick start is noticed quickly, and back
+# off to a cap so a slow one isn't hammered
+PROBE_INITIAL_DELAY = 0.05
+PROBE_MAX_DELAY = 2.0
+PROBE_BACKOFF_FACTOR = 2
+
+# Longest a single connection attempt may take
+PROBE_CONNECT_TIMEOUT = 1.0
+
+O_CLOEXEC = 0o2000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = O_CLOEXEC
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+
+SYS_PIDFD_OPEN = 434
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class ReadinessProbe(object):
+    """
+    One condition an application must meet to count as started (or
+    stopped).  check() tests the condition once; wait() repeats it with an
+    exponential backoff until it holds or the deadline passes.  Probes that
+    can be told when to look again (a file changing, a process exiting)
+    override wait_for_event() to block on that instead of just sleeping,
+    so they react as soon as something happens.
+    """
+
+    def __init__(self, description,
+                 timeout=ptm_constants.APPLICATION_START_TIMEOUT):
+        """
+        :type description: str
+        :type timeout: float Seconds to wait before giving up
+        """
+        self.description = description
+        self.timeout = timeout
+
+    def check(self):
+        """
+        :return: bool True if the condition holds
+        """
+        return False
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def wait_for_event(self, seconds):
+        """
+        Wait up to the given time for a reason to check again.
+        :type seconds: float
+        """
+        time.sleep(seconds)
+
+    def wait(self, deadline=None):
+        """
+        :type deadline: float UNIX time to give up at (default: timeout
+        seconds from now)
+        :return: bool True if the condition held before the deadline
+        """
+        if deadline is None:
+            deadline = time.time() + self.timeout
+        delay = PROBE_INITIAL_DELAY
+        self.open()
+        try:
+            while True:
+                if self.check():
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.wait_for_event(min(delay, remaining))
+                delay = min(delay * PROBE_BACKOFF_FACTOR, PROBE_MAX_DELAY)
+        finally:
+            self.close()
+
+    def __str__(self):
+        return self.description
+
+
+class FunctionProbe(ReadinessProbe):
+    """
+    Ready when the given function returns True, for conditions no other
+    probe covers (e.g. a command's output).
+    """
+
+    def __init__(self, description, func,
+                 timeout=ptm_constants.APPLICATION_START_TIMEOUT):
+        """
+        :type func: () -> bool
+        """
+        super(FunctionProbe, self).__init__(description, timeout)
+        self.func = func
+
+    def check(self):
+        return self.func() is True
+
+
+class TCPPortProbe(ReadinessProbe):
+    """
+    Ready when a TCP connection to the port succeeds and, if a request is
+    given, the reply to it starts with the expected response.
+    """
+
+    def __init__(self, ip, port, request=None, response=None,
+                 timeout=ptm_constants.APPLICATION_START_TIMEOUT):
+        """
+        :type ip: str
+        :type port: int
+        :type request: str
+        :type response: str
+        """
+        super(TCPPortProbe, self).__init__(
+            'TCP port ' + ip + ':' + str(port), timeout)
+        self.ip = ip
+        self.port = port
+        self.request = request
+        self.response = response
+
+    def check(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(PROBE_CONNECT_TIMEOUT)
+            sock.connect((self.ip, self.port))
+            if self.request is not None:
+                sock.sendall(self.request)
+            if self.response is not None:
+                return sock.recv(len(self.response)) == self.response
+            return True
+        except (socket.error, IOError):
+            return False
+        finally:
+            sock.close()
+
+
+class HTTPProbe(ReadinessProbe):
+    """
+    Ready when a GET on the URL is answered with a success (2xx) status, or
+    with one of the given statuses, if any.  Anything else, such as the 404
+    a servlet container gives before the application is deployed, doesn't
+    count.
+    """
+
+    def __init__(self, url, statuses=None,
+                 timeout=ptm_constants.APPLICATION_START_TIMEOUT):
+        """
+        :type url: str
+        :type statuses: list[int]
+        """
+        super(HTTPProbe, self).__init__('HTTP ' + url, timeout)
+        self.url = url
+        self.statuses = statuses
+
+    def check(self):
+        try:
+            status = urllib2.urlopen(
+                self.url, timeout=PROBE_CONNECT_TIMEOUT).getcode()
+        except urllib2.HTTPError as e:
+            status = e.code
+        except (urllib2.URLError, socket.error, IOError):
+            return False
+        if self.statuses is not None:
+            return status in self.statuses
+        return 200 <= status < 300
+
+
+class LogLineProbe(ReadinessProbe):
+    """
+    Ready when a line matching the pattern appears in the log file after
+    the given start position (see log_position), so lines left by an
+    earlier run don't count.  The file is opened once and read
+    incrementally, only ever looking at what was added since the last check
+    (from the start if it is replaced or truncated).  A log this process
+    can't read is read through the CLI instead (privileged by default, so
+    through the command daemon, if one is running).  inotify on its
+    directory wakes the probe up whenever it changes, but a busy log is
+    read at most once per (backed off) retry delay.
+    """
+
+    def __init__(self, log_file, pattern, start_position=None, cli=None,
+                 timeout=ptm_constants.APPLICATION_START_TIMEOUT):
+        """
+        :type log_file: str
+        :type pattern: str Regular expression
+        :type start_position: (int, int) The log's (inode, size), taken
+        with log_position before the application was started (None to read
+        the whole log)
+        :type cli: LinuxCLI Used only for logs this process can't read
+        """
+        super(LogLineProbe, self).__init__(
+            'log line "' + pattern + '" in ' + log_file, timeout)
+        self.log_file = log_file
+        self.pattern = re.compile(pattern)
+        self.cli = cli if cli is not None else LinuxCLI()
+        self.inode, self.offset = (start_position
+                                   if start_position is not None
+                                   else (None, 0))
+        self.partial = ''
+        self.log_fd = None
+        self.inotify_fd = None
+        self.last_check = 0
+        self.event_delay = PROBE_INITIAL_DELAY
+
+    @staticmethod
+    def log_position(log_file, cli=None):
+        """
+        :type log_file: str
+        :type cli: LinuxCLI Used only if this process can't stat the log
+        :return: (int, int) The inode and size of the log file, or
+        (None, 0) if there is none
+        """
+        try:
+            st = os.stat(log_file)
+            return st.st_ino, st.st_size
+        except OSError as e:
+            if e.errno != errno.EACCES:
+                return None, 0
+        if cli is None:
+            cli = LinuxCLI()
+        out = cli.cmd('stat -c "%i %s" ' + log_file)
+        if out.ret_code != 0:
+            return None, 0
+        inode, size = out.stdout.split()
+        return int(inode), int(size)
+
+    def open(self):
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        if _libc.inotify_add_watch(
+                fd, os.path.dirname(os.path.abspath(self.log_file)),
+                IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO) < 0:
+            # No directory to watch yet (or one we can't read), so fall
+            # back to polling
+            os.close(fd)
+            return
+        self.inotify_fd = fd
+        self.event_delay = PROBE_INITIAL_DELAY
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+        self.close_log()
+
+    def close_log(self):
+        if self.log_fd is not None:
+            os.close(self.log_fd)
+            self.log_fd = None
+
+    def wait_for_event(self, seconds):
+        if self.inotify_fd is None:
+            time.sleep(seconds)
+            return
+        ready, _, _ = select.select([self.inotify_fd], [], [], seconds)
+        if len(ready) == 0:
+            self.event_delay = PROBE_INITIAL_DELAY
+            return
+        try:
+            while os.read(self.inotify_fd, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+        # Each write to the log is an event, so keep backing off while
+        # they keep coming
+        wait = self.last_check + self.event_delay - time.time()
+        if wait > 0:
+            time.sleep(min(wait, seconds))
+        self.event_delay = min(self.event_delay * PROBE_BACKOFF_FACTOR,
+                               PROBE_MAX_DELAY)
+
+    def restart_from(self, inode, size):
+        """
+        Start again from the beginning of a new (or truncated) log.
+        :type inode: int
+        :type size: int
+        """
+        if inode != self.inode or size < self.offset:
+            self.inode = inode
+            self.offset = 0
+            self.partial = ''
+
+    def read_log(self):
+        """
+        :return: str What was added to the log since the last read, or None
+        if this process can't read it
+        """
+        try:
+            inode = os.stat(self.log_file).st_ino
+        except OSError as e:
+            self.close_log()
+            return None if e.errno == errno.EACCES else ''
+        if self.log_fd is not None and os.fstat(self.log_fd).st_ino != inode:
+            # Replaced (rotated, say) since it was opened
+            self.close_log()
+        if self.log_fd is None:
+            try:
+                self.log_fd = os.open(self.log_file,
+                                      os.O_RDONLY | O_CLOEXEC)
+            except OSError as e:
+                return None if e.errno == errno.EACCES else ''
+
+        st = os.fstat(self.log_fd)
+        self.restart_from(st.st_ino, st.st_size)
+        os.lseek(self.log_fd, self.offset, os.SEEK_SET)
+        chunks = []
+        remaining = st.st_size - self.offset
+        while remaining > 0:
+            chunk = os.read(self.log_fd, remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return ''.join(chunks)
+
+    def read_log_cli(self):
+        """
+        :return: str What was added to the log since the last read, read
+        through the CLI
+        """
+        inode, size = self.log_position(self.log_file, self.cli)
+        if inode is None:
+            return ''
+        self.restart_from(inode, size)
+        if size == self.offset:
+            return ''
+        out = self.cli.cmd('tail -c +' + str(self.offset + 1) + ' ' +
+                           self.log_file)
+        if out.ret_code != 0:
+            return ''
+        return out.stdout
+
+    def check(self):
+        self.last_check = time.time()
+        data = self.read_log()
+        if data is None:
+            data = self.read_log_cli()
+        if len(data) == 0:
+            return False
+        self.offset += len(data)
+
+        lines = (self.partial + data).split('\n')
+        self.partial = lines.pop()
+        return any(self.pattern.search(l) for l in lines)
+
+
+class ProcessExitProbe(ReadinessProbe):
+    """
+    Ready when the process has exited.  The process is watched through a
+    pidfd, which becomes readable the moment it exits, where the kernel
+    supports that; otherwise it is looked up in /proc (without forking
+    anything) on each check.
+    """
+
+    def __init__(self, pid, timeout=ptm_constants.APPLICATION_START_TIMEOUT):
+        """
+        :type pid: int
+        """
+        super(ProcessExitProbe, self).__init__(
+            'exit of process ' + str(pid), timeout)
+        self.pid = int(pid)
+        self.pidfd = None
+
+    def open(self):
+        fd = _libc.syscall(SYS_PIDFD_OPEN, self.pid, 0)
+        if fd >= 0:
+            self.pidfd = fd
+
+    def close(self):
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+
+    def wait_for_event(self, seconds):
+        if self.pidfd is None:
+            time.sleep(seconds)
+        else:
+            select.select([self.pidfd], [], [], seconds)
+
+    def check(self):
+        if self.pidfd is not None:
+            ready, _, _ = select.select([self.pidfd], [], [], 0)
+            return len(ready) > 0
+        return not process_table.is_running(self.pid, include_exited=False)
+
+
+def wait_for_probes(probes, logger=None):
+    """
+    Wait for all the probes at once, each up to its own timeout, and
+    raise with every probe that didn't pass in time.
+    :type probes: list[ReadinessProbe]
+    :type logger: logging.Logger
+    """
+    if len(probes) == 0:
+        return
+    start = time.time()
+    with futures.ThreadPoolExecutor(max_workers=len(probes)) as pool:
+        jobs = [(p, pool.submit(p.wait, start + p.timeout)) for p in probes]
+    failed = [str(p) for p, job in jobs if job.result() is not True]
+    if logger is not None:
+        logger.debug('Probes ' + ', '.join(str(p) for p in probes) +
+                     ' finished in ' + ('%.3f' % (time.time() - start)) +
+                     's' + (', timed out: ' + ', '.join(failed)
+                            if len(failed) > 0 else ''))
+    if len(failed) > 0:
+        raise SubprocessTimeoutException(
+            'Timed out waiting for: ' + ', '.join(failed))
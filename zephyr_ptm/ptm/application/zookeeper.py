@@ -12,17 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import socket
-import time
-
 from zephyr.common import cli
 from zephyr.common import exceptions
 from zephyr.common.file_location import *
 from zephyr_ptm.ptm.application import application
+from zephyr_ptm.ptm.application import readiness
 from zephyr_ptm.ptm.physical_topology_config import *
 from zephyr_ptm.ptm.application.configuration_handler import (
     FileConfigurationHandler)
-from zephyr_ptm.ptm.ptm_constants import APPLICATION_START_TIMEOUT
 
 
 class Zookeeper(application.Application):
@@ -103,42 +100,9 @@ class Zookeeper(application.Application):
               ', '.join(str(ip) for ip in self.zookeeper_ips))
 
     # TODO(micucci): Add a wait_for_process_stop here (and to all hosts)
-    def wait_for_process_start(self):
-        # Checking Zookeeper status
-        retries = 0
-        max_retries = APPLICATION_START_TIMEOUT
-        connected = False
-        while not connected:
-            ping_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.LOG.info('Trying to contact ZK server @' + self.ip.ip)
-            try:
-                ping_socket.settimeout(1)
-                ping_socket.connect((self.ip.ip, 2181))
-                ping_socket.send('ruok')
-                if ping_socket.recv(16) == 'imok':
-                    connected = True
-            except IOError:
-                pass
-            finally:
-                if not connected:
-                    retries += 1
-                    if retries > max_retries:
-                        raise exceptions.SubprocessFailedException(
-                            'Zookeeper host ' + self.num_id +
-                            ' timed out while starting')
-                    time.sleep(1)
-
-        # TODO(micucci): Look into why this works everywhere BUT Jenkins gates
-        """
-        retries = 0
-        while not LinuxCLI().exists('/run/zookeeper.' +
-                                    str(self.num_id) + '/pid'):
-            if retries > max_retries:
-                raise SubprocessFailedException(
-                    'Zookeeper PID file not created within timeout')
-            time.sleep(1)
-            retries += 1
-        """
+    def get_start_probes(self):
+        return [readiness.TCPPortProbe(self.ip.ip, 2181, request='ruok',
+                                       response='imok')]
 
     def prepare_environment(self):
         self.configurator.mount_config(self.num_id)
@@ -172,7 +136,8 @@ class Zookeeper(application.Application):
         if process.process.pid == -1:
             raise exceptions.SubprocessFailedException('java-zookeeper')
 
-        real_pid = self.cli.get_parent_pids(process.process.pid)[-1]
+        real_pid = self.cli.get_parent_pids(process.process.pid,
+                                            timeout=5)[-1]
         self.cli.write_to_file('/run/zookeeper/pid', str(real_pid))
 
     def control_stop(self):
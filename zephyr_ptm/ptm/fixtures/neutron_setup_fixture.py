@@ -27,6 +27,9 @@ class NeutronSetupFixture(object):
         super(NeutronSetupFixture, self).__init__()
         self.ptm_impl = ptm_impl
         self.LOG = None
+        # Where the clean neutron database is snapshotted for quick
+        # restores on teardown (None always re-creates the database)
+        self.db_snapshot_dir = neutron_api.NEUTRON_DB_SNAPSHOT_DIR
 
     def configure_logging(self, logger):
         self.LOG = logger
@@ -53,4 +56,5 @@ class NeutronSetupFixture(object):
         LinuxCLI(log_cmd=True).cmd(
             'mysqldump --user=root --password=cat neutron > ' +
             self.ptm_impl.log_manager.root_dir + '/neutron.db.dump')
-        neutron_api.clean_neutron(log=self.LOG)
+        neutron_api.clean_neutron(log=self.LOG,
+                                  snapshot_dir=self.db_snapshot_dir)
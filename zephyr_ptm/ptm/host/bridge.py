@@ -34,6 +34,11 @@ class Bridge(Interface):
         """ :type: dict [str, Interface]"""
 
     def create(self):
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.add_bridge(self.get_name(), stp='stp' in self.options)
+            return
+
         self.cli.cmd('brctl addbr ' + self.get_name())
         # Link all configured interfaces to this bridge
         # Set any configured options
@@ -53,7 +58,11 @@ class Bridge(Interface):
                     i.peer_interface.host.del_route(IP('0.0.0.0', '0'))
         # Remove the bridge (note, bridge interface must be DOWN for
         # removal to work)
-        self.cli.cmd('brctl delbr ' + self.get_name())
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.del_link(self.get_name())
+        else:
+            self.cli.cmd('brctl delbr ' + self.get_name())
 
     def link_interface(self, iface):
         """
@@ -61,7 +70,11 @@ class Bridge(Interface):
         :param iface: Interface Interface to link
         :return:
         """
-        self.cli.cmd('brctl addif ' + self.get_name() + ' ' + iface.name)
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.set_link(iface.name, master=self.get_name())
+        else:
+            self.cli.cmd('brctl addif ' + self.get_name() + ' ' + iface.name)
         self.linked_interfaces[iface.name] = iface
 
     def unlink_interface(self, iface):
@@ -70,7 +83,11 @@ class Bridge(Interface):
         :param iface: Interface Interface to unlink
         :return:
         """
-        self.cli.cmd('brctl delif ' + self.get_name() + ' ' + iface.name)
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.set_link(iface.name, master='')
+        else:
+            self.cli.cmd('brctl delif ' + self.get_name() + ' ' + iface.name)
         self.linked_interfaces.pop(iface.name)
 
     def print_config(self, indent=0):
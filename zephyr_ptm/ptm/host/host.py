@@ -12,15 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent import futures
+import contextlib
 import datetime
 import json
 import logging
+import os
+import threading
 import time
 import uuid
 
 from zephyr.common.cli import LinuxCLI
+from zephyr.common.echo_client import EchoWorkerClient
 from zephyr.common import exceptions
 from zephyr.common.ip import IP
+from zephyr.common.netlink import IPRoute
 from zephyr.common.tcp_dump import TCPDump
 from zephyr.common.tcp_sender import TCPSender
 from zephyr.common.utils import get_class_from_fqn
@@ -72,11 +78,24 @@ class Host(PTMObject):
         self.log_level = logging.INFO
         self.echo_server_procs = {}
         """ :type: dict[int, zephyr.common.cli.CommandStatus]"""
+        # What each echo server process was started with (its IP, ports,
+        # echo data and protocol), so it can be started again
+        self.echo_server_args = {}
+        """ :type: dict[zephyr.common.cli.CommandStatus,
+                        (str, list[int], str, str)]"""
         self.on_namespace = False
         self.log_file_name = zephyr_constants.ZEPHYR_LOG_FILE_NAME
         self.main_ip = '127.0.0.1'
         self.dhcpcd_is_running = set()
         self.tap_interfaces = {}
+        self.use_netlink = os.geteuid() == 0
+        """ :type: bool"""
+        self.netlink = None
+        """ :type: IPRoute"""
+        self.netlink_lock = threading.Lock()
+        self.echo_client = None
+        """ :type: EchoWorkerClient"""
+        self.echo_client_lock = threading.Lock()
 
     def configure_logging(self,
                           log_file_name, debug=False):
@@ -273,32 +292,72 @@ class Host(PTMObject):
             self.create_func(self.name)
 
     def remove(self):
+        # An open netlink socket would keep the namespace alive
+        if self.netlink is not None:
+            self.netlink.close()
+            self.netlink = None
+        if self.echo_client is not None:
+            self.echo_client.stop()
+            self.echo_client = None
         if self.remove_func is not None:
             self.remove_func(self.name)
 
-    def boot(self):
-        # Create and bring up all bridges since they are local
-        for bridge in self.bridges.values():
-            self.LOG.debug('Creating and bringing up bridge: ' + bridge.name)
-            bridge.create()
-            bridge.config_addr()
-            bridge.up()
-
-        # Create all interfaces, but wait to bring them up
-        for interface in self.interfaces.itervalues():
-            self.LOG.debug('Creating interface: ' + interface.name)
-            interface.create()
+    def get_netlink(self):
+        """
+        Get the rtnetlink connection used to configure this host's
+        interfaces, addresses and routes, or None if they should be
+        configured with 'ip' and 'brctl' commands instead (when not running
+        as root, or when the CLI only logs its commands).
+        :return: IPRoute
+        """
+        if not self.use_netlink or self.cli.debug:
+            return None
+        # Other hosts' threads may reach this host's interfaces too
+        with self.netlink_lock:
+            if self.netlink is None:
+                self.netlink = IPRoute(netns=self.cli.netns_name(),
+                                       check=False, logger=self.LOG)
+        return self.netlink
+
+    @contextlib.contextmanager
+    def netlink_batch(self):
+        """
+        Send all the interface, address and route changes made inside the
+        block to the kernel together, when configuring through netlink.
+        """
+        netlink = self.get_netlink()
+        if netlink is None:
+            yield
+        else:
+            with netlink.batch():
+                yield
 
-        self.set_loopback()
+    def boot(self):
+        with self.netlink_batch():
+            # Create and bring up all bridges since they are local
+            for bridge in self.bridges.values():
+                self.LOG.debug('Creating and bringing up bridge: ' +
+                               bridge.name)
+                bridge.create()
+                bridge.config_addr()
+                bridge.up()
+
+            # Create all interfaces, but wait to bring them up
+            for interface in self.interfaces.itervalues():
+                self.LOG.debug('Creating interface: ' + interface.name)
+                interface.create()
+
+            self.set_loopback()
 
     def shutdown(self):
-        for interface in self.interfaces.itervalues():
-            if interface.name in self.dhcpcd_is_running:
-                self.stop_dhcp_client(interface.name)
-            interface.remove()
+        with self.netlink_batch():
+            for interface in self.interfaces.itervalues():
+                if interface.name in self.dhcpcd_is_running:
+                    self.stop_dhcp_client(interface.name)
+                interface.remove()
 
-        for bridge in self.bridges.itervalues():
-            bridge.remove()
+            for bridge in self.bridges.itervalues():
+                bridge.remove()
 
     def reboot(self):
         self.shutdown()
@@ -306,13 +365,14 @@ class Host(PTMObject):
 
     def net_up(self):
         # Configure and bring up all network 'devices'
-        for interface in self.interfaces.itervalues():
-            self.LOG.debug('Bringing up interface: ' + interface.name +
-                           ' and configuring addresses: ' +
-                           str(map(str, interface.ip_list)))
-            interface.up()
-            interface.config_addr()
-            interface.start_vlans()
+        with self.netlink_batch():
+            for interface in self.interfaces.itervalues():
+                self.LOG.debug('Bringing up interface: ' + interface.name +
+                               ' and configuring addresses: ' +
+                               str(map(str, interface.ip_list)))
+                interface.up()
+                interface.config_addr()
+                interface.start_vlans()
 
     def net_finalize(self):
         # Special for VETH pairs, set the peer's default route to this host's
@@ -333,13 +393,15 @@ class Host(PTMObject):
                          ' -m state --state RELATED,ESTABLISHED -j ACCEPT')
 
         # Set up any IP forward rules
-        for dest, gw, dev in self.route_rules:
-            self.add_route(dest, gw, dev)
+        with self.netlink_batch():
+            for dest, gw, dev in self.route_rules:
+                self.add_route(dest, gw, dev)
 
     def net_down(self):
         # Set up any IP forward rules
-        for dest, gw, dev in self.route_rules:
-            self.del_route(dest)
+        with self.netlink_batch():
+            for dest, gw, dev in self.route_rules:
+                self.del_route(dest)
 
         # Set up any IP forward rules
         for exterior, interior in self.ip_forward_rules:
@@ -351,12 +413,13 @@ class Host(PTMObject):
                          exterior + ' -o ' + interior +
                          ' -m state --state RELATED,ESTABLISHED -j ACCEPT')
 
-        for interface in self.interfaces.itervalues():
-            interface.stop_vlans()
-            interface.down()
+        with self.netlink_batch():
+            for interface in self.interfaces.itervalues():
+                interface.stop_vlans()
+                interface.down()
 
-        for bridge in self.bridges.itervalues():
-            bridge.down()
+            for bridge in self.bridges.itervalues():
+                bridge.down()
 
     def prepare_applications(self, lm):
         for app in self.applications:
@@ -366,6 +429,7 @@ class Host(PTMObject):
         for app in self.applications:
             if not app_type or app.get_type() in app_type:
                 self.LOG.debug('ptm starting app: ' + app.name)
+                app.before_start()
                 start_process = self.run_app_command('start', app)
                 stdout, stderr = start_process.communicate()
                 start_process.poll()
@@ -375,12 +439,37 @@ class Host(PTMObject):
                 self.LOG.debug("Host control process error output: ")
                 self.LOG.debug(stderr)
 
+    def wait_for_applications(self, state, wait_func, app_type=None):
+        """
+        Wait for all the applications (of the given types) on this host to
+        start or stop at the same time, rather than one after another.
+        Every application is waited on even if some fail; the first
+        failure is then raised.
+        :type state: str
+        :type wait_func: (Application) -> None
+        :type app_type: list[int]
+        """
+        apps = [app for app in self.applications
+                if not app_type or app.get_type() in app_type]
+        if len(apps) == 0:
+            return
+        for app in apps:
+            self.LOG.debug('Waiting for app: ' + app.get_name() + ' to ' +
+                           state)
+        with futures.ThreadPoolExecutor(max_workers=len(apps)) as pool:
+            jobs = [(app, pool.submit(wait_func, app)) for app in apps]
+
+        failures = [(app, job.exception()) for app, job in jobs
+                    if job.exception() is not None]
+        for app, e in failures:
+            self.LOG.error('App: ' + app.get_name() + ' failed to ' +
+                           state + ': ' + str(e))
+        if len(failures) > 0:
+            raise failures[0][1]
+
     def wait_for_all_applications_to_start(self, app_type=None):
-        for app in self.applications:
-            if not app_type or app.get_type() in app_type:
-                self.LOG.debug('Waiting for app: ' + app.get_name() +
-                               ' to start')
-                app.wait_for_process_start()
+        self.wait_for_applications(
+            'start', lambda app: app.wait_for_process_start(), app_type)
 
     def stop_applications(self, app_type=None):
         for app in self.applications:
@@ -396,11 +485,8 @@ class Host(PTMObject):
                 self.LOG.debug(stderr)
 
     def wait_for_all_applications_to_stop(self, app_type=None):
-        for app in self.applications:
-            if not app_type or app.get_type() in app_type:
-                self.LOG.debug('Waiting for app: ' + app.get_name() +
-                               ' to stop')
-                app.wait_for_process_stop()
+        self.wait_for_applications(
+            'stop', lambda app: app.wait_for_process_stop(), app_type)
 
     def restart_apps(self, app_type=None):
         self.stop_applications(app_type=app_type)
@@ -412,12 +498,25 @@ class Host(PTMObject):
         self.wait_for_all_applications_to_start(app_type=app_type)
 
     def set_loopback(self, ip_addr=IP('127.0.0.1', '8')):
+        netlink = self.get_netlink()
+        if netlink is not None:
+            # An address already present just fails to be added again
+            netlink.add_addr('lo', ip_addr)
+            netlink.set_link('lo', up=True)
+            return
+
         if not self.cli.grep_cmd('ip addr | grep lo | grep inet',
                                  str(ip_addr)):
             self.cli.cmd('ip addr add ' + str(ip_addr) + ' dev lo')
         self.cli.cmd('ip link set dev lo up')
 
     def reset_default_route(self, ip_addr):
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.del_route('default')
+            netlink.add_route('default', IP(ip_addr))
+            return
+
         self.cli.cmd('ip route del default')
         self.cli.cmd('ip route add default via ' + ip_addr)
 
@@ -428,17 +527,25 @@ class Host(PTMObject):
         :type dev: str
         :return:
         """
-        if gw_ip is None:
-            if dev is None:
-                raise exceptions.ArgMismatchException(
-                    'Must specify either next-hop GW or device to add a route')
+        if gw_ip is None and dev is None:
+            raise exceptions.ArgMismatchException(
+                'Must specify either next-hop GW or device to add a route')
+
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.add_route(route_ip, gw_ip, dev)
+        elif gw_ip is None:
             self.cli.cmd('ip route add ' + str(route_ip) + ' dev ' + str(dev))
         else:
             self.cli.cmd('ip route add ' + str(route_ip) + ' via ' + gw_ip.ip +
                          (' dev ' + str(dev) if dev else ''))
 
     def del_route(self, route_ip):
-        self.cli.cmd('ip route del ' + str(route_ip.ip))
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.del_route(route_ip)
+        else:
+            self.cli.cmd('ip route del ' + str(route_ip.ip))
 
     # noinspection PyUnresolvedReferences
     def get_ip(self, iface_name):
@@ -471,7 +578,7 @@ class Host(PTMObject):
                 self.stop_dhcp_client(iface)
                 raise exceptions.HostNotFoundException(
                     'No IP addr received from DHCP')
-            time.sleep(0)
+            time.sleep(zephyr_constants.DHCP_POLL_INTERVAL)
 
         ip_addr = self.get_ip(iface)
         self.dhcpcd_is_running.add(iface)
@@ -587,9 +694,37 @@ class Host(PTMObject):
         :param protocol: str
         :return: CommandStatus
         """
+        return self.start_echo_servers(ip_addr, [port], echo_data, protocol)
+
+    def start_echo_servers(self, ip_addr='localhost', ports=None,
+                           echo_data="pong", protocol='tcp'):
+        """
+        Start one echo server process serving all of the given ports (any
+        server already on one of them is stopped first, see
+        stop_echo_servers).  The process keeps running until one of its
+        ports is stopped.
+        :param ip_addr: str
+        :param ports: list[int]
+        :param echo_data: str
+        :param protocol: str 'tcp', 'udp' or 'tcp,udp'
+        :return: bool
+        """
+        if ports is None:
+            ports = [zephyr_constants.DEFAULT_ECHO_PORT]
+        self.stop_echo_servers(ports)
+        self.run_echo_server_process(ip_addr, ports, echo_data, protocol)
+        return True
+
+    def run_echo_server_process(self, ip_addr, ports, echo_data, protocol):
+        """
+        :type ip_addr: str
+        :type ports: list[int]
+        :type echo_data: str
+        :type protocol: str
+        """
         cmd = [self.ptm.root_dir + '/echo-server.py',
                '-i', ip_addr,
-               '-p', str(port),
+               '-p', ','.join(str(p) for p in ports),
                '-l', self.log_file_name,
                '-r', self.log_manager.root_dir,
                '-o', echo_data,
@@ -598,12 +733,11 @@ class Host(PTMObject):
         if self.debug:
             cmd.append('-d')
 
-        if (port in self.echo_server_procs and
-                self.echo_server_procs[port] is not None):
-            self.stop_echo_server(ip_addr, port)
         es_process = self.cli.cmd_pipe([cmd], blocking=False)
-        self.echo_server_procs[port] = es_process
-        return True
+        for port in ports:
+            self.echo_server_procs[port] = es_process
+        self.echo_server_args[es_process] = (
+            ip_addr, list(ports), echo_data, protocol)
 
     def stop_echo_server(self, ip_addr='localhost',
                          port=zephyr_constants.DEFAULT_ECHO_PORT):
@@ -614,14 +748,48 @@ class Host(PTMObject):
         :param port: int
         :return: (file, file) | None
         """
+        return self.stop_echo_servers([port])
+
+    def stop_echo_servers(self, ports):
+        """
+        Stop serving the given ports.  A process serving several ports
+        can't let go of just some of them, so the whole process is stopped
+        (freeing all of its ports) and its other ports are served again by
+        a new process, started the same way.
+        :param ports: list[int]
+        :return: (file, file) | None The output of the last process stopped
+        """
         out = None
-        if (port in self.echo_server_procs and
-                self.echo_server_procs[port] is not None):
-            es_proc = self.echo_server_procs[port]
+        processes = []
+        for port in ports:
+            es_proc = self.echo_server_procs.get(port)
+            if es_proc is not None and es_proc not in processes:
+                processes.append(es_proc)
+
+        for es_proc in processes:
+            ip_addr, group_ports, echo_data, protocol = (
+                self.echo_server_args.pop(es_proc))
+            for port in group_ports:
+                self.echo_server_procs.pop(port, None)
             out = es_proc.terminate()
-            self.echo_server_procs.pop(port)
+            other_ports = [p for p in group_ports if p not in ports]
+            if len(other_ports) > 0:
+                self.run_echo_server_process(ip_addr, other_ports,
+                                             echo_data, protocol)
         return out
 
+    def get_echo_client(self):
+        """
+        Get the echo worker this host sends echo requests through, which
+        is started (in this host's namespace) on first use.
+        :return: EchoWorkerClient
+        """
+        with self.echo_client_lock:
+            if self.echo_client is None:
+                self.echo_client = EchoWorkerClient(
+                    self.cli, [self.ptm.root_dir + '/echo-send.py', '-w'])
+            return self.echo_client
+
     def send_echo_request(self, dest_ip='localhost',
                           dest_port=zephyr_constants.DEFAULT_ECHO_PORT,
                           echo_request='ping',
@@ -636,18 +804,62 @@ class Host(PTMObject):
         :param timeout: int
         :return: str
         """
-        cmd = [self.ptm.root_dir + '/echo-send.py',
-               '-i', dest_ip,
-               '-p', str(dest_port),
-               '-t', str(timeout),
-               '-o', echo_request,
-               '-c', protocol]
-
-        es_process = self.cli.cmd_pipe([cmd], blocking=True)
-        if es_process.ret_code != 0:
+        reply = self.send_echo_requests(
+            dest_ip, dest_port, [echo_request], protocol, timeout)[0]
+        if reply['error'] is not None:
             raise exceptions.SubprocessFailedException(
-                "Echo Send failed: " + es_process.stderr)
-        return es_process.stdout.strip()
+                "Echo Send failed: " + reply['error'])
+        return reply['reply'].strip()
+
+    def send_echo_requests(self, dest_ip='localhost',
+                           dest_port=zephyr_constants.DEFAULT_ECHO_PORT,
+                           echo_requests=list(['ping']),
+                           protocol='tcp', timeout=10, concurrency=1,
+                           keep_alive=False):
+        """
+        Send a batch of echo requests from this host, up to concurrency of
+        them at a time, and return the outcome of each, in order, as a
+        dict with the 'reply' (without the termination string, '' if none
+        came), its 'source' (the echo data of the server that answered),
+        the 'latency' in seconds, and the 'error' (None if it succeeded).
+        :param dest_ip: str
+        :param dest_port: int
+        :param echo_requests: list[str]
+        :param protocol: str
+        :param timeout: int
+        :param concurrency: int
+        :param keep_alive: bool Reuse TCP connections between requests
+        :return: list[dict[str, any]]
+        """
+        return self.get_echo_client().send_batch(
+            dest_ip, dest_port, echo_requests, protocol, timeout,
+            concurrency, keep_alive)
+
+    def generate_echo_load(self, dest_ip='localhost',
+                           dest_port=zephyr_constants.DEFAULT_ECHO_PORT,
+                           connections=1, rate=None, duration=10,
+                           echo_request='ping', protocol='tcp', timeout=10,
+                           keep_alive=False):
+        """
+        Send echo requests from this host over the given number of
+        concurrent connections, at the given total rate per second (or as
+        fast as they are answered), for the duration in seconds, and
+        return a report of the requests, replies, errors, throughput and
+        latency percentiles (see echo_client.load_report).
+        :param dest_ip: str
+        :param dest_port: int
+        :param connections: int
+        :param rate: float
+        :param duration: float
+        :param echo_request: str
+        :param protocol: str
+        :param timeout: int
+        :param keep_alive: bool Reuse TCP connections between requests
+        :return: dict[str, any]
+        """
+        return self.get_echo_client().generate_load(
+            dest_ip, dest_port, connections, rate, duration, echo_request,
+            protocol, timeout, keep_alive)
 
     @staticmethod
     def is_virtual_network_host():
@@ -690,14 +902,14 @@ class Host(PTMObject):
         tcps = TCPSender()
         opt_map = {'command': command}
         if source_mac is not None:
-            opt_map = {'smac': source_mac}
+            opt_map['smac'] = source_mac
         if dest_mac is not None:
-            opt_map = {'tmac': dest_mac}
+            opt_map['tmac'] = dest_mac
         if source_ip is not None:
-            opt_map = {'sip': source_ip}
+            opt_map['sip'] = source_ip
         if dest_ip is not None:
-            opt_map = {'tip': dest_ip}
-        opt_map += packet_options
+            opt_map['tip'] = dest_ip
+        opt_map.update(packet_options or {})
         return tcps.send_packet(self.cli, interface=iface, dest_ip=dest_ip,
                                 packet_type='arp',
                                 packet_options=opt_map, count=count).stdout
@@ -50,7 +50,21 @@ class Interface(PTMObject):
     def remove(self):
         pass
 
+    def get_netlink(self):
+        """
+        :return: zephyr.common.netlink.IPRoute
+        """
+        return self.host.get_netlink()
+
     def config_addr(self):
+        netlink = self.get_netlink()
+        if netlink is not None:
+            if self.mac is not None:
+                netlink.set_link(self.get_name(), mac=self.mac)
+            for ip in self.ip_list:
+                netlink.add_addr(self.get_name(), ip)
+            return
+
         if self.mac is not None:
             self.cli.cmd('ip link set dev ' + self.get_name() +
                          ' address ' + self.mac)
@@ -59,31 +73,52 @@ class Interface(PTMObject):
             self.cli.cmd('ip addr add ' + str(ip) + ' dev ' + self.get_name())
 
     def up(self):
-        self.cli.cmd('ip link set dev ' + self.get_name() + ' up')
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.set_link(self.get_name(), up=True)
+        else:
+            self.cli.cmd('ip link set dev ' + self.get_name() + ' up')
         self.state = Interface.UP
 
     def down(self):
-        self.cli.cmd('ip link set dev ' + self.get_name() + ' down')
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.set_link(self.get_name(), up=False)
+        else:
+            self.cli.cmd('ip link set dev ' + self.get_name() + ' down')
         self.state = Interface.DOWN
 
     def set_mac(self, new_mac):
         self.mac = new_mac
-        self.cli.cmd('ip link set dev ' + self.get_name() +
-                     ' address ' + new_mac)
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.set_link(self.get_name(), mac=new_mac)
+        else:
+            self.cli.cmd('ip link set dev ' + self.get_name() +
+                         ' address ' + new_mac)
 
     def add_ip(self, new_ip):
         """
         :type new_ip: IP
         """
-        self.cli.cmd('ip addr add ' + str(new_ip) + ' dev ' + self.get_name())
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.add_addr(self.get_name(), new_ip)
+        else:
+            self.cli.cmd('ip addr add ' + str(new_ip) +
+                         ' dev ' + self.get_name())
         self.ip_list.append(new_ip)
 
     def del_ip(self, new_ip):
         """
         :type new_ip: IP
         """
-        self.cli.cmd('ip addr del ' + str(new_ip) +
-                     ' dev ' + self.get_name())
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.del_addr(self.get_name(), new_ip)
+        else:
+            self.cli.cmd('ip addr del ' + str(new_ip) +
+                         ' dev ' + self.get_name())
         self.ip_list.remove(new_ip)
 
     def start_vlans(self):
@@ -102,6 +137,14 @@ class Interface(PTMObject):
         :type ip_list: list[IP]
         """
         vlan_iface = self.name + '.' + str(vlan_id)
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.add_vlan(vlan_iface, self.name, vlan_id)
+            netlink.set_link(vlan_iface, up=True)
+            for ip in ip_list:
+                netlink.add_addr(vlan_iface, ip)
+            return
+
         self.cli.cmd('ip link add link ' + self.name + ' name ' +
                      vlan_iface + ' type vlan id ' + str(vlan_id))
         self.cli.cmd('ip link set dev ' + vlan_iface + ' up')
@@ -110,6 +153,12 @@ class Interface(PTMObject):
 
     def unlink_vlan(self, vlan_id):
         vlan_iface = self.name + '.' + str(vlan_id)
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.set_link(vlan_iface, up=False)
+            netlink.del_link(vlan_iface)
+            return
+
         self.cli.cmd('ip link set dev ' + vlan_iface + ' down')
         self.cli.cmd('ip link del ' + vlan_iface)
 
@@ -47,12 +47,24 @@ class VirtualInterface(Interface):
         Link a veth peer to a far host and return the new interface
         :return: Interface The peer on the far host, configured and ready
         """
-        self.cli.cmd(
-            'ip link add dev ' + self.get_name() +
-            ' type veth peer name ' +
-            (self.peer_name
-             if self.use_namespace
-             else self.peer_interface.name))
+        netlink = self.get_netlink()
+        if netlink is None:
+            self.cli.cmd(
+                'ip link add dev ' + self.get_name() +
+                ' type veth peer name ' +
+                (self.peer_name
+                 if self.use_namespace
+                 else self.peer_interface.name))
+        elif self.use_namespace and self.peer_interface is not None:
+            # Create the peer straight on the far host, under its final
+            # name, rather than moving and renaming it afterwards
+            netlink.add_veth(self.get_name(), self.peer_interface.name,
+                             peer_netns=self.peer_interface.host.name)
+        else:
+            netlink.add_veth(self.get_name(),
+                             (self.peer_name
+                              if self.use_namespace
+                              else self.peer_interface.name))
 
         # Add interface to the linked bridge, if there is one
         if self.linked_bridge is not None:
@@ -62,7 +74,7 @@ class VirtualInterface(Interface):
         if self.peer_interface is None:
             return
 
-        if self.use_namespace:
+        if self.use_namespace and netlink is None:
             # move peer interface onto far host's namespace
             self.cli.cmd('ip link set dev ' + self.peer_name + ' netns ' +
                          self.peer_interface.host.name + ' name ' +
@@ -71,6 +83,10 @@ class VirtualInterface(Interface):
         # In the unlikely chance that the peer is also linked to a bridge,
         # go ahead and link
         if self.peer_interface.linked_bridge is not None:
+            if netlink is not None:
+                # The far host can only see the peer once the veth
+                # creation has been sent
+                netlink.flush()
             self.peer_interface.linked_bridge.link_interface(
                 self.peer_interface)
 
@@ -79,7 +95,11 @@ class VirtualInterface(Interface):
         return self.peer_interface
 
     def remove(self):
-        self.cli.cmd('ip link del dev ' + self.get_name())
+        netlink = self.get_netlink()
+        if netlink is not None:
+            netlink.del_link(self.get_name())
+        else:
+            self.cli.cmd('ip link del dev ' + self.get_name())
 
     def config_addr(self):
         # Perform the normal address configuration, then set the
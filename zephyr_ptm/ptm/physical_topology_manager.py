@@ -12,9 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent import futures
 import json
 import logging
 import os
+import time
+import traceback
 
 from zephyr.common import cli
 from zephyr.common import exceptions
@@ -26,10 +29,12 @@ from zephyr_ptm.ptm.application.netns_hv import NetnsHV
 from zephyr_ptm.ptm.fixtures import midonet_setup_fixture
 from zephyr_ptm.ptm.fixtures import neutron_setup_fixture
 from zephyr_ptm.ptm.physical_topology_config import PhysicalTopologyConfig
+from zephyr_ptm.ptm import ptm_constants
 
 
 class PhysicalTopologyManager(object):
-    def __init__(self, root_dir='.', log_manager=None, log_root_dir=None):
+    def __init__(self, root_dir='.', log_manager=None, log_root_dir=None,
+                 max_workers=ptm_constants.PTM_MAX_WORKERS):
         self.hosts_by_name = {}
         """ :type: dict[str, ptm.host.host.Host]"""
         self.host_by_start_order = []
@@ -63,6 +68,11 @@ class PhysicalTopologyManager(object):
         self.config_file = None
         self.hosts = []
         self.topo_file = None
+        self.max_workers = max_workers
+        self.phase_timings = []
+        """ :type: list[(str, float)]"""
+        self.host_timings = []
+        """ :type: list[(str, str, float)]"""
 
     def configure_logging(self, log_file_name=None,
                           log_name='ptm-root', debug=False):
@@ -267,51 +277,120 @@ class PhysicalTopologyManager(object):
             for h in l:
                 h.print_config(indent + 1)
 
+    def run_host_phase(self, phase, hosts, host_func, max_workers=None):
+        """
+        Run one startup or shutdown step on every given host at once, on at
+        most max_workers threads (the ptm's max_workers by default).  A
+        failure on one host doesn't stop the others; all failures are
+        logged and returned together once every host is done.  How long
+        each host and the phase as a whole took is added to host_timings
+        and phase_timings.
+        :type phase: str
+        :type hosts: list[Host]
+        :type host_func: (Host) -> None
+        :type max_workers: int
+        :return: list[(str, Exception)] Failed host names and their errors
+        """
+        if len(hosts) == 0:
+            return []
+        if max_workers is None:
+            max_workers = self.max_workers
+        self.LOG.debug('ptm ' + phase + ' on hosts: ' +
+                       ', '.join(h.name for h in hosts))
+
+        def run_on_host(h):
+            host_start = time.time()
+            try:
+                host_func(h)
+            except Exception:
+                self.LOG.fatal('ptm ' + phase + ' failed on host: ' +
+                               h.name + ': ' + traceback.format_exc())
+                raise
+            finally:
+                self.host_timings.append(
+                    (phase, h.name, time.time() - host_start))
+
+        phase_start = time.time()
+        failures = []
+        with futures.ThreadPoolExecutor(
+                max_workers=max(1, min(max_workers, len(hosts)))) as pool:
+            jobs = [(h, pool.submit(run_on_host, h)) for h in hosts]
+            for h, job in jobs:
+                if job.exception() is not None:
+                    failures.append((h.name, job.exception()))
+        elapsed = time.time() - phase_start
+        self.phase_timings.append((phase, elapsed))
+        self.LOG.debug('ptm ' + phase + ' took ' +
+                       ('%.3f' % elapsed) + 's')
+        return failures
+
+    def run_startup_phase(self, phase, host_func, max_workers=None):
+        """
+        Run a startup step on all hosts, one start-order tier at a time, so
+        no host starts a step before the hosts it depends on have finished
+        it.  Stops and raises with every failure on the first tier that
+        has any.
+        :type phase: str
+        :type host_func: (Host) -> None
+        :type max_workers: int
+        """
+        for tier, l in enumerate(self.host_by_start_order):
+            tier_phase = phase + ' (tier ' + str(tier) + ')'
+            failures = self.run_host_phase(tier_phase, l, host_func,
+                                           max_workers)
+            if len(failures) > 0:
+                raise exceptions.HostPhaseFailedException(tier_phase,
+                                                          failures)
+
+    def run_shutdown_phase(self, phase, host_func):
+        """
+        Run a shutdown step on all hosts, in reverse start-order tiers.
+        Failures are logged and collected, but the step (and the shutdown)
+        carries on through every host regardless.
+        :type phase: str
+        :type host_func: (Host) -> None
+        :return: list[(str, Exception)] Failed host names and their errors
+        """
+        failures = []
+        for tier, l in reversed(list(enumerate(self.host_by_start_order))):
+            failures += self.run_host_phase(
+                phase + ' (tier ' + str(tier) + ')', l, host_func)
+        return failures
+
     def startup(self):
         """
         Startup the configured Midonet cluster, including creating,
-        booting, initializing, and starting all hosts
+        booting, initializing, and starting all hosts.  Each step runs on
+        all the hosts in a start-order tier concurrently, with the tiers
+        taken in order.
         :return:
         """
         self.LOG.debug('**ptm starting up**')
+        startup_start = time.time()
 
         self.LOG.debug('ptm starting hosts')
-        for l in self.host_by_start_order:
-            for h in l:
-                self.LOG.debug('ptm creating host: ' + h.name)
-                h.create()
-
-        for l in self.host_by_start_order:
-            for h in l:
-                self.LOG.debug('ptm booting host: ' + h.name)
-                h.boot()
+        self.run_startup_phase('creating hosts', lambda h: h.create())
+        self.run_startup_phase('booting hosts', lambda h: h.boot())
 
         self.LOG.debug('ptm starting host network')
-        for l in self.host_by_start_order:
-            for h in l:
-                self.LOG.debug('ptm starting networks on host: ' + h.name)
-                h.net_up()
-
-        for l in self.host_by_start_order:
-            for h in l:
-                self.LOG.debug('ptm finalizing networks on host: ' + h.name)
-                h.net_finalize()
+        self.run_startup_phase('starting networks', lambda h: h.net_up())
+        self.run_startup_phase('finalizing networks',
+                               lambda h: h.net_finalize())
 
         self.LOG.debug('ptm starting host applications')
-        for l in self.host_by_start_order:
-            for h in l:
-                self.LOG.debug('ptm preparing config files on host: ' + h.name)
-                h.prepare_applications(self.log_manager)
+        # Application config files live on the filesystem all the hosts
+        # share, and some are common to several hosts, so write them one
+        # host at a time.
+        self.run_startup_phase(
+            'preparing config files',
+            lambda h: h.prepare_applications(self.log_manager),
+            max_workers=1)
 
-        for l in self.host_by_start_order:
-            for h in l:
-                self.LOG.debug('ptm starting apps on host: ' + h.name)
-                h.start_applications()
+        def start_apps(h):
+            h.start_applications()
+            h.wait_for_all_applications_to_start()
 
-            for h in l:
-                self.LOG.debug('ptm waiting for apps to start on host: ' +
-                               h.name)
-                h.wait_for_all_applications_to_start()
+        self.run_startup_phase('starting apps', start_apps)
 
         # Must go through and set up both neutron and
         # midonet for use by zephyr.
@@ -320,69 +399,46 @@ class PhysicalTopologyManager(object):
         self.midonet_setup.setup()
         self.neutron_setup.setup()
 
-        self.LOG.debug('**ptm startup finished**')
+        self.LOG.debug('**ptm startup finished in ' +
+                       ('%.3f' % (time.time() - startup_start)) + 's**')
 
     def shutdown(self):
         """
         Shutdown the configured Midonet cluster by stopping, shutting
-        own, and removing all hosts
-        :return:
+        own, and removing all hosts.  Each step runs on all the hosts in a
+        start-order tier concurrently, with the tiers taken in reverse
+        order.  Failures don't stop the shutdown; they are all reported
+        together at the end and returned.
+        :return: list[(str, Exception)] Failed host names and their errors
         """
         self.LOG.debug('**ptm shutting down**')
-        for l in reversed(self.host_by_start_order):
-            for h in l:
-                try:
-                    self.LOG.debug('ptm stopping apps on host: ' + h.name)
-                    h.stop_applications()
-                except Exception as e:
-                    self.LOG.fatal('Fatal error shutting down ptm host apps, '
-                                   'trying to continue to next host: ' +
-                                   str(e))
-
-        for l in reversed(self.host_by_start_order):
-            for h in l:
-                self.LOG.debug('ptm waiting for apps to stop on host: ' +
-                               h.name)
-                h.wait_for_all_applications_to_stop()
+        shutdown_start = time.time()
+        failures = []
+
+        def stop_apps(h):
+            h.stop_applications()
+            h.wait_for_all_applications_to_stop()
+
+        failures += self.run_shutdown_phase('stopping apps', stop_apps)
 
         self.LOG.debug('ptm stopping networks')
-        for l in reversed(self.host_by_start_order):
-            for h in l:
-                try:
-                    self.LOG.debug('ptm bringing down network on host: ' +
-                                   h.name)
-                    h.net_down()
-                except Exception as e:
-                    self.LOG.fatal(
-                        'Fatal error shutting down ptm host '
-                        'networks, trying to continue to next host: ' +
-                        str(e))
+        failures += self.run_shutdown_phase('bringing down networks',
+                                            lambda h: h.net_down())
 
         self.LOG.debug('ptm stopping hosts')
-        for l in reversed(self.host_by_start_order):
-            for h in l:
-                try:
-                    self.LOG.debug('ptm stopping host: ' + h.name)
-                    h.shutdown()
-                except Exception as e:
-                    self.LOG.fatal(
-                        'Fatal error shutting down ptm hosts, trying '
-                        'to continue to next host: ' +
-                        str(e))
-
-        for l in reversed(self.host_by_start_order):
-            for h in l:
-                try:
-                    self.LOG.debug('ptm deleting host: ' + h.name)
-                    h.remove()
-                except Exception as e:
-                    self.LOG.fatal(
-                        'Fatal error removing ptm hosts, trying to '
-                        'continue to next host: ' +
-                        str(e))
+        failures += self.run_shutdown_phase('stopping hosts',
+                                            lambda h: h.shutdown())
+        failures += self.run_shutdown_phase('deleting hosts',
+                                            lambda h: h.remove())
 
         self.neutron_setup.teardown()
-        self.LOG.debug('**ptm shutdown finished**')
+        self.LOG.debug('**ptm shutdown finished in ' +
+                       ('%.3f' % (time.time() - shutdown_start)) + 's**')
+        if len(failures) > 0:
+            self.LOG.fatal(
+                'ptm shutdown failed on host(s), but carried on: ' +
+                ', '.join(name + ': ' + str(e) for name, e in failures))
+        return failures
 
     def ptm_host_app_control(self, app_cmd, host_json, app_json, arg_list):
 
@@ -17,3 +17,6 @@ CONTROL_CMD_NAME = 'ptm-ctl.py'
 HOST_CONTROL_CMD_NAME = 'ptm-host-ctl.py'
 
 APPLICATION_START_TIMEOUT = 45
+
+# Most hosts the ptm will start up or shut down at the same time
+PTM_MAX_WORKERS = 8
@@ -157,6 +157,11 @@ class PTMUnderlayHost(underlay_host.UnderlayHost):
         return self.underlay_host_obj.start_echo_server(
             ip_addr, port, echo_data, protocol)
 
+    def do_start_echo_servers(self, ip_addr='localhost', ports=None,
+                              echo_data="pong", protocol='tcp'):
+        return self.underlay_host_obj.start_echo_servers(
+            ip_addr, ports, echo_data, protocol)
+
     def do_stop_echo_server(self, ip_addr='localhost',
                             port=zephyr_constants.DEFAULT_ECHO_PORT):
         return self.underlay_host_obj.stop_echo_server(ip_addr, port)
@@ -170,6 +175,26 @@ class PTMUnderlayHost(underlay_host.UnderlayHost):
             echo_request=echo_request, protocol=protocol,
             timeout=timeout)
 
+    def do_send_echo_requests(self, dest_ip='localhost',
+                              dest_port=zephyr_constants.DEFAULT_ECHO_PORT,
+                              echo_requests=list(['ping']),
+                              protocol='tcp', timeout=10, concurrency=1,
+                              keep_alive=False):
+        return self.underlay_host_obj.send_echo_requests(
+            dest_ip=dest_ip, dest_port=dest_port,
+            echo_requests=echo_requests, protocol=protocol,
+            timeout=timeout, concurrency=concurrency, keep_alive=keep_alive)
+
+    def do_generate_echo_load(self, dest_ip='localhost',
+                              dest_port=zephyr_constants.DEFAULT_ECHO_PORT,
+                              connections=1, rate=None, duration=10,
+                              echo_request='ping', protocol='tcp',
+                              timeout=10, keep_alive=False):
+        return self.underlay_host_obj.generate_echo_load(
+            dest_ip=dest_ip, dest_port=dest_port, connections=connections,
+            rate=rate, duration=duration, echo_request=echo_request,
+            protocol=protocol, timeout=timeout, keep_alive=keep_alive)
+
     def send_custom_packet(self, iface, **kwargs):
         return self.underlay_host_obj.send_custom_packet(iface, **kwargs)
 
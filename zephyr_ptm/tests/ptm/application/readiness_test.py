@@ -0,0 +1,217 @@
+# Copyright 2016 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import BaseHTTPServer
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+from zephyr.common.exceptions import *
+from zephyr.common.utils import run_unit_test
+from zephyr_ptm.ptm.application import readiness
+
+
+class OKHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Like a servlet container before its application is deployed
+        self.send_response(404 if self.path.startswith('/missing') else 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class NoCLI(object):
+    def cmd(self, *args, **kwargs):
+        raise AssertionError('Readable log read through the CLI')
+
+
+class ReadinessTest(unittest.TestCase):
+    def test_tcp_port(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        port = server.getsockname()[1]
+
+        def answer():
+            conn, _ = server.accept()
+            if conn.recv(4) == 'ruok':
+                conn.sendall('imok')
+            conn.close()
+
+        t = threading.Thread(target=answer)
+        t.start()
+        try:
+            self.assertTrue(readiness.TCPPortProbe(
+                '127.0.0.1', port, request='ruok', response='imok',
+                timeout=5).wait())
+        finally:
+            t.join()
+            server.close()
+
+        # Nothing listens on the port any more
+        self.assertFalse(readiness.TCPPortProbe(
+            '127.0.0.1', port, timeout=0.3).wait())
+
+    def test_http(self):
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), OKHandler)
+        url = 'http://127.0.0.1:' + str(server.server_port) + '/'
+        t = threading.Thread(target=server.serve_forever)
+        t.start()
+        try:
+            self.assertTrue(readiness.HTTPProbe(url, timeout=5).wait())
+            self.assertFalse(
+                readiness.HTTPProbe(url, statuses=[204], timeout=0.3).wait())
+            self.assertFalse(
+                readiness.HTTPProbe(url + 'missing', timeout=0.3).wait())
+            self.assertTrue(
+                readiness.HTTPProbe(url + 'missing', statuses=[404],
+                                    timeout=5).wait())
+        finally:
+            server.shutdown()
+            t.join()
+            server.server_close()
+
+    def test_log_line(self):
+        log_dir = tempfile.mkdtemp()
+        log_file = os.path.join(log_dir, 'app.log')
+        with open(log_file, 'w') as f:
+            f.write('Service starting\n')
+
+        def write_log():
+            time.sleep(0.3)
+            with open(log_file, 'a') as f:
+                f.write('Service is ')
+                f.flush()
+                time.sleep(0.1)
+                f.write('up\n')
+
+        # A line from an earlier run, before the start position
+        with open(log_file, 'a') as f:
+            f.write('Service started\n')
+        # A log this process can read is read directly, not through a CLI
+        cli = NoCLI()
+        probe = readiness.LogLineProbe(
+            log_file, 'Service (started|is up)', cli=cli)
+        self.assertTrue(probe.check())
+        probe.close()
+
+        probe = readiness.LogLineProbe(
+            log_file, 'Service (started|is up)',
+            start_position=readiness.LogLineProbe.log_position(log_file,
+                                                               cli),
+            cli=cli, timeout=10)
+        self.assertFalse(probe.check())
+
+        t = threading.Thread(target=write_log)
+        t.start()
+        start = time.time()
+        try:
+            self.assertTrue(probe.wait())
+            # Woken up by the write, not by a backed-off retry
+            self.assertLess(time.time() - start, 1.5)
+        finally:
+            t.join()
+
+        # A new log file is read from the start
+        os.remove(log_file)
+        with open(log_file, 'w') as f:
+            f.write('Service started\n')
+        self.assertTrue(probe.check())
+
+        os.remove(log_file)
+        os.rmdir(log_dir)
+        self.assertFalse(probe.check())
+        probe.close()
+
+    def test_log_line_busy(self):
+        log_dir = tempfile.mkdtemp()
+        log_file = os.path.join(log_dir, 'app.log')
+        open(log_file, 'w').close()
+        stop = threading.Event()
+
+        def write_log():
+            with open(log_file, 'a') as f:
+                while not stop.is_set():
+                    f.write('Service busy\n')
+                    f.flush()
+                    time.sleep(0.005)
+
+        probe = readiness.LogLineProbe(log_file, 'Service is up',
+                                       cli=NoCLI(), timeout=1.5)
+        checks = []
+        check = probe.check
+
+        def counted_check():
+            checks.append(time.time())
+            return check()
+
+        probe.check = counted_check
+        t = threading.Thread(target=write_log)
+        t.start()
+        try:
+            self.assertFalse(probe.wait())
+        finally:
+            stop.set()
+            t.join()
+        # Hundreds of writes, but the reads back off like the retries do
+        self.assertLessEqual(len(checks), 8)
+        self.assertGreater(probe.offset, 0)
+
+        os.remove(log_file)
+        os.rmdir(log_dir)
+
+    def test_process_exit(self):
+        process = subprocess.Popen(['sleep', '0.3'])
+        probe = readiness.ProcessExitProbe(process.pid, timeout=0.1)
+        self.assertFalse(probe.wait())
+
+        # An exited process counts even before it has been reaped
+        probe = readiness.ProcessExitProbe(process.pid, timeout=5)
+        start = time.time()
+        self.assertTrue(probe.wait())
+        self.assertLess(time.time() - start, 1.5)
+        process.wait()
+
+        # Without a pidfd, the process is looked up in /proc
+        probe = readiness.ProcessExitProbe(os.getpid(), timeout=0.1)
+        self.assertFalse(probe.check())
+        self.assertTrue(readiness.ProcessExitProbe(process.pid).check())
+
+    def test_wait_for_probes(self):
+        start = time.time()
+        readiness.wait_for_probes(
+            [readiness.FunctionProbe(
+                'probe' + str(i),
+                lambda: time.time() - start > 0.5, timeout=5)
+             for i in range(0, 5)])
+        # All probes waited at once
+        self.assertLess(time.time() - start, 2)
+
+        try:
+            readiness.wait_for_probes(
+                [readiness.FunctionProbe('ready', lambda: True),
+                 readiness.FunctionProbe('never', lambda: False,
+                                         timeout=0.2)])
+        except SubprocessTimeoutException as e:
+            self.assertIn('never', str(e))
+            self.assertNotIn('ready', str(e))
+        else:
+            self.fail('Probe that never passes should time out')
+
+run_unit_test(ReadinessTest)
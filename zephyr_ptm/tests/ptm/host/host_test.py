@@ -0,0 +1,81 @@
+# Copyright 2015 Midokura SARL
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import socket
+import time
+import unittest
+
+from zephyr.common.echo_server import EchoServer
+from zephyr.common.log_manager import LogManager
+from zephyr.common.utils import run_unit_test
+from zephyr_ptm.ptm.host.root_host import RootHost
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__)) + '/../../../..'
+
+
+class SamplePTM(object):
+    # Just what a Host needs to run its echo servers
+    def __init__(self):
+        self.root_dir = ROOT_DIR
+        self.log_manager = LogManager('./test-logs')
+
+
+def wait_for_echo(port, expected, timeout=10):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            resp = EchoServer.send('127.0.0.1', port, timeout=1)
+            if resp == expected:
+                return resp
+        except socket.error:
+            resp = None
+        if time.time() > deadline:
+            return resp
+        time.sleep(0.1)
+
+
+class HostTest(unittest.TestCase):
+    def test_restart_shared_echo_ports(self):
+        h = RootHost('root', SamplePTM())
+        h.configure_logging(log_file_name="test-ptm.log", debug=True)
+
+        try:
+            h.start_echo_servers(ip_addr='127.0.0.1', ports=[6081, 6082])
+            self.assertEqual('ping:pong', wait_for_echo(6081, 'ping:pong'))
+            self.assertEqual('ping:pong', wait_for_echo(6082, 'ping:pong'))
+            shared = h.echo_server_procs[6081]
+
+            # Restarting one of the shared ports stops the whole process,
+            # so the port is free for the new one, and the other port is
+            # served again
+            h.start_echo_server(ip_addr='127.0.0.1', port=6081,
+                                echo_data='pong2')
+            self.assertEqual('ping:pong2', wait_for_echo(6081, 'ping:pong2'))
+            self.assertEqual('ping:pong', wait_for_echo(6082, 'ping:pong'))
+            self.assertIsNotNone(shared.process.poll())
+            self.assertIsNot(h.echo_server_procs[6081],
+                             h.echo_server_procs[6082])
+
+            h.stop_echo_server(port=6082)
+            self.assertNotIn(6082, h.echo_server_procs)
+            self.assertEqual('ping:pong2', wait_for_echo(6081, 'ping:pong2'))
+            self.assertRaises(socket.error, EchoServer.send,
+                              '127.0.0.1', 6082, timeout=1)
+        finally:
+            h.stop_echo_servers([6081, 6082])
+        self.assertEqual({}, h.echo_server_procs)
+        self.assertEqual({}, h.echo_server_args)
+
+run_unit_test(HostTest)
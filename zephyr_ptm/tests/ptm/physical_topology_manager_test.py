@@ -13,9 +13,12 @@
 # limitations under the License.
 
 import os
+import threading
+import time
 import unittest
 
 from zephyr.common.cli import LinuxCLI
+from zephyr.common.exceptions import *
 from zephyr.common.log_manager import LogManager
 from zephyr.common.utils import run_unit_test
 from zephyr_ptm.ptm.physical_topology_manager import PhysicalTopologyManager
@@ -23,6 +26,21 @@ from zephyr_ptm.ptm.physical_topology_manager import PhysicalTopologyManager
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__)) + '/../../..'
 
 
+class FakeHost(object):
+    def __init__(self, name, calls, fail=False):
+        self.name = name
+        self.calls = calls
+        self.fail = fail
+
+    def step(self):
+        start = time.time()
+        time.sleep(0.2)
+        self.calls.append((self.name, start, time.time(),
+                           threading.current_thread().name))
+        if self.fail:
+            raise SubprocessFailedException(self.name + ' failed')
+
+
 class PhysicalTopologyManagerTest(unittest.TestCase):
 
     def test_configure(self):
@@ -143,6 +161,52 @@ class PhysicalTopologyManagerTest(unittest.TestCase):
                 './test-logs/PhysicalTopologyManagerTest-midolman.log')
             raise
 
+    def test_parallel_phases(self):
+        lm = LogManager('./test-logs')
+        ptm = PhysicalTopologyManager(root_dir=ROOT_DIR, log_manager=lm,
+                                      max_workers=2)
+        calls = []
+        ptm.host_by_start_order = [
+            [FakeHost('a', calls)],
+            [FakeHost('b1', calls), FakeHost('b2', calls, fail=True),
+             FakeHost('b3', calls)],
+            [FakeHost('c', calls)]]
+
+        try:
+            ptm.run_startup_phase('stepping', lambda h: h.step())
+        except HostPhaseFailedException as e:
+            self.assertEqual('stepping (tier 1)', e.phase)
+            self.assertEqual(['b2'], [name for name, _ in e.failures])
+        else:
+            self.fail('Failed host should fail the phase')
+
+        # The rest of the failed tier still ran, but the next one didn't
+        names = [c[0] for c in calls]
+        self.assertEqual('a', names[0])
+        self.assertEqual(set(['b1', 'b2', 'b3']), set(names[1:]))
+        ends = dict((c[0], c[2]) for c in calls)
+        starts = dict((c[0], c[1]) for c in calls)
+        self.assertTrue(all(starts[n] >= ends['a'] for n in names[1:]))
+
+        # Only two at a time in the tier
+        self.assertEqual(2, len(set(c[3] for c in calls[1:])))
+        self.assertTrue(ends['b1'] > starts['b2'] or
+                        ends['b2'] > starts['b1'])
+
+        self.assertEqual(['stepping (tier 0)', 'stepping (tier 1)'],
+                         [p for p, _ in ptm.phase_timings])
+        self.assertEqual(4, len(ptm.host_timings))
+        self.assertTrue(all(t >= 0.2 for _, _, t in ptm.host_timings))
+
+        # Shutdown steps go through every tier, in reverse, regardless
+        del calls[:]
+        failures = ptm.run_shutdown_phase('stepping down',
+                                          lambda h: h.step())
+        self.assertEqual(['b2'], [name for name, _ in failures])
+        self.assertEqual('c', calls[0][0])
+        self.assertEqual('a', calls[-1][0])
+        self.assertEqual(5, len(calls))
+
     def tearDown(self):
         LinuxCLI().cmd('ip netns del cmp1')
         LinuxCLI().cmd('ip netns del zoo1')